@@ -0,0 +1,47 @@
+"""add_order_sync_watermark
+
+Revision ID: add_order_sync_watermark
+Revises: bf055956cf66
+Create Date: 2025-12-14 10:00:00.000000
+
+订单增量同步优化：
+1. ozon_shops.order_sync_watermark - 增量同步水位，下次仅从水位（减重叠窗口）开始拉取
+2. ozon_postings.payload_hash - raw_payload 内容哈希，内容未变化的 posting 跳过处理
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_order_sync_watermark'
+down_revision = 'bf055956cf66'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema"""
+    op.add_column(
+        'ozon_shops',
+        sa.Column(
+            'order_sync_watermark',
+            sa.DateTime(timezone=True),
+            nullable=True,
+            comment='订单增量同步水位（上次成功拉取的截止时间）'
+        )
+    )
+    op.add_column(
+        'ozon_postings',
+        sa.Column(
+            'payload_hash',
+            sa.String(32),
+            nullable=True,
+            comment='raw_payload 内容哈希（同步时跳过未变化的 posting）'
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema"""
+    op.drop_column('ozon_postings', 'payload_hash')
+    op.drop_column('ozon_shops', 'order_sync_watermark')
@@ -0,0 +1,32 @@
+"""drop_webhook_idempotency_index
+
+Revision ID: drop_webhook_idempotency_index
+Revises: add_order_sync_watermark
+Create Date: 2025-12-15 10:00:00.000000
+
+Webhook 去重改为 Redis SET NX 快速路径 + event_id 唯一约束兜底，
+接收端不再按 idempotency_key 查询，删除该索引以减少写入开销和索引膨胀。
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'drop_webhook_idempotency_index'
+down_revision = 'add_order_sync_watermark'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema"""
+    op.drop_index('idx_ozon_webhook_idempotency', table_name='ozon_webhook_events')
+
+
+def downgrade() -> None:
+    """Downgrade database schema"""
+    op.create_index(
+        'idx_ozon_webhook_idempotency',
+        'ozon_webhook_events',
+        ['idempotency_key'],
+        unique=False
+    )
@@ -0,0 +1,36 @@
+"""add_product_sync_content_hash
+
+Revision ID: add_product_sync_content_hash
+Revises: drop_webhook_idempotency_index
+Create Date: 2025-12-16 10:00:00.000000
+
+商品同步按 OZON 数据内容哈希检测变化：
+哈希与上次同步一致的商品跳过映射和 ORM 更新，只刷新同步时间。
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_product_sync_content_hash'
+down_revision = 'drop_webhook_idempotency_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema"""
+    op.add_column(
+        'ozon_products',
+        sa.Column(
+            'sync_content_hash',
+            sa.String(length=64),
+            nullable=True,
+            comment='上次同步的OZON数据内容哈希（未变化时跳过映射与更新）'
+        )
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema"""
+    op.drop_column('ozon_products', 'sync_content_hash')
@@ -0,0 +1,48 @@
+"""add_dict_value_search_text
+
+Revision ID: add_dict_value_search_text
+Revises: add_product_sync_content_hash
+Create Date: 2025-12-17 10:00:00.000000
+
+字典值本地搜索：
+- 新增生成列 search_text（中文+俄文，小写，ё 归一为 е）
+- search_text 上建 pg_trgm GIN 索引，支持子串匹配与 word_similarity 模糊匹配
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_dict_value_search_text'
+down_revision = 'add_product_sync_content_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema"""
+    op.add_column(
+        'ozon_attribute_dictionary_values',
+        sa.Column(
+            'search_text',
+            sa.Text(),
+            sa.Computed(
+                "lower(translate(coalesce(value_zh, value) || ' ' || coalesce(value_ru, ''), 'Ёё', 'Ее'))",
+                persisted=True
+            ),
+            comment='本地搜索文本（自动生成）'
+        )
+    )
+    op.create_index(
+        'idx_ozon_dict_values_search_text',
+        'ozon_attribute_dictionary_values',
+        ['search_text'],
+        postgresql_using='gin',
+        postgresql_ops={'search_text': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema"""
+    op.drop_index('idx_ozon_dict_values_search_text', table_name='ozon_attribute_dictionary_values')
+    op.drop_column('ozon_attribute_dictionary_values', 'search_text')
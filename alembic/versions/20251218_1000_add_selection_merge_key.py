@@ -0,0 +1,40 @@
+"""add_selection_merge_key
+
+Revision ID: add_selection_merge_key
+Revises: add_dict_value_search_text
+Create Date: 2025-12-18 10:00:00.000000
+
+选品导入改为 COPY 临时表 + INSERT ... ON CONFLICT 合并：
+- 合并键：用户ID + 商品ID + 商品名称（优先俄文名，其次中文名）
+- 先清理合并键重复的历史数据（保留最新一条），再建唯一索引
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_selection_merge_key'
+down_revision = 'add_dict_value_search_text'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema"""
+    op.execute("""
+        DELETE FROM ozon_product_selection_items AS older
+        USING ozon_product_selection_items AS newer
+        WHERE older.user_id = newer.user_id
+          AND older.product_id = newer.product_id
+          AND COALESCE(older.product_name_ru, older.product_name_cn, '')
+              = COALESCE(newer.product_name_ru, newer.product_name_cn, '')
+          AND older.id < newer.id
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX uq_selection_user_product_name
+        ON ozon_product_selection_items (user_id, product_id, (COALESCE(product_name_ru, product_name_cn, '')))
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade database schema"""
+    op.drop_index('uq_selection_user_product_name', table_name='ozon_product_selection_items')
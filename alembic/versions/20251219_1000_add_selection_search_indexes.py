@@ -0,0 +1,57 @@
+"""add_selection_search_indexes
+
+Revision ID: add_selection_search_indexes
+Revises: add_selection_merge_key
+Create Date: 2025-12-19 10:00:00.000000
+
+选品搜索改为 (排序列, id) 复合键游标分页：
+- 每种排序一个 (user_id, 排序列 NULLS FIRST, id) 索引，升序正向扫描、降序反向扫描
+- 商品名称（俄文/中文）pg_trgm GIN 索引，支持 ILIKE 子串搜索
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_selection_search_indexes'
+down_revision = 'add_selection_merge_key'
+branch_labels = None
+depends_on = None
+
+TABLE = 'ozon_product_selection_items'
+
+KEYSET_INDEXES = {
+    'idx_selection_user_id': 'user_id, id',
+    'idx_selection_user_created': 'user_id, created_at, id',
+    'idx_selection_user_sales': 'user_id, monthly_sales_volume NULLS FIRST, id',
+    'idx_selection_user_price': 'user_id, current_price NULLS FIRST, id',
+    'idx_selection_user_weight': 'user_id, package_weight NULLS FIRST, id',
+}
+
+
+def upgrade() -> None:
+    """Upgrade database schema"""
+    for name, columns in KEYSET_INDEXES.items():
+        op.execute(f"CREATE INDEX {name} ON {TABLE} ({columns})")
+
+    op.create_index(
+        'idx_selection_name_ru_trgm',
+        TABLE,
+        ['product_name_ru'],
+        postgresql_using='gin',
+        postgresql_ops={'product_name_ru': 'gin_trgm_ops'}
+    )
+    op.create_index(
+        'idx_selection_name_cn_trgm',
+        TABLE,
+        ['product_name_cn'],
+        postgresql_using='gin',
+        postgresql_ops={'product_name_cn': 'gin_trgm_ops'}
+    )
+
+
+def downgrade() -> None:
+    """Downgrade database schema"""
+    op.drop_index('idx_selection_name_cn_trgm', table_name=TABLE)
+    op.drop_index('idx_selection_name_ru_trgm', table_name=TABLE)
+    for name in reversed(list(KEYSET_INDEXES)):
+        op.drop_index(name, table_name=TABLE)
@@ -0,0 +1,41 @@
+"""add_finance_no_sku_unique
+
+Revision ID: add_finance_no_sku_unique
+Revises: add_selection_search_indexes
+Create Date: 2025-12-20 10:00:00.000000
+
+财务交易改为批量 INSERT ... ON CONFLICT DO NOTHING 写入：
+- uq_ozon_finance_transaction 不约束 ozon_sku 为 NULL 的记录（无商品明细的操作）
+- 先清理 (shop_id, operation_id) 重复的无 SKU 记录（保留最早一条），再建部分唯一索引
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_finance_no_sku_unique'
+down_revision = 'add_selection_search_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Upgrade database schema"""
+    op.execute("""
+        DELETE FROM ozon_finance_transactions AS newer
+        USING ozon_finance_transactions AS older
+        WHERE newer.shop_id = older.shop_id
+          AND newer.operation_id = older.operation_id
+          AND newer.ozon_sku IS NULL
+          AND older.ozon_sku IS NULL
+          AND newer.id > older.id
+    """)
+    op.execute("""
+        CREATE UNIQUE INDEX uq_ozon_finance_transaction_no_sku
+        ON ozon_finance_transactions (shop_id, operation_id)
+        WHERE ozon_sku IS NULL
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade database schema"""
+    op.drop_index('uq_ozon_finance_transaction_no_sku', table_name='ozon_finance_transactions')
@@ -11,6 +11,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from ef_core.services.auth_service import get_auth_service
 from ef_core.services.audit_service import AuditService
 from ef_core.services.captcha_service import get_captcha_service
+from ef_core.services.principal_cache import invalidate_principals
 from ef_core.database import get_async_session, get_db_manager
 from ef_core.models.users import User, UserSettings
 from ef_core.utils.logger import get_logger
@@ -1037,6 +1038,21 @@ async def update_user(
 
     await session.commit()
 
+    # 角色、账号状态或到期时间变化时，令牌校验缓存立即失效（主账号的子账号继承其状态）
+    if (
+        old_role != user.role
+        or old_is_active != user.is_active
+        or old_account_status != user.account_status
+        or old_expires_at != (user.expires_at.isoformat() if user.expires_at else None)
+    ):
+        affected_ids = [user_id]
+        if user.role == "main_account" or old_role == "main_account":
+            child_result = await session.execute(
+                select(User.id).where(User.parent_user_id == user_id)
+            )
+            affected_ids.extend(child_result.scalars().all())
+        await invalidate_principals(*affected_ids)
+
     # 重新加载用户
     stmt = select(User).where(User.id == user_id).options(
         selectinload(User.shops),
@@ -1153,6 +1169,7 @@ async def delete_user(
     # 删除用户
     await session.delete(user)
     await session.commit()
+    await invalidate_principals(user_id)
 
     return None
 
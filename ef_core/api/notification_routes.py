@@ -135,25 +135,21 @@ async def websocket_endpoint(
 
                     if msg_type == "ping":
                         # 响应心跳
-                        await websocket.send_json({"type": "pong"})
+                        notification_manager.send_to_connection(websocket, {"type": "pong"})
 
                     elif msg_type == "subscribe":
                         # 订阅新店铺
                         new_shop_ids = message.get("shop_ids", [])
-                        if user.id in notification_manager._user_shops:
-                            notification_manager._user_shops[user.id].update(new_shop_ids)
-                        else:
-                            notification_manager._user_shops[user.id] = set(new_shop_ids)
+                        notification_manager.subscribe_shops(user.id, new_shop_ids)
                         logger.info(f"User {user.id} subscribed to shops: {new_shop_ids}")
-                        await websocket.send_json({"type": "subscribed", "shop_ids": new_shop_ids})
+                        notification_manager.send_to_connection(websocket, {"type": "subscribed", "shop_ids": new_shop_ids})
 
                     elif msg_type == "unsubscribe":
                         # 取消订阅店铺
                         remove_shop_ids = message.get("shop_ids", [])
-                        if user.id in notification_manager._user_shops:
-                            notification_manager._user_shops[user.id].difference_update(remove_shop_ids)
+                        notification_manager.unsubscribe_shops(user.id, remove_shop_ids)
                         logger.info(f"User {user.id} unsubscribed from shops: {remove_shop_ids}")
-                        await websocket.send_json({"type": "unsubscribed", "shop_ids": remove_shop_ids})
+                        notification_manager.send_to_connection(websocket, {"type": "unsubscribed", "shop_ids": remove_shop_ids})
 
                     else:
                         logger.warning(f"Unknown message type from user {user.id}: {msg_type}")
@@ -14,14 +14,13 @@ from fastapi.exceptions import RequestValidationError
 from ef_core.config import get_settings
 from ef_core.utils.logger import setup_logging, get_logger
 from ef_core.utils.errors import EuraFlowException
+from ef_core.utils.redis import close_redis
 from ef_core.database import get_db_manager
 from ef_core.event_bus import get_event_bus
 from ef_core.plugin_host import get_plugin_host
 from ef_core.tasks.registry import get_task_registry
 from ef_core.middleware.auth import AuthMiddleware
-from ef_core.middleware.logging import LoggingMiddleware
-from ef_core.middleware.metrics import MetricsMiddleware
-from ef_core.middleware.api_cost import ApiCostMiddleware
+from ef_core.middleware.instrumentation import InstrumentationMiddleware
 from ef_core.middleware.security import (
     SecurityHeadersMiddleware,
     RequestSizeLimitMiddleware,
@@ -64,6 +63,12 @@ async def lifespan(app: FastAPI):
         # 初始化插件系统
         await plugin_host.initialize()
 
+        # 启动 Webhook 队列消费（只在 API 进程中常驻；Celery 初始化插件时不启动），
+        # 重启后立即接管 Redis 分片积压和降级写库的待处理事件，不等待下一条 Webhook 到达
+        if plugin_host.is_plugin_enabled("ef.channels.ozon"):
+            from plugins.ef.channels.ozon.webhooks.worker import get_webhook_worker_pool
+            get_webhook_worker_pool().ensure_started()
+
         # 自动扫描并同步 API 权限
         try:
             from ef_core.services.permission_scanner import scan_and_register_permissions
@@ -99,6 +104,9 @@ async def lifespan(app: FastAPI):
         # 关闭数据库连接
         await db_manager.close()
 
+        # 关闭 Redis 连接池
+        await close_redis()
+
         logger.info("EuraFlow application shutdown complete")
 
     except Exception as e:
@@ -128,7 +136,8 @@ def create_app() -> FastAPI:
     # 设置日志
     setup_logging(
         log_level=settings.log_level,
-        log_format=settings.log_format
+        log_format=settings.log_format,
+        async_stdout=True,
     )
     
     # 创建应用
@@ -179,15 +188,12 @@ def create_app() -> FastAPI:
     if settings.rate_limit_enabled:
         setup_rate_limiter(app)
 
-    # 指标中间件
-    if settings.metrics_enabled:
-        app.add_middleware(MetricsMiddleware)
-
-    # API 耗时日志中间件
-    app.add_middleware(ApiCostMiddleware, log_dir="logs")
-
-    # 日志中间件
-    app.add_middleware(LoggingMiddleware)
+    # 请求观测中间件（trace_id、请求日志、指标、API 耗时日志，一次包装完成）
+    app.add_middleware(
+        InstrumentationMiddleware,
+        metrics_enabled=settings.metrics_enabled,
+        log_dir="logs",
+    )
     
     # 认证中间件
     app.add_middleware(AuthMiddleware)
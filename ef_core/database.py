@@ -7,7 +7,7 @@ import time
 from contextlib import asynccontextmanager
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Dict, Optional
 
 from sqlalchemy.ext.asyncio import (
     create_async_engine,
@@ -226,7 +226,7 @@ def reset_db_manager() -> None:
     避免 "Future attached to a different loop" 错误。
 
     使用场景：
-    - Celery 任务在 `asyncio.new_event_loop()` 中执行前调用
+    - Celery worker 进程创建常驻事件循环前调用（见 ef_core.tasks.async_runner）
     """
     global _db_manager
     if _db_manager is not None:
@@ -236,6 +236,23 @@ def reset_db_manager() -> None:
         logger.debug("Reset database manager for new event loop")
 
 
+# 常驻事件循环上共享的任务数据库管理器（Celery worker 的常驻循环启动时登记）
+_loop_task_db_managers: Dict[asyncio.AbstractEventLoop, DatabaseManager] = {}
+
+
+def bind_task_db_manager(loop: asyncio.AbstractEventLoop) -> DatabaseManager:
+    """为常驻事件循环登记共享的数据库管理器，之后在该循环上 get_task_db_manager() 都返回它"""
+    manager = _loop_task_db_managers.get(loop)
+    if manager is None:
+        manager = _loop_task_db_managers[loop] = DatabaseManager()
+    return manager
+
+
+def unbind_task_db_manager(loop: asyncio.AbstractEventLoop) -> Optional[DatabaseManager]:
+    """取消登记（调用方负责 close 返回的管理器）"""
+    return _loop_task_db_managers.pop(loop, None)
+
+
 def get_task_db_manager() -> DatabaseManager:
     """
     为 Celery 任务获取独立的数据库管理器
@@ -258,10 +275,17 @@ def get_task_db_manager() -> DatabaseManager:
                 # 执行数据库操作
                 pass
 
+    在已登记的常驻事件循环上（Celery worker，见 ef_core.tasks.async_runner）返回进程级共享实例，
+    任务之间复用同一个引擎和连接池。
+
     Returns:
-        DatabaseManager: 新的数据库管理器实例
+        DatabaseManager: 数据库管理器实例
     """
-    return DatabaseManager()
+    try:
+        manager = _loop_task_db_managers.get(asyncio.get_running_loop())
+    except RuntimeError:
+        manager = None
+    return manager if manager is not None else DatabaseManager()
 
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
@@ -1,18 +1,27 @@
 """
 EuraFlow 事件总线
 基于 Redis Streams 实现持久化消息队列
+
+可靠性：
+- 消费失败的消息保持 pending，由回收循环按投递次数指数退避后重新认领（XPENDING IDLE + XCLAIM），
+  同时接管已退出消费者遗留的消息
+- 超过最大投递次数的消息移入死信 Stream（ef:events:dlq:{topic}）并确认
+- 每批消息处理完后一次性 XACK
+- XADD 使用 MAXLEN ~ 近似裁剪，Stream 不再无限增长
+- publish 触发的内存订阅者在后台任务中执行，不阻塞发布方
 """
 import json
 import uuid
 import asyncio
 from datetime import datetime
-from typing import Dict, Any, List, Optional, Callable, Awaitable
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Set, Tuple
 from contextlib import asynccontextmanager
 
 import redis.asyncio as redis
 from ef_core.config import get_settings
 from ef_core.utils.logger import get_logger
 from ef_core.utils.errors import EuraFlowException
+from ef_core.utils.redis import CACHE, PUBSUB, get_redis
 
 logger = get_logger(__name__)
 
@@ -58,25 +67,35 @@ class EventPayload:
 
 class EventBus:
     """事件总线实现"""
-    
+
+    # Stream 近似长度上限（XADD MAXLEN ~）
+    STREAM_MAXLEN = 100_000
+    DLQ_MAXLEN = 10_000
+    # 每次读取 / 回收的消息数
+    BATCH_SIZE = 50
+    BLOCK_MS = 1000
+    # 最大投递次数，超过后移入死信队列
+    MAX_DELIVERIES = 5
+    # 重试退避：base * 2^(投递次数-1)，上限 max（毫秒）
+    RETRY_BASE_MS = 5_000
+    RETRY_MAX_MS = 300_000
+    # 回收循环间隔（秒）与每轮扫描的 pending 条数
+    RECLAIM_INTERVAL = 5
+    RECLAIM_SCAN = 500
+
     def __init__(self):
         self.settings = get_settings()
-        self.redis_client: Optional[redis.Redis] = None
         self.subscriptions: Dict[str, List[Callable]] = {}
         self._consumer_tasks: List[asyncio.Task] = []
+        self._local_tasks: Set[asyncio.Task] = set()
         self._running = False
     
     @asynccontextmanager
-    async def _get_redis(self):
-        """获取 Redis 连接"""
-        if not self.redis_client:
-            self.redis_client = redis.from_url(
-                self.settings.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
+    async def _get_redis(self, purpose: str = CACHE):
+        """获取共享 Redis 客户端（阻塞读取 Stream 的消费者使用 pubsub 连接池）"""
+        redis_client = await get_redis(purpose)
         try:
-            yield self.redis_client
+            yield redis_client
         except Exception as e:
             logger.error("Redis operation failed", exc_info=True)
             raise
@@ -104,11 +123,12 @@ class EventBus:
         
         if self._consumer_tasks:
             await asyncio.gather(*self._consumer_tasks, return_exceptions=True)
-        
-        # 关闭 Redis 连接
-        if self.redis_client:
-            await self.redis_client.close()
-        
+
+        # 等待进行中的内存订阅者执行完毕
+        if self._local_tasks:
+            await asyncio.wait(self._local_tasks, timeout=5)
+
+        # Redis 客户端由 ef_core.utils.redis 统一管理（close_redis），这里不关闭共享连接
         logger.info("Event bus shutdown complete")
     
     def _get_stream_name(self, topic: str) -> str:
@@ -118,6 +138,14 @@ class EventBus:
     def _get_consumer_group(self, topic: str) -> str:
         """获取消费组名称"""
         return f"ef:group:{topic}"
+
+    def _get_dlq_name(self, topic: str) -> str:
+        """获取死信 Stream 名称"""
+        return f"ef:events:dlq:{topic}"
+
+    def _retry_delay_ms(self, deliveries: int) -> int:
+        """第 N 次投递失败后的重试间隔"""
+        return min(self.RETRY_BASE_MS * (2 ** max(deliveries - 1, 0)), self.RETRY_MAX_MS)
     
     async def publish(
         self,
@@ -146,16 +174,21 @@ class EventBus:
         if key:
             event_data["key"] = key
         
-        # 发布到 Redis Stream
+        # 发布到 Redis Stream（近似裁剪，避免无限增长）
         async with self._get_redis() as r:
-            message_id = await r.xadd(stream_name, event_data)
+            message_id = await r.xadd(
+                stream_name, event_data, maxlen=self.STREAM_MAXLEN, approximate=True
+            )
         
         logger.debug(f"Published event to {topic}", 
                     event_id=event.event_id,
                     message_id=message_id)
         
-        # 同时触发内存中的订阅者（低延迟）
-        await self._trigger_handlers(topic, event)
+        # 同时触发内存中的订阅者（低延迟，后台执行不阻塞发布方）
+        if self.subscriptions.get(topic):
+            task = asyncio.create_task(self._trigger_handlers(topic, event))
+            self._local_tasks.add(task)
+            task.add_done_callback(self._local_tasks.discard)
         
         return event.event_id
     
@@ -185,61 +218,48 @@ class EventBus:
                 if "BUSYGROUP" not in str(e):
                     raise
         
-        # 启动消费者任务
-        consumer_task = asyncio.create_task(
-            self._consume_stream(topic, handler)
-        )
-        self._consumer_tasks.append(consumer_task)
+        # 启动消费者任务与回收任务（共用同一消费者名）
+        consumer_name = f"{group_name}:{uuid.uuid4().hex[:8]}"
+        self._consumer_tasks.append(asyncio.create_task(
+            self._consume_stream(topic, handler, consumer_name)
+        ))
+        self._consumer_tasks.append(asyncio.create_task(
+            self._reclaim_pending(topic, handler, consumer_name)
+        ))
         
         logger.info(f"Subscribed to topic {topic}")
     
     async def _consume_stream(
         self,
         topic: str,
-        handler: Callable[[Dict[str, Any]], Awaitable[None]]
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        consumer_name: str
     ) -> None:
-        """消费 Redis Stream"""
+        """消费 Redis Stream 新消息"""
         stream_name = self._get_stream_name(topic)
         group_name = self._get_consumer_group(topic)
-        consumer_name = f"{group_name}:{uuid.uuid4().hex[:8]}"
         
         logger.info(f"Starting consumer {consumer_name} for {topic}")
         
         while self._running:
             try:
-                async with self._get_redis() as r:
+                async with self._get_redis(PUBSUB) as r:
                     # 读取消息
                     messages = await r.xreadgroup(
                         group_name,
                         consumer_name,
                         {stream_name: ">"},
-                        count=10,
-                        block=1000  # 1秒超时
+                        count=self.BATCH_SIZE,
+                        block=self.BLOCK_MS
                     )
                     
                     if not messages:
                         continue
                     
+                    # 确认、死信等短命令使用缓存连接池，pubsub 连接池只用于阻塞读取
+                    cache_client = await get_redis()
                     for stream, stream_messages in messages:
-                        for message_id, data in stream_messages:
-                            try:
-                                # 解析事件数据
-                                event_json = data.get("data", "{}")
-                                event_dict = json.loads(event_json)
-                                event = EventPayload.from_dict(event_dict)
-                                
-                                # 调用处理器
-                                await handler(event.payload)
-                                
-                                # 确认消息
-                                await r.xack(stream_name, group_name, message_id)
-                                
-                                logger.debug(f"Processed message {message_id} from {topic}")
-                                
-                            except Exception as e:
-                                logger.error(f"Error processing message {message_id}",
-                                           exc_info=True)
-                                # TODO: 实现重试和死信队列逻辑
+                        await self._handle_batch(cache_client, topic, handler, stream_messages)
                                 
             except asyncio.CancelledError:
                 logger.info(f"Consumer {consumer_name} cancelled")
@@ -247,6 +267,131 @@ class EventBus:
             except Exception as e:
                 logger.error(f"Consumer {consumer_name} error", exc_info=True)
                 await asyncio.sleep(5)  # 错误后等待重试
+
+    async def _handle_batch(
+        self,
+        r: redis.Redis,
+        topic: str,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        stream_messages: List[Tuple[str, Dict[str, str]]]
+    ) -> None:
+        """
+        按序处理一批消息，成功的消息一次性确认
+
+        失败的消息保持 pending，由 _reclaim_pending 退避后重试
+        """
+        acked: List[str] = []
+
+        for message_id, data in stream_messages:
+            try:
+                # 解析事件数据
+                event_json = (data or {}).get("data", "{}")
+                event_dict = json.loads(event_json)
+                event = EventPayload.from_dict(event_dict)
+            except (TypeError, ValueError):
+                # 无法解析的消息重试也不会成功，直接进入死信队列
+                logger.error(f"Malformed message {message_id} on {topic}")
+                await self._dead_letter(r, topic, message_id, data or {}, "malformed message")
+                continue
+
+            try:
+                # 调用处理器
+                await handler(event.payload)
+                acked.append(message_id)
+                logger.debug(f"Processed message {message_id} from {topic}")
+            except Exception:
+                logger.error(f"Error processing message {message_id}",
+                           exc_info=True)
+
+        # 批量确认
+        if acked:
+            await r.xack(self._get_stream_name(topic), self._get_consumer_group(topic), *acked)
+
+    async def _reclaim_pending(
+        self,
+        topic: str,
+        handler: Callable[[Dict[str, Any]], Awaitable[None]],
+        consumer_name: str
+    ) -> None:
+        """
+        回收 pending 消息：失败重试（指数退避）、接管退出消费者的消息、毒消息入死信队列
+
+        使用 XPENDING IDLE 而非 XAUTOCLAIM：退避需要每条消息的空闲时长和投递次数，
+        XAUTOCLAIM 认领时会重置空闲时长且不返回投递次数。
+        XCLAIM 带 min_idle_time，多个进程同时回收时只有一个能认领成功。
+        """
+        stream_name = self._get_stream_name(topic)
+        group_name = self._get_consumer_group(topic)
+
+        while self._running:
+            try:
+                await asyncio.sleep(self.RECLAIM_INTERVAL)
+
+                async with self._get_redis() as r:
+                    pending = await r.xpending_range(
+                        stream_name, group_name,
+                        min="-", max="+",
+                        count=self.RECLAIM_SCAN,
+                        idle=self.RETRY_BASE_MS
+                    )
+                    if not pending:
+                        continue
+
+                    due: List[str] = []
+                    for entry in pending:
+                        deliveries = entry["times_delivered"]
+                        if deliveries >= self.MAX_DELIVERIES:
+                            # 超过最大投递次数：移入死信队列
+                            entries = await r.xrange(stream_name, entry["message_id"], entry["message_id"])
+                            data = entries[0][1] if entries else {}
+                            await self._dead_letter(
+                                r, topic, entry["message_id"], data,
+                                f"exceeded {self.MAX_DELIVERIES} deliveries"
+                            )
+                        elif entry["time_since_delivered"] >= self._retry_delay_ms(deliveries):
+                            due.append(entry["message_id"])
+
+                    if not due:
+                        continue
+
+                    claimed = await r.xclaim(
+                        stream_name, group_name, consumer_name,
+                        min_idle_time=self.RETRY_BASE_MS,
+                        message_ids=due
+                    )
+                    # 已被裁剪的消息返回空数据，直接确认
+                    missing = [message_id for message_id, data in claimed if not data]
+                    if missing:
+                        await r.xack(stream_name, group_name, *missing)
+
+                    claimed = [(message_id, data) for message_id, data in claimed if data]
+                    if claimed:
+                        logger.info(f"Retrying {len(claimed)} pending messages on {topic}")
+                        await self._handle_batch(r, topic, handler, claimed)
+
+            except asyncio.CancelledError:
+                break
+            except Exception:
+                logger.error(f"Pending reclaim error for {topic}", exc_info=True)
+
+    async def _dead_letter(
+        self,
+        r: redis.Redis,
+        topic: str,
+        message_id: str,
+        data: Dict[str, str],
+        reason: str
+    ) -> None:
+        """移入死信 Stream 并确认原消息"""
+        dead = dict(data)
+        dead.update({
+            "source_id": message_id,
+            "reason": reason,
+            "failed_at": datetime.utcnow().isoformat() + "Z",
+        })
+        await r.xadd(self._get_dlq_name(topic), dead, maxlen=self.DLQ_MAXLEN, approximate=True)
+        await r.xack(self._get_stream_name(topic), self._get_consumer_group(topic), message_id)
+        logger.warning(f"Moved message {message_id} on {topic} to dead letter queue: {reason}")
     
     async def _trigger_handlers(
         self,
@@ -323,6 +468,41 @@ class EventBus:
             
             return len(claimed) > 0
 
+    async def get_dead_letters(self, topic: str, count: int = 100) -> List[Dict[str, Any]]:
+        """获取死信消息（最新在前）"""
+        async with self._get_redis() as r:
+            entries = await r.xrevrange(self._get_dlq_name(topic), count=count)
+
+        return [
+            {
+                "dlq_id": dlq_id,
+                "source_id": data.get("source_id"),
+                "reason": data.get("reason"),
+                "failed_at": data.get("failed_at"),
+                "data": data.get("data"),
+            }
+            for dlq_id, data in entries
+        ]
+
+    async def replay_dead_letters(self, topic: str, count: int = 100) -> int:
+        """将死信消息重新投递到原 Stream（投递后从死信队列删除）"""
+        dlq_name = self._get_dlq_name(topic)
+        replayed = 0
+
+        async with self._get_redis() as r:
+            entries = await r.xrange(dlq_name, count=count)
+            for dlq_id, data in entries:
+                event_data = {k: v for k, v in data.items() if k in ("data", "key")}
+                if event_data:
+                    await r.xadd(
+                        self._get_stream_name(topic), event_data,
+                        maxlen=self.STREAM_MAXLEN, approximate=True
+                    )
+                    replayed += 1
+                await r.xdel(dlq_name, dlq_id)
+
+        return replayed
+
 
 # 全局事件总线实例
 _event_bus: Optional[EventBus] = None
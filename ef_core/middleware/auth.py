@@ -1,19 +1,26 @@
 """
 认证中间件（简化版本）
 """
-from typing import Callable, Optional
+from datetime import datetime
+from typing import Optional
 
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from ef_core.utils.logger import get_logger
 from ef_core.utils.errors import UnauthorizedError, ForbiddenError
 from ef_core.services.auth_service import get_auth_service
+from ef_core.services.principal_cache import (
+    CachedPrincipal,
+    compute_valid_until,
+    get_principal_cache,
+    principal_field,
+)
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    """认证中间件"""
+class AuthMiddleware:
+    """认证中间件（原生 ASGI，避免 BaseHTTPMiddleware 为每个请求额外创建任务和内存流）"""
 
     # 无需认证的路径
     PUBLIC_PATHS = {
@@ -55,14 +62,28 @@ class AuthMiddleware(BaseHTTPMiddleware):
         "/api/ef/v1/auth/clone/status",   # 获取状态
     ]
     
-    def __init__(self, app, logger=None):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, logger=None):
+        self.app = app
         self.logger = logger or get_logger("middleware.auth")
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # request.state 写入 scope["state"]，下游路由读取同一份
+        response = await self._authenticate(Request(scope))
+        if response is not None:
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
+
+    async def _authenticate(self, request: Request) -> Optional[Response]:
+        """认证请求：放行返回 None，拒绝返回错误响应"""
         # 检查是否为公开路径
         if self._is_public_path(request.url.path):
-            return await call_next(request)
+            return None
 
         # 检查 Authorization 头（JWT Token认证）
         auth_header = request.headers.get("authorization", "")
@@ -76,7 +97,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 request.state.user_id = 1
                 request.state.shop_id = None  # 不设置默认店铺ID
                 request.state.permissions = ["*"]
-                return await call_next(request)
+                return None
             else:
                 return JSONResponse(
                     status_code=401,
@@ -138,7 +159,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 request.state.user_id = 1
                 request.state.shop_id = None  # 不设置默认店铺ID
                 request.state.permissions = ["*"]
-                return await call_next(request)
+                return None
             else:
                 return JSONResponse(
                     status_code=401,
@@ -224,7 +245,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 )
 
         # 继续处理请求
-        return await call_next(request)
+        return None
     
     def _is_public_path(self, path: str) -> bool:
         """检查是否为公开路径"""
@@ -264,58 +285,38 @@ class AuthMiddleware(BaseHTTPMiddleware):
             if payload.get("type") != "access":
                 return None
 
-            # 检查黑名单
             jti = payload.get("jti")
-            if jti and await auth_service.is_token_revoked(jti):
-                return None
-
-            # 验证会话令牌（单设备登录）和账号状态
             session_token = payload.get("session_token")
             user_id = int(payload.get("sub"))
-            can_write = True
-            write_error = ""
-
-            from ef_core.database import get_db_manager
-            from ef_core.models.users import User
-            from sqlalchemy import select
-            from sqlalchemy.orm import selectinload
-
-            db_manager = get_db_manager()
-            async with db_manager.get_session() as db:
-                # 查询用户（包含 parent_user 用于子账号继承状态）
-                stmt = select(User).where(User.id == user_id).options(
-                    selectinload(User.parent_user)
-                )
-                result = await db.execute(stmt)
-                user = result.scalar_one_or_none()
-
-                if not user:
-                    return None
-
-                # 验证会话令牌（单设备登录检测）
-                if session_token and user.current_session_token:
-                    if user.current_session_token != session_token:
-                        # 不记录 token 内容，仅记录事件（安全规范）
-                        self.logger.info(f"Session expired for user {user_id}: logged in from another device")
-                        # 返回特殊错误标记，表示被别处登录踢出
-                        return {"error": "SESSION_EXPIRED"}
-
-                # 检查账号是否可以执行写操作（admin 不受限制）
-                can_write, write_error = user.can_write()
 
             # 解析克隆状态
             is_cloned = payload.get("is_cloned", False)
             clone_session_id = payload.get("clone_session_id")
             original_user_id = payload.get("original_user_id")
 
-            # 如果是克隆状态，验证克隆会话是否有效
-            if is_cloned and clone_session_id:
-                from ef_core.services.clone_service import get_clone_service
-                clone_service = get_clone_service()
-                session_valid = await clone_service.validate_clone_session(clone_session_id)
-                if not session_valid:
-                    self.logger.info(f"Clone session expired: {clone_session_id}")
+            # 黑名单、会话、账号状态、克隆会话的校验结论按令牌缓存，
+            # 登录/登出/状态变更/克隆恢复时失效（见 principal_cache）
+            principal_cache = get_principal_cache()
+            cache_field = principal_field(session_token, jti, clone_session_id if is_cloned else None)
+            principal, generation = await principal_cache.get(user_id, cache_field)
+
+            if principal is None:
+                principal = await self._load_principal(
+                    user_id=user_id,
+                    jti=jti,
+                    session_token=session_token,
+                    clone_session_id=clone_session_id if is_cloned else None,
+                )
+                if principal is None:
                     return None
+                await principal_cache.set(user_id, cache_field, principal, generation)
+
+            if not principal.session_valid:
+                # 返回特殊错误标记，表示被别处登录踢出
+                return {"error": "SESSION_EXPIRED"}
+
+            can_write = principal.can_write
+            write_error = principal.write_error
 
             # 返回用户信息（包含 shop_ids、session_token、写权限、克隆状态和登录来源）
             return {
@@ -337,6 +338,72 @@ class AuthMiddleware(BaseHTTPMiddleware):
             self.logger.debug(f"Token validation failed: {e}")
             return None
     
+    async def _load_principal(
+        self,
+        user_id: int,
+        jti: Optional[str],
+        session_token: Optional[str],
+        clone_session_id: Optional[str],
+    ) -> Optional[CachedPrincipal]:
+        """回源校验令牌（缓存未命中时调用），令牌无效返回 None"""
+        auth_service = get_auth_service()
+
+        # 检查黑名单
+        if jti and await auth_service.is_token_revoked(jti):
+            return None
+
+        from ef_core.database import get_db_manager
+        from ef_core.models.users import User
+        from sqlalchemy import select
+        from sqlalchemy.orm import selectinload
+
+        db_manager = get_db_manager()
+        async with db_manager.get_session() as db:
+            # 查询用户（包含 parent_user 用于子账号继承状态）
+            stmt = select(User).where(User.id == user_id).options(
+                selectinload(User.parent_user)
+            )
+            result = await db.execute(stmt)
+            user = result.scalar_one_or_none()
+
+            if not user:
+                return None
+
+            # 验证会话令牌（单设备登录检测）
+            if session_token and user.current_session_token:
+                if user.current_session_token != session_token:
+                    # 不记录 token 内容，仅记录事件（安全规范）
+                    self.logger.info(f"Session expired for user {user_id}: logged in from another device")
+                    return CachedPrincipal(
+                        session_valid=False,
+                        can_write=False,
+                        write_error="",
+                        valid_until=compute_valid_until(),
+                    )
+
+            # 检查账号是否可以执行写操作（admin 不受限制）
+            can_write, write_error = user.can_write()
+            # 账号到期时可写状态会变化，缓存结论不能跨过到期时间
+            expires_at = None if user.role == "admin" else user.get_effective_expires_at()
+
+        # 如果是克隆状态，验证克隆会话是否有效
+        clone_expires_at = None
+        if clone_session_id:
+            from ef_core.services.clone_service import get_clone_service
+            clone_service = get_clone_service()
+            clone_status = await clone_service.get_clone_status(clone_session_id)
+            if not clone_status:
+                self.logger.info(f"Clone session expired: {clone_session_id}")
+                return None
+            clone_expires_at = datetime.fromisoformat(clone_status["expires_at"])
+
+        return CachedPrincipal(
+            session_valid=True,
+            can_write=can_write,
+            write_error=write_error,
+            valid_until=compute_valid_until(expires_at, clone_expires_at),
+        )
+
     def check_permission(self, request: Request, required_permission: str) -> bool:
         """检查权限"""
         user_permissions = getattr(request.state, "permissions", [])
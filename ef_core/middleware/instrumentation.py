@@ -0,0 +1,323 @@
+"""
+请求观测中间件（原生 ASGI）
+
+一次包装完成原先 LoggingMiddleware / MetricsMiddleware / ApiCostMiddleware 三层的工作：
+- trace_id：写入 request.state 与日志上下文，并回写 X-Trace-Id 响应头
+- 请求/响应日志：stdout 经有界队列由后台线程写出（见 utils/log_sink.py）
+- Prometheus 指标：请求数、耗时、请求/响应大小
+- 耗时日志：logs/api_cost.log，同样经队列写出，不在事件循环上做文件 IO
+
+响应体不做缓冲：消息原样透传，只统计字节数；仅错误响应（>=400）顺带截取前
+MAX_BODY_LOG_SIZE 字节写入日志，流式响应（SSE、文件下载）不受影响。
+"""
+import json
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qsl
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ef_core.utils.log_sink import get_file_log_sink
+from ef_core.utils.logger import LogContext, get_logger
+
+from .metrics import (
+    PROMETHEUS_AVAILABLE,
+    endpoint_pattern,
+)
+
+if PROMETHEUS_AVAILABLE:
+    from .metrics import REQUEST_COUNT, REQUEST_DURATION, REQUEST_SIZE, RESPONSE_SIZE
+
+
+# 不记录详细日志的路径（健康检查、静态资源等）
+SKIP_DETAIL_PATHS = {
+    "/healthz",
+    "/metrics",
+    "/favicon.ico",
+}
+
+# 不记录耗时日志的路径前缀
+SKIP_COST_PREFIXES = (
+    "/healthz",
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+    "/favicon.ico",
+    "/static/",
+    "/assets/",
+)
+
+# 敏感字段（不记录到日志）
+SENSITIVE_FIELDS = {"password", "api_key", "apikey", "secret", "token", "authorization"}
+
+# 最大记录的响应体大小（字节）
+MAX_BODY_LOG_SIZE = 10000
+
+# 慢请求阈值（毫秒）
+SLOW_THRESHOLD_MS = 1000
+
+
+class InstrumentationMiddleware:
+    """请求观测中间件（trace_id、日志、指标、耗时日志）"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        metrics_enabled: bool = True,
+        log_dir: str = "logs",
+        logger=None,
+    ):
+        self.app = app
+        self.metrics_enabled = metrics_enabled and PROMETHEUS_AVAILABLE
+        self.logger = logger or get_logger("middleware.logging")
+
+        # 获取项目根目录（ef_core 的上级目录）
+        project_root = Path(__file__).parent.parent.parent
+        self.cost_log_file = project_root / log_dir / "api_cost.log"
+        self.log_sink = get_file_log_sink()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # 只处理 HTTP 请求
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        trace_id = str(uuid.uuid4())
+        scope.setdefault("state", {})["trace_id"] = trace_id
+
+        method = scope["method"]
+        path = scope["path"]
+        skip_detail = path in SKIP_DETAIL_PATHS
+        headers = _Headers(scope)
+
+        status_code = 0
+        response_bytes = 0
+        error_body: List[bytes] = []
+        error_body_size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, response_bytes, error_body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message).append("X-Trace-Id", trace_id)
+            elif message["type"] == "http.response.body":
+                body = message.get("body", b"")
+                response_bytes += len(body)
+                # 只截取错误响应的开头，不等待、不缓冲完整响应体
+                if status_code >= 400 and not skip_detail and error_body_size < MAX_BODY_LOG_SIZE:
+                    chunk = body[:MAX_BODY_LOG_SIZE - error_body_size]
+                    error_body.append(chunk)
+                    error_body_size += len(chunk)
+            await send(message)
+
+        with LogContext(trace_id=trace_id):
+            if not skip_detail:
+                self._log_request(scope, headers, method, path)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            except Exception as e:
+                duration = time.perf_counter() - start_time
+                self.logger.error(
+                    "API request failed",
+                    direction="inbound",
+                    method=method,
+                    path=path,
+                    latency_ms=int(duration * 1000),
+                    result="error",
+                    err=str(e),
+                    exc_info=True
+                )
+                self._observe(method, path, headers, status_code or 500, duration, response_bytes)
+                self._log_cost(scope, method, path, status_code or 500, duration)
+                raise
+
+            duration = time.perf_counter() - start_time
+            if not skip_detail:
+                self._log_response(method, path, status_code, duration, error_body, response_bytes)
+            self._observe(method, path, headers, status_code, duration, response_bytes)
+            self._log_cost(scope, method, path, status_code, duration)
+
+    def _log_request(self, scope: Scope, headers: "_Headers", method: str, path: str) -> None:
+        """记录入站请求"""
+        user_agent = headers.get("user-agent")
+        log_data = {
+            "direction": "inbound",
+            "method": method,
+            "path": path,
+            "url": _build_url(scope, headers),
+            "client_ip": _get_client_ip(scope, headers),
+            "user_agent": user_agent[:200] if user_agent else None,
+        }
+
+        query_string = scope.get("query_string", b"")
+        if query_string:
+            query_params = dict(parse_qsl(query_string.decode("latin-1"), keep_blank_values=True))
+            if query_params:
+                log_data["query_params"] = _mask_sensitive(query_params)
+
+        self.logger.info("API request", **log_data)
+
+    def _log_response(
+        self,
+        method: str,
+        path: str,
+        status_code: int,
+        duration: float,
+        error_body: List[bytes],
+        response_bytes: int,
+    ) -> None:
+        """记录响应"""
+        resp_log_data = {
+            "direction": "inbound",
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "latency_ms": int(duration * 1000),
+            "result": "success" if status_code < 400 else "error",
+        }
+
+        if status_code >= 400:
+            body = _decode_body(b"".join(error_body), response_bytes)
+            if body:
+                resp_log_data["response_body"] = body
+            self.logger.warning("API response error", **resp_log_data)
+        else:
+            self.logger.info("API response", **resp_log_data)
+
+    def _observe(
+        self,
+        method: str,
+        path: str,
+        headers: "_Headers",
+        status_code: int,
+        duration: float,
+        response_bytes: int,
+    ) -> None:
+        """记录 Prometheus 指标"""
+        if not self.metrics_enabled:
+            return
+
+        endpoint = endpoint_pattern(path)
+        status = str(status_code)
+        REQUEST_COUNT.labels(method=method, endpoint=endpoint, status_code=status).inc()
+        REQUEST_DURATION.labels(method=method, endpoint=endpoint).observe(duration)
+        REQUEST_SIZE.labels(method=method, endpoint=endpoint).observe(_request_size(headers))
+        RESPONSE_SIZE.labels(method=method, endpoint=endpoint, status_code=status).observe(response_bytes)
+
+    def _log_cost(self, scope: Scope, method: str, path: str, status_code: int, duration: float) -> None:
+        """记录耗时日志（格式：时间 | 方法 | 路径 | 状态码 | 耗时(ms) | 参数摘要）"""
+        if path.startswith(SKIP_COST_PREFIXES):
+            return
+
+        duration_ms = duration * 1000
+        query_string = scope.get("query_string", b"").decode("utf-8", errors="replace")
+        params = f"?{query_string}" if query_string else "-"
+        slow_marker = " [SLOW]" if duration_ms >= SLOW_THRESHOLD_MS else ""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        self.log_sink.write(
+            self.cost_log_file,
+            f"{timestamp} | {method:6s} | {path:60s} | {status_code:3d} | "
+            f"{duration_ms:8.2f}ms{slow_marker} | {params}",
+        )
+
+
+class _Headers:
+    """按需解析请求头（大部分请求只读 1~2 个头）"""
+
+    __slots__ = ("_raw", "_parsed")
+
+    def __init__(self, scope: Scope):
+        self._raw = scope.get("headers") or []
+        self._parsed: Optional[dict] = None
+
+    def get(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        if self._parsed is None:
+            self._parsed = {
+                key.decode("latin-1"): value.decode("latin-1") for key, value in self._raw
+            }
+        return self._parsed.get(name, default)
+
+    def raw(self):
+        return self._raw
+
+
+def _build_url(scope: Scope, headers: _Headers) -> str:
+    """还原请求 URL（与 starlette Request.url 一致）"""
+    scheme = scope.get("scheme", "http")
+    host = headers.get("host")
+    if not host:
+        server = scope.get("server")
+        host = f"{server[0]}:{server[1]}" if server else "localhost"
+    url = f"{scheme}://{host}{scope.get('root_path', '')}{scope['path']}"
+    query_string = scope.get("query_string", b"")
+    if query_string:
+        url += f"?{query_string.decode('latin-1')}"
+    return url
+
+
+def _get_client_ip(scope: Scope, headers: _Headers) -> str:
+    """获取客户端 IP"""
+    # 检查反向代理头部
+    forwarded_for = headers.get("x-forwarded-for")
+    if forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+
+    real_ip = headers.get("x-real-ip")
+    if real_ip:
+        return real_ip
+
+    # 使用连接 IP
+    client = scope.get("client")
+    if client:
+        return client[0]
+
+    return "unknown"
+
+
+def _request_size(headers: _Headers) -> float:
+    """获取请求大小（字节）：优先 Content-Length，否则按请求头估算"""
+    content_length = headers.get("content-length")
+    if content_length:
+        try:
+            return float(content_length)
+        except (ValueError, TypeError):
+            pass
+    return float(sum(len(key) + len(value) + 4 for key, value in headers.raw()))
+
+
+def _mask_sensitive(data):
+    """脱敏敏感字段"""
+    if isinstance(data, dict):
+        masked = {}
+        for key, value in data.items():
+            if key.lower() in SENSITIVE_FIELDS:
+                masked[key] = "***MASKED***"
+            elif isinstance(value, dict):
+                masked[key] = _mask_sensitive(value)
+            elif isinstance(value, list):
+                masked[key] = [_mask_sensitive(item) if isinstance(item, dict) else item for item in value]
+            else:
+                masked[key] = value
+        return masked
+    return data
+
+
+def _decode_body(body: bytes, total_size: int) -> Optional[str]:
+    """解码截取的响应体（JSON 优先）"""
+    if not body:
+        return None
+
+    text = body.decode("utf-8", errors="replace")
+    if total_size <= len(body):
+        try:
+            return json.dumps(json.loads(body), ensure_ascii=False)
+        except ValueError:
+            return text
+    return text + f"... [truncated, total {total_size} bytes]"
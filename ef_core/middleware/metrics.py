@@ -1,11 +1,17 @@
 """
-指标收集中间件
+指标收集
+
+HTTP 指标在 InstrumentationMiddleware 中与日志、耗时一起采集（见 instrumentation.py），
+这里只定义指标和 /metrics 端点。
+
+只有 API 进程提供 /metrics：后台 worker 的指标写入 Redis 汇总，
+由 register_metrics_refresher 注册的回调在每次抓取前读取并更新。
 """
-import time
-from typing import Callable
+import re
+from functools import lru_cache
+from typing import Awaitable, Callable, List
 
 from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
 
 try:
     from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
@@ -15,171 +21,67 @@ except ImportError:
 
 from ef_core.utils.logger import get_logger
 
+logger = get_logger(__name__)
 
-class MetricsMiddleware(BaseHTTPMiddleware):
-    """指标收集中间件"""
-    
-    def __init__(self, app, logger=None):
-        super().__init__(app)
-        self.logger = logger or get_logger("middleware.metrics")
-        
-        if PROMETHEUS_AVAILABLE:
-            # 请求计数器
-            self.request_count = Counter(
-                'ef_http_requests_total',
-                'Total HTTP requests',
-                ['method', 'endpoint', 'status_code']
-            )
-            
-            # 请求延迟直方图
-            self.request_duration = Histogram(
-                'ef_http_request_duration_seconds',
-                'HTTP request duration',
-                ['method', 'endpoint']
-            )
-            
-            # 请求大小直方图
-            self.request_size = Histogram(
-                'ef_http_request_size_bytes',
-                'HTTP request size',
-                ['method', 'endpoint']
-            )
-            
-            # 响应大小直方图
-            self.response_size = Histogram(
-                'ef_http_response_size_bytes',
-                'HTTP response size',
-                ['method', 'endpoint', 'status_code']
-            )
-        else:
-            self.logger.warning("Prometheus client not available, metrics disabled")
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        if not PROMETHEUS_AVAILABLE:
-            return await call_next(request)
-        
-        # 提取请求信息
-        method = request.method
-        endpoint = self._get_endpoint_pattern(request)
-        
-        # 记录请求大小
-        request_size = self._get_request_size(request)
-        self.request_size.labels(method=method, endpoint=endpoint).observe(request_size)
-        
-        # 记录请求开始时间
-        start_time = time.time()
-        
-        try:
-            # 处理请求
-            response = await call_next(request)
-            
-            # 记录指标
-            duration = time.time() - start_time
-            status_code = str(response.status_code)
-            
-            self.request_count.labels(
-                method=method,
-                endpoint=endpoint,
-                status_code=status_code
-            ).inc()
-            
-            self.request_duration.labels(
-                method=method,
-                endpoint=endpoint
-            ).observe(duration)
-            
-            # 记录响应大小
-            response_size = self._get_response_size(response)
-            self.response_size.labels(
-                method=method,
-                endpoint=endpoint,
-                status_code=status_code
-            ).observe(response_size)
-            
-            return response
-            
-        except Exception as e:
-            # 记录错误指标
-            self.request_count.labels(
-                method=method,
-                endpoint=endpoint,
-                status_code="500"
-            ).inc()
-            
-            duration = time.time() - start_time
-            self.request_duration.labels(
-                method=method,
-                endpoint=endpoint
-            ).observe(duration)
-            
-            raise
-    
-    def _get_endpoint_pattern(self, request: Request) -> str:
-        """获取端点模式（用于聚合指标）"""
-        path = request.url.path
-        
-        # 替换 ID 参数为占位符
-        import re
-        
-        # 替换数字 ID
-        path = re.sub(r'/\d+', '/{id}', path)
-        
-        # 替换 UUID
-        path = re.sub(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '/{uuid}', path)
-        
-        # 替换其他常见参数模式
-        path = re.sub(r'/[A-Za-z0-9_-]{20,}', '/{token}', path)
-        
-        return path or "/"
-    
-    def _get_request_size(self, request: Request) -> float:
-        """获取请求大小（字节）"""
-        content_length = request.headers.get("content-length")
-        if content_length:
-            try:
-                return float(content_length)
-            except (ValueError, TypeError):
-                pass
-        
-        # 估算大小
-        size = 0
-        
-        # 请求行大小
-        size += len(f"{request.method} {request.url.path} HTTP/1.1")
-        
-        # 头部大小
-        for name, value in request.headers.items():
-            size += len(f"{name}: {value}\r\n")
-        
-        return float(size)
-    
-    def _get_response_size(self, response: Response) -> float:
-        """获取响应大小（字节）"""
-        content_length = response.headers.get("content-length")
-        if content_length:
-            try:
-                return float(content_length)
-            except (ValueError, TypeError):
-                pass
-        
-        # 估算大小（不太准确，但比没有好）
-        size = 0
-        
-        # 状态行大小
-        size += len(f"HTTP/1.1 {response.status_code}")
-        
-        # 头部大小
-        for name, value in response.headers.items():
-            size += len(f"{name}: {value}\r\n")
-        
-        # Body 大小估算（如果是 JSON）
-        if hasattr(response, 'body') and response.body:
-            if isinstance(response.body, bytes):
-                size += len(response.body)
-            elif isinstance(response.body, str):
-                size += len(response.body.encode('utf-8'))
-        
-        return float(size)
+
+if PROMETHEUS_AVAILABLE:
+    # 请求计数器
+    REQUEST_COUNT = Counter(
+        'ef_http_requests_total',
+        'Total HTTP requests',
+        ['method', 'endpoint', 'status_code']
+    )
+
+    # 请求延迟直方图
+    REQUEST_DURATION = Histogram(
+        'ef_http_request_duration_seconds',
+        'HTTP request duration',
+        ['method', 'endpoint']
+    )
+
+    # 请求大小直方图
+    REQUEST_SIZE = Histogram(
+        'ef_http_request_size_bytes',
+        'HTTP request size',
+        ['method', 'endpoint']
+    )
+
+    # 响应大小直方图
+    RESPONSE_SIZE = Histogram(
+        'ef_http_response_size_bytes',
+        'HTTP response size',
+        ['method', 'endpoint', 'status_code']
+    )
+
+
+_NUMERIC_ID = re.compile(r'/\d+')
+_UUID = re.compile(r'/[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+_TOKEN = re.compile(r'/[A-Za-z0-9_-]{20,}')
+
+
+@lru_cache(maxsize=4096)
+def endpoint_pattern(path: str) -> str:
+    """获取端点模式（用于聚合指标）"""
+    # 替换数字 ID
+    path = _NUMERIC_ID.sub('/{id}', path)
+
+    # 替换 UUID
+    path = _UUID.sub('/{uuid}', path)
+
+    # 替换其他常见参数模式
+    path = _TOKEN.sub('/{token}', path)
+
+    return path or "/"
+
+
+# 抓取前执行的刷新回调（读取其它进程写入 Redis 的指标）
+_refreshers: List[Callable[[], Awaitable[None]]] = []
+
+
+def register_metrics_refresher(refresher: Callable[[], Awaitable[None]]) -> None:
+    """注册 /metrics 抓取前执行的异步刷新回调（重复注册忽略）"""
+    if refresher not in _refreshers:
+        _refreshers.append(refresher)
 
 
 def get_metrics_handler():
@@ -187,11 +89,18 @@ def get_metrics_handler():
     async def metrics_endpoint(request: Request):
         if not PROMETHEUS_AVAILABLE:
             return Response("Prometheus client not available", status_code=503)
-        
+
+        for refresher in _refreshers:
+            try:
+                await refresher()
+            except Exception as e:
+                # 单个来源失败不影响其它指标输出
+                logger.warning(f"Metrics refresher {refresher.__qualname__} failed: {e}")
+
         metrics_data = generate_latest()
         return Response(
             metrics_data,
             media_type=CONTENT_TYPE_LATEST
         )
     
-    return metrics_endpoint
\ No newline at end of file
+    return metrics_endpoint
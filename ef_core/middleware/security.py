@@ -8,11 +8,9 @@
 
 注意：X-XSS-Protection 已弃用，现代浏览器有内置 XSS 防护
 """
-from typing import Callable
-
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from ef_core.utils.logger import get_logger
 
@@ -22,36 +20,53 @@ logger = get_logger(__name__)
 MAX_REQUEST_SIZE = 10 * 1024 * 1024
 
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    """安全响应头中间件"""
+class SecurityHeadersMiddleware:
+    """安全响应头中间件（原生 ASGI）"""
+
+    # X-XSS-Protection 已弃用，现代浏览器有内置 XSS 防护，不再需要此头部
+    HEADERS = (
+        ("X-Content-Type-Options", "nosniff"),
+        ("X-Frame-Options", "SAMEORIGIN"),
+        ("Referrer-Policy", "strict-origin-when-cross-origin"),
+    )
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        response = await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        # 添加安全响应头
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "SAMEORIGIN"
-        # X-XSS-Protection 已弃用，现代浏览器有内置 XSS 防护，不再需要此头部
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # 添加安全响应头
+                headers = MutableHeaders(scope=message)
+                for name, value in self.HEADERS:
+                    headers[name] = value
+            await send(message)
 
-        return response
+        await self.app(scope, receive, send_wrapper)
 
 
-class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
-    """请求大小限制中间件"""
+class RequestSizeLimitMiddleware:
+    """请求大小限制中间件（原生 ASGI）"""
 
-    def __init__(self, app, max_size: int = MAX_REQUEST_SIZE):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, max_size: int = MAX_REQUEST_SIZE):
+        self.app = app
         self.max_size = max_size
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # 检查 Content-Length 头
-        content_length = request.headers.get("content-length")
-        if content_length:
-            try:
-                size = int(content_length)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            # 检查 Content-Length 头
+            content_length = Headers(scope=scope).get("content-length")
+            if content_length:
+                try:
+                    size = int(content_length)
+                except ValueError:
+                    size = 0
                 if size > self.max_size:
-                    return JSONResponse(
+                    response = JSONResponse(
                         status_code=413,
                         content={
                             "ok": False,
@@ -64,10 +79,10 @@ class RequestSizeLimitMiddleware(BaseHTTPMiddleware):
                             }
                         }
                     )
-            except ValueError:
-                pass
+                    await response(scope, receive, send)
+                    return
 
-        return await call_next(request)
+        await self.app(scope, receive, send)
 
 
 def setup_rate_limiter(app):
@@ -18,8 +18,10 @@ import redis.asyncio as redis
 from ef_core.config import get_settings
 from ef_core.database import get_db_manager
 from ef_core.models.users import User
+from ef_core.services.principal_cache import invalidate_principals
 from ef_core.utils.logger import get_logger
 from ef_core.utils.errors import UnauthorizedError, ValidationError
+from ef_core.utils.redis import get_redis_client
 from sqlalchemy import select, or_
 from sqlalchemy.orm import selectinload
 
@@ -36,7 +38,6 @@ class AuthService:
     
     def __init__(self):
         self.settings = get_settings()
-        self._redis_client = None
         self._fernet = None
         
         # JWT配置
@@ -48,14 +49,8 @@ class AuthService:
     
     @property
     def redis_client(self) -> redis.Redis:
-        """获取Redis客户端（懒加载）"""
-        if not self._redis_client:
-            self._redis_client = redis.from_url(
-                self.settings.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-        return self._redis_client
+        """当前事件循环的共享 Redis 客户端"""
+        return get_redis_client()
     
     @property
     def fernet(self) -> Fernet:
@@ -271,6 +266,9 @@ class AuthService:
 
             await session.commit()
 
+            # 旧设备的会话结论立即失效
+            await invalidate_principals(user.id)
+
             # 重新查询用户以获取最新数据
             stmt = select(User).where(User.id == user.id).options(
                 selectinload(User.shops),
@@ -443,6 +441,8 @@ class AuthService:
                         int(self.refresh_token_expire.total_seconds())
                     )
             
+            await invalidate_principals(access_payload.get("sub"))
+
             logger.info("User logged out", user_id=access_payload.get("sub"))
             
         except Exception as e:
@@ -13,8 +13,10 @@ from sqlalchemy.orm import selectinload
 from ef_core.config import get_settings
 from ef_core.database import get_db_manager
 from ef_core.models.users import User
+from ef_core.services.principal_cache import invalidate_principals
 from ef_core.utils.logger import get_logger
 from ef_core.utils.errors import ForbiddenError, ValidationError, NotFoundError
+from ef_core.utils.redis import get_redis_client, mset
 
 logger = get_logger(__name__)
 
@@ -28,18 +30,11 @@ class CloneService:
 
     def __init__(self):
         self.settings = get_settings()
-        self._redis_client = None
 
     @property
     def redis_client(self) -> redis.Redis:
-        """获取Redis客户端（懒加载）"""
-        if not self._redis_client:
-            self._redis_client = redis.from_url(
-                self.settings.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-        return self._redis_client
+        """当前事件循环的共享 Redis 客户端"""
+        return get_redis_client()
 
     async def create_clone_session(
         self,
@@ -124,19 +119,11 @@ class CloneService:
                 "expires_at": expires_at.isoformat()
             }
 
-            # 存储到 Redis
-            await self.redis_client.setex(
-                f"{self.CLONE_SESSION_PREFIX}{session_id}",
-                self.CLONE_SESSION_TTL,
-                json.dumps(session_data)
-            )
-
-            # 记录 admin 当前的克隆会话（用于防止重复克隆）
-            await self.redis_client.setex(
-                f"{self.ADMIN_CLONE_PREFIX}{admin_user.id}",
-                self.CLONE_SESSION_TTL,
-                session_id
-            )
+            # 存储到 Redis，同时记录 admin 当前的克隆会话（用于防止重复克隆），一次往返写入
+            await mset({
+                f"{self.CLONE_SESSION_PREFIX}{session_id}": json.dumps(session_data),
+                f"{self.ADMIN_CLONE_PREFIX}{admin_user.id}": session_id,
+            }, ttl=self.CLONE_SESSION_TTL)
 
             logger.info(
                 "Clone session created",
@@ -198,8 +185,11 @@ class CloneService:
         admin_user_id = session_data.get("admin_user_id")
 
         # 删除克隆会话
-        await self.redis_client.delete(f"{self.CLONE_SESSION_PREFIX}{clone_session_id}")
-        await self.redis_client.delete(f"{self.ADMIN_CLONE_PREFIX}{admin_user_id}")
+        await self.redis_client.delete(
+            f"{self.CLONE_SESSION_PREFIX}{clone_session_id}",
+            f"{self.ADMIN_CLONE_PREFIX}{admin_user_id}",
+        )
+        await invalidate_principals(session_data.get("cloned_user_id"))
 
         logger.info(
             "Clone session restored",
@@ -264,6 +254,7 @@ class CloneService:
             await self.redis_client.delete(f"{self.CLONE_SESSION_PREFIX}{clone_session_id}")
             if admin_user_id:
                 await self.redis_client.delete(f"{self.ADMIN_CLONE_PREFIX}{admin_user_id}")
+            await invalidate_principals(session_data.get("cloned_user_id"))
 
             logger.info(
                 "Clone session invalidated",
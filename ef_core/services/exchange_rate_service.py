@@ -14,6 +14,7 @@ from ef_core.models.exchange_rate import ExchangeRateConfig, ExchangeRate
 from ef_core.database import get_db_manager
 from ef_core.config import get_settings
 from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import get_redis
 
 logger = get_logger(__name__)
 settings = get_settings()
@@ -23,18 +24,11 @@ class ExchangeRateService:
     """汇率服务"""
 
     def __init__(self):
-        self.redis_client: Optional[aioredis.Redis] = None
         self.cache_ttl = 86400  # 24小时缓存
 
     async def _get_redis(self) -> aioredis.Redis:
-        """获取Redis连接"""
-        if self.redis_client is None:
-            self.redis_client = await aioredis.from_url(
-                settings.redis_url,
-                encoding="utf-8",
-                decode_responses=True
-            )
-        return self.redis_client
+        """获取共享 Redis 客户端"""
+        return await get_redis()
 
     async def configure_api(
         self,
@@ -0,0 +1,312 @@
+"""
+认证主体缓存
+
+AuthMiddleware 每个请求都要确认：访问令牌未被撤销、会话令牌仍是当前会话（单设备登录）、
+账号可写（子账号继承主账号状态）、克隆会话仍然有效。这些结论在两次登录/状态变更之间不会变化，
+因此按 (user_id, session_token, jti, clone_session_id) 缓存校验结果：
+
+1. 进程内 LRU（命中时一次字典查找，不访问 Redis/Postgres）
+2. Redis Hash ef:auth:principal:{user_id}（每个字段对应一个令牌，进程重启/多实例共享）
+3. 未命中时回源：黑名单 + 数据库 + 克隆会话校验，结果回填两级缓存
+
+失效：登录、登出、账号状态/到期时间变更、克隆恢复时调用 invalidate()，
+删除 Redis 中该用户的 Hash 并递增失效代数（回源期间发生的失效不会被旧结论覆盖），
+再通过 pub/sub 广播给所有进程清除本地条目。
+说明：这里不用 EventBus，EventBus 基于消费组，一条消息只会投递给一个消费者，无法广播。
+
+条目的有效期不会超过账号到期时间和克隆会话到期时间，到期后自然回源重新判断。
+"""
+import asyncio
+import json
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from redis.exceptions import RedisError
+
+try:
+    from prometheus_client import Counter
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import PUBSUB, get_redis
+
+logger = get_logger(__name__)
+
+
+if PROMETHEUS_AVAILABLE:
+    _PRINCIPAL_LOOKUPS = Counter(
+        'ef_auth_principal_cache_total',
+        'Authenticated principal cache lookups',
+        ['layer', 'result'],
+    )
+
+
+KEY_PREFIX = "ef:auth:principal"
+INVALIDATE_CHANNEL = "ef:auth:principal:invalidate"
+# 进程内条目存活时间：pub/sub 丢消息（如订阅重连期间）时的兜底
+LOCAL_TTL_SECONDS = 30
+LOCAL_MAX_ENTRIES = 20_000
+# Redis 条目存活时间
+REDIS_TTL_SECONDS = 600
+# 失效代数保留时间（远大于一次回源耗时即可）
+GENERATION_TTL_SECONDS = 24 * 3600
+
+# 仅当失效代数未变化时写入（防止回源期间的失效被旧结论覆盖）
+_SET_IF_GENERATION_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return 1
+"""
+
+
+@dataclass
+class CachedPrincipal:
+    """缓存的令牌校验结论（不含令牌载荷本身，载荷每次从 JWT 解出）"""
+
+    session_valid: bool
+    can_write: bool
+    write_error: str
+    # 结论有效截止时间（Unix 时间戳），受账号到期和克隆会话到期约束
+    valid_until: float
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str) -> "CachedPrincipal":
+        return cls(**json.loads(raw))
+
+
+def principal_field(session_token: Optional[str], jti: Optional[str], clone_session_id: Optional[str]) -> str:
+    """Redis Hash 字段名（同一用户下区分不同令牌）"""
+    return f"{session_token or ''}:{jti or ''}:{clone_session_id or ''}"
+
+
+def compute_valid_until(*deadlines: Optional[datetime], ttl: float = REDIS_TTL_SECONDS) -> float:
+    """结论有效期：默认 ttl 秒，不超过传入的任一截止时间"""
+    valid_until = time.time() + ttl
+    for deadline in deadlines:
+        if deadline is None:
+            continue
+        if deadline.tzinfo is None:
+            deadline = deadline.replace(tzinfo=timezone.utc)
+        valid_until = min(valid_until, deadline.timestamp())
+    return valid_until
+
+
+class PrincipalCache:
+    """认证主体两级缓存"""
+
+    def __init__(self, max_entries: int = LOCAL_MAX_ENTRIES, local_ttl: float = LOCAL_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        # (user_id, field) -> (本地过期时间, 结论)
+        self._local: "OrderedDict[Tuple[int, str], Tuple[float, CachedPrincipal]]" = OrderedDict()
+        # user_id -> 本地条目字段集合（失效时按用户清除）
+        self._by_user: Dict[int, Set[str]] = {}
+        # 每个事件循环一个订阅任务（Celery 每个任务新建事件循环）
+        self._listeners: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Task]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    # ========== 查询 ==========
+
+    async def get(self, user_id: int, field: str) -> Tuple[Optional[CachedPrincipal], Optional[str]]:
+        """
+        读取缓存结论
+
+        Returns:
+            (结论, 代数)：命中时代数为 None；未命中时返回当前代数，回源后原样传给 set()，
+            回源期间发生的失效会使这次回填作废。Redis 不可用时两者均为 None（不回填）。
+        """
+        self._ensure_listener()
+
+        now = time.time()
+        entry = self._local.get((user_id, field))
+        if entry is not None:
+            local_expires, principal = entry
+            if local_expires > now and principal.valid_until > now:
+                self._local.move_to_end((user_id, field))
+                self._record("local", "hit")
+                return principal, None
+            self._evict(user_id, field)
+
+        try:
+            redis_client = await get_redis()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hget(self._key(user_id), field)
+                pipe.get(self._generation_key(user_id))
+                raw, generation = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Principal cache unavailable: {e}")
+            self._record("redis", "unavailable")
+            return None, None
+
+        generation = generation or "0"
+        if not raw:
+            self._record("redis", "miss")
+            return None, generation
+
+        principal = CachedPrincipal.from_json(raw)
+        if principal.valid_until <= now:
+            self._record("redis", "expired")
+            return None, generation
+
+        self._remember(user_id, field, principal)
+        self._record("redis", "hit")
+        return principal, None
+
+    async def set(self, user_id: int, field: str, principal: CachedPrincipal, generation: Optional[str]) -> None:
+        """回填两级缓存（代数已变化说明回源期间发生过失效，放弃回填）"""
+        if generation is None or principal.valid_until <= time.time():
+            return
+
+        try:
+            redis_client = await get_redis()
+            stored = await redis_client.eval(
+                _SET_IF_GENERATION_SCRIPT,
+                2,
+                self._key(user_id),
+                self._generation_key(user_id),
+                generation,
+                field,
+                principal.to_json(),
+                REDIS_TTL_SECONDS,
+            )
+        except RedisError as e:
+            logger.warning(f"Failed to store principal for user {user_id}: {e}")
+            return
+
+        if stored:
+            self._remember(user_id, field, principal)
+
+    # ========== 失效 ==========
+
+    async def invalidate(self, *user_ids: int) -> None:
+        """
+        使用户的所有缓存结论失效（登录/登出/账号状态变更/克隆恢复后调用）
+
+        先删除 Redis，再广播；其它进程收到广播前最多沿用本地结论 LOCAL_TTL_SECONDS 秒。
+        """
+        ids = sorted({int(user_id) for user_id in user_ids if user_id is not None})
+        if not ids:
+            return
+
+        self.evict_local(ids)
+        try:
+            redis_client = await get_redis()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.delete(*[self._key(user_id) for user_id in ids])
+                for user_id in ids:
+                    pipe.incr(self._generation_key(user_id))
+                    pipe.expire(self._generation_key(user_id), GENERATION_TTL_SECONDS)
+                pipe.publish(INVALIDATE_CHANNEL, json.dumps(ids))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to invalidate principals {ids}: {e}")
+
+    def evict_local(self, user_ids: Iterable[int]) -> None:
+        """清除本进程内指定用户的条目"""
+        for user_id in user_ids:
+            for field in self._by_user.pop(user_id, set()):
+                self._local.pop((user_id, field), None)
+
+    # ========== 内部 ==========
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return f"{KEY_PREFIX}:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: int) -> str:
+        return f"{KEY_PREFIX}:gen:{user_id}"
+
+    def _remember(self, user_id: int, field: str, principal: CachedPrincipal) -> None:
+        key = (user_id, field)
+        self._local[key] = (time.time() + self.local_ttl, principal)
+        self._local.move_to_end(key)
+        self._by_user.setdefault(user_id, set()).add(field)
+        while len(self._local) > self.max_entries:
+            (old_user_id, old_field), _ = self._local.popitem(last=False)
+            self._discard_index(old_user_id, old_field)
+
+    def _evict(self, user_id: int, field: str) -> None:
+        self._local.pop((user_id, field), None)
+        self._discard_index(user_id, field)
+
+    def _discard_index(self, user_id: int, field: str) -> None:
+        fields = self._by_user.get(user_id)
+        if fields is not None:
+            fields.discard(field)
+            if not fields:
+                del self._by_user[user_id]
+
+    def _ensure_listener(self) -> None:
+        """懒启动当前事件循环的失效广播订阅"""
+        loop = asyncio.get_running_loop()
+        task = self._listeners.get(loop)
+        if task is None or task.done():
+            self._listeners[loop] = loop.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        """订阅失效广播；断线后重连，期间本地条目依赖短 TTL 兜底"""
+        while True:
+            pubsub = None
+            try:
+                redis_client = await get_redis(PUBSUB)
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                # 订阅建立前的广播可能已错过，清空本地缓存
+                self._local.clear()
+                self._by_user.clear()
+
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        self.evict_local(int(user_id) for user_id in json.loads(message["data"]))
+                    except (TypeError, ValueError) as e:
+                        logger.warning(f"Malformed principal invalidation message: {e}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Principal invalidation listener error, reconnecting: {e}")
+                self._local.clear()
+                self._by_user.clear()
+                await asyncio.sleep(1)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+    @staticmethod
+    def _record(layer: str, result: str) -> None:
+        if PROMETHEUS_AVAILABLE:
+            _PRINCIPAL_LOOKUPS.labels(layer=layer, result=result).inc()
+
+
+_principal_cache: Optional[PrincipalCache] = None
+
+
+def get_principal_cache() -> PrincipalCache:
+    """获取认证主体缓存单例"""
+    global _principal_cache
+    if _principal_cache is None:
+        _principal_cache = PrincipalCache()
+    return _principal_cache
+
+
+async def invalidate_principals(*user_ids: int) -> None:
+    """使用户的认证缓存失效（便捷函数）"""
+    await get_principal_cache().invalidate(*user_ids)
@@ -0,0 +1,318 @@
+"""
+任务进度服务
+
+API、Celery、ARQ 进程共用的后台任务进度存储与推送（替代进程内的任务字典和各任务自行写入的 JSON 进度键）：
+
+- 存储：每个任务一个 Redis Hash ef:task:progress:{task_id}，字段值为 JSON（嵌套结构、数字类型原样保留），
+  更新只写变化的字段；TTL 1 小时，每次写入续期，不需要定时清理
+- 合并/节流：同一任务在 MIN_WRITE_INTERVAL 秒内的多次 update() 在进程内合并为一次写入，
+  节流窗口结束时由延迟刷新写出最后的状态；进入终态（completed/failed 等）或 force=True 时立即写入
+- 推送：每次写入后把任务最新快照经 WebSocket 背板推送给任务所有者（start(user_id=...) / bind_owner() 记录），
+  消息格式 {"type": "task.progress", "task_id": ..., "data": {...}}，前端据此刷新进度，不再轮询
+
+Redis 不可用时只记录警告，不影响任务本身的执行。
+
+用法:
+    from ef_core.services.task_progress import task_progress
+
+    await task_progress.start(task_id, "stock_update", user_id=user.id, total=len(items))
+    for i, item in enumerate(items):
+        ...
+        await task_progress.update(task_id, current=i + 1, progress=int((i + 1) * 100 / len(items)))
+    await task_progress.complete(task_id, result={"updated": n})
+"""
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from redis.exceptions import RedisError
+
+from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import get_redis
+
+logger = get_logger(__name__)
+
+
+KEY_PREFIX = "ef:task:progress"
+PROGRESS_TTL_SECONDS = 3600
+# 同一任务两次写入的最小间隔（秒）
+MIN_WRITE_INTERVAL = 0.5
+
+# 进入这些状态时立即写入（不节流）
+TERMINAL_STATUSES = frozenset({"completed", "failed", "success", "failure", "error", "cancelled"})
+# start() 重置任务时清除的字段（所有者等其它字段保留）
+RESET_FIELDS = ("completed_at", "failed_at", "error", "result")
+
+MESSAGE_TYPE = "task.progress"
+
+
+def _utcnow_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _decode(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return raw
+
+
+class TaskProgressService:
+    """任务进度服务（进程内单例：节流状态按进程维护，存储与推送跨进程共享）"""
+
+    def __init__(self, min_interval: float = MIN_WRITE_INTERVAL, ttl: int = PROGRESS_TTL_SECONDS):
+        self.min_interval = min_interval
+        self.ttl = ttl
+        # 等待写入的字段：task_id -> {field: value}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        # 最近一次写入时间（monotonic）
+        self._last_write: Dict[str, float] = {}
+        # 节流窗口结束时的延迟刷新
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
+
+    # ========== 写入 ==========
+
+    async def start(
+        self,
+        task_id: str,
+        task_type: str,
+        user_id: Optional[int] = None,
+        status: str = "running",
+        message: str = "",
+        **fields: Any
+    ) -> Dict[str, Any]:
+        """
+        创建（或重置）任务进度记录，立即写入
+
+        重置时清除上一次运行的结果字段，保留所有者等其它字段（API 进程可能已先写入 user_id）。
+
+        Args:
+            task_id: 任务ID
+            task_type: 任务类型（如 products、orders、stock_update）
+            user_id: 任务所有者，进度变化推送给该用户
+            status: 初始状态
+            message: 初始消息
+            **fields: 其它初始字段
+
+        Returns:
+            写入后的任务快照
+        """
+        record = {
+            "task_id": task_id,
+            "type": task_type,
+            "status": status,
+            "progress": 0,
+            "message": message,
+            "started_at": _utcnow_iso(),
+            **fields,
+        }
+        if user_id is not None:
+            record["user_id"] = user_id
+        self._discard_pending(task_id)
+        return await self._write(task_id, record, reset=True)
+
+    async def update(self, task_id: str, force: bool = False, **fields: Any) -> None:
+        """
+        更新任务字段（合并、节流）
+
+        节流窗口内的更新先合并在进程内，窗口结束时写出；
+        status 为终态或 force=True 时连同已合并的字段立即写入。
+        """
+        pending = self._pending.setdefault(task_id, {})
+        pending.update(fields)
+
+        if force or fields.get("status") in TERMINAL_STATUSES:
+            await self.flush(task_id)
+            return
+
+        wait = self._last_write.get(task_id, 0.0) + self.min_interval - time.monotonic()
+        if wait <= 0:
+            await self.flush(task_id)
+        elif task_id not in self._flush_tasks:
+            self._flush_tasks[task_id] = asyncio.create_task(self._flush_later(task_id, wait))
+
+    async def complete(
+        self,
+        task_id: str,
+        result: Optional[Dict[str, Any]] = None,
+        message: str = "",
+        **fields: Any
+    ) -> Dict[str, Any]:
+        """标记任务完成（立即写入），返回任务快照"""
+        fields.update(status="completed", progress=100, completed_at=_utcnow_iso())
+        if result is not None:
+            fields["result"] = result
+        if message:
+            fields["message"] = message
+        return await self._finish(task_id, fields)
+
+    async def fail(self, task_id: str, error: str, message: str = "", **fields: Any) -> Dict[str, Any]:
+        """标记任务失败（立即写入），返回任务快照"""
+        fields.update(
+            status="failed",
+            error=error,
+            message=message or f"任务失败: {error}",
+            failed_at=_utcnow_iso(),
+        )
+        return await self._finish(task_id, fields)
+
+    async def bind_owner(self, task_id: str, user_id: int) -> None:
+        """
+        记录任务所有者（任务由其它进程执行时，由发起请求的 API 进程调用）
+
+        只写 user_id 一个字段，与任务自身的写入先后无关。
+        """
+        await self._write(task_id, {"user_id": user_id}, push=False)
+
+    async def flush(self, task_id: Optional[str] = None) -> None:
+        """立即写出合并中的更新（task_id 为 None 时写出全部任务）"""
+        task_ids = [task_id] if task_id is not None else list(self._pending)
+        for tid in task_ids:
+            flush_task = self._flush_tasks.pop(tid, None)
+            if flush_task is not None and flush_task is not asyncio.current_task():
+                flush_task.cancel()
+            fields = self._pending.pop(tid, None)
+            if fields:
+                await self._write(tid, fields)
+
+    async def delete(self, task_id: str) -> None:
+        """删除任务进度记录"""
+        self._discard_pending(task_id)
+        try:
+            redis_client = await get_redis()
+            await redis_client.delete(self._key(task_id))
+        except RedisError as e:
+            logger.warning(f"Failed to delete task progress {task_id}: {e}")
+
+    # ========== 查询 ==========
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务快照（不存在或已过期时返回 None）"""
+        try:
+            redis_client = await get_redis()
+            raw = await redis_client.hgetall(self._key(task_id))
+        except RedisError as e:
+            logger.warning(f"Failed to read task progress {task_id}: {e}")
+            return None
+        return {field: _decode(value) for field, value in raw.items()} if raw else None
+
+    async def list_tasks(self, task_type: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        列出所有未过期的任务（可按类型过滤）
+
+        Returns:
+            {task_id: 任务快照}
+        """
+        tasks: Dict[str, Dict[str, Any]] = {}
+        try:
+            redis_client = await get_redis()
+            keys = [key async for key in redis_client.scan_iter(match=f"{KEY_PREFIX}:*", count=200)]
+            if not keys:
+                return tasks
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.hgetall(key)
+                snapshots = await pipe.execute()
+        except RedisError as e:
+            logger.warning(f"Failed to list task progress: {e}")
+            return tasks
+
+        prefix_len = len(KEY_PREFIX) + 1
+        for key, raw in zip(keys, snapshots):
+            if not raw:
+                continue
+            snapshot = {field: _decode(value) for field, value in raw.items()}
+            if task_type is None or snapshot.get("type") == task_type:
+                tasks[key[prefix_len:]] = snapshot
+        return tasks
+
+    # ========== 内部实现 ==========
+
+    @staticmethod
+    def _key(task_id: str) -> str:
+        return f"{KEY_PREFIX}:{task_id}"
+
+    def _discard_pending(self, task_id: str) -> None:
+        self._pending.pop(task_id, None)
+        flush_task = self._flush_tasks.pop(task_id, None)
+        if flush_task is not None and flush_task is not asyncio.current_task():
+            flush_task.cancel()
+
+    async def _flush_later(self, task_id: str, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        self._flush_tasks.pop(task_id, None)
+        await self.flush(task_id)
+
+    async def _finish(self, task_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """终态写入：合并尚未写出的字段后立即写入，并清理本进程的节流状态"""
+        pending = self._pending.pop(task_id, {})
+        pending.update(fields)
+        self._discard_pending(task_id)
+        snapshot = await self._write(task_id, pending)
+        self._last_write.pop(task_id, None)
+        return snapshot
+
+    async def _write(
+        self,
+        task_id: str,
+        fields: Dict[str, Any],
+        reset: bool = False,
+        push: bool = True
+    ) -> Dict[str, Any]:
+        """
+        写入字段并推送最新快照（一次 pipeline 往返）
+
+        Returns:
+            写入后的完整快照；Redis 不可用时返回本次写入的字段
+        """
+        self._last_write[task_id] = time.monotonic()
+        key = self._key(task_id)
+        mapping = {field: _encode(value) for field, value in fields.items()}
+        mapping["updated_at"] = _encode(_utcnow_iso())
+
+        try:
+            redis_client = await get_redis()
+            async with redis_client.pipeline(transaction=True) as pipe:
+                if reset:
+                    pipe.hdel(key, *RESET_FIELDS)
+                pipe.hset(key, mapping=mapping)
+                pipe.expire(key, self.ttl)
+                pipe.hgetall(key)
+                raw = (await pipe.execute())[-1]
+        except RedisError as e:
+            logger.warning(f"Failed to write task progress {task_id}: {e}")
+            return dict(fields, task_id=task_id)
+
+        snapshot = {field: _decode(value) for field, value in raw.items()}
+        snapshot.setdefault("task_id", task_id)
+
+        owner = snapshot.get("user_id")
+        if push and owner is not None:
+            await self._push(int(owner), task_id, snapshot)
+        return snapshot
+
+    async def _push(self, user_id: int, task_id: str, snapshot: Dict[str, Any]) -> None:
+        from ef_core.websocket.manager import notification_manager
+
+        try:
+            await notification_manager.send_to_user(user_id, {
+                "type": MESSAGE_TYPE,
+                "task_id": task_id,
+                "data": snapshot,
+                "timestamp": snapshot.get("updated_at"),
+            })
+        except Exception as e:
+            logger.warning(f"Failed to push task progress {task_id}: {e}")
+
+
+# 全局单例
+task_progress = TaskProgressService()
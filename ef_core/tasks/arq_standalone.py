@@ -51,12 +51,21 @@ async def startup(ctx: dict[str, Any]) -> None:
     from ef_core.database import get_db_manager
     ctx['db_manager'] = get_db_manager()
 
+    # 常驻标签预缓存 worker（消费货件状态变化写入的 Redis 队列）
+    from plugins.ef.channels.ozon.services.label_prefetch_worker import get_label_prefetch_worker
+    get_label_prefetch_worker().ensure_started()
+
     logger.info("ARQ Worker started successfully")
 
 
 async def shutdown(ctx: dict[str, Any]) -> None:
     """Worker 关闭时清理"""
     logger.info("ARQ Worker shutting down...")
+
+    # 停止标签预缓存 worker，已领取未处理的货件放回队列
+    from plugins.ef.channels.ozon.services.label_prefetch_worker import get_label_prefetch_worker
+    await get_label_prefetch_worker().stop()
+
     logger.info("ARQ Worker shutdown complete")
 
 
@@ -5,64 +5,23 @@ ARQ 任务工具模块
 """
 
 import logging
-import os
 from typing import Any, Optional
 
-from arq import create_pool
-from arq.connections import RedisSettings
 from arq.jobs import Job, JobStatus
 
-logger = logging.getLogger(__name__)
-
-# 全局连接池（懒加载）
-_arq_pool = None
-
-
-def get_redis_settings() -> RedisSettings:
-    """
-    获取 Redis 连接配置
+from ef_core.utils.redis import QUEUE, get_redis
 
-    与 arq_worker.py 保持一致，使用 database=2
-    """
-    redis_host = os.getenv('EF__REDIS_HOST', 'localhost')
-    redis_port = int(os.getenv('EF__REDIS_PORT', '6379'))
-    redis_password = os.getenv('EF__REDIS_PASSWORD', None)
-
-    return RedisSettings(
-        host=redis_host,
-        port=redis_port,
-        password=redis_password,
-        database=2,
-    )
+logger = logging.getLogger(__name__)
 
 
 async def get_arq_pool():
     """
-    获取 ARQ Redis 连接池
+    获取 ARQ Redis 客户端
 
-    使用单例模式，整个应用共享一个连接池。
+    使用共享 Redis 层的 queue 连接池（database=2，与 Celery 隔离），按事件循环复用，
+    由 ef_core.utils.redis.close_redis() 统一关闭。
     """
-    global _arq_pool
-
-    if _arq_pool is None:
-        _arq_pool = await create_pool(get_redis_settings())
-        logger.info("Created ARQ connection pool")
-
-    return _arq_pool
-
-
-async def close_arq_pool():
-    """
-    关闭 ARQ 连接池
-
-    应在应用关闭时调用。
-    """
-    global _arq_pool
-
-    if _arq_pool is not None:
-        await _arq_pool.close()
-        _arq_pool = None
-        logger.info("Closed ARQ connection pool")
+    return await get_redis(QUEUE)
 
 
 async def enqueue_task(
@@ -256,7 +215,7 @@ async def get_queue_info(queue_name: str = "arq:queue") -> dict[str, Any]:
     pool = await get_arq_pool()
 
     # 获取队列长度
-    pending_count = await pool.redis.llen(queue_name)
+    pending_count = await pool.llen(queue_name)
 
     return {
         "queue_name": queue_name,
@@ -0,0 +1,171 @@
+"""
+Celery 任务的异步执行桥接
+
+每个 worker 进程持有一个常驻事件循环（后台线程 run_forever），所有 Celery 任务通过
+run_async(coro) 在该循环上执行协程，不再每次任务 new_event_loop() + create_async_engine()：
+
+- 数据库：get_task_db_manager() / get_db_manager() 在常驻循环上返回进程级共享的引擎和连接池
+- Redis：get_redis() 按事件循环缓存客户端，常驻循环上的各用途连接池跨任务复用
+- 进程内首次调用时创建（prefork 子进程在 fork 之后创建，不继承父进程的线程和连接）
+- WorkerLoopStep（solo/threads pool）和 worker_process_shutdown 信号（prefork 子进程）
+  负责退出时释放引擎、关闭 Redis 并停止循环
+
+用法:
+    from ef_core.tasks.async_runner import run_async
+
+    @celery_app.task(bind=True, name="ef.xxx")
+    def my_task(self, shop_id: int):
+        return run_async(_my_task_async(shop_id))
+"""
+import asyncio
+import os
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+from celery import bootsteps, signals
+
+from ef_core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# 关闭时等待引擎释放、连接关闭的最长时间（秒）
+SHUTDOWN_TIMEOUT = 10
+
+
+class WorkerEventLoop:
+    """worker 进程的常驻事件循环（独立线程中运行）"""
+
+    def __init__(self):
+        from ef_core.database import bind_task_db_manager, reset_db_manager
+        from ef_core.utils.redis import reset_redis
+
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+
+        # 父进程（或插件初始化的临时循环）创建的引擎/Redis 连接不能在新循环上使用
+        reset_db_manager()
+        reset_redis()
+        self.db_manager = bind_task_db_manager(self.loop)
+
+        self._thread = threading.Thread(target=self._run, name="ef-task-loop", daemon=True)
+        self._thread.start()
+        logger.info("Started worker event loop", pid=self.pid)
+
+    def _run(self) -> None:
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    @property
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def run(self, coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+        """在常驻循环上执行协程并阻塞等待结果"""
+        if self.in_loop_thread:
+            coro.close()
+            raise RuntimeError("run_async() 不能在任务事件循环内调用，请直接 await")
+
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # 超时 / SoftTimeLimitExceeded 等：取消循环中的协程，避免其在后台继续执行
+            future.cancel()
+            raise
+
+    def shutdown(self) -> None:
+        """释放数据库引擎和 Redis 连接，停止事件循环"""
+        from ef_core.database import get_db_manager, unbind_task_db_manager
+        from ef_core.utils.redis import close_redis
+
+        async def cleanup():
+            unbind_task_db_manager(self.loop)
+            await self.db_manager.close()
+            await get_db_manager().close()
+            await close_redis()
+
+        try:
+            asyncio.run_coroutine_threadsafe(cleanup(), self.loop).result(SHUTDOWN_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Worker event loop cleanup failed: {e}")
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(SHUTDOWN_TIMEOUT)
+            if not self.loop.is_running():
+                self.loop.close()
+            logger.info("Stopped worker event loop", pid=self.pid)
+
+
+_worker_loop: Optional[WorkerEventLoop] = None
+_worker_loop_lock = threading.Lock()
+
+
+def get_worker_loop() -> WorkerEventLoop:
+    """获取当前进程的常驻事件循环（fork 后的子进程会重新创建）"""
+    global _worker_loop
+    if _worker_loop is None or _worker_loop.pid != os.getpid():
+        with _worker_loop_lock:
+            if _worker_loop is None or _worker_loop.pid != os.getpid():
+                _worker_loop = WorkerEventLoop()
+    return _worker_loop
+
+
+def run_async(coro: Coroutine[Any, Any, T], timeout: Optional[float] = None) -> T:
+    """
+    在 worker 常驻事件循环上执行协程（Celery 任务中同步调用异步代码的唯一入口）
+
+    Args:
+        coro: 要执行的协程
+        timeout: 最长等待时间（秒），默认不限（由 Celery 的 soft_time_limit 控制）
+
+    Returns:
+        协程的返回值（异常原样抛出）
+    """
+    return get_worker_loop().run(coro, timeout)
+
+
+def shutdown_worker_loop() -> None:
+    """关闭当前进程的常驻事件循环（未创建时忽略）"""
+    global _worker_loop
+    with _worker_loop_lock:
+        worker_loop, _worker_loop = _worker_loop, None
+    if worker_loop is not None and worker_loop.pid == os.getpid():
+        worker_loop.shutdown()
+
+
+class WorkerLoopStep(bootsteps.StartStopStep):
+    """
+    Worker bootstep：在执行任务的进程中启动/关闭常驻事件循环
+
+    solo/threads 等 pool 在 worker 主进程执行任务，由本 step 管理；
+    prefork 的任务在子进程执行，主进程不创建（fork 前不能有后台线程），
+    子进程由 worker_process_init / worker_process_shutdown 信号管理。
+    """
+
+    requires = {"celery.worker.components:Pool"}
+
+    def __init__(self, worker, **kwargs):
+        super().__init__(worker, **kwargs)
+        self.in_process = not getattr(worker.pool_cls, "__module__", "").endswith("prefork")
+
+    def start(self, worker):
+        if self.in_process:
+            get_worker_loop()
+
+    def stop(self, worker):
+        if self.in_process:
+            shutdown_worker_loop()
+
+
+@signals.worker_process_init.connect
+def _start_loop_in_child(**kwargs):
+    """prefork 子进程启动时创建常驻事件循环和连接池"""
+    get_worker_loop()
+
+
+@signals.worker_process_shutdown.connect
+def _stop_loop_in_child(**kwargs):
+    """prefork 子进程退出时释放连接并停止事件循环"""
+    shutdown_worker_loop()
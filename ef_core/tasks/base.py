@@ -92,8 +92,9 @@ def task_with_context(
         if asyncio.iscoroutinefunction(func):
             @wraps(func)
             def sync_wrapper(*args, **kwargs):
-                """将异步函数包装为同步函数"""
-                return asyncio.run(func(*args, **kwargs))
+                """将异步函数包装为同步函数（在 worker 常驻事件循环上执行）"""
+                from .async_runner import run_async
+                return run_async(func(*args, **kwargs))
             
             sync_wrapper.__name__ = func.__name__
             sync_wrapper.__doc__ = func.__doc__
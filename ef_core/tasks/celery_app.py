@@ -76,6 +76,11 @@ celery_app.conf.update(
     result_compression="gzip",
 )
 
+# 常驻事件循环：所有任务通过 run_async() 在每个 worker 进程的同一个事件循环和连接池上执行
+from .async_runner import WorkerLoopStep  # noqa: E402
+
+celery_app.steps["worker"].add(WorkerLoopStep)
+
 # 定期任务配置（Beat Schedule）
 celery_app.conf.beat_schedule = {
     # 系统健康检查
@@ -561,6 +566,7 @@ def _initialize_plugins_for_celery():
         from ef_core.plugin_host import get_plugin_host
         from ef_core.tasks.registry import TaskRegistry
         from ef_core.event_bus import EventBus
+        from ef_core.utils.redis import close_redis
 
         logger.info("🔧 Initializing plugins for Celery...")
 
@@ -584,8 +590,9 @@ def _initialize_plugins_for_celery():
 
                 return task_registry
             finally:
-                # 关键修复：在事件循环结束前正确关闭 EventBus，避免 "Event loop is closed" 错误
+                # 关键修复：在事件循环结束前正确关闭 EventBus 和本循环的 Redis 连接，避免 "Event loop is closed" 错误
                 await event_bus.shutdown()
+                await close_redis()
 
         # 在单个事件循环中执行所有异步操作
         # 先检测是否已有运行中的事件循环，避免创建不会被 await 的协程
@@ -646,51 +653,48 @@ def cleanup_stale_tasks_on_startup(**kwargs):
     """
     Worker 启动时清理所有僵死的任务进度记录
 
-    当 Celery worker 重启时，Redis 中可能还保留着旧的任务进度状态。
+    当 Celery worker 重启时，Redis 中可能还保留着旧的任务进度状态（ef_core.services.task_progress）。
     这些状态会导致前端认为任务还在运行，但实际上 worker 已经重启，任务已经丢失。
     """
-    try:
-        import redis
-        import json
-        from celery.result import AsyncResult
+    import asyncio
+    from celery.result import AsyncResult
 
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-        cleaned_count = 0
-        zombie_count = 0
+    from ef_core.services.task_progress import task_progress
+    from ef_core.utils.redis import close_redis
 
-        for key in redis_client.keys("celery-task-progress:*"):
-            try:
-                data = redis_client.get(key)
-                if not data:
+    async def cleanup() -> int:
+        zombie_count = 0
+        # Redis 客户端按事件循环隔离：临时循环上创建的连接在结束时关闭
+        try:
+            for task_id, progress in (await task_progress.list_tasks()).items():
+                # starting/syncing 只由 Celery 任务写入（API 进程内的同步任务不受影响），
+                # 已结束的任务记录按 TTL 自动过期
+                if progress.get('status') not in ['starting', 'syncing']:
                     continue
 
-                progress = json.loads(data)
-                task_id = key.replace("celery-task-progress:", "")
+                # 检查 Celery 中任务是否真的在运行
+                result = AsyncResult(task_id, app=celery_app)
 
-                # 检查任务状态
-                if progress.get('status') in ['starting', 'syncing']:
-                    # 检查 Celery 中任务是否真的在运行
-                    result = AsyncResult(task_id, app=celery_app)
+                # PENDING 表示任务不存在或未开始，FAILURE/SUCCESS/REVOKED 表示任务已结束
+                if result.state in ['PENDING', 'FAILURE', 'SUCCESS', 'REVOKED']:
+                    await task_progress.delete(task_id)
+                    zombie_count += 1
+                    logger.warning(f"Cleaned zombie task {task_id} with Celery state {result.state}")
+                else:
+                    logger.info(f"Task {task_id} is still running with state {result.state}")
+        finally:
+            await close_redis()
+        return zombie_count
 
-                    # PENDING 表示任务不存在或未开始，FAILURE/SUCCESS/REVOKED 表示任务已结束
-                    if result.state in ['PENDING', 'FAILURE', 'SUCCESS', 'REVOKED']:
-                        redis_client.delete(key)
-                        zombie_count += 1
-                        logger.warning(f"Cleaned zombie task {task_id} with Celery state {result.state}")
-                    else:
-                        logger.info(f"Task {task_id} is still running with state {result.state}")
-                elif progress.get('status') in ['completed', 'failed']:
-                    # 已完成的任务，清理掉
-                    redis_client.delete(key)
-                    cleaned_count += 1
-
-            except Exception as e:
-                logger.error(f"Error cleaning task progress {key}: {e}", exc_info=True)
-
-        if zombie_count > 0 or cleaned_count > 0:
-            logger.info(
-                f"Startup cleanup completed: {zombie_count} zombie tasks, {cleaned_count} completed tasks removed"
-            )
+    try:
+        loop = asyncio.new_event_loop()
+        try:
+            zombie_count = loop.run_until_complete(cleanup())
+        finally:
+            loop.close()
+
+        if zombie_count > 0:
+            logger.info(f"Startup cleanup completed: {zombie_count} zombie tasks removed")
     except Exception as e:
         logger.error(f"Failed to cleanup stale tasks on startup: {e}", exc_info=True)
 
@@ -26,28 +26,15 @@ async def system_health_check() -> Dict[str, Any]:
     }
 
     try:
-        # 检查数据库连接（使用独立引擎避免事件循环冲突）
+        # 检查数据库连接（worker 常驻事件循环上的共享引擎）
         try:
-            from sqlalchemy.ext.asyncio import create_async_engine
-            from ef_core.config import get_settings
+            from sqlalchemy import text
+            from ef_core.database import get_task_db_manager
 
-            settings = get_settings()
             start_time = datetime.utcnow()
-
-            # 创建独立的引擎实例（不使用单例，避免事件循环绑定问题）
-            temp_engine = create_async_engine(
-                settings.database_url,
-                pool_pre_ping=True,
-                pool_size=1,
-                max_overflow=0,
-            )
-            try:
-                async with temp_engine.begin() as conn:
-                    from sqlalchemy import text
-                    await conn.execute(text("SELECT 1"))
-                db_healthy = True
-            finally:
-                await temp_engine.dispose()
+            async with get_task_db_manager().create_async_engine().connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            db_healthy = True
 
             latency_ms = int((datetime.utcnow() - start_time).total_seconds() * 1000)
             health_status["checks"]["database"] = {
@@ -305,73 +292,56 @@ async def check_expired_accounts() -> Dict[str, Any]:
     }
 
     try:
-        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
         from sqlalchemy import select
         from sqlalchemy.orm import selectinload
-        from ef_core.config import get_settings
+        from ef_core.database import get_task_db_manager
         from ef_core.models.users import User
         from ef_core.websocket.manager import notification_manager
 
-        settings = get_settings()
+        async with get_task_db_manager().get_session() as session:
+            # 获取所有在线用户ID（汇总所有 API 进程，Celery 进程本身不持有连接）
+            online_user_ids = await notification_manager.get_cluster_online_user_ids()
 
-        # 创建独立的引擎实例
-        temp_engine = create_async_engine(
-            settings.database_url,
-            pool_pre_ping=True,
-            pool_size=1,
-            max_overflow=0,
-        )
+            if not online_user_ids:
+                logger.info("No online users to check")
+                return result
 
-        try:
-            async_session = async_sessionmaker(temp_engine, expire_on_commit=False)
-
-            async with async_session() as session:
-                # 获取所有在线用户ID
-                online_user_ids = notification_manager.get_online_user_ids()
-
-                if not online_user_ids:
-                    logger.info("No online users to check")
-                    return result
-
-                result["checked"] = len(online_user_ids)
-
-                # 查询这些用户（包含 parent_user 用于子账号继承状态）
-                stmt = select(User).where(User.id.in_(online_user_ids)).options(
-                    selectinload(User.parent_user)
-                )
-                users_result = await session.execute(stmt)
-                users = users_result.scalars().all()
-
-                # 检查每个用户是否过期
-                for user in users:
-                    try:
-                        # 跳过 admin
-                        if user.role == "admin":
-                            continue
-
-                        # 检查是否可以登录（包含过期检查）
-                        can_login, error_msg = user.can_login()
-
-                        if not can_login:
-                            # 发送过期通知
-                            await notification_manager.send_session_expired(
-                                user_id=user.id,
-                                reason="account_expired" if "过期" in error_msg else "account_disabled",
-                                message=error_msg
-                            )
-                            result["expired_notified"] += 1
-                            logger.info(
-                                f"Notified user {user.id} ({user.username}) to logout: {error_msg}"
-                            )
-                    except Exception as e:
-                        result["errors"] += 1
-                        logger.error(
-                            f"Failed to check/notify user {user.id}: {e}",
-                            exc_info=True
-                        )
+            result["checked"] = len(online_user_ids)
 
-        finally:
-            await temp_engine.dispose()
+            # 查询这些用户（包含 parent_user 用于子账号继承状态）
+            stmt = select(User).where(User.id.in_(online_user_ids)).options(
+                selectinload(User.parent_user)
+            )
+            users_result = await session.execute(stmt)
+            users = users_result.scalars().all()
+
+            # 检查每个用户是否过期
+            for user in users:
+                try:
+                    # 跳过 admin
+                    if user.role == "admin":
+                        continue
+
+                    # 检查是否可以登录（包含过期检查）
+                    can_login, error_msg = user.can_login()
+
+                    if not can_login:
+                        # 发送过期通知
+                        await notification_manager.send_session_expired(
+                            user_id=user.id,
+                            reason="account_expired" if "过期" in error_msg else "account_disabled",
+                            message=error_msg
+                        )
+                        result["expired_notified"] += 1
+                        logger.info(
+                            f"Notified user {user.id} ({user.username}) to logout: {error_msg}"
+                        )
+                except Exception as e:
+                    result["errors"] += 1
+                    logger.error(
+                        f"Failed to check/notify user {user.id}: {e}",
+                        exc_info=True
+                    )
 
         logger.info(
             f"Expired accounts check completed: "
@@ -0,0 +1,203 @@
+"""
+异步日志落盘
+
+请求路径上的日志写入（stdout、api_cost.log）统一进入有界内存队列，
+由后台线程批量写出，事件循环只做一次 put_nowait。
+
+队列满时丢弃新日志并计数，不阻塞请求处理（日志不能反过来拖慢接口）。
+"""
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Dict, Optional, TextIO, Tuple
+
+try:
+    from prometheus_client import Counter
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+if PROMETHEUS_AVAILABLE:
+    _DROPPED_LOGS = Counter(
+        'ef_log_sink_dropped_total',
+        'Log lines dropped because the sink queue was full',
+        ['sink'],
+    )
+
+
+# 队列容量（条）
+DEFAULT_QUEUE_SIZE = 10_000
+# 写线程每次最多合并的条数
+WRITE_BATCH_SIZE = 500
+
+
+def _record_drop(sink: str) -> None:
+    if PROMETHEUS_AVAILABLE:
+        _DROPPED_LOGS.labels(sink=sink).inc()
+
+
+class FileLogSink:
+    """按文件追加的日志写入器（后台线程批量写出）"""
+
+    def __init__(self, maxsize: int = DEFAULT_QUEUE_SIZE):
+        self._queue: "queue.Queue[Optional[Tuple[Path, str]]]" = queue.Queue(maxsize=maxsize)
+        self._files: Dict[Path, TextIO] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def write(self, path: Path, line: str) -> bool:
+        """提交一行日志（不阻塞）；队列满时丢弃并返回 False"""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((path, line))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            _record_drop("file")
+            return False
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ef-log-sink", daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """写完队列中剩余日志后停止"""
+        thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # 合并已积压的日志，减少 write/flush 次数
+            while item is not None and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            stop = False
+            touched = set()
+            for entry in batch:
+                if entry is None:
+                    stop = True
+                    continue
+                path, line = entry
+                try:
+                    handle = self._open(path)
+                    handle.write(line)
+                    handle.write("\n")
+                    touched.add(path)
+                except Exception:
+                    pass  # 忽略写入错误，不影响请求处理
+
+            for path in touched:
+                try:
+                    self._files[path].flush()
+                except Exception:
+                    pass
+
+            if stop:
+                for handle in self._files.values():
+                    try:
+                        handle.close()
+                    except Exception:
+                        pass
+                self._files.clear()
+                return
+
+    def _open(self, path: Path) -> TextIO:
+        handle = self._files.get(path)
+        if handle is None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(path, "a", encoding="utf-8")
+            self._files[path] = handle
+        return handle
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    有界队列日志处理器：记录在调用线程格式化（QueueHandler.prepare），
+    由监听线程交给 target 输出；队列满时丢弃而不是抛错/阻塞。
+
+    监听线程按进程懒启动，fork 出的子进程会自动拉起自己的监听线程。
+    """
+
+    def __init__(self, target: logging.Handler, maxsize: int = DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        self.target = target
+        self._listener: Optional[QueueListener] = None
+        self._listener_pid: Optional[int] = None
+        self._listener_lock = threading.Lock()
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _record_drop("stdout")
+
+    def _ensure_listener(self) -> None:
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._listener_lock:
+            if self._listener_pid != pid:
+                self._listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._listener_pid = pid
+
+    def close(self) -> None:
+        """写完队列中剩余日志后停止监听线程"""
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._listener_pid = None
+        super().close()
+
+
+def build_stdout_queue_handler(
+    formatter: logging.Formatter,
+    level: int,
+    maxsize: int = DEFAULT_QUEUE_SIZE,
+) -> BoundedQueueHandler:
+    """构造“有界队列 + 后台线程写 stdout”的处理器"""
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setLevel(level)
+    # prepare() 已把消息格式化好，这里只需原样输出
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    queue_handler = BoundedQueueHandler(stream_handler, maxsize=maxsize)
+    queue_handler.setLevel(level)
+    queue_handler.setFormatter(formatter)
+    return queue_handler
+
+
+_file_sink: Optional[FileLogSink] = None
+
+
+def get_file_log_sink() -> FileLogSink:
+    """获取文件日志写入器单例"""
+    global _file_sink
+    if _file_sink is None:
+        _file_sink = FileLogSink()
+    return _file_sink
@@ -15,6 +15,8 @@ from contextvars import ContextVar
 import structlog
 from structlog.processors import JSONRenderer, TimeStamper, add_log_level
 
+from .log_sink import BoundedQueueHandler, build_stdout_queue_handler
+
 # Context variables for request tracking
 trace_id_var: ContextVar[Optional[str]] = ContextVar("trace_id", default=None)
 plugin_var: ContextVar[Optional[str]] = ContextVar("plugin", default=None)
@@ -98,7 +100,12 @@ class EuraFlowProcessor:
         return event_dict
 
 
-def setup_logging(log_level: str = "INFO", log_format: str = "json", enable_pii_masking: bool = True) -> None:
+def setup_logging(
+    log_level: str = "INFO",
+    log_format: str = "json",
+    enable_pii_masking: bool = True,
+    async_stdout: bool = False,
+) -> None:
     """配置日志系统
 
     确保所有模块的日志都能正确输出到 stdout，包括：
@@ -139,10 +146,14 @@ def setup_logging(log_level: str = "INFO", log_format: str = "json", enable_pii_
     # 2. 移除已有的 handlers，避免重复
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
+        if isinstance(handler, BoundedQueueHandler):
+            handler.close()
 
     # 3. 创建 stdout handler
-    stdout_handler = logging.StreamHandler(sys.stdout)
-    stdout_handler.setLevel(level)
+    # async_stdout=True 时经有界队列由后台线程写出，事件循环上不做阻塞 IO
+    if not async_stdout:
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        stdout_handler.setLevel(level)
 
     # 4. 设置格式 - 对于标准 logging，使用简单格式以便与 structlog JSON 区分
     if log_format == "json":
@@ -155,7 +166,10 @@ def setup_logging(log_level: str = "INFO", log_format: str = "json", enable_pii_
         formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
-    stdout_handler.setFormatter(formatter)
+    if async_stdout:
+        stdout_handler = build_stdout_queue_handler(formatter, level)
+    else:
+        stdout_handler.setFormatter(formatter)
     root_logger.addHandler(stdout_handler)
 
     # 5. 确保关键模块的日志级别正确设置
@@ -1,52 +1,331 @@
 """
 Redis 工具模块
 
-提供全局 Redis 连接获取方法
+全部进程（API、Celery、ARQ、WebSocket 背板）共用的异步 Redis 客户端层：
+- 按用途分连接池：cache（缓存/锁/计数，默认）、pubsub（订阅、阻塞读取等长时间占用连接的操作）、
+  queue（ARQ 任务队列，database=2，返回原始 bytes）；长连接不会占满缓存连接池
+- 客户端按事件循环隔离（Celery 常驻循环、临时循环各自持有连接），同一循环内复用
+- 每条命令按调用位置（模块:函数）记录耗时：prometheus 直方图（可选）+ 慢命令警告日志；
+  pipeline 整体计为一次 PIPELINE 调用
+- mget/mset 等批量辅助方法：按块 pipeline 执行，一次往返读写多个键
+
+异步代码中只使用本模块的客户端，不再创建同步 redis.Redis（会阻塞事件循环）。
+
+用法:
+    from ef_core.utils.redis import get_redis, mget_json, mset_json
+
+    redis_client = await get_redis()
+    await redis_client.set("key", "value", ex=60)
+
+    values = await mget_json(["a", "b"])
+    await mset_json({"a": {...}, "b": {...}}, ttl=300)
 """
+import asyncio
+import json
+import sys
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence
+
 import redis.asyncio as redis
-from typing import Optional
+from redis.asyncio.client import Pipeline
+
+try:
+    from prometheus_client import Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+try:
+    from arq.connections import ArqRedis
+    ARQ_AVAILABLE = True
+except ImportError:
+    ARQ_AVAILABLE = False
 
 from ef_core.config import get_settings
+from ef_core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 连接池用途
+CACHE = "cache"
+PUBSUB = "pubsub"
+QUEUE = "queue"
+
+# ARQ 使用 database=2，与 Celery（0/1）隔离
+QUEUE_DB = 2
+
+# 各用途的连接池配置
+POOL_OPTIONS: Dict[str, Dict[str, Any]] = {
+    CACHE: {
+        "max_connections": 50,
+        "decode_responses": True,
+        "socket_connect_timeout": 2,
+        "socket_timeout": 5,
+    },
+    PUBSUB: {
+        # 订阅和 XREADGROUP BLOCK 会长时间占用连接，不设读超时；
+        # 连接池满时直接报错而不是等待，PUBLISH 等短命令一律使用 CACHE，不要放到这里
+        # （API 进程常驻约 12 个：webhook 分片消费者 8、事件总线消费者 2、WebSocket 背板和权限缓存订阅各 1）
+        "max_connections": 20,
+        "decode_responses": True,
+        "socket_connect_timeout": 2,
+        "health_check_interval": 30,
+    },
+    QUEUE: {
+        # ARQ 使用 pickle 序列化任务，必须返回原始 bytes
+        "max_connections": 10,
+        "decode_responses": False,
+        "socket_connect_timeout": 2,
+        "socket_timeout": 5,
+        "db": QUEUE_DB,
+    },
+}
+
+# 超过该耗时（秒）的命令记录警告日志
+SLOW_COMMAND_SECONDS = 0.1
+# mget/mset 每条命令的最大键数
+BATCH_CHUNK_SIZE = 500
+
+# 计算调用位置时跳过的模块（redis-py、arq 内部和本模块）
+_SKIP_MODULE_PREFIXES = ("redis.", "arq.", __name__)
+
+
+if PROMETHEUS_AVAILABLE:
+    _COMMAND_DURATION = Histogram(
+        'ef_redis_command_duration_seconds',
+        'Redis command latency by pool, command and call site',
+        ['pool', 'command', 'site'],
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+    )
+
+
+def _call_site() -> str:
+    """发起 Redis 调用的业务代码位置（模块:函数）"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if not module.startswith(_SKIP_MODULE_PREFIXES):
+            code = frame.f_code
+            return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def _observe(pool: str, command: str, site: str, elapsed: float) -> None:
+    if PROMETHEUS_AVAILABLE:
+        _COMMAND_DURATION.labels(pool=pool, command=command, site=site).observe(elapsed)
+    if elapsed >= SLOW_COMMAND_SECONDS:
+        logger.warning(
+            "Slow Redis command",
+            pool=pool,
+            command=command,
+            site=site,
+            elapsed_ms=round(elapsed * 1000, 1),
+        )
+
+
+class InstrumentedPipeline(Pipeline):
+    """pipeline 整体计时（命令只在 execute 时发送）"""
+
+    pool_purpose = CACHE
+
+    async def execute(self, raise_on_error: bool = True):
+        if not self.command_stack:
+            return await super().execute(raise_on_error)
+        site = _call_site()
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _observe(self.pool_purpose, "PIPELINE", site, time.perf_counter() - started)
+
+
+class _InstrumentedMixin:
+    """按调用位置记录每条命令的耗时"""
+
+    pool_purpose = CACHE
+
+    async def execute_command(self, *args, **options):
+        site = _call_site()
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            command = str(args[0]).upper() if args else "UNKNOWN"
+            _observe(self.pool_purpose, command, site, time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        pipe = InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+        pipe.pool_purpose = self.pool_purpose
+        return pipe
+
+
+class InstrumentedRedis(_InstrumentedMixin, redis.Redis):
+    """带调用计时的异步 Redis 客户端"""
+
+
+if ARQ_AVAILABLE:
+    class InstrumentedArqRedis(_InstrumentedMixin, ArqRedis):
+        """带调用计时的 ARQ 客户端（enqueue_job 等方法由 ArqRedis 提供）"""
 
-_redis_client: Optional[redis.Redis] = None
-_connection_pool: Optional[redis.ConnectionPool] = None
 
+# 事件循环 -> {用途: 客户端}
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, redis.Redis]]" = (
+    weakref.WeakKeyDictionary()
+)
 
-async def get_redis() -> redis.Redis:
+
+def _create_client(purpose: str) -> redis.Redis:
+    if purpose not in POOL_OPTIONS:
+        raise ValueError(f"Unknown Redis pool purpose: {purpose}")
+
+    options = dict(POOL_OPTIONS[purpose])
+    db = options.pop("db", None)
+    if options["decode_responses"]:
+        options["encoding"] = "utf-8"
+    pool = redis.ConnectionPool.from_url(get_settings().redis_url, **options)
+    if db is not None:
+        # URL 中的 database 优先于关键字参数，这里显式覆盖
+        pool.connection_kwargs["db"] = db
+
+    if purpose == QUEUE and ARQ_AVAILABLE:
+        client = InstrumentedArqRedis(pool_or_conn=pool)
+    else:
+        client = InstrumentedRedis(connection_pool=pool)
+    client.pool_purpose = purpose
+    return client
+
+
+def get_redis_client(purpose: str = CACHE) -> redis.Redis:
     """
-    获取 Redis 异步客户端单例（使用连接池）
+    获取当前事件循环指定用途的 Redis 客户端（同步版本，供属性、非 async 辅助函数使用）
 
-    连接池配置：
-    - max_connections=50: 支持 50+ 并发请求
-    - 单例模式：全局共享同一个连接池
+    必须在运行中的事件循环内调用；客户端的命令仍需 await。
+
+    Args:
+        purpose: 连接池用途（CACHE / PUBSUB / QUEUE）
+
+    Returns:
+        redis.Redis: Redis 异步客户端（QUEUE 用途在安装 arq 时为 ArqRedis）
+    """
+    loop = asyncio.get_running_loop()
+    clients = _clients.get(loop)
+    if clients is None:
+        clients = _clients[loop] = {}
+
+    client = clients.get(purpose)
+    if client is None:
+        client = clients[purpose] = _create_client(purpose)
+    return client
+
+
+async def get_redis(purpose: str = CACHE) -> redis.Redis:
+    """
+    获取当前事件循环指定用途的 Redis 异步客户端（使用连接池）
+
+    Args:
+        purpose: 连接池用途（CACHE / PUBSUB / QUEUE），默认 CACHE
 
     Returns:
         redis.Redis: Redis 异步客户端
     """
-    global _redis_client, _connection_pool
+    return get_redis_client(purpose)
 
-    if _redis_client is None:
-        settings = get_settings()
-        # 创建连接池（支持高并发）
-        _connection_pool = redis.ConnectionPool.from_url(
-            settings.redis_url,
-            max_connections=50,
-            encoding="utf-8",
-            decode_responses=True,
-        )
-        _redis_client = redis.Redis(connection_pool=_connection_pool)
 
-    return _redis_client
+def reset_redis() -> None:
+    """丢弃全部客户端和连接池（不关闭连接，用于切换到新的事件循环前，如 fork 后的子进程）"""
+    _clients.clear()
 
 
 async def close_redis() -> None:
-    """关闭 Redis 连接和连接池"""
-    global _redis_client, _connection_pool
+    """关闭当前事件循环的全部 Redis 客户端和连接池"""
+    clients = _clients.pop(asyncio.get_running_loop(), None) or {}
+    for purpose, client in clients.items():
+        try:
+            await client.close(close_connection_pool=True)
+        except Exception as e:
+            logger.warning(f"Failed to close Redis {purpose} client: {e}")
+
+
+# ========== 批量读写（pipeline） ==========
+
+def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def mget(
+    keys: Sequence[str],
+    purpose: str = CACHE,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> List[Optional[Any]]:
+    """
+    批量读取多个键（按块 MGET，一次 pipeline 往返）
+
+    Returns:
+        与 keys 顺序一致的值列表，不存在的键为 None
+    """
+    keys = list(keys)
+    if not keys:
+        return []
+
+    redis_client = await get_redis(purpose)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for chunk in _chunks(keys, chunk_size):
+            pipe.mget(chunk)
+        results = await pipe.execute()
+    return [value for chunk_values in results for value in chunk_values]
+
+
+async def mset(
+    mapping: Mapping[str, Any],
+    ttl: Optional[int] = None,
+    purpose: str = CACHE,
+    chunk_size: int = BATCH_CHUNK_SIZE,
+) -> None:
+    """
+    批量写入多个键（一次 pipeline 往返）
+
+    Args:
+        mapping: {键: 值}
+        ttl: 过期时间（秒）；为 None 时按块 MSET，否则逐键 SET EX（MSET 不支持过期时间）
+    """
+    if not mapping:
+        return
+
+    redis_client = await get_redis(purpose)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        if ttl is None:
+            items = list(mapping.items())
+            for chunk in _chunks(items, chunk_size):
+                pipe.mset(dict(chunk))
+        else:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ttl)
+        await pipe.execute()
+
+
+async def mget_json(keys: Sequence[str], purpose: str = CACHE) -> List[Optional[Any]]:
+    """批量读取 JSON 值（不存在或无法解析的键为 None）"""
+    values = []
+    for raw in await mget(keys, purpose=purpose):
+        try:
+            values.append(json.loads(raw) if raw is not None else None)
+        except (TypeError, ValueError):
+            values.append(None)
+    return values
 
-    if _redis_client is not None:
-        await _redis_client.close()
-        _redis_client = None
 
-    if _connection_pool is not None:
-        await _connection_pool.disconnect()
-        _connection_pool = None
+async def mset_json(
+    mapping: Mapping[str, Any],
+    ttl: Optional[int] = None,
+    purpose: str = CACHE,
+) -> None:
+    """批量写入 JSON 值"""
+    await mset(
+        {key: json.dumps(value, ensure_ascii=False, default=str) for key, value in mapping.items()},
+        ttl=ttl,
+        purpose=purpose,
+    )
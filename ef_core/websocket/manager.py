@@ -1,17 +1,82 @@
 """
 WebSocket通知管理器
 管理所有活跃的WebSocket连接，支持按用户和店铺路由通知
+
+多进程/多节点：
+- 任意进程（API worker、Celery、ARQ）调用 send_* 都会经 Redis pub/sub 广播，
+  持有连接的 API 进程收到后投递给本地连接；发起方进程直接投递本地连接，不处理自己的回声
+- 在线用户：每个持有连接的进程定期把本地在线用户写入 Redis（带 TTL），
+  get_cluster_online_user_ids() 汇总全部进程
+
+发送：
+- 每条消息只序列化一次，文本在各连接间共享
+- 每个连接一个有界发送队列 + 独立发送任务，广播只做入队，不等待任何 socket
+- 发送队列满（慢客户端）或发送超时的连接直接断开，由客户端重连
 """
 import asyncio
 import json
+import time
+import uuid
 from typing import Dict, Set, Any, Optional
 from datetime import datetime, timezone
 from fastapi import WebSocket
 from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import CACHE, PUBSUB, get_redis_client
 
 logger = get_logger(__name__)
 
 
+# Redis pub/sub 频道
+CHANNEL = "ef:ws:notifications"
+# 在线用户（按进程）：ef:ws:presence:{node_id} -> {user_id}
+PRESENCE_PREFIX = "ef:ws:presence"
+PRESENCE_TTL_SECONDS = 90
+PRESENCE_REFRESH_INTERVAL = 30
+
+# 每个连接的发送队列长度（积压超过即视为慢客户端）
+SEND_QUEUE_SIZE = 1000
+# 单次发送超时（秒）
+SEND_TIMEOUT = 10
+
+
+def _serialize(message: Dict[str, Any]) -> str:
+    """与 WebSocket.send_json 相同的序列化格式"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class _ConnectionSender:
+    """单个连接的有界发送队列"""
+
+    def __init__(self, websocket: WebSocket, on_failure):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self._on_failure = on_failure
+        self._task = asyncio.create_task(self._run())
+
+    def offer(self, text: str) -> bool:
+        """入队；队列已满返回 False"""
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                text = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(text), timeout=SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.warning(f"WebSocket send failed: {e}")
+            await self._on_failure(self.websocket)
+
+    def close(self) -> None:
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+
+
 class NotificationManager:
     """WebSocket通知管理器（单例）"""
 
@@ -27,21 +92,37 @@ class NotificationManager:
         if self._initialized:
             return
 
+        # 本进程标识（过滤 pub/sub 回声、区分在线用户）
+        self.node_id = uuid.uuid4().hex
+
         # 连接存储：user_id -> {websocket连接}
         self._connections: Dict[int, Set[WebSocket]] = {}
 
         # 用户订阅的店铺：user_id -> {shop_ids}
         self._user_shops: Dict[int, Set[int]] = {}
 
+        # 倒排索引：shop_id -> {user_ids}
+        self._shop_users: Dict[int, Set[int]] = {}
+
         # WebSocket到用户的反向映射：websocket -> user_id
         self._ws_to_user: Dict[WebSocket, int] = {}
 
+        # 每个连接的发送队列
+        self._senders: Dict[WebSocket, _ConnectionSender] = {}
+
         # 连接统计
         self._total_connections = 0
+        self._dropped_slow = 0
+
+        self._listener_task: Optional[asyncio.Task] = None
 
         self._initialized = True
         logger.info("NotificationManager initialized")
 
+    # ------------------------------------------------------------------
+    # 连接管理
+    # ------------------------------------------------------------------
+
     async def connect(self, websocket: WebSocket, user_id: int, shop_ids: Optional[list[int]] = None):
         """
         注册新的WebSocket连接
@@ -58,16 +139,16 @@ class NotificationManager:
             self._connections[user_id] = set()
         self._connections[user_id].add(websocket)
 
-        # 记录反向映射
+        # 记录反向映射与发送队列
         self._ws_to_user[websocket] = user_id
+        self._senders[websocket] = _ConnectionSender(websocket, self._drop_connection)
 
         # 记录用户订阅的店铺
         if shop_ids:
-            if user_id not in self._user_shops:
-                self._user_shops[user_id] = set()
-            self._user_shops[user_id].update(shop_ids)
+            self.subscribe_shops(user_id, shop_ids)
 
         self._total_connections += 1
+        self._ensure_listener()
 
         logger.info(
             f"WebSocket connected: user_id={user_id}, "
@@ -76,37 +157,41 @@ class NotificationManager:
         )
 
         # 发送连接成功消息
-        await self._send_to_websocket(websocket, {
+        self._deliver_local_user(user_id, _serialize({
             "type": "connected",
             "user_id": user_id,
             "shop_ids": list(shop_ids) if shop_ids else [],
             "timestamp": datetime.now(timezone.utc).isoformat()
-        })
+        }), only=websocket)
 
     async def disconnect(self, websocket: WebSocket):
         """
-        注销WebSocket连接
+        注销WebSocket连接（可重复调用）
 
         Args:
             websocket: 要断开的WebSocket连接
         """
-        user_id = self._ws_to_user.get(websocket)
+        self._unregister(websocket)
+
+    def _unregister(self, websocket: WebSocket) -> None:
+        """移除连接的全部索引并停止其发送任务"""
+        user_id = self._ws_to_user.pop(websocket, None)
 
         if user_id is None:
-            logger.warning("Disconnect called for unknown websocket")
+            logger.debug("Disconnect called for unknown websocket")
             return
 
+        sender = self._senders.pop(websocket, None)
+        if sender:
+            sender.close()
+
         # 移除连接
         if user_id in self._connections:
             self._connections[user_id].discard(websocket)
             if not self._connections[user_id]:
                 del self._connections[user_id]
                 # 清理用户店铺订阅
-                if user_id in self._user_shops:
-                    del self._user_shops[user_id]
-
-        # 清理反向映射
-        del self._ws_to_user[websocket]
+                self.unsubscribe_shops(user_id, list(self._user_shops.get(user_id, ())))
 
         self._total_connections -= 1
 
@@ -115,75 +200,85 @@ class NotificationManager:
             f"total_connections={self._total_connections}"
         )
 
+    async def _drop_connection(self, websocket: WebSocket) -> None:
+        """断开发送失败或跟不上的连接"""
+        self._unregister(websocket)
+        try:
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def subscribe_shops(self, user_id: int, shop_ids: list[int]) -> None:
+        """用户订阅店铺（同时维护倒排索引）"""
+        self._user_shops.setdefault(user_id, set()).update(shop_ids)
+        for shop_id in shop_ids:
+            self._shop_users.setdefault(shop_id, set()).add(user_id)
+
+    def unsubscribe_shops(self, user_id: int, shop_ids: list[int]) -> None:
+        """用户取消订阅店铺"""
+        user_shops = self._user_shops.get(user_id)
+        if user_shops is not None:
+            user_shops.difference_update(shop_ids)
+            if not user_shops:
+                del self._user_shops[user_id]
+
+        for shop_id in shop_ids:
+            users = self._shop_users.get(shop_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self._shop_users[shop_id]
+
+    # ------------------------------------------------------------------
+    # 发送
+    # ------------------------------------------------------------------
+
     async def send_to_user(self, user_id: int, message: Dict[str, Any]) -> int:
         """
-        发送消息给特定用户的所有连接
+        发送消息给特定用户的所有连接（所有节点）
 
         Args:
             user_id: 用户ID
             message: 消息内容
 
         Returns:
-            成功发送的连接数
+            本节点成功入队的连接数
         """
-        if user_id not in self._connections:
-            logger.debug(f"User {user_id} has no active connections")
-            return 0
-
-        connections = self._connections[user_id].copy()
-        sent_count = 0
-        failed_connections = []
-
-        for websocket in connections:
-            try:
-                await self._send_to_websocket(websocket, message)
-                sent_count += 1
-            except Exception as e:
-                logger.error(f"Failed to send to user {user_id}: {e}")
-                failed_connections.append(websocket)
-
-        # 清理失败的连接
-        for websocket in failed_connections:
-            await self.disconnect(websocket)
-
-        return sent_count
+        text = _serialize(message)
+        await self._publish("user", user_id, text)
+        return self._deliver_local_user(user_id, text)
 
     async def send_to_shop_users(self, shop_id: int, message: Dict[str, Any]) -> int:
         """
-        发送消息给订阅了特定店铺的所有用户
+        发送消息给订阅了特定店铺的所有用户（所有节点）
 
         Args:
             shop_id: 店铺ID
             message: 消息内容
 
         Returns:
-            成功发送的连接数
+            本节点成功入队的连接数
         """
-        sent_count = 0
-
-        for user_id, shop_ids in self._user_shops.items():
-            if shop_id in shop_ids:
-                count = await self.send_to_user(user_id, message)
-                sent_count += count
+        text = _serialize(message)
+        await self._publish("shop", shop_id, text)
+        sent_count = self._deliver_local_shop(shop_id, text)
 
         logger.debug(f"Sent message to {sent_count} connections for shop {shop_id}")
         return sent_count
 
     async def broadcast(self, message: Dict[str, Any]) -> int:
         """
-        广播消息给所有连接
+        广播消息给所有连接（所有节点）
 
         Args:
             message: 消息内容
 
         Returns:
-            成功发送的连接数
+            本节点成功入队的连接数
         """
-        sent_count = 0
-
-        for user_id in list(self._connections.keys()):
-            count = await self.send_to_user(user_id, message)
-            sent_count += count
+        text = _serialize(message)
+        await self._publish("all", None, text)
+        sent_count = self._deliver_local_all(text)
 
         logger.info(f"Broadcasted message to {sent_count} connections")
         return sent_count
@@ -195,34 +290,145 @@ class NotificationManager:
         Args:
             websocket: WebSocket连接
         """
-        try:
-            await self._send_to_websocket(websocket, {
-                "type": "ping",
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            })
-        except Exception as e:
-            logger.error(f"Failed to send ping: {e}")
-            await self.disconnect(websocket)
+        self.send_to_connection(websocket, {
+            "type": "ping",
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
 
-    async def _send_to_websocket(self, websocket: WebSocket, message: Dict[str, Any]):
+    def send_to_connection(self, websocket: WebSocket, message: Dict[str, Any]) -> bool:
         """
-        发送消息到WebSocket（内部方法）
+        发送消息到单个本地连接（经该连接的发送队列，避免与广播并发写同一 socket）
 
-        Args:
-            websocket: WebSocket连接
-            message: 消息内容
-
-        Raises:
-            Exception: 发送失败
+        Returns:
+            是否成功入队
         """
+        user_id = self._ws_to_user.get(websocket)
+        if user_id is None:
+            return False
+        return self._deliver_local_user(user_id, _serialize(message), only=websocket) > 0
+
+    def _deliver_local_user(self, user_id: int, text: str, only: Optional[WebSocket] = None) -> int:
+        """投递给本节点上某个用户的连接（只入队，不等待发送）"""
+        connections = self._connections.get(user_id)
+        if not connections:
+            return 0
+
+        sent_count = 0
+        for websocket in (only,) if only is not None else tuple(connections):
+            sender = self._senders.get(websocket)
+            if sender is None:
+                continue
+            if sender.offer(text):
+                sent_count += 1
+            else:
+                # 立即移出索引，后续消息不再投递给该连接
+                self._dropped_slow += 1
+                logger.warning(f"WebSocket send queue full, dropping slow connection: user_id={user_id}")
+                self._unregister(websocket)
+                asyncio.create_task(self._drop_connection(websocket))
+        return sent_count
+
+    def _deliver_local_shop(self, shop_id: int, text: str) -> int:
+        return sum(
+            self._deliver_local_user(user_id, text)
+            for user_id in tuple(self._shop_users.get(shop_id, ()))
+        )
+
+    def _deliver_local_all(self, text: str) -> int:
+        return sum(
+            self._deliver_local_user(user_id, text)
+            for user_id in tuple(self._connections)
+        )
+
+    # ------------------------------------------------------------------
+    # Redis 背板
+    # ------------------------------------------------------------------
+
+    def _get_redis(self, purpose: str = CACHE):
+        """当前事件循环的背板 Redis 客户端（PUBLISH、在线用户等短命令用缓存连接池，只有订阅用 PUBSUB）"""
+        return get_redis_client(purpose)
+
+    async def _publish(self, target: str, target_id: Optional[int], text: str) -> None:
+        """发布到其他节点；失败时仅投递本节点"""
+        envelope = json.dumps({
+            "origin": self.node_id,
+            "target": target,
+            "id": target_id,
+            "text": text,
+        }, ensure_ascii=False)
         try:
-            # 添加调试日志
-            logger.info(f"Sending WebSocket message: type={message.get('type')}, message={str(message)[:200]}")
-            await websocket.send_json(message)
-            logger.info(f"WebSocket message sent successfully: type={message.get('type')}")
+            await self._get_redis().publish(CHANNEL, envelope)
         except Exception as e:
-            logger.error(f"WebSocket send failed: {e}")
-            raise
+            logger.warning(f"WebSocket backplane publish failed, delivering locally only: {e}")
+
+    def _dispatch_remote(self, raw: str) -> None:
+        """处理其他节点发布的消息"""
+        try:
+            envelope = json.loads(raw)
+        except (TypeError, ValueError):
+            logger.warning("Invalid WebSocket backplane message")
+            return
+
+        if envelope.get("origin") == self.node_id:
+            return
+
+        target, target_id, text = envelope.get("target"), envelope.get("id"), envelope.get("text", "")
+        if target == "user":
+            self._deliver_local_user(int(target_id), text)
+        elif target == "shop":
+            self._deliver_local_shop(int(target_id), text)
+        elif target == "all":
+            self._deliver_local_all(text)
+
+    def _ensure_listener(self) -> None:
+        """持有连接的进程才需要订阅背板（首次连接时启动）"""
+        if self._listener_task is None or self._listener_task.done():
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        """订阅背板频道，并定期上报本节点在线用户"""
+        while True:
+            pubsub = None
+            try:
+                pubsub = self._get_redis(PUBSUB).pubsub()
+                await pubsub.subscribe(CHANNEL)
+                logger.info(f"WebSocket backplane subscribed: node={self.node_id}")
+
+                last_presence = 0.0
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._dispatch_remote(message["data"])
+
+                    if time.monotonic() - last_presence >= PRESENCE_REFRESH_INTERVAL:
+                        last_presence = time.monotonic()
+                        await self._refresh_presence(self._get_redis())
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket backplane listener error: {e}")
+                await asyncio.sleep(3)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.close()
+                    except Exception:
+                        pass
+
+    async def _refresh_presence(self, client) -> None:
+        """覆盖写入本节点在线用户集合"""
+        key = f"{PRESENCE_PREFIX}:{self.node_id}"
+        pipe = client.pipeline(transaction=True)
+        pipe.delete(key)
+        if self._connections:
+            pipe.sadd(key, *self._connections.keys())
+            pipe.expire(key, PRESENCE_TTL_SECONDS)
+        await pipe.execute()
+
+    # ------------------------------------------------------------------
+    # 业务通知
+    # ------------------------------------------------------------------
 
     async def send_session_expired(
         self,
@@ -279,32 +485,55 @@ class NotificationManager:
             message="您的账号已过期，请联系管理员续期"
         )
 
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+
     def get_stats(self) -> Dict[str, Any]:
         """
-        获取连接统计信息
+        获取连接统计信息（本节点）
 
         Returns:
             统计信息字典
         """
         return {
+            "node_id": self.node_id,
             "total_connections": self._total_connections,
             "unique_users": len(self._connections),
             "subscribed_shops": sum(len(shops) for shops in self._user_shops.values()),
-            "users_by_shop": {
-                shop_id: sum(1 for shops in self._user_shops.values() if shop_id in shops)
-                for shop_id in set().union(*self._user_shops.values())
-            } if self._user_shops else {}
+            "users_by_shop": {shop_id: len(users) for shop_id, users in self._shop_users.items()},
+            "queued_messages": sum(sender.queue.qsize() for sender in self._senders.values()),
+            "dropped_slow_connections": self._dropped_slow,
         }
 
     def get_online_user_ids(self) -> Set[int]:
         """
-        获取所有在线用户ID
+        获取本节点在线用户ID
 
         Returns:
             在线用户ID集合
         """
         return set(self._connections.keys())
 
+    async def get_cluster_online_user_ids(self) -> Set[int]:
+        """
+        获取所有节点的在线用户ID（可在 Celery/ARQ 等不持有连接的进程中调用）
+
+        Returns:
+            在线用户ID集合
+        """
+        user_ids: Set[int] = set(self._connections.keys())
+        client = self._get_redis()
+        keys = [key async for key in client.scan_iter(match=f"{PRESENCE_PREFIX}:*", count=100)]
+        if not keys:
+            return user_ids
+        async with client.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.smembers(key)
+            for members in await pipe.execute():
+                user_ids.update(int(uid) for uid in members)
+        return user_ids
+
 
 # 全局单例实例
 notification_manager = NotificationManager()
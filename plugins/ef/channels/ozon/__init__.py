@@ -164,7 +164,7 @@ async def attributes_sync_task(**kwargs):
             catalog_service = CatalogService(client, db)
 
             # 同步所有叶子类目的特征（包括字典值）
-            # 注意：强制串行执行，避免并发导致的数据库锁竞争问题
+            # 字典值按 (类目, 特征) 并发同步，同一字典串行，避免数据库锁竞争
             sync_result = await catalog_service.batch_sync_category_attributes(
                 category_ids=None,
                 sync_all_leaf=True,
@@ -237,8 +237,9 @@ async def setup(hooks) -> None:
         description="从 OZON 平台同步商品库存数据"
     )
 
-    # 注册定时任务：标签预缓存（每5分钟）
-    # 预先下载待打印订单的标签PDF，打印时直接读取本地文件
+    # 注册定时任务：标签预缓存兜底扫描（每5分钟）
+    # 标签主要由事件驱动的预缓存 worker 下载；定时任务把遗漏的待打印订单补入队列，
+    # 没有常驻 worker 时就地消费
     # 注意：传入异步函数，由 register_cron 统一包装为 Celery Task
     from .tasks.label_prefetch_task import prefetch_labels_async, cleanup_labels_async
     await hooks.register_cron(
@@ -246,9 +247,14 @@ async def setup(hooks) -> None:
         cron="*/5 * * * *",
         task=prefetch_labels_async,
         display_name="标签预缓存",
-        description="预先下载待打印订单的标签 PDF"
+        description="补入待打印订单到标签预缓存队列，无常驻 worker 时就地下载标签 PDF"
     )
 
+    # 标签预缓存指标由 worker 写入 Redis，API 进程在 /metrics 抓取前读取
+    from ef_core.middleware.metrics import register_metrics_refresher
+    from .services.label_prefetch_worker import refresh_prefetch_metrics
+    register_metrics_refresher(refresh_prefetch_metrics)
+
     # 注册定时任务：标签缓存清理（每天凌晨4点执行）
     # 清理超过7天的标签PDF文件，释放磁盘空间
     await hooks.register_cron(
@@ -259,6 +265,17 @@ async def setup(hooks) -> None:
         description="清理超过7天的标签 PDF 文件"
     )
 
+    # 注册定时任务：Webhook 事件清理（每天凌晨3:40执行）
+    # 按状态保留（processed/ignored 30天，failed 90天），分批删除
+    from .tasks.webhook_retention_task import cleanup_webhook_events_async
+    await hooks.register_cron(
+        name="ef.ozon.webhooks.cleanup",
+        cron="40 3 * * *",
+        task=cleanup_webhook_events_async,
+        display_name="Webhook 事件清理",
+        description="清理超过保留期的 OZON Webhook 事件记录"
+    )
+
     # ============================================================
     # OZON Web 同步定时任务（使用浏览器 Cookie 访问 OZON 页面）
     # 执行时间（UTC，北京时间 = UTC + 8）：
@@ -616,6 +633,16 @@ async def setup(hooks) -> None:
                     "format": "date",
                     "description": "目标同步日期（YYYY-MM-DD格式，留空则默认昨天）"
                 },
+                "date_from": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "范围同步开始日期（YYYY-MM-DD，优先于 target_date，按天并发拉取）"
+                },
+                "date_to": {
+                    "type": "string",
+                    "format": "date",
+                    "description": "范围同步结束日期（YYYY-MM-DD，留空则到昨天）"
+                },
                 "shop_id": {
                     "type": "integer",
                     "description": "指定店铺ID（留空则同步所有活跃店铺）"
@@ -1760,6 +1787,14 @@ async def teardown() -> None:
             await db.commit()
             logger.info("Updated all shops sync status to stopped")
 
+        # 停止 Webhook 队列消费并释放分片租约（未确认消息由下一个持有者接管）
+        from .webhooks.worker import get_webhook_worker_pool
+        await get_webhook_worker_pool().stop()
+
+        # 停止标签预缓存 worker（仅在常驻进程中启动过）
+        from .services.label_prefetch_worker import get_label_prefetch_worker
+        await get_label_prefetch_worker().stop()
+
         # 取消所有待处理的异步任务
         pending_tasks = asyncio.all_tasks()
         for task in pending_tasks:
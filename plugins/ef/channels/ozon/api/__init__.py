@@ -1,9 +1,11 @@
 """Ozon API 客户端模块"""
 
 from .client import OzonAPIClient
-from .rate_limiter import RateLimiter
+from .rate_limiter import DistributedRateLimiter, RateLimiter, get_ozon_rate_limiter
 
 __all__ = [
     "OzonAPIClient",
-    "RateLimiter"
+    "RateLimiter",
+    "DistributedRateLimiter",
+    "get_ozon_rate_limiter",
 ]
\ No newline at end of file
@@ -297,28 +297,24 @@ async def sync_cancellations(
     # 生成任务ID
     task_id = f"cancellation_sync_{uuid.uuid4().hex[:12]}"
 
+    # 初始化任务状态（进度推送给发起用户）
+    from ..services.sync.task_state_manager import get_task_state_manager
+    task_manager = get_task_state_manager()
+    await task_manager.create_task(
+        task_id,
+        "cancellations",
+        message="正在同步取消申请，请稍候...",
+        user_id=current_user.id,
+        shop_id=request.shop_id
+    )
+
     # 异步执行同步任务
     async def run_sync():
         """在后台执行同步任务"""
-        from ..services.ozon_sync import SYNC_TASKS
-        from ..utils.datetime_utils import utcnow
-
         try:
-            # 初始化任务状态
-            SYNC_TASKS[task_id] = {
-                "status": "running",
-                "progress": 0,
-                "message": "正在同步取消申请，请稍候...",
-                "started_at": utcnow().isoformat(),
-                "type": "cancellations",
-            }
-
             # 进度更新回调函数
             async def update_progress(progress: int, message: str):
-                SYNC_TASKS[task_id].update({
-                    "progress": progress,
-                    "message": message
-                })
+                await task_manager.update_progress(task_id, progress, message)
 
             # 创建新的数据库会话用于异步任务
             from ef_core.database import get_db_manager
@@ -332,29 +328,19 @@ async def sync_cancellations(
                 )
 
                 # 更新任务为完成状态
-                SYNC_TASKS[task_id] = {
-                    "status": "completed",
-                    "progress": 100,
-                    "message": result.get("message", "同步完成"),
-                    "completed_at": utcnow().isoformat(),
-                    "type": "cancellations",
-                    "result": {
+                await task_manager.complete_task(
+                    task_id,
+                    result={
                         "records_synced": result.get("records_synced", 0),
                         "records_updated": result.get("records_updated", 0)
-                    }
-                }
+                    },
+                    message=result.get("message", "同步完成")
+                )
                 logger.info(f"取消申请同步完成，task_id={task_id}")
 
         except Exception as e:
             # 更新任务为失败状态
-            SYNC_TASKS[task_id] = {
-                "status": "failed",
-                "progress": SYNC_TASKS.get(task_id, {}).get("progress", 0),
-                "message": f"同步失败: {str(e)}",
-                "error": str(e),
-                "failed_at": utcnow().isoformat(),
-                "type": "cancellations",
-            }
+            await task_manager.fail_task(task_id, str(e))
             logger.error(f"取消申请同步失败: {e}")
             import traceback
             logger.error(traceback.format_exc())
@@ -418,28 +404,24 @@ async def sync_returns(
     # 生成任务ID
     task_id = f"return_sync_{uuid.uuid4().hex[:12]}"
 
+    # 初始化任务状态（进度推送给发起用户）
+    from ..services.sync.task_state_manager import get_task_state_manager
+    task_manager = get_task_state_manager()
+    await task_manager.create_task(
+        task_id,
+        "returns",
+        message="正在同步退货申请，请稍候...",
+        user_id=current_user.id,
+        shop_id=request.shop_id
+    )
+
     # 异步执行同步任务
     async def run_sync():
         """在后台执行同步任务"""
-        from ..services.ozon_sync import SYNC_TASKS
-        from ..utils.datetime_utils import utcnow
-
         try:
-            # 初始化任务状态
-            SYNC_TASKS[task_id] = {
-                "status": "running",
-                "progress": 0,
-                "message": "正在同步退货申请，请稍候...",
-                "started_at": utcnow().isoformat(),
-                "type": "returns",
-            }
-
             # 进度更新回调函数
             async def update_progress(progress: int, message: str):
-                SYNC_TASKS[task_id].update({
-                    "progress": progress,
-                    "message": message
-                })
+                await task_manager.update_progress(task_id, progress, message)
 
             # 创建新的数据库会话用于异步任务
             from ef_core.database import get_db_manager
@@ -453,29 +435,19 @@ async def sync_returns(
                 )
 
                 # 更新任务为完成状态
-                SYNC_TASKS[task_id] = {
-                    "status": "completed",
-                    "progress": 100,
-                    "message": result.get("message", "同步完成"),
-                    "completed_at": utcnow().isoformat(),
-                    "type": "returns",
-                    "result": {
+                await task_manager.complete_task(
+                    task_id,
+                    result={
                         "records_synced": result.get("records_synced", 0),
                         "records_updated": result.get("records_updated", 0)
-                    }
-                }
+                    },
+                    message=result.get("message", "同步完成")
+                )
                 logger.info(f"退货申请同步完成，task_id={task_id}")
 
         except Exception as e:
             # 更新任务为失败状态
-            SYNC_TASKS[task_id] = {
-                "status": "failed",
-                "progress": SYNC_TASKS.get(task_id, {}).get("progress", 0),
-                "message": f"同步失败: {str(e)}",
-                "error": str(e),
-                "failed_at": utcnow().isoformat(),
-                "type": "returns",
-            }
+            await task_manager.fail_task(task_id, str(e))
             logger.error(f"退货申请同步失败: {e}")
             import traceback
             logger.error(traceback.format_exc())
@@ -740,9 +740,10 @@ async def archive_chat(
 async def sync_chats(
     shop_id: int,
     chat_id_list: Optional[list[str]] = Body(None, description="要同步的聊天ID列表"),
-    shop_and_client: tuple = Depends(get_shop_and_client)
+    shop_and_client: tuple = Depends(get_shop_and_client),
+    current_user: User = Depends(get_current_user)
 ):
-    """从OZON同步聊天数据（异步任务模式）
+    """从OZON同步聊天数据（异步任务模式，进度通过 WebSocket task.progress 推送）
 
     Args:
         shop_id: 店铺ID
@@ -766,6 +767,13 @@ async def sync_chats(
     # 生成任务ID
     task_id = f"chat_sync_{uuid.uuid4().hex[:12]}"
 
+    # 立即创建任务状态（记录所有者，进度推送给当前用户）
+    from ..services.sync.task_state_manager import get_task_state_manager
+    await get_task_state_manager().create_task(
+        task_id, "chats", message="任务已创建，正在启动...", user_id=current_user.id,
+        status="pending", shop_id=shop_id
+    )
+
     # 定义异步任务
     async def run_sync():
         """后台运行聊天同步"""
@@ -816,6 +824,7 @@ async def sync_chats(
             logger.error(f"Chat sync failed: {e}")
             import traceback
             logger.error(traceback.format_exc())
+            await get_task_state_manager().fail_task(task_id, str(e))
 
     # 创建异步任务
     asyncio.create_task(run_sync())
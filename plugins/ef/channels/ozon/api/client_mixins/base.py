@@ -14,7 +14,7 @@ from ef_core.utils.external_api_timing import log_external_api_timing
 from ef_core.utils.logger import get_logger
 
 if TYPE_CHECKING:
-    from ..rate_limiter import RateLimiter
+    from ..rate_limiter import DistributedRateLimiter
 
 logger = get_logger(__name__)
 
@@ -33,7 +33,7 @@ class OzonAPIClientBase:
             api_key: Ozon API 密钥
             shop_id: 店铺ID（用于多店铺隔离）
         """
-        from ..rate_limiter import RateLimiter
+        from ..rate_limiter import get_ozon_rate_limiter
 
         self.client_id = client_id
         self.api_key = api_key
@@ -47,18 +47,8 @@ class OzonAPIClientBase:
         )
 
         # 限流器（每秒请求数）
-        # OZON官方API限流：50 req/s
-        self.rate_limiter: "RateLimiter" = RateLimiter(
-            rate_limit={
-                "products": 50,  # 商品接口：50 req/s
-                "orders": 50,  # 订单接口：50 req/s
-                "postings": 50,  # 发货单接口：50 req/s
-                "analytics": 50,  # 分析接口：50 req/s
-                "actions": 50,  # 促销活动接口：50 req/s
-                "categories": 50,  # 类目接口：50 req/s
-                "default": 50,  # 默认：50 req/s
-            }
-        )
+        # OZON官方API限流：每个 Client-Id 50 req/s，由所有进程共享（Redis 令牌桶）
+        self.rate_limiter: "DistributedRateLimiter" = get_ozon_rate_limiter(client_id)
 
         # 请求追踪
         self.correlation_id: Optional[str] = None
@@ -202,8 +192,11 @@ class OzonAPIClientBase:
 
             # 检查响应状态
             if response.status_code == 429:
-                # 限流，等待后重试
-                retry_after = int(response.headers.get("Retry-After", 60))
+                # 限流：写入共享惩罚键，所有进程对该资源同时退避（不在此处持槽睡眠）
+                try:
+                    retry_after = float(response.headers.get("Retry-After", 1))
+                except ValueError:
+                    retry_after = 1.0
                 logger.warning(
                     "OZON API rate limited",
                     direction="outbound",
@@ -211,7 +204,7 @@ class OzonAPIClientBase:
                     retry_after=retry_after,
                     shop_id=self.shop_id,
                 )
-                await asyncio.sleep(retry_after)
+                await self.rate_limiter.penalize(resource_type, retry_after)
                 raise Exception("Rate limited")
 
             response.raise_for_status()
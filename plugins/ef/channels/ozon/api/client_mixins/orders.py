@@ -318,6 +318,14 @@ class OrdersMixin:
                 "OZON", "POST", "/v2/posting/fbs/package-label", api_elapsed_ms,
                 f"shop={self.shop_id} | ERROR={e.response.status_code}"
             )
+
+            # 429：通知共享限流器，所有进程同时退避
+            if e.response.status_code == 429:
+                try:
+                    retry_after = float(e.response.headers.get("Retry-After", 1))
+                except ValueError:
+                    retry_after = 1.0
+                await self.rate_limiter.penalize("postings", retry_after)
             raise
         except Exception as e:
             # 记录外部 API 耗时（如果已经开始计时）
@@ -1057,36 +1057,33 @@ class ExtensionLoginRateLimiter:
         Returns:
             (is_allowed, retry_after): 是否允许登录，需等待的秒数
         """
-        import redis.asyncio as redis
-
-        # 检查 IP 锁定
+        # IP 与用户名两个维度的锁定，一次往返查询
         ip_key = f"{cls.KEY_PREFIX_IP}{ip}"
-        lockout_key = f"{ip_key}:lockout"
-        lockout_ttl = await redis_client.ttl(lockout_key)
-        if lockout_ttl > 0:
-            return False, lockout_ttl
-
-        # 检查用户名锁定
         user_key = f"{cls.KEY_PREFIX_USER}{username}"
-        lockout_key = f"{user_key}:lockout"
-        lockout_ttl = await redis_client.ttl(lockout_key)
-        if lockout_ttl > 0:
-            return False, lockout_ttl
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.ttl(f"{ip_key}:lockout")
+            pipe.ttl(f"{user_key}:lockout")
+            ip_lockout_ttl, user_lockout_ttl = await pipe.execute()
+
+        for lockout_ttl in (ip_lockout_ttl, user_lockout_ttl):
+            if lockout_ttl > 0:
+                return False, lockout_ttl
 
         return True, 0
 
     @classmethod
     async def record_failure(cls, redis_client, ip: str, username: str):
         """记录登录失败"""
-        # IP 维度计数
         ip_key = f"{cls.KEY_PREFIX_IP}{ip}"
-        ip_count = await redis_client.incr(ip_key)
-        await redis_client.expire(ip_key, 86400)  # 24小时后重置计数
-
-        # 用户名维度计数
         user_key = f"{cls.KEY_PREFIX_USER}{username}"
-        user_count = await redis_client.incr(user_key)
-        await redis_client.expire(user_key, 86400)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            # IP 维度计数（24小时后重置计数）
+            pipe.incr(ip_key)
+            pipe.expire(ip_key, 86400)
+            # 用户名维度计数
+            pipe.incr(user_key)
+            pipe.expire(user_key, 86400)
+            ip_count, _, user_count, _ = await pipe.execute()
 
         # 设置锁定（如果达到阈值）
         ip_lockout = cls._get_lockout_duration(ip_count)
@@ -1102,8 +1099,7 @@ class ExtensionLoginRateLimiter:
         """登录成功后清除失败计数"""
         ip_key = f"{cls.KEY_PREFIX_IP}{ip}"
         user_key = f"{cls.KEY_PREFIX_USER}{username}"
-        await redis_client.delete(ip_key, f"{ip_key}:lockout")
-        await redis_client.delete(user_key, f"{user_key}:lockout")
+        await redis_client.delete(ip_key, f"{ip_key}:lockout", user_key, f"{user_key}:lockout")
 
 
 @router.post("/auth/login", response_model=ExtensionLoginResponse)
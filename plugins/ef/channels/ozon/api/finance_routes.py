@@ -13,6 +13,7 @@ import logging
 from ef_core.database import get_async_session
 from ef_core.models.users import User
 from ef_core.api.auth import get_current_user_flexible
+from ef_core.services.task_progress import task_progress
 from ..models.finance import OzonFinanceTransaction, OzonInvoicePayment, calculate_billing_period_by_payment_date
 from ..models.ozon_shops import OzonShop
 from ..models.global_settings import OzonGlobalSetting
@@ -1184,6 +1185,7 @@ async def start_finance_history_sync(
             date_to=request.date_to,
             shop_id=request.shop_id
         )
+        await task_progress.bind_owner(task.id, current_user.id)
 
         logger.info(
             f"Finance history sync task started: task_id={task.id}, "
@@ -1218,7 +1220,7 @@ async def get_finance_history_sync_progress(
     try:
         from ..tasks.finance_history_sync_task import get_task_progress
 
-        progress = get_task_progress(task_id)
+        progress = await get_task_progress(task_id)
 
         return FinanceHistorySyncProgress(
             status=progress.get("status", "unknown"),
@@ -6,17 +6,19 @@ import asyncio
 import logging
 from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ef_core.database import get_async_session
 from ef_core.middleware.auth import require_role
 from ef_core.models.users import User
+from ef_core.services.task_progress import task_progress
 
 from ...api.client import OzonAPIClient
 from ...models import OzonShop
 from ...services.catalog_service import CatalogService
+from ...services.category_tree_artifact import generate_category_tree_artifact, get_category_tree_store
 
 router = APIRouter(tags=["ozon-listing-category"])
 logger = logging.getLogger(__name__)
@@ -159,6 +161,57 @@ async def get_category_tree(
         }
 
 
+@router.get("/listings/categories/tree/artifact")
+async def get_category_tree_artifact(
+    request: Request,
+    root: Optional[int] = Query(None, description="只返回该类目的子节点（懒加载）"),
+    depth: Optional[int] = Query(None, ge=1, le=5, description="返回层数（不传返回完整树）"),
+    db: AsyncSession = Depends(get_async_session)
+):
+    """
+    获取类目树产物（与 /data/categoryTree.json 同一内容）
+
+    - ETag 为产物版本号（内容哈希），If-None-Match 命中返回 304
+    - 完整树按 Accept-Encoding 直接返回预压缩内容（br/gzip）
+    - root/depth 用于懒加载：只返回某个类目的子节点或前几层，截断处的节点不带 children
+    """
+    store = get_category_tree_store()
+    tree = await store.get()
+    if tree is None:
+        # 产物尚未生成（首次部署），从数据库生成一次
+        if await generate_category_tree_artifact(db) is None:
+            raise HTTPException(status_code=404, detail="Category tree not available")
+        tree = await store.get()
+        if tree is None:
+            raise HTTPException(status_code=503, detail="Category tree not ready")
+
+    lazy = root is not None or depth is not None
+    etag = f'"{tree.version}-{root or 0}-{depth or 0}"' if lazy else tree.etag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",  # 每次用 ETag 协商，版本未变时 304
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers)
+
+    if lazy:
+        body = tree.subtree(root, depth)
+        if body is None:
+            raise HTTPException(status_code=404, detail=f"Category {root} not found")
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    accept_encoding = request.headers.get("accept-encoding", "")
+    for encoding in ("br", "gzip"):
+        if encoding in accept_encoding and encoding in tree.bodies:
+            headers["Content-Encoding"] = encoding
+            return Response(content=tree.bodies[encoding], media_type="application/json", headers=headers)
+    return Response(content=tree.bodies["identity"], media_type="application/json", headers=headers)
+
+
 @router.get("/listings/categories/search")
 async def search_categories(
     query: str = Query(..., description="搜索关键词"),
@@ -420,13 +473,13 @@ async def get_category_attributes(
 async def search_attribute_values(
     category_id: int,
     attribute_id: int,
-    query: Optional[str] = Query(None, description="搜索关键词（至少2个字符）"),
+    query: Optional[str] = Query(None, description="搜索关键词（中文至少1个字，其它至少2个字符）"),
     limit: int = Query(100, le=500, description="返回数量限制"),
     shop_id: int = Query(..., description="店铺ID"),
     db: AsyncSession = Depends(get_async_session)
 ):
     """
-    搜索属性字典值（直接调用OZON API）
+    搜索属性字典值（优先搜索本地缓存，字典未缓存时调用OZON API）
 
     用于属性值选择，如品牌、颜色、尺码等
     """
@@ -534,9 +587,6 @@ async def sync_category_tree_async(
     - task_id: 任务ID（用于查询任务状态）
     """
     try:
-        import json
-
-        import redis
         from celery.result import AsyncResult
 
         from ef_core.tasks.celery_app import celery_app
@@ -551,42 +601,35 @@ async def sync_category_tree_async(
 
         logger.info(f"Starting async category tree sync: shop_id={shop_id}, force_refresh={force_refresh}")
 
-        # 检查是否有正在执行的类目同步任务
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
-        # 查找所有正在执行的任务
-        for key in redis_client.keys("celery-task-progress:*"):
-            task_data = redis_client.get(key)
-            if task_data:
-                progress = json.loads(task_data)
-                # 检查是否是类目同步任务（通过字段判断）
-                if progress.get('status') in ['starting', 'syncing'] and 'processed_categories' in progress:
-                    existing_task_id = key.replace("celery-task-progress:", "")
-
-                    # 检查 Celery 中任务是否真的在运行
-                    result = AsyncResult(existing_task_id, app=celery_app)
-
-                    # 如果任务状态是僵尸状态，清理掉
-                    if result.state in ['PENDING', 'FAILURE', 'SUCCESS', 'REVOKED']:
-                        redis_client.delete(key)
-                        logger.warning(
-                            f"Cleaned zombie category sync task {existing_task_id} with Celery state {result.state}"
-                        )
-                        continue
+        # 查找正在执行的类目同步任务
+        running_tasks = await task_progress.list_tasks(task_type="category_tree_sync")
+        for existing_task_id, progress in running_tasks.items():
+            if progress.get('status') in ['starting', 'syncing']:
+                # 检查 Celery 中任务是否真的在运行
+                result = AsyncResult(existing_task_id, app=celery_app)
+
+                # 如果任务状态是僵尸状态，清理掉
+                if result.state in ['PENDING', 'FAILURE', 'SUCCESS', 'REVOKED']:
+                    await task_progress.delete(existing_task_id)
+                    logger.warning(
+                        f"Cleaned zombie category sync task {existing_task_id} with Celery state {result.state}"
+                    )
+                    continue
 
-                    # 任务确实在运行，返回已存在的任务
-                    logger.info(f"Found existing running category sync task: {existing_task_id}")
-                    return {
-                        "success": True,
-                        "task_id": existing_task_id,
-                        "message": "检测到正在执行的类目同步任务，将继续监控该任务"
-                    }
+                # 任务确实在运行，返回已存在的任务
+                logger.info(f"Found existing running category sync task: {existing_task_id}")
+                return {
+                    "success": True,
+                    "task_id": existing_task_id,
+                    "message": "检测到正在执行的类目同步任务，将继续监控该任务"
+                }
 
         # 启动后台异步任务
         task = sync_category_tree_task.delay(
             shop_id=shop_id,
             force_refresh=force_refresh
         )
+        await task_progress.bind_owner(task.id, current_user.id)
 
         logger.info(f"Category tree sync task started: task_id={task.id}")
 
@@ -623,9 +666,6 @@ async def batch_sync_category_attributes(
     - task_id: 任务ID（用于查询任务状态）
     """
     try:
-        import json
-
-        import redis
         from celery.result import AsyncResult
 
         from ef_core.tasks.celery_app import celery_app
@@ -654,34 +694,27 @@ async def batch_sync_category_attributes(
         )
 
         # 检查是否有正在执行的任务（加强版：同时检查 Celery 任务状态）
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
-        # 查找所有正在执行的任务
-        for key in redis_client.keys("celery-task-progress:*"):
-            task_data = redis_client.get(key)
-            if task_data:
-                progress = json.loads(task_data)
-                if progress.get('status') in ['starting', 'syncing']:
-                    existing_task_id = key.replace("celery-task-progress:", "")
-
-                    # 检查 Celery 中任务是否真的在运行
-                    result = AsyncResult(existing_task_id, app=celery_app)
-
-                    # 如果任务状态是 PENDING/FAILURE/SUCCESS/REVOKED，说明是僵尸状态，清理掉
-                    if result.state in ['PENDING', 'FAILURE', 'SUCCESS', 'REVOKED']:
-                        redis_client.delete(key)
-                        logger.warning(
-                            f"Cleaned zombie task {existing_task_id} with Celery state {result.state}"
-                        )
-                        continue
+        running_tasks = await task_progress.list_tasks(task_type="category_attributes_sync")
+        for existing_task_id, progress in running_tasks.items():
+            if progress.get('status') in ['starting', 'syncing']:
+                # 检查 Celery 中任务是否真的在运行
+                result = AsyncResult(existing_task_id, app=celery_app)
+
+                # 如果任务状态是 PENDING/FAILURE/SUCCESS/REVOKED，说明是僵尸状态，清理掉
+                if result.state in ['PENDING', 'FAILURE', 'SUCCESS', 'REVOKED']:
+                    await task_progress.delete(existing_task_id)
+                    logger.warning(
+                        f"Cleaned zombie task {existing_task_id} with Celery state {result.state}"
+                    )
+                    continue
 
-                    # 任务确实在运行，返回已存在的任务
-                    logger.info(f"Found existing running task: {existing_task_id} (Celery state: {result.state})")
-                    return {
-                        "success": True,
-                        "task_id": existing_task_id,
-                        "message": "检测到正在执行的同步任务，将继续监控该任务"
-                    }
+                # 任务确实在运行，返回已存在的任务
+                logger.info(f"Found existing running task: {existing_task_id} (Celery state: {result.state})")
+                return {
+                    "success": True,
+                    "task_id": existing_task_id,
+                    "message": "检测到正在执行的同步任务，将继续监控该任务"
+                }
 
         # 启动后台异步任务
         task = batch_sync_category_attributes_task.delay(
@@ -692,6 +725,7 @@ async def batch_sync_category_attributes(
             language=language,
             max_concurrent=max_concurrent
         )
+        await task_progress.bind_owner(task.id, current_user.id)
 
         logger.info(f"Batch sync task started: task_id={task.id}")
 
@@ -726,17 +760,12 @@ async def get_category_sync_task_status(
         任务状态信息
     """
     try:
-        import json
-
-        import redis
         from celery.result import AsyncResult
 
         task = AsyncResult(task_id)
 
         # 尝试从 Redis 获取进度信息
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-        progress_key = f"celery-task-progress:{task_id}"
-        progress_data = redis_client.get(progress_key)
+        progress_info = await task_progress.get(task_id)
 
         response = {
             "task_id": task_id,
@@ -744,8 +773,7 @@ async def get_category_sync_task_status(
         }
 
         # 如果有进度数据，优先使用 Redis 进度状态（比 Celery 状态更准确）
-        if progress_data:
-            progress_info = json.loads(progress_data)
+        if progress_info:
             response["info"] = progress_info
             response["progress"] = progress_info.get('percent', 0)
 
@@ -818,17 +846,12 @@ async def get_batch_sync_task_status(
         任务状态信息
     """
     try:
-        import json
-
-        import redis
         from celery.result import AsyncResult
 
         task = AsyncResult(task_id)
 
         # 尝试从 Redis 获取进度信息
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-        progress_key = f"celery-task-progress:{task_id}"
-        progress_data = redis_client.get(progress_key)
+        progress_info = await task_progress.get(task_id)
 
         response = {
             "task_id": task_id,
@@ -836,8 +859,7 @@ async def get_batch_sync_task_status(
         }
 
         # 如果有进度数据，优先使用 Redis 进度状态（比 Celery 状态更准确）
-        if progress_data:
-            progress_info = json.loads(progress_data)
+        if progress_info:
             response["info"] = progress_info
             response["progress"] = progress_info.get('percent', 0)
 
@@ -10,13 +10,12 @@ from decimal import Decimal
 import logging
 import json
 import hashlib
-import redis.asyncio as redis
 
 from ef_core.database import get_async_session
-from ef_core.config import get_settings
 from ef_core.models.users import User
 from ef_core.middleware.auth import require_role
 from ef_core.api.auth import get_current_user_flexible
+from ef_core.utils.redis import get_redis
 from ..models import OzonPosting, OzonProduct, OzonDomesticTracking, OzonGlobalSetting, OzonShipmentPackage
 from ..utils.datetime_utils import utcnow, parse_date, parse_date_with_timezone, get_global_timezone
 from sqlalchemy import delete
@@ -27,20 +26,6 @@ logger = logging.getLogger(__name__)
 
 # Redis 缓存配置
 ORDER_STATS_CACHE_TTL = 1800  # 30分钟
-_redis_client: Optional[redis.Redis] = None
-
-
-async def get_redis_client() -> redis.Redis:
-    """获取 Redis 客户端（懒加载单例）"""
-    global _redis_client
-    if _redis_client is None:
-        settings = get_settings()
-        _redis_client = redis.from_url(
-            settings.redis_url,
-            encoding="utf-8",
-            decode_responses=True
-        )
-    return _redis_client
 
 
 @router.get("/orders")
@@ -446,7 +431,7 @@ async def get_order_stats(
 
     # 尝试从缓存获取
     try:
-        redis_client = await get_redis_client()
+        redis_client = await get_redis()
         cached = await redis_client.get(cache_key)
         if cached:
             logger.debug(f"订单统计命中缓存: {cache_key}")
@@ -915,23 +900,24 @@ async def sync_orders(
     # 异步执行同步任务（使用新版 OrderSyncService）
     from ..services.sync.order_sync import OrderSyncService
 
+    from ..services.sync.task_state_manager import get_task_state_manager
+    task_manager = get_task_state_manager()
+
+    # 初始化任务状态（用于 API 返回，进度推送给发起用户）
+    await task_manager.create_task(
+        task_id,
+        "orders",
+        mode=mode,
+        message="正在准备同步...",
+        user_id=current_user.id,
+        shop_id=shop_id
+    )
+
     async def run_sync():
         """在后台执行同步任务"""
-        from ..services.ozon_sync import SYNC_TASKS
-        from ..utils.datetime_utils import utcnow
         from ef_core.database import get_db_manager
 
         try:
-            # 初始化任务状态（用于 API 返回）
-            SYNC_TASKS[task_id] = {
-                "status": "running",
-                "progress": 0,
-                "message": "正在准备同步...",
-                "started_at": utcnow().isoformat(),
-                "type": "orders",
-                "mode": mode,
-            }
-
             # 创建新的数据库会话
             db_manager = get_db_manager()
             async with db_manager.get_session() as task_db:
@@ -944,24 +930,15 @@ async def sync_orders(
                     mode=mode
                 )
 
-                # 同步任务结果到 SYNC_TASKS
-                SYNC_TASKS[task_id] = result
-
                 logger.info(
                     f"Order sync completed for shop {shop_id}",
                     extra={"task_id": task_id, "mode": mode, "result": result}
                 )
 
         except Exception as e:
-            SYNC_TASKS[task_id] = {
-                "status": "failed",
-                "progress": SYNC_TASKS.get(task_id, {}).get("progress", 0),
-                "message": f"{'全量' if mode == 'full' else '增量'}同步失败: {str(e)}",
-                "error": str(e),
-                "failed_at": utcnow().isoformat(),
-                "type": "orders",
-                "mode": mode,
-            }
+            await task_manager.fail_task(
+                task_id, str(e), f"{'全量' if mode == 'full' else '增量'}同步失败: {str(e)}"
+            )
             logger.error(f"Order sync failed: {e}", exc_info=True)
 
     # 在后台启动同步任务
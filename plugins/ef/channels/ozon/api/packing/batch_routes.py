@@ -8,8 +8,11 @@ from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from decimal import Decimal
+import asyncio
 import logging
 
+import httpx
+
 from ef_core.database import get_async_session
 from ef_core.models.users import User
 from ef_core.middleware.auth import require_role
@@ -161,6 +164,57 @@ class BatchPrintRequest(BaseModel):
     weights: Optional[Dict[str, int]] = Field(None, description="各货件的包装重量，key为posting_number，value为重量(克)")
 
 
+def _describe_label_error(e: Exception) -> Dict[str, str]:
+    """将获取标签的异常转换为前端展示的错误信息和建议"""
+    if isinstance(e, httpx.HTTPStatusError):
+        # 解析OZON API返回的错误信息
+        error_detail = "未知错误"
+        suggestion = "请稍后重试"
+
+        try:
+            error_data = e.response.json() if e.response else {}
+            error_message = error_data.get('message', '') or str(e)
+
+            # 解析常见错误
+            if 'aren\'t ready' in error_message.lower() or 'not ready' in error_message.lower():
+                error_detail = "标签未就绪"
+                suggestion = "请在订单装配后45-60秒重试"
+            elif 'not found' in error_message.lower():
+                error_detail = "货件不存在"
+                suggestion = "订单可能已取消或不存在"
+            elif 'invalid' in error_message.lower():
+                error_detail = "货件编号无效"
+                suggestion = "请检查货件编号是否正确"
+            else:
+                error_detail = error_message[:100]  # 限制长度
+        except Exception:
+            error_detail = f"HTTP {e.response.status_code if e.response else 'unknown'}"
+
+        return {"error": error_detail, "suggestion": suggestion}
+
+    # 安全地转换异常为字符串，避免UTF-8解码错误
+    exc_type = type(e).__name__
+    try:
+        if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
+            error_msg = f"{exc_type}: HTTP {e.response.status_code}"
+        elif e.args:
+            # 安全地处理args[0]
+            arg = e.args[0]
+            if isinstance(arg, bytes):
+                error_msg = f"{exc_type}: <binary data, {len(arg)} bytes>"
+            elif isinstance(arg, str):
+                error_msg = f"{exc_type}: {arg[:100]}"
+            else:
+                error_msg = f"{exc_type}: {type(arg).__name__}"
+        else:
+            error_msg = f"{exc_type}: Unknown"
+    except Exception:
+        # 如果所有方法都失败，使用安全的默认消息
+        error_msg = f"{exc_type}: <error details unavailable>"
+
+    return {"error": error_msg, "suggestion": "请检查网络或联系技术支持"}
+
+
 @router.post("/packing/postings/batch-print-labels")
 async def batch_print_labels(
     request: Request,
@@ -183,9 +237,11 @@ async def batch_print_labels(
 
     错误处理策略：
     1. 预检查：检查每个posting的缓存状态
-    2. 逐个调用：避免一个失败导致全部失败
+    2. 按店铺批量获取：一次调用获取多个标签，整组失败时逐个重试，避免一个失败导致全部失败
     3. 详细错误：返回具体哪些posting_number失败及原因
 
+    多个标签合并为一个PDF，相同货件集合重复打印时直接复用已合并的文件
+
     Returns:
         成功：
         {
@@ -213,12 +269,6 @@ async def batch_print_labels(
         }
     """
     import os
-    import base64
-    import uuid
-    import httpx
-    from datetime import datetime
-    import json
-    from ef_core.services.audit_service import AuditService
 
     # 获取请求参数
     posting_numbers = body.posting_numbers
@@ -334,7 +384,7 @@ async def batch_print_labels(
 
         logger.info(f"批量打印: 总{len(posting_numbers)}个, 缓存{len(cached_postings)}个, 需获取{len(need_fetch_postings)}个")
 
-        # 5. 调用OZON API获取未缓存的标签（逐个尝试，捕获错误）
+        # 5. 调用OZON API获取未缓存的标签
         failed_postings = []
         success_postings = []
         pdf_files = []
@@ -347,15 +397,13 @@ async def batch_print_labels(
                 success_postings.append(pn)
                 # 注意：打印追踪字段在 confirm-print API 中更新
 
-        # 5.2 获取未缓存的标签（逐个调用，避免一个失败影响全部）
+        # 5.2 获取未缓存的标签：按店铺分组批量获取（每店铺并发一组），失败货件单独隔离
         from ..client import OzonAPIClient
         from ...services.label_service import LabelService
 
         label_service = LabelService(db)
 
-        # 按店铺分组，为每个店铺创建 API 客户端
-        api_clients: Dict[int, OzonAPIClient] = {}
-
+        shop_fetch_postings: Dict[int, List[str]] = {}
         for pn in need_fetch_postings:
             # 检查posting是否存在
             posting = postings.get(pn)
@@ -366,127 +414,56 @@ async def batch_print_labels(
                     "suggestion": "请检查货件编号是否正确"
                 })
                 continue
+            shop_fetch_postings.setdefault(posting.shop_id, []).append(pn)
 
-            # 获取或创建该店铺的 API 客户端
-            shop_id = posting.shop_id
-            if shop_id not in api_clients:
-                shop = shops[shop_id]
-                api_clients[shop_id] = OzonAPIClient(shop.client_id, shop.api_key_enc, shop.id)
-
-            client = api_clients[shop_id]
-
+        async def fetch_shop_labels(shop_id: int, shop_posting_numbers: List[str]):
+            shop = shops[shop_id]
             try:
-                # 使用标签服务下载并保存PDF
-                download_result = await label_service.download_and_save_label(
-                    posting_number=pn,
-                    api_client=client,
-                    force=False  # 不强制重新下载
-                )
+                async with OzonAPIClient(shop.client_id, shop.api_key_enc, shop.id) as client:
+                    return await label_service.fetch_labels(shop_posting_numbers, client)
+            except Exception as e:
+                return {pn: e for pn in shop_posting_numbers}
 
-                if not download_result["success"]:
-                    raise ValueError(download_result.get("error", "未知错误"))
+        shop_results = await asyncio.gather(*(
+            fetch_shop_labels(shop_id, shop_posting_numbers)
+            for shop_id, shop_posting_numbers in shop_fetch_postings.items()
+        ))
+        fetch_results = {pn: result for shop_result in shop_results for pn, result in shop_result.items()}
 
-                pdf_files.append(download_result["pdf_path"])
+        for pn in need_fetch_postings:
+            if pn not in fetch_results:
+                continue
+            result = fetch_results[pn]
+            if isinstance(result, Exception):
+                failure = _describe_label_error(result)
+                failed_postings.append({"posting_number": pn, **failure})
+                logger.warning(f"获取标签失败 {pn}: {failure['error']}")
+            else:
+                pdf_files.append(result)
                 success_postings.append(pn)
                 # 注意：打印追踪字段在 confirm-print API 中更新
 
-            except httpx.HTTPStatusError as e:
-                # 捕获HTTP错误，解析OZON API返回的错误信息
-                error_detail = "未知错误"
-                suggestion = "请稍后重试"
-
-                try:
-                    error_data = e.response.json() if e.response else {}
-                    error_message = error_data.get('message', '') or str(e)
-
-                    # 解析常见错误
-                    if 'aren\'t ready' in error_message.lower() or 'not ready' in error_message.lower():
-                        error_detail = "标签未就绪"
-                        suggestion = "请在订单装配后45-60秒重试"
-                    elif 'not found' in error_message.lower():
-                        error_detail = "货件不存在"
-                        suggestion = "订单可能已取消或不存在"
-                    elif 'invalid' in error_message.lower():
-                        error_detail = "货件编号无效"
-                        suggestion = "请检查货件编号是否正确"
-                    else:
-                        error_detail = error_message[:100]  # 限制长度
-                except Exception:
-                    error_detail = f"HTTP {e.response.status_code if e.response else 'unknown'}"
-
-                failed_postings.append({
-                    "posting_number": pn,
-                    "error": error_detail,
-                    "suggestion": suggestion
-                })
-                logger.warning(f"获取标签失败 {pn}: {error_detail}")
-
-            except Exception as e:
-                # 安全地转换异常为字符串，避免UTF-8解码错误
-                exc_type = type(e).__name__
-                try:
-                    # 对于httpx.HTTPStatusError，提取状态码
-                    if hasattr(e, 'response') and hasattr(e.response, 'status_code'):
-                        error_msg = f"{exc_type}: HTTP {e.response.status_code}"
-                    elif e.args:
-                        # 安全地处理args[0]
-                        arg = e.args[0]
-                        if isinstance(arg, bytes):
-                            error_msg = f"{exc_type}: <binary data, {len(arg)} bytes>"
-                        elif isinstance(arg, str):
-                            error_msg = f"{exc_type}: {arg[:100]}"
-                        else:
-                            error_msg = f"{exc_type}: {type(arg).__name__}"
-                    else:
-                        error_msg = f"{exc_type}: Unknown"
-                except Exception:
-                    # 如果所有方法都失败，使用安全的默认消息
-                    error_msg = f"{exc_type}: <error details unavailable>"
-
-                failed_postings.append({
-                    "posting_number": pn,
-                    "error": error_msg,
-                    "suggestion": "请检查网络或联系技术支持"
-                })
-                logger.error(f"获取标签异常 {pn}: {error_msg}")
-
-        # 关闭所有 API 客户端
-        for client in api_clients.values():
-            await client.close()
+        # 写回并提交新获取标签的缓存路径
+        fetched_paths = {pn: result for pn, result in fetch_results.items() if isinstance(result, str)}
+        if fetched_paths:
+            await label_service.record_label_paths(fetched_paths)
+            await db.commit()
 
         # 注意：审计日志、积分扣除、重量更新已移至 confirm-print API
         # 此API仅负责获取标签PDF
 
-        # 6. 处理PDF文件（单个直接返回，多个合并）
+        # 6. 处理PDF文件（单个直接返回，多个合并；合并在工作线程执行并按货件集合复用）
         pdf_url = None
         if pdf_files:
             if len(pdf_files) == 1:
                 # 单个 posting，直接返回单文件 URL（避免冗余的 batch 文件）
-                from ...services.label_service import LabelService
-                pdf_url = LabelService.get_label_url(success_postings[0])
+                pdf_url = LabelService.get_label_url(pdf_files[0])
                 logger.info(f"单个标签打印: {pdf_url}")
             else:
                 # 多个 posting，合并成 batch（但每个单独的 PDF 已保存在 labels/ 目录）
                 try:
-                    from PyPDF2 import PdfMerger
-                    from ...services.label_service import LabelService
-
-                    merger = PdfMerger()
-                    for pdf_file in pdf_files:
-                        merger.append(pdf_file)
-
-                    # 生成批量PDF文件名
-                    batch_filename = f"batch_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}.pdf"
-                    batch_path = f"{LabelService.get_label_dir()}/{batch_filename}"
-
-                    # 确保目录存在
-                    os.makedirs(os.path.dirname(batch_path), exist_ok=True)
-
-                    merger.write(batch_path)
-                    merger.close()
-
-                    pdf_url = f"/downloads/labels/{batch_filename}"
-                    logger.info(f"批量标签打印: 成功合并{len(pdf_files)}个PDF -> {batch_path}")
+                    batch_path = await label_service.merge_labels(pdf_files)
+                    pdf_url = LabelService.get_label_url(batch_path)
                 except Exception as e:
                     logger.error(f"合并PDF失败: {e}")
                     # 合并失败不影响结果，只是没有合并后的PDF
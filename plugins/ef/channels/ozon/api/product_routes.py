@@ -14,6 +14,7 @@ from ef_core.database import get_async_session
 from ef_core.models.users import User
 from ef_core.middleware.auth import require_role
 from ef_core.api.auth import get_current_user_flexible
+from ef_core.services.task_progress import task_progress
 from ..models import OzonProduct, OzonShop
 from ..models.orders import OzonPosting
 from .permissions import filter_by_shop_permission, build_shop_filter_condition
@@ -123,7 +124,7 @@ async def _sync_all_shops(
     import asyncio
     import uuid
     from ..services import OzonSyncService
-    from ..services.ozon_sync import SYNC_TASKS
+    from ..services.sync.task_state_manager import get_task_state_manager
     from ef_core.database import get_db_manager
 
     # 获取用户有权限的店铺列表
@@ -159,17 +160,18 @@ async def _sync_all_shops(
     parent_task_id = f"batch_sync_{uuid.uuid4().hex[:12]}"
 
     # 初始化父任务状态
-    SYNC_TASKS[parent_task_id] = {
-        "status": "running",
-        "progress": 0,
-        "message": f"准备同步 {len(shops)} 个店铺...",
-        "started_at": datetime.now().isoformat(),
-        "type": "batch_products",
-        "shops": [{"shop_id": shop.id, "shop_name": shop.shop_name, "status": "pending"} for shop in shops],
-        "total_shops": len(shops),
-        "completed_shops": 0,
-        "mode": "full" if full_sync else "incremental"
-    }
+    task_manager = get_task_state_manager()
+    shop_states = [{"shop_id": shop.id, "shop_name": shop.shop_name, "status": "pending"} for shop in shops]
+    await task_manager.create_task(
+        parent_task_id,
+        "batch_products",
+        mode="full" if full_sync else "incremental",
+        message=f"准备同步 {len(shops)} 个店铺...",
+        user_id=current_user.id,
+        shops=shop_states,
+        total_shops=len(shops),
+        completed_shops=0
+    )
 
     # 在后台启动批量同步任务
     async def _batch_sync_task():
@@ -181,10 +183,13 @@ async def _sync_all_shops(
         for idx, shop in enumerate(shops):
             try:
                 # 更新父任务进度
-                progress = int((idx / len(shops)) * 100)
-                SYNC_TASKS[parent_task_id]["progress"] = progress
-                SYNC_TASKS[parent_task_id]["message"] = f"正在同步店铺 {shop.shop_name} ({idx + 1}/{len(shops)})"
-                SYNC_TASKS[parent_task_id]["shops"][idx]["status"] = "running"
+                shop_states[idx]["status"] = "running"
+                await task_manager.update_progress(
+                    parent_task_id,
+                    int((idx / len(shops)) * 100),
+                    f"正在同步店铺 {shop.shop_name} ({idx + 1}/{len(shops)})",
+                    shops=shop_states
+                )
 
                 # 创建子任务ID
                 child_task_id = f"{parent_task_id}_shop_{shop.id}"
@@ -201,31 +206,34 @@ async def _sync_all_shops(
 
                     if result.get("status") == "completed":
                         completed += 1
-                        SYNC_TASKS[parent_task_id]["shops"][idx]["status"] = "completed"
-                        SYNC_TASKS[parent_task_id]["shops"][idx]["result"] = result.get("result", {})
+                        shop_states[idx]["status"] = "completed"
+                        shop_states[idx]["result"] = result.get("result", {})
                     else:
                         failed += 1
-                        SYNC_TASKS[parent_task_id]["shops"][idx]["status"] = "failed"
-                        SYNC_TASKS[parent_task_id]["shops"][idx]["error"] = result.get("error", "未知错误")
+                        shop_states[idx]["status"] = "failed"
+                        shop_states[idx]["error"] = result.get("error", "未知错误")
 
             except Exception as e:
                 logger.error(f"批量同步店铺 {shop.id} 失败: {e}", exc_info=True)
                 failed += 1
-                SYNC_TASKS[parent_task_id]["shops"][idx]["status"] = "failed"
-                SYNC_TASKS[parent_task_id]["shops"][idx]["error"] = str(e)
+                shop_states[idx]["status"] = "failed"
+                shop_states[idx]["error"] = str(e)
 
-            SYNC_TASKS[parent_task_id]["completed_shops"] = completed + failed
+            await task_manager.update_task(
+                parent_task_id, shops=shop_states, completed_shops=completed + failed
+            )
 
         # 更新父任务最终状态
-        SYNC_TASKS[parent_task_id]["status"] = "completed"
-        SYNC_TASKS[parent_task_id]["progress"] = 100
-        SYNC_TASKS[parent_task_id]["message"] = f"批量同步完成：{completed} 个成功，{failed} 个失败"
-        SYNC_TASKS[parent_task_id]["completed_at"] = datetime.now().isoformat()
-        SYNC_TASKS[parent_task_id]["result"] = {
-            "total_shops": len(shops),
-            "completed": completed,
-            "failed": failed
-        }
+        await task_manager.complete_task(
+            parent_task_id,
+            result={
+                "total_shops": len(shops),
+                "completed": completed,
+                "failed": failed
+            },
+            message=f"批量同步完成：{completed} 个成功，{failed} 个失败",
+            shops=shop_states
+        )
 
     # 启动后台任务（不等待完成）
     asyncio.create_task(_batch_sync_task())
@@ -787,6 +795,7 @@ async def update_prices(
 
     # 提交异步任务
     task = batch_update_prices_task.delay(shop_id, updates)
+    await task_progress.bind_owner(task.id, current_user.id)
 
     return {
         "success": True,
@@ -811,15 +820,11 @@ async def get_batch_price_update_task_status(
     """
     try:
         from celery.result import AsyncResult
-        import redis
-        import json
 
         task = AsyncResult(task_id)
 
         # 从 Redis 获取进度信息
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-        progress_key = f"celery-task-progress:{task_id}"
-        progress_data = redis_client.get(progress_key)
+        progress_info = await task_progress.get(task_id)
 
         response = {
             "task_id": task_id,
@@ -827,8 +832,7 @@ async def get_batch_price_update_task_status(
         }
 
         # 如果有进度数据，使用进度数据
-        if progress_data:
-            progress_info = json.loads(progress_data)
+        if progress_info:
             response["info"] = progress_info
             response["progress"] = progress_info.get('percent', 0)
 
@@ -885,6 +889,7 @@ async def update_stocks(
 
     # 提交异步任务
     task = batch_update_stocks_task.delay(shop_id, updates)
+    await task_progress.bind_owner(task.id, current_user.id)
 
     return {
         "success": True,
@@ -911,15 +916,11 @@ async def get_batch_stock_update_task_status(
     """
     try:
         from celery.result import AsyncResult
-        import redis
-        import json
 
         task = AsyncResult(task_id)
 
         # 从 Redis 获取进度信息
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-        progress_key = f"celery-task-progress:{task_id}"
-        progress_data = redis_client.get(progress_key)
+        progress_info = await task_progress.get(task_id)
 
         response = {
             "task_id": task_id,
@@ -927,8 +928,7 @@ async def get_batch_stock_update_task_status(
         }
 
         # 如果有进度数据，使用进度数据
-        if progress_data:
-            progress_info = json.loads(progress_data)
+        if progress_info:
             response["info"] = progress_info
             response["progress"] = progress_info.get('percent', 0)
 
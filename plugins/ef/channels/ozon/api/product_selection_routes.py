@@ -8,6 +8,7 @@ from datetime import datetime, timedelta
 import tempfile
 import shutil
 import json
+import uuid
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, or_
@@ -20,6 +21,7 @@ from ef_core.database import get_async_session
 from ef_core.api.auth import get_current_user, get_current_user_flexible
 from ef_core.models.users import User
 from ef_core.services.audit_service import AuditService
+from ef_core.services.task_progress import task_progress
 from ..services.product_selection_service import ProductSelectionService
 from ..models.product_selection import ProductSelectionItem, ImportHistory
 from ..services.sync_state_manager import get_sync_state_manager
@@ -51,6 +53,7 @@ class ProductSearchRequest(BaseModel):
     is_read: Optional[bool] = Field(None, description="是否已读（None=全部,True=已读,False=未读）")
     sort_by: Optional[str] = Field('created_asc', description="排序方式")
     after_id: Optional[int] = Field(0, ge=0, description="游标：上次最后一个商品的ID")
+    cursor: Optional[str] = Field(None, description="游标：上一页返回的 cursor（优先于 after_id）")
     limit: Optional[int] = Field(20, ge=1, le=100, description="每次加载数量")
 
 
@@ -67,6 +70,7 @@ class ImportResponse(BaseModel):
     duration: Optional[int] = None
     error: Optional[str] = None
     errors: Optional[List[Dict[str, Any]]] = None
+    task_id: Optional[str] = None  # 导入进度任务ID（task.progress 推送）
 
 
 class PreviewResponse(BaseModel):
@@ -187,6 +191,7 @@ async def import_products(
     file: UploadFile = File(...),
     strategy: str = Form('update'),
     shop_id: int = Form(...),  # 必须明确指定店铺ID
+    task_id: Optional[str] = Form(None),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_async_session)
 ):
@@ -197,6 +202,7 @@ async def import_products(
         file: Excel或CSV文件
         strategy: 导入策略 (skip/update/append)
         shop_id: 店铺ID
+        task_id: 进度任务ID（可选，由前端生成以便上传期间即可订阅 task.progress；未提供时自动生成）
     """
     # 检查文件类型
     if not file.filename:
@@ -219,17 +225,55 @@ async def import_products(
             shutil.copyfileobj(file.file, tmp_file)
             tmp_file_path = Path(tmp_file.name)
 
-            # 调用服务层导入
-            service = ProductSelectionService()
-            result = await service.import_file(
-                db=db,
-                file_path=tmp_file_path,
-                file_type='csv' if file_extension == 'csv' else 'xlsx',
-                import_strategy=strategy,
+            # 导入进度：每处理完一块推送给当前用户
+            progress_task_id = task_id or f"selection_import_{uuid.uuid4().hex[:12]}"
+            await task_progress.start(
+                progress_task_id,
+                "selection_import",
                 user_id=current_user.id,
-                validate_only=False
+                message="正在导入选品数据...",
+                file_name=file.filename,
             )
 
+            async def report_progress(processed: int, total: Optional[int]) -> None:
+                await task_progress.update(
+                    progress_task_id,
+                    current=processed,
+                    total=total,
+                    progress=min(int(processed * 100 / total), 99) if total else 0,
+                    message=f"已处理 {processed} 行",
+                )
+
+            # 调用服务层导入
+            service = ProductSelectionService()
+            try:
+                result = await service.import_file(
+                    db=db,
+                    file_path=tmp_file_path,
+                    file_type='csv' if file_extension == 'csv' else 'xlsx',
+                    import_strategy=strategy,
+                    user_id=current_user.id,
+                    validate_only=False,
+                    progress_callback=report_progress
+                )
+            except Exception as e:
+                await task_progress.fail(progress_task_id, str(e))
+                raise
+
+            if not result['success']:
+                await task_progress.fail(progress_task_id, result.get('error', '导入失败'))
+            else:
+                await task_progress.complete(
+                    progress_task_id,
+                    result={
+                        "import_id": result.get('import_id'),
+                        "total_rows": result.get('total_rows', 0),
+                        "success_rows": result.get('success_rows', 0),
+                        "failed_rows": result.get('failed_rows', 0),
+                    },
+                    message="选品数据导入完成",
+                )
+
             if result['success']:
                 # 记录导入选品数据审计日志
                 await AuditService.log_action(
@@ -253,7 +297,7 @@ async def import_products(
                     user_agent=request.headers.get("user-agent"),
                     request_id=getattr(request.state, 'trace_id', None)
                 )
-                return ImportResponse(**result)
+                return ImportResponse(**result, task_id=progress_task_id)
             else:
                 raise HTTPException(status_code=400, detail=result.get('error', '导入失败'))
 
@@ -338,17 +382,21 @@ async def search_products(
     # 构建筛选条件
     filters = {
         k: v for k, v in request.dict().items()
-        if v is not None and k not in ['sort_by', 'after_id', 'limit']
+        if v is not None and k not in ['sort_by', 'after_id', 'cursor', 'limit']
     }
 
-    result = await service.search_products(
-        db=db,
-        user_id=current_user.id,
-        filters=filters,
-        sort_by=request.sort_by,
-        after_id=request.after_id,
-        limit=request.limit
-    )
+    try:
+        result = await service.search_products(
+            db=db,
+            user_id=current_user.id,
+            filters=filters,
+            sort_by=request.sort_by,
+            after_id=request.after_id,
+            limit=request.limit,
+            cursor=request.cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         'success': True,
@@ -373,7 +421,7 @@ async def get_products(
     competitor_min_price_max: Optional[float] = Query(None, description="最低跟卖价上限"),
     listing_date_start: Optional[str] = Query(None, description="上架时间晚于（YYYY-MM-DD）"),
     sort_by: str = Query('created_asc', description="排序方式"),
-    page: int = Query(1, ge=1, description="页码"),
+    cursor: Optional[str] = Query(None, description="游标：上一页返回的 cursor"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     current_user: User = Depends(get_current_user_flexible),
     db: AsyncSession = Depends(get_async_session)
@@ -414,14 +462,17 @@ async def get_products(
     if listing_date_start:
         filters['listing_date_start'] = listing_date_start
 
-    result = await service.search_products(
-        db=db,
-        user_id=current_user.id,
-        filters=filters,
-        sort_by=sort_by,
-        page=page,
-        page_size=page_size
-    )
+    try:
+        result = await service.search_products(
+            db=db,
+            user_id=current_user.id,
+            filters=filters,
+            sort_by=sort_by,
+            limit=page_size,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
     return {
         'success': True,
@@ -497,6 +548,7 @@ async def mark_products_as_read(
 
         await db.commit()
         marked_count = result.rowcount
+        await ProductSelectionService.invalidate_search_counts(current_user.id)
 
         logger.info(f"用户 {current_user.id} 标记了 {marked_count} 个商品为已读")
 
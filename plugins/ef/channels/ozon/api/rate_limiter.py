@@ -5,13 +5,28 @@
 性能优化：
 - 使用成熟的 aiolimiter 库，避免持锁睡眠的反模式
 - 支持高并发场景，无锁竞争导致的串行化问题
+
+分布式限流：
+- DistributedRateLimiter 基于 Redis Lua 令牌桶，按 client_id + 资源类型跨进程共享额度
 """
 import asyncio
 import time
+import weakref
 from typing import Dict, Optional
 from collections import defaultdict
 from aiolimiter import AsyncLimiter
 
+try:
+    from prometheus_client import Counter, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import get_redis
+
+_logger = get_logger(__name__)
+
 
 class TokenBucket:
     """令牌桶实现（基于 aiolimiter.AsyncLimiter）"""
@@ -191,4 +206,259 @@ class AdaptiveRateLimiter(RateLimiter):
             import logging
             logging.getLogger(__name__).warning(
                 f"Rate limit decreased for {resource_type}: {old_rate} -> {new_rate}"
-            )
\ No newline at end of file
+            )
+
+# ==================== 分布式限流（跨进程共享） ====================
+
+# OZON 官方 API 限流：每个 Client-Id 50 req/s（所有进程共享同一额度）
+OZON_RATE_LIMITS: Dict[str, float] = {
+    "products": 50,
+    "orders": 50,
+    "postings": 50,
+    "analytics": 50,
+    "actions": 50,
+    "categories": 50,
+    "default": 50,
+}
+
+# 令牌桶 Lua 脚本（原子执行，时钟取 Redis 服务器时间，避免多机时钟漂移）
+# KEYS[1]: 令牌桶 hash（t=剩余令牌, ts=上次补充时间ms）
+# KEYS[2]: 惩罚键（收到 429 后写入，存活期间所有进程暂停该资源）
+# ARGV[1]: 速率（令牌/秒） ARGV[2]: 桶容量 ARGV[3]: 申请令牌数
+# 返回：0 表示获取成功，否则为建议等待的毫秒数
+_TOKEN_BUCKET_LUA = """
+if redis.replicate_commands then pcall(redis.replicate_commands) end
+local penalty = redis.call('PTTL', KEYS[2])
+if penalty > 0 then
+    return penalty
+end
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local tokens = tonumber(redis.call('HGET', KEYS[1], 't'))
+local ts = tonumber(redis.call('HGET', KEYS[1], 'ts'))
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate / 1000)
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+else
+    wait = math.ceil((requested - tokens) * 1000 / rate)
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity * 1000 / rate) + 1000)
+return wait
+"""
+
+if PROMETHEUS_AVAILABLE:
+    _RATE_LIMIT_WAIT = Histogram(
+        'ef_ozon_rate_limit_wait_seconds',
+        'Time spent waiting for an OZON API rate limit token',
+        ['resource'],
+        buckets=(0.005, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60),
+    )
+    _RATE_LIMIT_ACQUIRE = Counter(
+        'ef_ozon_rate_limit_acquire_total',
+        'OZON API rate limit token acquisitions',
+        ['resource', 'outcome'],
+    )
+
+
+class _LoopState:
+    """单个事件循环内的限流状态（Lua 脚本绑定当前循环的共享 Redis 客户端，asyncio.Lock 绑定事件循环）"""
+
+    def __init__(self):
+        self.redis = None
+        self.script = None
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+
+class DistributedRateLimiter:
+    """
+    基于 Redis 的分布式令牌桶限流器
+
+    同一 client_id + 资源类型的令牌桶由所有 API worker / ARQ / Celery 进程共享，
+    保证整个集群对单个卖家的请求速率不超过 OZON 实际配额。
+
+    - 店铺公平：每个 client_id 独立令牌桶，一个店铺耗尽额度不会阻塞其他店铺；
+      同进程内同一桶的等待者经 asyncio.Lock 排队（FIFO），只有队首轮询 Redis
+    - 429 反馈：penalize() 写入共享惩罚键，所有进程同时退避，而非各自持槽睡眠
+    - 降级：Redis 不可用时回退到进程内 TokenBucket，不阻断业务
+    - 指标：等待耗时直方图（Prometheus）+ 进程内等待统计 get_wait_stats()
+
+    接口与 RateLimiter 兼容（acquire / get_available_tokens）。
+    """
+
+    KEY_PREFIX = "ef:ozon:ratelimit"
+
+    def __init__(self, client_id: str, rate_limit: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            client_id: OZON Client-Id（限流维度）
+            rate_limit: 资源类型到请求速率的映射，默认 OZON_RATE_LIMITS
+        """
+        self.client_id = str(client_id)
+        self.rates: Dict[str, float] = dict(rate_limit or OZON_RATE_LIMITS)
+        if "default" not in self.rates:
+            self.rates["default"] = 10
+
+        # Redis 不可用时的本地降级桶
+        self._fallback = RateLimiter(self.rates)
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+        # 等待统计：resource -> {count, waited, total_wait, max_wait}
+        self._stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"count": 0, "waited": 0, "total_wait": 0.0, "max_wait": 0.0}
+        )
+
+    def _resource(self, resource_type: str) -> str:
+        return resource_type if resource_type in self.rates else "default"
+
+    def _bucket_key(self, resource: str) -> str:
+        return f"{self.KEY_PREFIX}:{self.client_id}:{resource}"
+
+    def _penalty_key(self, resource: str) -> str:
+        return f"{self.KEY_PREFIX}:{self.client_id}:{resource}:penalty"
+
+    async def _get_state(self) -> _LoopState:
+        """获取当前事件循环的 Redis 客户端与排队锁"""
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = _LoopState()
+            self._states[loop] = state
+        redis_client = await get_redis()
+        if state.redis is not redis_client:
+            # 共享客户端（连接关闭后会重新创建）变化时重新绑定脚本
+            state.redis = redis_client
+            state.script = redis_client.register_script(_TOKEN_BUCKET_LUA)
+        return state
+
+    async def acquire(self, resource_type: str = "default", tokens: int = 1) -> float:
+        """
+        获取指定资源的令牌（必要时等待）
+
+        Args:
+            resource_type: 资源类型
+            tokens: 需要的令牌数
+
+        Returns:
+            实际等待时间（秒）
+        """
+        resource = self._resource(resource_type)
+        rate = self.rates[resource]
+        start = time.monotonic()
+        outcome = "immediate"
+
+        try:
+            state = await self._get_state()
+            lock = state.locks.get(resource)
+            if lock is None:
+                lock = state.locks[resource] = asyncio.Lock()
+
+            async with lock:
+                while True:
+                    wait_ms = await state.script(
+                        keys=[self._bucket_key(resource), self._penalty_key(resource)],
+                        args=[rate, rate, tokens],
+                    )
+                    if not wait_ms:
+                        break
+                    outcome = "waited"
+                    await asyncio.sleep(int(wait_ms) / 1000)
+        except Exception as e:
+            # Redis 异常：降级到进程内限流，保证业务可用
+            _logger.warning(
+                "Distributed rate limiter unavailable, falling back to local bucket",
+                client_id=self.client_id,
+                resource=resource,
+                error=str(e),
+            )
+            outcome = "fallback"
+            await self._fallback.acquire(resource, tokens)
+
+        waited = time.monotonic() - start
+        self._record(resource, waited, outcome)
+        return waited
+
+    async def penalize(self, resource_type: str = "default", seconds: float = 1.0) -> None:
+        """
+        收到 429 后让所有进程对该资源暂停 seconds 秒
+
+        Args:
+            resource_type: 资源类型
+            seconds: 暂停时长（通常取 Retry-After）
+        """
+        resource = self._resource(resource_type)
+        try:
+            state = await self._get_state()
+            await state.redis.set(self._penalty_key(resource), "1", px=max(1, int(seconds * 1000)))
+        except Exception as e:
+            _logger.warning(
+                "Failed to record rate limit penalty",
+                client_id=self.client_id,
+                resource=resource,
+                error=str(e),
+            )
+
+    def _record(self, resource: str, waited: float, outcome: str) -> None:
+        stats = self._stats[resource]
+        stats["count"] += 1
+        if outcome != "immediate":
+            stats["waited"] += 1
+        stats["total_wait"] += waited
+        stats["max_wait"] = max(stats["max_wait"], waited)
+
+        if PROMETHEUS_AVAILABLE:
+            _RATE_LIMIT_WAIT.labels(resource=resource).observe(waited)
+            _RATE_LIMIT_ACQUIRE.labels(resource=resource, outcome=outcome).inc()
+
+        if waited > 1:
+            _logger.debug(
+                f"Rate limit: waited {waited:.2f}s for {resource}",
+                client_id=self.client_id,
+            )
+
+    def get_wait_stats(self) -> Dict[str, Dict[str, float]]:
+        """获取本进程内各资源的等待统计"""
+        result = {}
+        for resource, stats in self._stats.items():
+            count = stats["count"] or 1
+            result[resource] = {
+                **stats,
+                "avg_wait": stats["total_wait"] / count,
+            }
+        return result
+
+    def get_available_tokens(self, resource_type: str = "default") -> float:
+        """获取可用令牌数（估算值，返回桶容量）"""
+        return self.rates[self._resource(resource_type)]
+
+
+_distributed_limiters: Dict[str, DistributedRateLimiter] = {}
+
+
+def get_ozon_rate_limiter(client_id: str) -> DistributedRateLimiter:
+    """
+    获取指定 client_id 的分布式限流器（进程内单例）
+
+    同进程内的多个 OzonAPIClient 实例共享同一个限流器，
+    从而共享排队锁与等待统计。
+    """
+    key = str(client_id)
+    limiter = _distributed_limiters.get(key)
+    if limiter is None:
+        limiter = _distributed_limiters[key] = DistributedRateLimiter(key)
+    return limiter
+
+
+def get_all_wait_stats() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """获取本进程内所有店铺的限流等待统计（client_id -> resource -> stats）"""
+    return {client_id: limiter.get_wait_stats() for client_id, limiter in _distributed_limiters.items()}
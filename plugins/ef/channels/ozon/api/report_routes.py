@@ -992,21 +992,27 @@ async def start_batch_finance_sync(
     except PermissionError:
         return {"ok": False, "error": "您没有权限操作该店铺"}
 
+    lock_acquired = False
     try:
-        import redis
-        from ..tasks.batch_finance_sync_task import batch_finance_sync_task
-
-        # 使用 Redis 锁防止并发启动
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-        lock_key = "batch_finance_sync:lock"
+        from ef_core.services.task_progress import task_progress
+        from ef_core.utils.redis import get_redis
+        from ..tasks.batch_finance_sync_task import (
+            BATCH_SYNC_LOCK_KEY,
+            BATCH_SYNC_LOCK_TTL,
+            batch_finance_sync_task,
+            release_batch_sync_lock,
+        )
 
-        # 尝试获取锁（5分钟过期）
-        if not redis_client.set(lock_key, "1", ex=300, nx=True):
+        # 使用 Redis 锁防止并发启动（5分钟过期）
+        redis_client = await get_redis()
+        lock_acquired = bool(await redis_client.set(BATCH_SYNC_LOCK_KEY, "1", ex=BATCH_SYNC_LOCK_TTL, nx=True))
+        if not lock_acquired:
             # 锁已存在，说明有任务正在运行
             return {"ok": False, "error": "批量同步任务已在运行中，请稍后再试"}
 
         # 启动异步任务
         task = batch_finance_sync_task.delay()
+        await task_progress.bind_owner(task.id, current_user.id)
 
         logger.info(f"Started batch finance sync task: {task.id}")
 
@@ -1017,11 +1023,12 @@ async def start_batch_finance_sync(
         }
     except Exception as e:
         logger.error(f"Failed to start batch finance sync: {e}")
-        # 发生错误时释放锁
-        try:
-            redis_client.delete(lock_key)
-        except:
-            pass
+        # 发生错误时释放锁（只释放本次获取的锁）
+        if lock_acquired:
+            try:
+                await release_batch_sync_lock()
+            except Exception:
+                pass
         return {"ok": False, "error": f"启动批量同步失败: {str(e)}"}
 
 
@@ -1037,16 +1044,12 @@ async def get_batch_finance_sync_progress(task_id: str):
         任务进度信息
     """
     try:
-        import redis
-        import ast
-
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        from ef_core.services.task_progress import task_progress
 
         # 从 Redis 读取进度
-        key = f"batch_finance_sync:{task_id}"
-        progress_str = redis_client.get(key)
+        progress = await task_progress.get(task_id)
 
-        if not progress_str:
+        if not progress or "status" not in progress:
             # 检查任务状态
             from celery.result import AsyncResult
             task_result = AsyncResult(task_id)
@@ -1067,9 +1070,6 @@ async def get_batch_finance_sync_progress(task_id: str):
                     "message": "未找到任务进度信息"
                 }
 
-        # 解析进度信息
-        progress = ast.literal_eval(progress_str)
-
         return progress
 
     except Exception as e:
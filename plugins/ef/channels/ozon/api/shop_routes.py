@@ -704,15 +704,17 @@ async def trigger_sync(
     task_id = f"task_{uuid.uuid4().hex[:12]}"
 
     # 立即初始化任务状态，避免查询时找不到
-    from ..services.ozon_sync import SYNC_TASKS
-    SYNC_TASKS[task_id] = {
-        "status": "pending",
-        "progress": 0,
-        "message": "任务已创建，正在启动...",
-        "started_at": datetime.now().isoformat(),
-        "type": sync_type,
-        "shop_id": shop_id
-    }
+    from ef_core.services.task_progress import task_progress
+    from ..services.sync.task_state_manager import get_task_state_manager
+    task_manager = get_task_state_manager()
+    await task_manager.create_task(
+        task_id,
+        sync_type,
+        message="任务已创建，正在启动...",
+        user_id=current_user.id,
+        status="pending",
+        shop_id=shop_id
+    )
 
     # 根据同步类型执行不同的同步任务
     async def run_sync():
@@ -729,6 +731,7 @@ async def trigger_sync(
                 if sync_type in ["all", "orders"]:
                     # 如果是全部同步，为订单生成新的任务ID
                     order_task_id = task_id if sync_type == "orders" else f"task_{uuid.uuid4().hex[:12]}"
+                    await task_progress.bind_owner(order_task_id, current_user.id)
                     logger.info(f"Calling sync_orders: shop_id={shop_id}, order_task_id={order_task_id}, mode={orders_mode}")
                     await OzonSyncService.sync_orders(shop_id, task_db, order_task_id, orders_mode)
                     logger.info(f"sync_orders completed for task: {order_task_id}")
@@ -737,14 +740,7 @@ async def trigger_sync(
                 import traceback
                 logger.error(traceback.format_exc())
                 # 更新任务状态为失败
-                SYNC_TASKS[task_id] = {
-                    "status": "failed",
-                    "progress": 0,
-                    "message": f"同步失败: {str(e)}",
-                    "error": str(e),
-                    "completed_at": datetime.now().isoformat(),
-                    "type": sync_type
-                }
+                await task_manager.fail_task(task_id, str(e))
 
     # 在后台启动同步任务（不等待完成）
     task = asyncio.create_task(run_sync())
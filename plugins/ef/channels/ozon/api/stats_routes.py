@@ -8,10 +8,10 @@ from decimal import Decimal
 from datetime import timedelta
 import logging
 import json
-import redis
 
 from ef_core.database import get_async_session
 from ef_core.api.auth import get_current_user_flexible
+from ef_core.utils.redis import get_redis
 from ..utils.datetime_utils import utcnow, get_global_timezone, calculate_date_range
 from ..models.global_settings import OzonGlobalSetting
 from sqlalchemy import select, or_
@@ -19,9 +19,6 @@ from sqlalchemy import select, or_
 router = APIRouter(tags=["ozon-stats"])
 logger = logging.getLogger(__name__)
 
-# Redis 缓存客户端
-_redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
 # 统计数据缓存 TTL（秒）
 STATS_CACHE_TTL = 60  # 1 分钟缓存
 
@@ -211,7 +208,8 @@ async def get_statistics(
     # 尝试从缓存获取
     if not skip_cache:
         try:
-            cached = _redis_client.get(cache_key)
+            redis_client = await get_redis()
+            cached = await redis_client.get(cache_key)
             if cached:
                 logger.debug(f"Statistics cache hit: {cache_key}")
                 return json.loads(cached)
@@ -454,7 +452,8 @@ async def get_statistics(
 
         # 缓存结果到 Redis
         try:
-            _redis_client.setex(cache_key, STATS_CACHE_TTL, json.dumps(result))
+            redis_client = await get_redis()
+            await redis_client.setex(cache_key, STATS_CACHE_TTL, json.dumps(result))
             logger.debug(f"Statistics cached: {cache_key}, TTL: {STATS_CACHE_TTL}s")
         except Exception as e:
             logger.warning(f"Redis cache write failed: {e}")
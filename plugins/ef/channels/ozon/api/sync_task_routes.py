@@ -4,7 +4,7 @@
 from fastapi import APIRouter, HTTPException
 import logging
 
-from ..utils.datetime_utils import utcnow
+from ef_core.services.task_progress import task_progress
 
 router = APIRouter(prefix="/sync", tags=["ozon-sync-tasks"])
 logger = logging.getLogger(__name__)
@@ -15,7 +15,7 @@ async def get_task_status(task_id: str):
     """获取同步任务状态"""
     from ..services import OzonSyncService
 
-    status = OzonSyncService.get_task_status(task_id)
+    status = await OzonSyncService.get_task_status(task_id)
 
     if not status:
         raise HTTPException(status_code=404, detail="Task not found")
@@ -30,21 +30,15 @@ async def get_task_status(task_id: str):
 async def debug_sync_status():
     """Debug endpoint to test sync status"""
     from ..services import OzonSyncService
-    from ..services.ozon_sync import SYNC_TASKS
 
     # Add a test task
-    SYNC_TASKS['debug_task'] = {
-        'status': 'running',
-        'progress': 75,
-        'message': 'Debug task',
-        'started_at': utcnow().isoformat()
-    }
+    await task_progress.start('debug_task', 'debug', message='Debug task', progress=75)
 
     # Get all tasks
     return {
         "ok": True,
-        "tasks": SYNC_TASKS,
-        "debug_task_status": OzonSyncService.get_task_status('debug_task')
+        "tasks": await task_progress.list_tasks(),
+        "debug_task_status": await OzonSyncService.get_task_status('debug_task')
     }
 
 
@@ -53,11 +47,7 @@ async def get_sync_status(
     task_id: str
 ):
     """获取同步任务状态"""
-    # Simplified version for debugging
-    from ..services.ozon_sync import SYNC_TASKS
-
-    # Get the task status directly
-    status = SYNC_TASKS.get(task_id)
+    status = await task_progress.get(task_id)
 
     if not status:
         # Return a 404 response
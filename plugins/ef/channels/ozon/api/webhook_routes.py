@@ -12,8 +12,11 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from ef_core.database import get_async_session
+from ef_core.middleware.auth import require_role
+from ef_core.models.users import User
 from ..models.ozon_shops import OzonShop
 from ..webhooks.handler import OzonWebhookHandler
+from ..webhooks.worker import get_queue_stats, get_webhook_worker_pool
 from ..services.shop_cache import get_shop_cache
 from ..utils.datetime_utils import utcnow
 
@@ -294,9 +297,11 @@ async def receive_webhook(
             webhook_secret=webhook_secret or ""  # 使用空字符串如果没有配置secret
         )
 
-        # 处理Webhook事件
+        # 入队Webhook事件（立即应答OZON，由 worker 池异步处理）
         # event_type可能来自X-Event-Type头或payload的message_type字段
-        logger.info(f"Processing webhook event: type={event_type}, shop_id={shop.id}, event_id={x_event_id}")
+        logger.info(f"Queueing webhook event: type={event_type}, shop_id={shop.id}, event_id={x_event_id}")
+        # worker 池由应用启动时启动；这里兜底（未经应用生命周期启动的进程，幂等）
+        get_webhook_worker_pool().ensure_started()
 
         result = await webhook_handler.handle_webhook(
             event_type=event_type,  # 使用提取出的event_type（支持TYPE_*格式）
@@ -307,11 +312,11 @@ async def receive_webhook(
 
         # 记录处理结果
         if result.get("success"):
-            logger.info(f"Webhook processed successfully: {result}")
+            logger.info(f"Webhook queued successfully: {result}")
             # 按OZON规范：成功处理返回 HTTP 200 + {result, body, sign, push_type, time}
             return ozon_success_response(signature=actual_signature, push_type=event_type, request_time=request_time)
         else:
-            logger.error(f"Webhook processing failed: {result}")
+            logger.error(f"Webhook queueing failed: {result}")
 
             # 按OZON API规范：处理失败应返回 HTTP 4xx/5xx + {error: {code, message, details}}
             # 参考文档：section/如果有一个错误
@@ -362,6 +367,25 @@ async def webhook_health():
     }
 
 
+@router.get("/queue/stats")
+async def webhook_queue_stats(
+    current_user: User = Depends(require_role("admin"))
+):
+    """
+    Webhook 队列状态（仅超级管理员）
+
+    返回各分片的积压（未确认/未投递）、最旧消息等待时间、消费进程，以及死信数量。
+    Webhook 路由前缀对 OZON 回调公开，这里由路由依赖单独校验登录和角色。
+    """
+    try:
+        stats = await get_queue_stats()
+        stats["worker_running"] = get_webhook_worker_pool().running
+        return stats
+    except Exception as e:
+        logger.error(f"Failed to get webhook queue stats: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get queue stats: {str(e)}")
+
+
 @router.get("/events")
 async def list_webhook_events(
     shop_id: int = None,
@@ -8,7 +8,7 @@ from typing import Optional, Tuple
 
 from sqlalchemy import (
     Column, String, Integer, BigInteger, Numeric,
-    DateTime, JSON, ForeignKey, Index, UniqueConstraint, Text, Date
+    DateTime, JSON, ForeignKey, Index, UniqueConstraint, Text, Date, text
 )
 from sqlalchemy.dialects.postgresql import JSONB
 
@@ -75,6 +75,9 @@ class OzonFinanceTransaction(Base):
     __table_args__ = (
         # 唯一约束：同一个operation_id + ozon_sku组合只能有一条记录（扁平化后的唯一性）
         UniqueConstraint("shop_id", "operation_id", "ozon_sku", name="uq_ozon_finance_transaction"),
+        # 无商品明细的记录 ozon_sku 为空，唯一约束不约束 NULL，单独用部分唯一索引去重
+        Index("uq_ozon_finance_transaction_no_sku", "shop_id", "operation_id",
+              unique=True, postgresql_where=text("ozon_sku IS NULL")),
         # 按店铺+日期查询（高频）
         Index("idx_ozon_finance_shop_date", "shop_id", "operation_date"),
         # 按发货单号查询（关联订单）
@@ -7,7 +7,7 @@ from decimal import Decimal
 from typing import Optional, Dict, Any, List
 from sqlalchemy import (
     Column, String, Integer, BigInteger, Numeric, Boolean, DateTime,
-    Text, ForeignKey, Index, UniqueConstraint, TIMESTAMP
+    Text, ForeignKey, Index, UniqueConstraint, TIMESTAMP, Computed
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import JSONB
@@ -132,6 +132,12 @@ class OzonCategoryAttribute(Base):
     )
 
 
+# 字典值搜索文本生成表达式（查询词需按 normalize_search_text 做同样的归一化）
+DICT_VALUE_SEARCH_TEXT_SQL = (
+    "lower(translate(coalesce(value_zh, value) || ' ' || coalesce(value_ru, ''), 'Ёё', 'Ее'))"
+)
+
+
 class OzonAttributeDictionaryValue(Base):
     """OZON属性字典值缓存表"""
     __tablename__ = "ozon_attribute_dictionary_values"
@@ -149,6 +155,13 @@ class OzonAttributeDictionaryValue(Base):
     info_ru = Column(Text, nullable=True, comment="附加信息俄文")
     picture = Column(String(500))
 
+    # 本地搜索文本（中文+俄文，小写，ё 归一为 е），由数据库自动生成
+    search_text = Column(
+        Text,
+        Computed(DICT_VALUE_SEARCH_TEXT_SQL, persisted=True),
+        comment="本地搜索文本（自动生成）"
+    )
+
     # 缓存信息
     cached_at = Column(DateTime(timezone=True), default=utcnow)
 
@@ -161,6 +174,9 @@ class OzonAttributeDictionaryValue(Base):
         # 全文搜索索引
         Index("idx_ozon_dict_values_search", "value", postgresql_using="gin",
               postgresql_ops={"value": "gin_trgm_ops"}),
+        # 本地字典值搜索（子串 LIKE 与 word_similarity 模糊匹配）
+        Index("idx_ozon_dict_values_search_text", "search_text", postgresql_using="gin",
+              postgresql_ops={"search_text": "gin_trgm_ops"}),
         {"extend_existing": True}
     )
 
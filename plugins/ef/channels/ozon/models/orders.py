@@ -83,6 +83,7 @@ class OzonPosting(Base):
     
     # 原始数据
     raw_payload = Column(JSONB)
+    payload_hash = Column(String(32), comment="raw_payload 内容哈希（同步时跳过未变化的 posting）")
 
     # 业务字段（Posting维度）
     material_cost = Column(Numeric(18, 2), comment="物料成本（包装、标签等）")
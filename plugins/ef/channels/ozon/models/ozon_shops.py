@@ -113,6 +113,12 @@ class OzonShop(Base):
         comment="最后同步时间"
     )
 
+    order_sync_watermark: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+        comment="订单增量同步水位（上次成功拉取的截止时间）"
+    )
+
     # 发货托管（启用后，发货员可以看到该店铺的订单）
     shipping_managed: Mapped[bool] = mapped_column(
         Boolean,
@@ -162,6 +168,7 @@ class OzonShop(Base):
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
             "last_sync_at": self.last_sync_at.isoformat() if self.last_sync_at else None,
+            "order_sync_watermark": self.order_sync_watermark.isoformat() if self.order_sync_watermark else None,
             "current_balance_rub": float(self.current_balance_rub) if self.current_balance_rub else None,
             "balance_updated_at": self.balance_updated_at.isoformat() if self.balance_updated_at else None,
         }
@@ -1,7 +1,7 @@
 """
 选品助手数据模型
 """
-from sqlalchemy import Column, Integer, String, Numeric, DateTime, JSON, Text, Index, UniqueConstraint, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Numeric, DateTime, JSON, Text, Index, UniqueConstraint, ForeignKey, Boolean, text
 from sqlalchemy.sql import func
 from datetime import datetime
 from decimal import Decimal as D
@@ -114,6 +114,20 @@ class ProductSelectionItem(Base):
         Index('idx_commission', 'rfbs_commission_low', 'rfbs_commission_mid',
               'fbp_commission_low', 'fbp_commission_mid'),
         Index('idx_batch_read', 'batch_id', 'is_read'),
+        # 导入合并键（INSERT ... ON CONFLICT）：用户ID + 商品ID + 商品名称（优先俄文名）
+        Index('uq_selection_user_product_name', 'user_id', 'product_id',
+              text("COALESCE(product_name_ru, product_name_cn, '')"), unique=True),
+        # 搜索游标分页：每种排序一个 (user_id, 排序列, id) 索引，空值顺序与查询一致（降序反向扫描）
+        Index('idx_selection_user_id', 'user_id', 'id'),
+        Index('idx_selection_user_created', 'user_id', 'created_at', 'id'),
+        Index('idx_selection_user_sales', 'user_id', text('monthly_sales_volume NULLS FIRST'), 'id'),
+        Index('idx_selection_user_price', 'user_id', text('current_price NULLS FIRST'), 'id'),
+        Index('idx_selection_user_weight', 'user_id', text('package_weight NULLS FIRST'), 'id'),
+        # 商品名称子串搜索（ILIKE）
+        Index('idx_selection_name_ru_trgm', 'product_name_ru', postgresql_using='gin',
+              postgresql_ops={'product_name_ru': 'gin_trgm_ops'}),
+        Index('idx_selection_name_cn_trgm', 'product_name_cn', postgresql_using='gin',
+              postgresql_ops={'product_name_cn': 'gin_trgm_ops'}),
     )
 
     def to_dict(self):
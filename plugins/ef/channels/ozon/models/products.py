@@ -117,6 +117,7 @@ class OzonProduct(Base):
     last_sync_at = Column(DateTime(timezone=True))
     sync_status = Column(String(50), default="pending")  # pending/syncing/success/failed
     sync_error = Column(String(1000))
+    sync_content_hash = Column(String(64), comment="上次同步的OZON数据内容哈希（未变化时跳过映射与更新）")
 
     # 商品上架流程状态
     listing_status = Column(String(50), comment="上架状态: draft/media_ready/import_submitted/created/priced/live/ready_for_sale/error")
@@ -125,7 +125,7 @@ class OzonWebhookEvent(Base):
     processed_at = Column(DateTime(timezone=True))
     retry_count = Column(Integer, default=0)
 
-    # 幂等性
+    # 幂等性（去重由 event_id 唯一约束保证，此列仅保留用于展示）
     idempotency_key = Column(String(200))
 
     # 错误信息
@@ -145,7 +145,6 @@ class OzonWebhookEvent(Base):
     __table_args__ = (
         Index("idx_ozon_webhook_status", "status", "created_at"),
         Index("idx_ozon_webhook_shop", "shop_id", "event_type", "created_at"),
-        Index("idx_ozon_webhook_idempotency", "idempotency_key"),
         Index("idx_ozon_webhook_entity", "entity_type", "entity_id")
     )
 
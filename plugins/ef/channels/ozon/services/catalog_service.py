@@ -3,16 +3,20 @@ OZON类目服务
 负责类目、属性、字典值的拉取、缓存与查询
 """
 import asyncio
-import json
-import os
-from pathlib import Path
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import select, and_, or_, update
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_, update, bindparam, case, func, literal
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from ef_core.utils.logger import get_logger
 from ..api.client import OzonAPIClient
+from ..utils.text_search import min_search_length, normalize_search_text
+from .category_tree_artifact import (
+    category_tree_artifact_exists,
+    generate_category_tree_artifact,
+    get_category_tree_store,
+)
 from ..models.listing import (
     OzonCategory,
     OzonCategoryAttribute,
@@ -22,6 +26,49 @@ from ..models.listing import (
 logger = get_logger(__name__)
 
 
+# 批量写入每批行数（asyncpg 单条语句参数上限 32767）
+WRITE_BATCH_SIZE = 1000
+# 字典值分页大小
+DICTIONARY_PAGE_SIZE = 2000
+# 批量同步时字典值默认并发数
+DEFAULT_DICTIONARY_CONCURRENCY = 4
+# 本地字典值搜索：补充模糊匹配的最短查询长度（pg_trgm 按三元组比较）
+FUZZY_MIN_QUERY_LENGTH = 3
+
+
+def _flatten_category_tree(
+    categories: List[Dict[str, Any]],
+    parent_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    展开类目树（先序遍历，顺序与逐层递归保存一致）
+
+    兼容两种字段名：
+    1-2级使用 description_category_id 和 category_name
+    3级（叶子）使用 type_id 和 type_name
+    """
+    nodes = []
+    stack = [(data, parent_id, 0) for data in reversed(categories)]
+    while stack:
+        data, parent, level = stack.pop()
+        category_id = data.get("description_category_id") or data.get("type_id")
+        if not category_id:
+            logger.warning(f"Category data missing ID, skipping: {data}")
+            continue
+
+        children = data.get("children") or []
+        nodes.append({
+            "category_id": category_id,
+            "parent_id": parent,
+            "name": data.get("category_name") or data.get("type_name", ""),
+            "is_leaf": len(children) == 0,
+            "is_disabled": data.get("disabled", False),
+            "level": level,
+        })
+        stack.extend((child, category_id, level + 1) for child in reversed(children))
+    return nodes
+
+
 class CatalogService:
     """OZON类目服务"""
 
@@ -40,22 +87,23 @@ class CatalogService:
         self,
         root_category_id: Optional[int] = None,
         force_refresh: bool = False,
-        progress_callback: Optional[callable] = None
+        progress_callback: Optional[Callable[..., Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
         同步类目树（中文+俄文双语）
 
+        中文、俄文类目树并发拉取后在内存中展开合并，与一次性加载的现有类目比对，
+        只写入新增和发生变化的类目（批量 INSERT / 按主键批量 UPDATE）。
+
         Args:
             root_category_id: 根类目ID(None表示从顶层开始)
             force_refresh: 是否强制刷新
-            progress_callback: 进度回调函数 (current, total, category_name)
+            progress_callback: 异步进度回调函数 (current, total, category_name)
 
         Returns:
             同步结果
         """
         try:
-            from datetime import datetime, timezone
-            from sqlalchemy import func
             logger.info(f"Starting bilingual category tree sync, root={root_category_id}, force={force_refresh}")
 
             # 检查缓存是否过期
@@ -67,107 +115,150 @@ class CatalogService:
                     logger.info(f"Category cache exists ({cached_count} categories), skipping sync")
                     return {"success": True, "cached": True, "total_categories": cached_count}
 
-            # 记录同步开始时间
-            sync_start_time = datetime.now(timezone.utc)
-
-            # 第一步：同步中文
-            logger.info("Step 1/2: Syncing Chinese names...")
-            zh_response = await self.client.get_category_tree(
-                category_id=root_category_id,
-                language="ZH_HANS"
+            # 第一步：并发拉取中文、俄文类目树
+            logger.info("Step 1/3: Fetching Chinese and Russian category trees...")
+            zh_response, ru_response = await asyncio.gather(
+                self.client.get_category_tree(category_id=root_category_id, language="ZH_HANS"),
+                self.client.get_category_tree(category_id=root_category_id, language="DEFAULT"),  # OZON默认语言为俄文
+                return_exceptions=True
             )
 
+            if isinstance(zh_response, BaseException):
+                raise zh_response
             if not zh_response.get("result"):
                 error_msg = zh_response.get("error", {}).get("message", "Unknown error")
                 logger.error(f"Failed to fetch Chinese category tree: {error_msg}")
                 return {"success": False, "error": error_msg}
 
-            zh_categories = zh_response["result"]
-            total_count = self._count_categories_recursive(zh_categories)
+            # 同一 category_id 出现多次时以最后一次为准（与原逐个保存时的覆盖顺序一致）
+            nodes: Dict[int, Dict[str, Any]] = {}
+            for node in _flatten_category_tree(zh_response["result"], root_category_id):
+                nodes[node["category_id"]] = node
+            total_count = len(nodes)
             logger.info(f"Total categories to sync: {total_count}")
 
-            # 初始化进度追踪
-            progress_state = {"current": 0}
-            synced_count = 0
+            ru_names: Optional[Dict[int, str]] = None
+            if isinstance(ru_response, BaseException) or not ru_response.get("result"):
+                logger.warning("Failed to fetch Russian category tree, keeping existing Russian names")
+            else:
+                ru_names = {
+                    node["category_id"]: node["name"]
+                    for node in _flatten_category_tree(ru_response["result"], root_category_id)
+                }
+
+            # 第二步：与现有类目比对，批量写入（中文、俄文名称一次合并）
+            logger.info("Step 2/3: Diffing against cached categories...")
+            existing_rows = (await self.db.execute(
+                select(
+                    OzonCategory.id,
+                    OzonCategory.category_id,
+                    OzonCategory.parent_id,
+                    OzonCategory.name,
+                    OzonCategory.name_zh,
+                    OzonCategory.name_ru,
+                    OzonCategory.is_leaf,
+                    OzonCategory.is_disabled,
+                    OzonCategory.is_deprecated,
+                    OzonCategory.level,
+                ).order_by(OzonCategory.id)
+            )).all()
+            existing = {}
+            for row in existing_rows:
+                existing.setdefault(row.category_id, row)
+
+            sync_time = datetime.now(timezone.utc)
+            node_list = list(nodes.values())
             new_count = 0
             updated_count = 0
 
-            # 递归保存中文类目
-            for category_data in zh_categories:
-                result = await self._save_category_recursive(
-                    category_data,
-                    parent_id=root_category_id,
-                    language="zh",
-                    progress_state=progress_state,
-                    total_count=total_count,
-                    progress_callback=progress_callback
-                )
-                synced_count += result['count']
-                new_count += result['new']
-                updated_count += result['updated']
-
-            # 提交中文数据
-            await self.db.commit()
-            logger.info(f"Chinese sync completed: {synced_count} categories")
-
-            # 第二步：同步俄文
-            logger.info("Step 2/2: Syncing Russian names...")
-            ru_response = await self.client.get_category_tree(
-                category_id=root_category_id,
-                language="DEFAULT"  # OZON默认语言为俄文
-            )
+            for start in range(0, len(node_list), WRITE_BATCH_SIZE):
+                batch = node_list[start:start + WRITE_BATCH_SIZE]
+                new_rows = []
+                changed_rows = []
+
+                for node in batch:
+                    category_id = node["category_id"]
+                    row = existing.get(category_id)
+
+                    # 俄文树缺失该类目或拉取失败时保留已有俄文名称
+                    name_ru = row.name_ru if row else None
+                    if ru_names is not None:
+                        name_ru = ru_names.get(category_id, name_ru)
+
+                    values = {
+                        "parent_id": node["parent_id"],  # OZON可能会调整类目结构
+                        "name": node["name"] or name_ru or "",  # 主显示字段（优先中文）
+                        "name_zh": node["name"],
+                        "name_ru": name_ru,
+                        "is_leaf": node["is_leaf"],
+                        "is_disabled": node["is_disabled"],
+                        "is_deprecated": False,  # 重新激活已废弃的类目
+                        "level": node["level"],
+                    }
+
+                    if row is None:
+                        new_rows.append({
+                            "category_id": category_id,
+                            **values,
+                            "cached_at": sync_time,
+                            "last_updated_at": sync_time,
+                        })
+                    elif any(getattr(row, key) != value for key, value in values.items()):
+                        changed_rows.append({"id": row.id, **values, "last_updated_at": sync_time})
 
-            if not ru_response.get("result"):
-                logger.warning("Failed to fetch Russian category tree, skipping Russian names")
-            else:
-                ru_categories = ru_response["result"]
-                progress_state = {"current": 0}
-
-                # 递归保存俄文类目
-                for category_data in ru_categories:
-                    await self._save_category_recursive(
-                        category_data,
-                        parent_id=root_category_id,
-                        language="ru",
-                        progress_state=progress_state,
-                        total_count=total_count,
-                        progress_callback=progress_callback
+                if new_rows:
+                    await self.db.execute(
+                        insert(OzonCategory)
+                        .values(new_rows)
+                        .on_conflict_do_nothing(index_elements=["category_id", "parent_id"])
                     )
+                if changed_rows:
+                    await self.db.execute(update(OzonCategory), changed_rows)
+
+                new_count += len(new_rows)
+                updated_count += len(changed_rows)
+
+                if progress_callback:
+                    await progress_callback(start + len(batch), total_count, batch[-1]["name"])
+
+            # 第三步：标记废弃的类目（仅全量同步：本次类目树中不存在的类目）
+            deprecated_count = 0
+            if root_category_id is None:
+                logger.info("Step 3/3: Marking deprecated categories...")
+                deprecated_ids = [
+                    row.id for row in existing_rows
+                    if row.category_id not in nodes and not row.is_deprecated
+                ]
+                for start in range(0, len(deprecated_ids), WRITE_BATCH_SIZE):
+                    await self.db.execute(
+                        update(OzonCategory)
+                        .where(OzonCategory.id.in_(deprecated_ids[start:start + WRITE_BATCH_SIZE]))
+                        .values(is_deprecated=True, last_updated_at=sync_time)
+                    )
+                deprecated_count = len(deprecated_ids)
 
-                await self.db.commit()
-                logger.info("Russian sync completed")
-
-            # 第三步：更新主显示字段（name = name_zh or name_ru）
-            logger.info("Step 3/3: Updating primary display fields...")
-            await self.db.execute(
-                update(OzonCategory)
-                .values(name=func.coalesce(OzonCategory.name_zh, OzonCategory.name_ru))
-            )
-            await self.db.commit()
-
-            # 标记废弃的类目（未在本次同步中更新的类目）
-            deprecated_result = await self.db.execute(
-                update(OzonCategory)
-                .where(OzonCategory.last_updated_at < sync_start_time)
-                .where(OzonCategory.is_deprecated == False)
-                .values(is_deprecated=True)
-            )
-            deprecated_count = deprecated_result.rowcount
             await self.db.commit()
 
             if deprecated_count > 0:
                 logger.info(f"Marked {deprecated_count} categories as deprecated")
 
-            logger.info(f"Bilingual category tree sync completed: {synced_count} categories ({new_count} new, {updated_count} updated), {deprecated_count} deprecated")
+            unchanged_count = total_count - new_count - updated_count
+            logger.info(
+                f"Bilingual category tree sync completed: {total_count} categories "
+                f"({new_count} new, {updated_count} updated, {unchanged_count} unchanged), "
+                f"{deprecated_count} deprecated"
+            )
 
-            # 生成前端可用的 JS 文件
-            await self._generate_category_tree_js()
+            # 类目有变化（或产物尚未生成）时重新生成前端使用的类目树产物
+            if new_count or updated_count or deprecated_count or not category_tree_artifact_exists():
+                await self._generate_category_tree_js()
 
             return {
                 "success": True,
-                "total_categories": synced_count,
+                "total_categories": total_count,
                 "new_categories": new_count,
                 "updated_categories": updated_count,
+                "unchanged_categories": unchanged_count,
                 "deprecated_categories": deprecated_count,
                 "cached": False
             }
@@ -177,138 +268,6 @@ class CatalogService:
             await self.db.rollback()
             return {"success": False, "error": str(e)}
 
-    def _count_categories_recursive(self, categories: List[Dict[str, Any]]) -> int:
-        """递归计算类目树中的总类目数"""
-        count = 0
-        for category_data in categories:
-            count += 1
-            children = category_data.get("children", [])
-            if children:
-                count += self._count_categories_recursive(children)
-        return count
-
-    async def _save_category_recursive(
-        self,
-        category_data: Dict[str, Any],
-        parent_id: Optional[int] = None,
-        language: str = "zh",
-        level: int = 0,
-        progress_state: Optional[Dict] = None,
-        total_count: int = 0,
-        progress_callback: Optional[callable] = None
-    ) -> Dict[str, int]:
-        """
-        递归保存类目（包含子类目）
-
-        Args:
-            category_data: 类目数据
-            parent_id: 父类目ID
-            language: 语言（zh=中文, ru=俄文）
-            level: 层级深度
-            progress_state: 进度状态 {'current': 0}
-            total_count: 总类目数
-            progress_callback: 进度回调函数 (current, total, category_name)
-
-        Returns:
-            保存结果 {'count': 总数, 'new': 新增数, 'updated': 更新数}
-        """
-        # 兼容两种字段名：
-        # 1-2级使用 description_category_id 和 category_name
-        # 3级（叶子）使用 type_id 和 type_name
-        category_id = category_data.get("description_category_id") or category_data.get("type_id")
-        if not category_id:
-            logger.warning(f"Category data missing ID, skipping: {category_data}")
-            return {'count': 0, 'new': 0, 'updated': 0}
-
-        # 检查类目是否已存在（仅用 category_id 查询，因为 OZON 可能会调整类目的父级关系）
-        stmt = select(OzonCategory).where(OzonCategory.category_id == category_id)
-        result = await self.db.execute(stmt)
-        existing = result.scalar_one_or_none()
-
-        # 兼容两种字段名
-        category_name = category_data.get("category_name") or category_data.get("type_name", "")
-        children = category_data.get("children", [])
-        is_disabled = category_data.get("disabled", False)
-
-        # 判断是否叶子类目：初步判断，后续可能更新
-        is_leaf = len(children) == 0
-
-        is_new = False
-        if existing:
-            # 更新现有类目
-            if language == "zh":
-                existing.name_zh = category_name
-            elif language == "ru":
-                existing.name_ru = category_name
-
-            # 仅在中文同步时更新结构字段
-            if language == "zh":
-                existing.parent_id = parent_id  # 更新父类目ID（OZON可能会调整类目结构）
-                existing.is_leaf = is_leaf
-                existing.is_disabled = is_disabled
-                existing.is_deprecated = False  # 重新激活已废弃的类目
-                existing.level = level
-                existing.last_updated_at = datetime.now(timezone.utc)
-        else:
-            # 创建新类目（仅在中文同步时创建）
-            if language == "zh":
-                category = OzonCategory(
-                    category_id=category_id,
-                    parent_id=parent_id,
-                    name=category_name,  # 主显示字段（临时设置为中文，后续会被COALESCE更新）
-                    name_zh=category_name,
-                    is_leaf=is_leaf,
-                    is_disabled=is_disabled,
-                    level=level
-                )
-                self.db.add(category)
-                # 立即flush确保后续查询能找到此记录，避免重复插入
-                await self.db.flush()
-                is_new = True
-            else:
-                # 俄文同步时类目应该已存在，记录警告
-                logger.warning(f"Category {category_id} not found during Russian sync, skipping")
-                return {'count': 0, 'new': 0, 'updated': 0}
-
-        # 更新进度（仅在中文同步时）
-        if language == "zh" and progress_state is not None:
-            progress_state['current'] += 1
-            if progress_callback:
-                progress_callback(
-                    progress_state['current'],
-                    total_count,
-                    category_name
-                )
-
-        result = {
-            'count': 1,
-            'new': 1 if is_new else 0,
-            'updated': 0 if is_new else 1
-        }
-
-        # 递归处理子类目（OZON API已在第一次调用时返回完整树结构）
-        if children:
-            for child_data in children:
-                try:
-                    child_result = await self._save_category_recursive(
-                        child_data,
-                        parent_id=category_id,
-                        language=language,
-                        level=level + 1,
-                        progress_state=progress_state,
-                        total_count=total_count,
-                        progress_callback=progress_callback
-                    )
-                    result['count'] += child_result['count']
-                    result['new'] += child_result['new']
-                    result['updated'] += child_result['updated']
-                except Exception as e:
-                    child_id = child_data.get("description_category_id") or child_data.get("type_id")
-                    child_name = child_data.get("category_name") or child_data.get("type_name")
-                    logger.error(f"Failed to save child {child_id} ({child_name}): {e}", exc_info=True)
-
-        return result
-
     async def sync_category_attributes(
         self,
         category_id: int,
@@ -318,6 +277,8 @@ class CatalogService:
         """
         同步类目属性（中文+俄文双语）
 
+        中文、俄文属性并发拉取，按 attribute_id 合并后一次 INSERT ... ON CONFLICT 写入。
+
         Args:
             category_id: 类目ID
             force_refresh: 是否强制刷新
@@ -327,9 +288,6 @@ class CatalogService:
             同步结果
         """
         try:
-            from datetime import timedelta
-            from sqlalchemy import func as sql_func
-
             # 检查缓存：8 天时间窗口
             needs_ru_sync = False
             sync_start_time = datetime.now(timezone.utc)
@@ -369,7 +327,7 @@ class CatalogService:
                         logger.info(f"Category {category_id} has {cached_count - recent_count} expired attrs, need full sync")
 
             # 查询类目信息（获取parent_id作为description_category_id）
-            cat_stmt = select(OzonCategory).where(OzonCategory.category_id == category_id)
+            cat_stmt = select(OzonCategory).where(OzonCategory.category_id == category_id).limit(1)
             cat_result = await self.db.execute(cat_stmt)
             category = cat_result.scalar_one_or_none()
 
@@ -380,16 +338,24 @@ class CatalogService:
 
             synced_count = 0
 
-            # 如果只需要补充俄文，跳过中文同步
-            if not needs_ru_sync:
-                # 第一步：同步中文属性
-                logger.info(f"Step 1/2: Syncing Chinese attributes for category {category_id}...")
-                zh_response = await self.client.get_category_attributes(
+            def fetch_attributes(lang: str):
+                return self.client.get_category_attributes(
                     category_id=category.parent_id,  # 父类别ID
                     type_id=category_id,  # 商品类型ID（叶子节点）
-                    language="ZH_HANS"
+                    language=lang
+                )
+
+            # 第一步：拉取属性（如果只需要补充俄文，跳过中文）
+            if not needs_ru_sync:
+                logger.info(f"Step 1/2: Fetching Chinese and Russian attributes for category {category_id}...")
+                zh_response, ru_response = await asyncio.gather(
+                    fetch_attributes("ZH_HANS"),
+                    fetch_attributes("DEFAULT"),  # OZON默认语言为俄文
+                    return_exceptions=True
                 )
 
+                if isinstance(zh_response, BaseException):
+                    raise zh_response
                 if not zh_response.get("result"):
                     error_msg = zh_response.get("error", {}).get("message", "Unknown error")
 
@@ -404,63 +370,56 @@ class CatalogService:
 
                     logger.error(f"Failed to fetch Chinese category attributes: {error_msg}")
                     return {"success": False, "error": error_msg}
-
-                zh_attributes = zh_response["result"]
-
-                for attr_data in zh_attributes:
-                    await self._save_category_attribute(category_id, attr_data, language="zh")
-                    synced_count += 1
-
-                logger.info(f"Chinese attributes synced: {synced_count}")
             else:
-                logger.info(f"Skipping Chinese sync (already cached), syncing Russian only...")
-
-            # 第二步：同步俄文属性
-            logger.info(f"Step 2/2: Syncing Russian attributes for category {category_id}...")
-            ru_response = await self.client.get_category_attributes(
-                category_id=category.parent_id,
-                type_id=category_id,
-                language="DEFAULT"  # OZON默认语言为俄文
-            )
+                logger.info(f"Step 1/2: Skipping Chinese sync (already cached), fetching Russian only...")
+                zh_response = None
+                ru_response = await fetch_attributes("DEFAULT")
 
-            if ru_response.get("result"):
-                ru_attributes = ru_response["result"]
-                for attr_data in ru_attributes:
-                    await self._save_category_attribute(category_id, attr_data, language="ru")
-                logger.info("Russian attributes synced")
-            else:
+            ru_attrs: Optional[Dict[int, Dict[str, Any]]] = None
+            if isinstance(ru_response, BaseException) or not ru_response.get("result"):
                 logger.warning("Failed to fetch Russian attributes, skipping Russian names")
+            else:
+                ru_attrs = {attr["id"]: attr for attr in ru_response["result"] if attr.get("id")}
+
+            # 第二步：批量写入
+            logger.info(f"Step 2/2: Saving attributes for category {category_id}...")
+            if zh_response is not None:
+                rows: Dict[int, Dict[str, Any]] = {}
+                for attr_data in zh_response["result"]:
+                    attribute_id = attr_data.get("id")
+                    if not attribute_id:
+                        continue
+                    ru_data = ru_attrs.get(attribute_id) if ru_attrs is not None else None
+                    rows[attribute_id] = self._category_attribute_row(
+                        category_id, attr_data, ru_data, sync_start_time
+                    )
 
-            # 第三步：更新主显示字段
-            from sqlalchemy import func
-            await self.db.execute(
-                update(OzonCategoryAttribute)
-                .where(OzonCategoryAttribute.category_id == category_id)
-                .values(
-                    name=func.coalesce(OzonCategoryAttribute.name_zh, OzonCategoryAttribute.name_ru),
-                    description=func.coalesce(OzonCategoryAttribute.description_zh, OzonCategoryAttribute.description_ru),
-                    group_name=func.coalesce(OzonCategoryAttribute.group_name_zh, OzonCategoryAttribute.group_name_ru)
-                )
-            )
+                await self._upsert_category_attributes(list(rows.values()))
+                synced_count = len(rows)
+                logger.info(f"Attributes synced: {synced_count}")
+            elif ru_attrs:
+                await self._update_category_attributes_ru(category_id, ru_attrs, sync_start_time)
+                logger.info("Russian attributes synced")
 
-            # 第四步：标记废弃的特征（本次同步未更新的）
-            deprecated_result = await self.db.execute(
-                update(OzonCategoryAttribute)
-                .where(
-                    and_(
-                        OzonCategoryAttribute.category_id == category_id,
-                        OzonCategoryAttribute.cached_at < sync_start_time,
-                        OzonCategoryAttribute.is_deprecated == False
+            # 标记废弃的特征（本次同步未更新的；俄文补充失败时什么都没更新，不做标记）
+            deprecated_count = 0
+            if zh_response is not None or ru_attrs:
+                deprecated_result = await self.db.execute(
+                    update(OzonCategoryAttribute)
+                    .where(
+                        and_(
+                            OzonCategoryAttribute.category_id == category_id,
+                            OzonCategoryAttribute.cached_at < sync_start_time,
+                            OzonCategoryAttribute.is_deprecated == False
+                        )
                     )
+                    .values(is_deprecated=True)
                 )
-                .values(is_deprecated=True)
-            )
-            deprecated_count = deprecated_result.rowcount
+                deprecated_count = deprecated_result.rowcount
             if deprecated_count > 0:
                 logger.info(f"Marked {deprecated_count} attributes as deprecated for category {category_id}")
 
             # 注意：不在这里commit，由外层调用者统一commit
-            # await self.db.flush()
 
             logger.info(f"Bilingual sync completed: {synced_count} attributes for category {category_id}")
 
@@ -476,82 +435,103 @@ class CatalogService:
             await self.db.rollback()
             return {"success": False, "error": str(e)}
 
-    async def _save_category_attribute(
-        self,
+    @staticmethod
+    def _category_attribute_row(
         category_id: int,
         attr_data: Dict[str, Any],
-        language: str = "zh"
-    ):
-        """保存单个类目属性（支持双语）"""
-        attribute_id = attr_data.get("id")
-        if not attribute_id:
-            return
-
-        # 检查是否存在
-        stmt = select(OzonCategoryAttribute).where(
-            and_(
-                OzonCategoryAttribute.category_id == category_id,
-                OzonCategoryAttribute.attribute_id == attribute_id
-            )
-        )
-        existing = await self.db.scalar(stmt)
-
+        ru_data: Optional[Dict[str, Any]],
+        cached_at: datetime
+    ) -> Dict[str, Any]:
+        """合并中文/俄文属性数据为一行（俄文缺失时为 None，写入时保留已有俄文）"""
         name = attr_data.get("name", "")
         description = attr_data.get("description", "")
         group_name = attr_data.get("group_name")
+        group_name_ru = ru_data.get("group_name") if ru_data is not None else None
+
+        return {
+            "category_id": category_id,
+            "attribute_id": attr_data["id"],
+            "name": name,  # 主显示字段（优先中文）
+            "name_zh": name,
+            "name_ru": ru_data.get("name", "") if ru_data is not None else None,
+            "description": description,
+            "description_zh": description,
+            "description_ru": ru_data.get("description", "") if ru_data is not None else None,
+            "attribute_type": attr_data.get("type", "string"),
+            "is_required": attr_data.get("is_required", False),
+            "is_collection": attr_data.get("is_collection", False),
+            "is_aspect": attr_data.get("is_aspect", False),
+            "dictionary_id": attr_data.get("dictionary_id"),
+            "category_dependent": attr_data.get("category_dependent", False),
+            "group_id": attr_data.get("group_id"),
+            "group_name": group_name if group_name is not None else group_name_ru,
+            "group_name_zh": group_name,
+            "group_name_ru": group_name_ru,
+            "attribute_complex_id": attr_data.get("attribute_complex_id"),
+            "max_value_count": attr_data.get("max_value_count"),
+            "complex_is_collection": attr_data.get("complex_is_collection", False),
+            "cached_at": cached_at,
+            "is_deprecated": False,  # 重新激活（如果之前被标记为废弃）
+        }
 
-        if existing:
-            # 更新现有属性
-            existing.cached_at = datetime.now(timezone.utc)  # 更新缓存时间
-            existing.is_deprecated = False  # 重新激活（如果之前被标记为废弃）
-
-            if language == "zh":
-                existing.name_zh = name
-                existing.description_zh = description
-                existing.group_name_zh = group_name
-                # 仅在中文同步时更新结构字段
-                existing.attribute_type = attr_data.get("type", "string")
-                existing.is_required = attr_data.get("is_required", False)
-                existing.is_collection = attr_data.get("is_collection", False)
-                existing.is_aspect = attr_data.get("is_aspect", False)
-                existing.dictionary_id = attr_data.get("dictionary_id")
-                existing.category_dependent = attr_data.get("category_dependent", False)
-                existing.group_id = attr_data.get("group_id")
-                existing.attribute_complex_id = attr_data.get("attribute_complex_id")
-                existing.max_value_count = attr_data.get("max_value_count")
-                existing.complex_is_collection = attr_data.get("complex_is_collection", False)
-            elif language == "ru":
-                existing.name_ru = name
-                existing.description_ru = description
-                existing.group_name_ru = group_name
-        else:
-            # 创建新属性（仅在中文同步时创建）
-            if language == "zh":
-                attr_info = {
-                    "category_id": category_id,
-                    "attribute_id": attribute_id,
-                    "name": name,  # 主显示字段（临时设置为中文）
-                    "name_zh": name,
-                    "description": description,  # 主显示字段
-                    "description_zh": description,
-                    "attribute_type": attr_data.get("type", "string"),
-                    "is_required": attr_data.get("is_required", False),
-                    "is_collection": attr_data.get("is_collection", False),
-                    "is_aspect": attr_data.get("is_aspect", False),
-                    "dictionary_id": attr_data.get("dictionary_id"),
-                    "category_dependent": attr_data.get("category_dependent", False),
-                    "group_id": attr_data.get("group_id"),
-                    "group_name": group_name,  # 主显示字段
-                    "group_name_zh": group_name,
-                    "attribute_complex_id": attr_data.get("attribute_complex_id"),
-                    "max_value_count": attr_data.get("max_value_count"),
-                    "complex_is_collection": attr_data.get("complex_is_collection", False),
-                }
-                attribute = OzonCategoryAttribute(**attr_info)
-                self.db.add(attribute)
-            else:
-                # 俄文同步时属性应该已存在，记录警告
-                logger.warning(f"Attribute {attribute_id} for category {category_id} not found during Russian sync")
+    async def _upsert_category_attributes(self, rows: List[Dict[str, Any]]) -> None:
+        """批量写入类目属性（INSERT ... ON CONFLICT (category_id, attribute_id) DO UPDATE）"""
+        table = OzonCategoryAttribute.__table__
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            stmt = insert(OzonCategoryAttribute).values(rows[start:start + WRITE_BATCH_SIZE])
+            excluded = stmt.excluded
+            set_ = {
+                column: excluded[column]
+                for column in rows[0].keys()
+                if column not in ("category_id", "attribute_id", "name_ru", "description_ru", "group_name", "group_name_ru")
+            }
+            # 俄文拉取失败时保留已有俄文
+            set_["name_ru"] = func.coalesce(excluded.name_ru, table.c.name_ru)
+            set_["description_ru"] = func.coalesce(excluded.description_ru, table.c.description_ru)
+            set_["group_name_ru"] = func.coalesce(excluded.group_name_ru, table.c.group_name_ru)
+            set_["group_name"] = func.coalesce(excluded.group_name_zh, excluded.group_name_ru, table.c.group_name_ru)
+
+            await self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["category_id", "attribute_id"],
+                    set_=set_
+                )
+            )
+
+    async def _update_category_attributes_ru(
+        self,
+        category_id: int,
+        ru_attrs: Dict[int, Dict[str, Any]],
+        cached_at: datetime
+    ) -> None:
+        """仅补充俄文：按 attribute_id 批量更新已有属性（不存在的属性忽略）"""
+        table = OzonCategoryAttribute.__table__
+        stmt = (
+            update(table)
+            .where(
+                and_(
+                    table.c.category_id == category_id,
+                    table.c.attribute_id == bindparam("b_attribute_id")
+                )
+            )
+            .values(
+                name_ru=bindparam("b_name_ru"),
+                description_ru=bindparam("b_description_ru"),
+                group_name_ru=bindparam("b_group_name_ru"),
+                group_name=func.coalesce(table.c.group_name_zh, bindparam("b_group_name_ru")),
+                cached_at=cached_at,
+                is_deprecated=False
+            )
+        )
+        await self.db.execute(stmt, [
+            {
+                "b_attribute_id": attribute_id,
+                "b_name_ru": attr_data.get("name", ""),
+                "b_description_ru": attr_data.get("description", ""),
+                "b_group_name_ru": attr_data.get("group_name"),
+            }
+            for attribute_id, attr_data in ru_attrs.items()
+        ])
 
     async def sync_attribute_values(
         self,
@@ -563,6 +543,9 @@ class CatalogService:
         """
         同步属性字典值（中文+俄文双语，支持分页）
 
+        中文、俄文两条分页游标并发推进；每页中文值与已到达的俄文值合并后
+        一次 INSERT ... ON CONFLICT 写入，先于/晚于中文到达而未合并的俄文值最后按 value_id 批量更新。
+
         Args:
             attribute_id: 属性ID
             category_id: 类目ID
@@ -610,13 +593,10 @@ class CatalogService:
             # 字典值不会频繁变化，每周同步一次足够（周一 18:30 UTC）
             skip_chinese_sync = False
             if not force_refresh:
-                from sqlalchemy import func as sql_func
-                from datetime import timedelta
-
                 # 检查最近 8 天内是否已同步过此字典
                 cache_window = datetime.now(timezone.utc) - timedelta(days=8)
                 recent_sync_count = await self.db.scalar(
-                    select(sql_func.count(OzonAttributeDictionaryValue.id)).where(
+                    select(func.count(OzonAttributeDictionaryValue.id)).where(
                         and_(
                             OzonAttributeDictionaryValue.dictionary_id == dictionary_id,
                             OzonAttributeDictionaryValue.cached_at >= cache_window
@@ -627,7 +607,7 @@ class CatalogService:
                 if recent_sync_count and recent_sync_count > 0:
                     # 8天内已同步，检查是否有俄文缺失
                     missing_ru_count = await self.db.scalar(
-                        select(sql_func.count(OzonAttributeDictionaryValue.id)).where(
+                        select(func.count(OzonAttributeDictionaryValue.id)).where(
                             and_(
                                 OzonAttributeDictionaryValue.dictionary_id == dictionary_id,
                                 or_(
@@ -644,7 +624,7 @@ class CatalogService:
                     else:
                         # 完全缓存，跳过
                         cached_count = await self.db.scalar(
-                            select(sql_func.count(OzonAttributeDictionaryValue.id)).where(
+                            select(func.count(OzonAttributeDictionaryValue.id)).where(
                                 OzonAttributeDictionaryValue.dictionary_id == dictionary_id
                             )
                         )
@@ -652,96 +632,60 @@ class CatalogService:
                         return {"success": True, "cached": True, "count": cached_count}
                 # 如果超过8天或从未同步，继续同步（会合并新值）
 
-            # 第一步：同步中文字典值（如果需要跳过则直接进入俄文同步）
-            if not skip_chinese_sync:
-                logger.info(f"Step 1/2: Syncing Chinese dictionary values for dict {dictionary_id}...")
-                last_value_id = 0
-                has_more = True
-
-                while has_more:
-                    response = await self.client.get_attribute_values(
-                        attribute_id=attribute_id,
-                        category_id=category_id,
-                        parent_category_id=parent_id,
-                        last_value_id=last_value_id,
-                        limit=2000,
-                        language="ZH_HANS"
-                    )
-
-                    if not response.get("result"):
-                        break
-
-                    values = response.get("result", [])
-                    if not values:
-                        break
-
-                    for value_data in values:
-                        await self._save_dictionary_value(dictionary_id, value_data, language="zh")
-                        synced_count += 1
-                        last_value_id = value_data.get("id", 0)
-
-                    has_more = response.get("has_next", False)
-
-                await self.db.flush()
-                logger.info(f"Chinese dictionary values synced: {synced_count}")
+            if skip_chinese_sync:
+                logger.info(f"Step 1/2: Syncing Russian dictionary values only for dict {dictionary_id}...")
             else:
-                logger.info(f"Step 1/2: Skipping Chinese sync (already cached), proceeding to Russian sync...")
-
-            # 第二步：同步俄文字典值
-            logger.info(f"Step 2/2: Syncing Russian dictionary values for dict {dictionary_id}...")
-            last_value_id = 0
-            has_more = True
-
-            while has_more:
-                response = await self.client.get_attribute_values(
-                    attribute_id=attribute_id,
-                    category_id=category_id,
-                    parent_category_id=parent_id,
-                    last_value_id=last_value_id,
-                    limit=2000,
-                    language="DEFAULT"  # OZON默认语言为俄文
-                )
-
-                if not response.get("result"):
-                    break
-
-                values = response.get("result", [])
-                if not values:
-                    break
-
-                for value_data in values:
-                    await self._save_dictionary_value(dictionary_id, value_data, language="ru")
-                    last_value_id = value_data.get("id", 0)
-
-                has_more = response.get("has_next", False)
-
-            await self.db.flush()
-            logger.info("Russian dictionary values synced")
-
-            # 第三步：更新主显示字段
-            from sqlalchemy import func
-            await self.db.execute(
-                update(OzonAttributeDictionaryValue)
-                .where(OzonAttributeDictionaryValue.dictionary_id == dictionary_id)
-                .values(
-                    value=func.coalesce(OzonAttributeDictionaryValue.value_zh, OzonAttributeDictionaryValue.value_ru),
-                    info=func.coalesce(OzonAttributeDictionaryValue.info_zh, OzonAttributeDictionaryValue.info_ru)
+                logger.info(f"Step 1/2: Syncing Chinese and Russian dictionary values for dict {dictionary_id}...")
+
+            # 第一步：并发翻页，中文页与已到达的俄文值合并写入
+            zh_cursor: Optional[int] = None if skip_chinese_sync else 0
+            ru_cursor: Optional[int] = 0
+            pending_ru: Dict[int, Dict[str, Any]] = {}
+            fetched_count = 0
+
+            while zh_cursor is not None or ru_cursor is not None:
+                (zh_values, zh_cursor), (ru_values, ru_cursor) = await asyncio.gather(
+                    self._fetch_dictionary_page(attribute_id, category_id, parent_id, zh_cursor, "ZH_HANS"),
+                    self._fetch_dictionary_page(attribute_id, category_id, parent_id, ru_cursor, "DEFAULT")  # OZON默认语言为俄文
                 )
-            )
 
-            # 第四步：标记废弃的字典值（本次同步未更新的）
-            deprecated_result = await self.db.execute(
-                update(OzonAttributeDictionaryValue)
-                .where(
-                    and_(
-                        OzonAttributeDictionaryValue.dictionary_id == dictionary_id,
-                        OzonAttributeDictionaryValue.cached_at < sync_start_time,
-                        OzonAttributeDictionaryValue.is_deprecated == False
+                fetched_count += len(zh_values) + len(ru_values)
+                for value_data in ru_values:
+                    if value_data.get("id"):
+                        pending_ru[value_data["id"]] = value_data
+
+                if zh_values:
+                    rows: Dict[int, Dict[str, Any]] = {}
+                    for value_data in zh_values:
+                        value_id = value_data.get("id")
+                        if not value_id:
+                            continue
+                        rows[value_id] = self._dictionary_value_row(
+                            dictionary_id, value_data, pending_ru.pop(value_id, None), sync_start_time
+                        )
+                    await self._upsert_dictionary_values(list(rows.values()))
+                    synced_count += len(zh_values)
+
+            # 第二步：未随中文写入的俄文值按 value_id 批量更新（不存在的值忽略）
+            logger.info(f"Step 2/2: Applying {len(pending_ru)} remaining Russian values for dict {dictionary_id}...")
+            if pending_ru:
+                await self._update_dictionary_values_ru(dictionary_id, pending_ru, sync_start_time)
+
+            # 标记废弃的字典值（本次同步未更新的；一页都没拉到时不做标记）
+            deprecated_count = 0
+            if fetched_count > 0:
+                deprecated_result = await self.db.execute(
+                    update(OzonAttributeDictionaryValue)
+                    .where(
+                        and_(
+                            OzonAttributeDictionaryValue.dictionary_id == dictionary_id,
+                            OzonAttributeDictionaryValue.cached_at < sync_start_time,
+                            OzonAttributeDictionaryValue.is_deprecated == False
+                        )
                     )
+                    .values(is_deprecated=True)
                 )
-                .values(is_deprecated=True)
-            )
-            deprecated_count = deprecated_result.rowcount
+                deprecated_count = deprecated_result.rowcount
             if deprecated_count > 0:
                 logger.info(f"Marked {deprecated_count} dictionary values as deprecated for dict {dictionary_id}")
 
@@ -761,60 +705,120 @@ class CatalogService:
             await self.db.rollback()
             return {"success": False, "error": str(e)}
 
-    async def _save_dictionary_value(
+    async def _fetch_dictionary_page(
         self,
-        dictionary_id: int,
-        value_data: Dict[str, Any],
-        language: str = "zh"
-    ):
-        """保存单个字典值（支持双语）"""
-        value_id = value_data.get("id")
-        if not value_id:
-            return
-
-        # 检查是否存在
-        stmt = select(OzonAttributeDictionaryValue).where(
-            and_(
-                OzonAttributeDictionaryValue.dictionary_id == dictionary_id,
-                OzonAttributeDictionaryValue.value_id == value_id
-            )
+        attribute_id: int,
+        category_id: int,
+        parent_id: int,
+        last_value_id: Optional[int],
+        language: str
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        拉取一页字典值
+
+        Returns:
+            (字典值列表, 下一页游标)：没有下一页时游标为 None；传入游标为 None 时直接返回空页
+        """
+        if last_value_id is None:
+            return [], None
+
+        response = await self.client.get_attribute_values(
+            attribute_id=attribute_id,
+            category_id=category_id,
+            parent_category_id=parent_id,
+            last_value_id=last_value_id,
+            limit=DICTIONARY_PAGE_SIZE,
+            language=language
         )
-        existing = await self.db.scalar(stmt)
 
+        values = response.get("result") or []
+        if not values or not response.get("has_next", False):
+            return values, None
+        return values, values[-1].get("id", 0)
+
+    @staticmethod
+    def _dictionary_value_row(
+        dictionary_id: int,
+        value_data: Dict[str, Any],
+        ru_data: Optional[Dict[str, Any]],
+        cached_at: datetime
+    ) -> Dict[str, Any]:
+        """合并中文/俄文字典值为一行（俄文未到达时为 None，写入时保留已有俄文）"""
         value_text = value_data.get("value", "")
         info_text = value_data.get("info", "")
-        picture = value_data.get("picture", "")
-
-        if existing:
-            # 更新现有字典值
-            existing.cached_at = datetime.now(timezone.utc)  # 更新缓存时间
-            existing.is_deprecated = False  # 重新激活（如果之前被标记为废弃）
-
-            if language == "zh":
-                existing.value_zh = value_text
-                existing.info_zh = info_text
-                # 仅在中文同步时更新 picture
-                existing.picture = picture
-            elif language == "ru":
-                existing.value_ru = value_text
-                existing.info_ru = info_text
-        else:
-            # 创建新字典值（仅在中文同步时创建）
-            if language == "zh":
-                dict_value = OzonAttributeDictionaryValue(
-                    dictionary_id=dictionary_id,
-                    value_id=value_id,
-                    value=value_text,  # 主显示字段（临时设置为中文）
-                    value_zh=value_text,
-                    info=info_text,  # 主显示字段
-                    info_zh=info_text,
-                    picture=picture,
-                    cached_at=datetime.now(timezone.utc)
+
+        return {
+            "dictionary_id": dictionary_id,
+            "value_id": value_data["id"],
+            "value": value_text,  # 主显示字段（优先中文）
+            "value_zh": value_text,
+            "value_ru": ru_data.get("value", "") if ru_data is not None else None,
+            "info": info_text,
+            "info_zh": info_text,
+            "info_ru": ru_data.get("info", "") if ru_data is not None else None,
+            "picture": value_data.get("picture", ""),
+            "cached_at": cached_at,
+            "is_deprecated": False,  # 重新激活（如果之前被标记为废弃）
+        }
+
+    async def _upsert_dictionary_values(self, rows: List[Dict[str, Any]]) -> None:
+        """批量写入字典值（INSERT ... ON CONFLICT (dictionary_id, value_id) DO UPDATE）"""
+        table = OzonAttributeDictionaryValue.__table__
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            stmt = insert(OzonAttributeDictionaryValue).values(rows[start:start + WRITE_BATCH_SIZE])
+            excluded = stmt.excluded
+            await self.db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=["dictionary_id", "value_id"],
+                    set_={
+                        "value": excluded.value,
+                        "value_zh": excluded.value_zh,
+                        "value_ru": func.coalesce(excluded.value_ru, table.c.value_ru),
+                        "info": excluded.info,
+                        "info_zh": excluded.info_zh,
+                        "info_ru": func.coalesce(excluded.info_ru, table.c.info_ru),
+                        "picture": excluded.picture,
+                        "cached_at": excluded.cached_at,
+                        "is_deprecated": excluded.is_deprecated,
+                    }
                 )
-                self.db.add(dict_value)
-            else:
-                # 俄文同步时字典值应该已存在，记录警告
-                logger.warning(f"Dictionary value {value_id} for dict {dictionary_id} not found during Russian sync")
+            )
+
+    async def _update_dictionary_values_ru(
+        self,
+        dictionary_id: int,
+        ru_values: Dict[int, Dict[str, Any]],
+        cached_at: datetime
+    ) -> None:
+        """按 value_id 批量更新字典值俄文（不存在的值忽略）"""
+        table = OzonAttributeDictionaryValue.__table__
+        stmt = (
+            update(table)
+            .where(
+                and_(
+                    table.c.dictionary_id == dictionary_id,
+                    table.c.value_id == bindparam("b_value_id")
+                )
+            )
+            .values(
+                value_ru=bindparam("b_value_ru"),
+                info_ru=bindparam("b_info_ru"),
+                value=func.coalesce(table.c.value_zh, bindparam("b_value_ru")),
+                info=func.coalesce(table.c.info_zh, bindparam("b_info_ru")),
+                cached_at=cached_at,
+                is_deprecated=False
+            )
+        )
+        params = [
+            {
+                "b_value_id": value_id,
+                "b_value_ru": value_data.get("value", ""),
+                "b_info_ru": value_data.get("info", ""),
+            }
+            for value_id, value_data in ru_values.items()
+        ]
+        for start in range(0, len(params), WRITE_BATCH_SIZE):
+            await self.db.execute(stmt, params[start:start + WRITE_BATCH_SIZE])
 
     async def batch_sync_category_attributes(
         self,
@@ -822,22 +826,24 @@ class CatalogService:
         sync_all_leaf: bool = False,
         sync_dictionary_values: bool = True,
         language: str = "ZH_HANS",
-        max_concurrent: int = 1,  # 已废弃，保留参数兼容性，实际始终串行执行
-        progress_callback: Optional[callable] = None
+        max_concurrent: int = DEFAULT_DICTIONARY_CONCURRENCY,
+        progress_callback: Optional[Callable[..., Awaitable[None]]] = None
     ) -> Dict[str, Any]:
         """
-        批量同步类目特征（串行执行，支持进度跟踪）
+        批量同步类目特征（支持进度跟踪）
 
-        注意：此方法强制串行执行，避免并发导致的数据库锁竞争问题。
-        max_concurrent 参数已废弃，保留仅为兼容性。
+        类目逐个同步特征；每个类目的字典值按 (类目, 特征) 并发同步，最多 max_concurrent 个，
+        每个任务使用独立会话并单独提交。多个类目可能共享同一个 dictionary_id，
+        同一字典加锁串行（后到的任务命中 8 天缓存直接跳过），避免并发写同一批行导致锁等待。
+        OZON 请求频率由 API 客户端的限流器统一控制。
 
         Args:
             category_ids: 类目ID列表（如果为None且sync_all_leaf=True，则同步所有叶子类目）
             sync_all_leaf: 是否同步所有叶子类目
             sync_dictionary_values: 是否同步特征值指南
             language: 语言（ZH_HANS/DEFAULT/RU/EN/TR）
-            max_concurrent: 已废弃，始终串行执行
-            progress_callback: 进度回调函数
+            max_concurrent: 字典值同步最大并发数
+            progress_callback: 异步进度回调函数
 
         Returns:
             同步结果
@@ -847,7 +853,6 @@ class CatalogService:
             if sync_all_leaf and not category_ids:
                 # 查询所有叶子类目（去重），按同步时间升序（最旧的或未同步的优先）
                 # 注意：由于支持多对多关系，同一个 category_id 可能有多条记录，需要去重
-                from sqlalchemy import func
 
                 # 使用 group_by 去重，并获取每个 category_id 的最小同步时间
                 stmt = select(
@@ -883,9 +888,31 @@ class CatalogService:
             synced_values = 0
             errors = []
 
-            # 串行同步类目（避免并发导致的锁竞争问题）
-            # 原因：多个类目可能共享同一个 dictionary_id，并发更新会导致严重的锁等待（20-60秒）
-            # 改为串行执行，虽然总时间更长，但避免了锁竞争导致的超长等待
+            # 字典值任务：独立会话 + 全局并发上限 + 同一字典串行
+            semaphore = asyncio.Semaphore(max(1, max_concurrent))
+            dictionary_locks: Dict[int, asyncio.Lock] = {}
+            session_factory = async_sessionmaker(
+                self.db.bind,
+                class_=AsyncSession,
+                expire_on_commit=False,
+                autoflush=False
+            )
+
+            async def sync_values(category_id: int, attribute_id: int, dictionary_id: int) -> Dict[str, Any]:
+                lock = dictionary_locks.setdefault(dictionary_id, asyncio.Lock())
+                async with lock:
+                    async with semaphore:
+                        async with session_factory() as session:
+                            value_result = await CatalogService(self.client, session).sync_attribute_values(
+                                attribute_id=attribute_id,
+                                category_id=category_id,
+                                force_refresh=False,
+                                language=language
+                            )
+                            if value_result.get("success"):
+                                await session.commit()
+                            return value_result
+
             for category_id in category_ids:
                 try:
                     # 1. 同步类目特征
@@ -910,20 +937,27 @@ class CatalogService:
                         # 获取该类目的所有属性
                         attrs = await self.get_category_attributes(category_id, required_only=False)
 
-                        # 提前提取所有需要的属性值，避免循环中的惰性加载
+                        # 提前提取所有需要的属性值，避免并发任务中的惰性加载
                         attrs_to_sync = [
                             (attr.attribute_id, attr.dictionary_id)
                             for attr in attrs
                             if attr.dictionary_id
                         ]
 
-                        for attribute_id, dictionary_id in attrs_to_sync:
-                            value_result = await self.sync_attribute_values(
-                                attribute_id=attribute_id,
-                                category_id=category_id,
-                                force_refresh=False,
-                                language=language
-                            )
+                        # 先提交特征，字典值任务在独立会话中读取
+                        await self.db.commit()
+
+                        value_results = await asyncio.gather(
+                            *(
+                                sync_values(category_id, attribute_id, dictionary_id)
+                                for attribute_id, dictionary_id in attrs_to_sync
+                            ),
+                            return_exceptions=True
+                        )
+
+                        for (attribute_id, _), value_result in zip(attrs_to_sync, value_results):
+                            if isinstance(value_result, BaseException):
+                                value_result = {"success": False, "error": str(value_result)}
 
                             if value_result.get("success"):
                                 synced_values += value_result.get("synced_count", 0)
@@ -950,7 +984,7 @@ class CatalogService:
 
                     # 调用进度回调（用于实时更新前端显示）
                     if progress_callback:
-                        progress_callback(
+                        await progress_callback(
                             current=synced_categories,
                             total=total_categories,
                             category_id=category_id,
@@ -961,15 +995,13 @@ class CatalogService:
 
                 except Exception as e:
                     logger.error(f"Failed to sync category {category_id}: {e}", exc_info=True)
+                    await self.db.rollback()
                     errors.append({
                         "category_id": category_id,
                         "step": "sync",
                         "error": str(e)
                     })
 
-            # 注意：每个类目已经单独commit了，这里不需要再commit
-            # await self.db.commit()
-
             return {
                 "success": True,
                 "synced_categories": synced_categories,
@@ -992,18 +1024,25 @@ class CatalogService:
         query: str,
         only_leaf: bool = True,
         limit: int = 20
-    ) -> List[OzonCategory]:
+    ) -> List[Any]:
         """
         搜索类目
 
+        使用进程内类目名称索引（与前端类目树同一产物，中文/俄文名称，前缀优先）；
+        产物尚未生成时回退到数据库 ILIKE 查询。
+
         Args:
             query: 搜索关键词
             only_leaf: 仅返回叶子类目
             limit: 返回数量限制
 
         Returns:
-            类目列表
+            类目列表（OzonCategory 或同名字段的索引条目）
         """
+        tree = await get_category_tree_store().get()
+        if tree is not None:
+            return tree.search(query, only_leaf=only_leaf, limit=limit)
+
         stmt = select(OzonCategory).where(
             OzonCategory.name.ilike(f"%{query}%")
         )
@@ -1054,23 +1093,40 @@ class CatalogService:
         """
         搜索字典值
 
-        - 如果有搜索词：调用OZON API搜索
         - 如果没有搜索词：从本地数据库读取
+        - 如果有搜索词：在本地缓存的字典值中搜索（前缀优先，其次子串，不足时补充 trigram 模糊匹配），
+          仅当该字典尚未缓存到本地时才调用OZON搜索API
 
         Args:
             category_id: 类目ID（叶子类目）
             attribute_id: 属性ID
-            query: 搜索关键词（至少2个字符，None或空字符串表示获取所有）
+            query: 搜索关键词（中文至少1个字，其它至少2个字符；None或空字符串表示获取所有）
             limit: 返回数量限制
 
         Returns:
             字典值列表（字典格式）
         """
+        normalized_query = normalize_search_text(query or "")
+
         # 如果没有搜索词，从本地数据库读取
-        if not query or len(query.strip()) < 2:
+        if len(normalized_query) < min_search_length(normalized_query):
             return await self._get_dictionary_values_from_db(attribute_id, limit)
 
-        # 有搜索词，调用OZON搜索API
+        # 有搜索词，优先搜索本地缓存
+        dictionary_id = await self.db.scalar(
+            select(OzonCategoryAttribute.dictionary_id).where(
+                and_(
+                    OzonCategoryAttribute.category_id == category_id,
+                    OzonCategoryAttribute.attribute_id == attribute_id
+                )
+            )
+        )
+        if dictionary_id:
+            values = await self._search_local_dictionary_values(dictionary_id, normalized_query, limit)
+            if values or await self._is_dictionary_cached(dictionary_id):
+                return values
+
+        # 本地无法回答（属性没有字典ID，或字典尚未缓存到本地）：回退到OZON搜索API
         # 查询类目信息，获取父类目ID
         category = await self.db.scalar(
             select(OzonCategory).where(OzonCategory.category_id == category_id)
@@ -1088,7 +1144,7 @@ class CatalogService:
                 attribute_id=attribute_id,
                 category_id=category_id,
                 parent_category_id=parent_id,
-                query=query,
+                query=query.strip(),
                 limit=limit,
                 language="ZH_HANS"
             )
@@ -1101,6 +1157,70 @@ class CatalogService:
             logger.error(f"Failed to search attribute values: {e}", exc_info=True)
             return []
 
+    async def _search_local_dictionary_values(
+        self,
+        dictionary_id: int,
+        normalized_query: str,
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        在本地缓存中搜索字典值（search_text 上的 pg_trgm GIN 索引）
+
+        排序：整体前缀 > 词前缀（含俄文部分）> 其它子串，同级按值长度；
+        子串结果不足 limit 且查询词足够长时，用 word_similarity 补充模糊匹配（拼写差异、词形变化）。
+        """
+        T = OzonAttributeDictionaryValue
+        columns = (T.value_id, T.value, T.info, T.picture)
+        base_filter = and_(T.dictionary_id == dictionary_id, T.is_deprecated == False)
+        substring_match = T.search_text.contains(normalized_query, autoescape=True)
+
+        rank = case(
+            (T.search_text.startswith(normalized_query, autoescape=True), 0),
+            (T.search_text.contains(" " + normalized_query, autoescape=True), 1),
+            else_=2
+        )
+        result = await self.db.execute(
+            select(*columns)
+            .where(base_filter, substring_match)
+            .order_by(rank, func.length(T.value), T.value)
+            .limit(limit)
+        )
+        rows = list(result.all())
+
+        if len(rows) < limit and len(normalized_query) >= FUZZY_MIN_QUERY_LENGTH:
+            similarity = func.word_similarity(normalized_query, T.search_text)
+            result = await self.db.execute(
+                select(*columns)
+                .where(
+                    base_filter,
+                    literal(normalized_query).op("<%")(T.search_text),
+                    ~substring_match
+                )
+                .order_by(similarity.desc(), T.value)
+                .limit(limit - len(rows))
+            )
+            rows.extend(result.all())
+
+        # 转换为字典格式（匹配OZON API返回格式）
+        return [
+            {
+                "id": row.value_id,
+                "value": row.value,
+                "info": row.info or "",
+                "picture": row.picture or ""
+            }
+            for row in rows
+        ]
+
+    async def _is_dictionary_cached(self, dictionary_id: int) -> bool:
+        """字典是否已缓存到本地"""
+        value_id = await self.db.scalar(
+            select(OzonAttributeDictionaryValue.id)
+            .where(OzonAttributeDictionaryValue.dictionary_id == dictionary_id)
+            .limit(1)
+        )
+        return value_id is not None
+
     async def _get_dictionary_values_from_db(
         self,
         attribute_id: int,
@@ -1153,91 +1273,17 @@ class CatalogService:
 
     async def _generate_category_tree_js(self):
         """
-        生成前端可直接使用的类目树 JS 文件
+        生成前端使用的类目树产物（web/public/data/categoryTree.json 及预压缩文件）
 
-        注意：由于支持多对多关系（同一个category_id可有多个parent_id），
-        在树中，每个子类目会在其每个父类目下都显示一次。
-
-        生成文件路径: web/src/data/categoryTree.ts
+        内容哈希与现有产物一致时不重写，见 category_tree_artifact.py
         """
         try:
-            # 查询所有未废弃的类目（按内部ID和层级排序）
-            result = await self.db.execute(
-                select(OzonCategory)
-                .where(OzonCategory.is_deprecated == False)
-                .order_by(OzonCategory.level, OzonCategory.id)
-            )
-            all_categories = list(result.scalars().all())
-
-            if not all_categories:
-                logger.warning("No categories found, skipping JS generation")
-                return
-
-            # 构建 parent_id 到 children 的映射（基于数据库记录，不是category_id）
-            # 使用内部ID作为key，避免多对多关系导致的混乱
-            children_map: Dict[Optional[int], List[OzonCategory]] = {}
-            for cat in all_categories:
-                if cat.parent_id not in children_map:
-                    children_map[cat.parent_id] = []
-                children_map[cat.parent_id].append(cat)
-
-            # 递归构建树形结构（包含双语数据）
-            def build_tree_node(category: OzonCategory) -> Dict[str, Any]:
-                node = {
-                    "value": category.category_id,  # 前端使用 category_id
-                    "label": category.name,  # 主显示名称（优先中文）
-                    "label_zh": category.name_zh,  # 中文名称
-                    "label_ru": category.name_ru,  # 俄文名称
-                    "isLeaf": category.is_leaf,
-                    "disabled": category.is_disabled,
-                }
-
-                # 使用当前记录的 category_id 查找子记录（parent_id == category.category_id）
-                children_cats = children_map.get(category.category_id, [])
-                if children_cats:
-                    node["children"] = [build_tree_node(child) for child in children_cats]
-
-                return node
-
-            # 找到所有根类目（parent_id为NULL）
-            root_categories = children_map.get(None, [])
-
-            # 构建树
-            tree_data = [build_tree_node(root) for root in root_categories]
-
-            # 统计唯一的 category_id 数量（用于显示）
-            unique_category_ids = len(set(cat.category_id for cat in all_categories))
-
-            # 确定文件路径（放在 public 目录，避免编译到 bundle）
-            project_root = Path.cwd()
-            data_dir = project_root / "web" / "public" / "data"
-            data_dir.mkdir(parents=True, exist_ok=True)
-
-            file_path = data_dir / "categoryTree.json"
-
-            # 生成 JSON 数据（包含元信息）
-            json_data = {
-                "generatedAt": datetime.now(timezone.utc).isoformat() + "Z",
-                "totalRecords": len(all_categories),
-                "uniqueCategories": unique_category_ids,
-                "data": tree_data
-            }
-
-            # 写入文件
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(json_data, f, ensure_ascii=False, indent=2)
-
-            logger.info(f"Category tree JSON file generated: {file_path} ({len(all_categories)} records, {unique_category_ids} unique categories)")
-
+            await generate_category_tree_artifact(self.db)
         except Exception as e:
-            logger.error(f"Failed to generate category tree JS: {e}", exc_info=True)
+            logger.error(f"Failed to generate category tree artifact: {e}", exc_info=True)
             # 不抛出异常，避免影响同步流程
 
 
-# 导入func用于count
-from sqlalchemy import func
-
-
 async def match_attribute_values(
     db,
     category_id: int,
@@ -0,0 +1,401 @@
+"""
+类目树产物
+
+类目同步后把类目树生成为带版本号（内容哈希）的紧凑 JSON，并预压缩为 gzip/brotli：
+- web/public/data/categoryTree.json(.gz/.br)：保持原路径与格式，新增 version 字段
+- categoryTree.meta.json：版本号与统计信息（判断是否需要重新生成时不必解析整棵树）
+- 接口按 ETag/If-None-Match 返回 304，按 Accept-Encoding 直接返回预压缩内容，
+  也可只返回某个子树或前几层（懒加载）
+- 各进程基于同一产物建立类目名称索引，供类目搜索使用
+
+内容哈希与现有产物一致时不重写文件（generatedAt 不变，客户端缓存继续有效）。
+进程内产物按 meta 文件修改时间懒加载（最多每 RELOAD_CHECK_INTERVAL 秒检查一次），
+Celery 中生成的新产物会被 API 进程自动感知。
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+from ef_core.utils.logger import get_logger
+
+from ..models.listing import OzonCategory
+from ..utils.text_search import normalize_search_text
+
+logger = get_logger(__name__)
+
+
+TREE_FILE_NAME = "categoryTree.json"
+META_FILE_NAME = "categoryTree.meta.json"
+# 进程内产物检查文件变化的最小间隔（秒）
+RELOAD_CHECK_INTERVAL = 5
+# 子树响应缓存条数（每个版本单独缓存）
+SUBTREE_CACHE_SIZE = 256
+
+
+def get_category_tree_dir() -> Path:
+    """产物目录（放在 public 目录，避免编译到 bundle）"""
+    return Path.cwd() / "web" / "public" / "data"
+
+
+def build_category_tree(categories: List[Any]) -> List[Dict[str, Any]]:
+    """
+    构建类目树（包含双语数据）
+
+    由于支持多对多关系（同一个category_id可有多个parent_id），
+    每个子类目会在其每个父类目下都显示一次。
+
+    Args:
+        categories: 按 (level, id) 排序的类目行，需包含 category_id/parent_id/name/name_zh/name_ru/is_leaf/is_disabled
+    """
+    children_map: Dict[Optional[int], List[Any]] = {}
+    for category in categories:
+        children_map.setdefault(category.parent_id, []).append(category)
+
+    def build_node(category: Any, path: Tuple[int, ...]) -> Dict[str, Any]:
+        node = {
+            "value": category.category_id,  # 前端使用 category_id
+            "label": category.name,  # 主显示名称（优先中文）
+            "label_zh": category.name_zh,  # 中文名称
+            "label_ru": category.name_ru,  # 俄文名称
+            "isLeaf": category.is_leaf,
+            "disabled": category.is_disabled,
+        }
+
+        # 使用当前记录的 category_id 查找子记录（parent_id == category.category_id），跳过环路
+        children = [
+            child for child in children_map.get(category.category_id, [])
+            if child.category_id not in path
+        ]
+        if children:
+            child_path = path + (category.category_id,)
+            node["children"] = [build_node(child, child_path) for child in children]
+
+        return node
+
+    # 根类目（parent_id为NULL）
+    return [build_node(root, ()) for root in children_map.get(None, [])]
+
+
+def _dump(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _read_meta(data_dir: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(data_dir / META_FILE_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def category_tree_artifact_exists(data_dir: Optional[Path] = None) -> bool:
+    """产物是否已生成"""
+    data_dir = data_dir or get_category_tree_dir()
+    return (data_dir / META_FILE_NAME).exists() and (data_dir / TREE_FILE_NAME).exists()
+
+
+def _write_artifact(data_dir: Path, tree_data: List[Dict[str, Any]], total_records: int, unique_categories: int) -> Tuple[str, bool]:
+    """在线程中执行：计算内容哈希，变化时写出 JSON 与预压缩文件（meta 最后写，作为发布标志）"""
+    data_bytes = _dump(tree_data)
+    version = hashlib.sha256(data_bytes).hexdigest()[:16]
+
+    meta = _read_meta(data_dir)
+    if meta and meta.get("version") == version and (data_dir / TREE_FILE_NAME).exists():
+        return version, False
+
+    meta = {
+        "version": version,
+        "generatedAt": datetime.now(timezone.utc).isoformat(),
+        "totalRecords": total_records,
+        "uniqueCategories": unique_categories,
+    }
+    # 与原文件格式一致（data 放最后），直接拼接避免再序列化一次整棵树
+    body = _dump(meta)[:-1] + b',"data":' + data_bytes + b"}"
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    tree_path = data_dir / TREE_FILE_NAME
+    _write_atomic(tree_path, body)
+    _write_atomic(tree_path.with_name(TREE_FILE_NAME + ".gz"), gzip.compress(body, compresslevel=9))
+    br_path = tree_path.with_name(TREE_FILE_NAME + ".br")
+    if BROTLI_AVAILABLE:
+        _write_atomic(br_path, brotli.compress(body, quality=11))
+    elif br_path.exists():
+        # 旧版本的 .br 不能留着（会和新 JSON 不一致）
+        br_path.unlink()
+    _write_atomic(data_dir / META_FILE_NAME, _dump(meta))
+    return version, True
+
+
+async def generate_category_tree_artifact(db: AsyncSession, data_dir: Optional[Path] = None) -> Optional[str]:
+    """
+    生成类目树产物（内容未变化时不重写）
+
+    Returns:
+        产物版本号；没有类目时返回 None
+    """
+    data_dir = data_dir or get_category_tree_dir()
+
+    # 查询所有未废弃的类目（按层级和内部ID排序），只取构建树需要的列
+    result = await db.execute(
+        select(
+            OzonCategory.category_id,
+            OzonCategory.parent_id,
+            OzonCategory.name,
+            OzonCategory.name_zh,
+            OzonCategory.name_ru,
+            OzonCategory.is_leaf,
+            OzonCategory.is_disabled,
+        )
+        .where(OzonCategory.is_deprecated == False)
+        .order_by(OzonCategory.level, OzonCategory.id)
+    )
+    categories = result.all()
+
+    if not categories:
+        logger.warning("No categories found, skipping category tree generation")
+        return None
+
+    tree_data = build_category_tree(categories)
+    unique_categories = len({category.category_id for category in categories})
+
+    version, written = await asyncio.to_thread(
+        _write_artifact, data_dir, tree_data, len(categories), unique_categories
+    )
+    if written:
+        logger.info(
+            f"Category tree artifact generated: version={version} "
+            f"({len(categories)} records, {unique_categories} unique categories)"
+        )
+        get_category_tree_store().invalidate()
+    else:
+        logger.info(f"Category tree unchanged (version={version}), skipping regeneration")
+    return version
+
+
+# ========== 进程内产物与名称索引 ==========
+
+@dataclass
+class CategoryIndexEntry:
+    """类目名称索引条目（字段与 OzonCategory 同名，调用方可按原方式读取）"""
+
+    category_id: int
+    parent_id: Optional[int]
+    name: str
+    name_zh: Optional[str]
+    name_ru: Optional[str]
+    is_leaf: bool
+    level: int
+    search_key: str
+
+
+class LoadedCategoryTree:
+    """已加载的类目树产物"""
+
+    def __init__(self, meta: Dict[str, Any], payload: Dict[str, Any], bodies: Dict[str, bytes]):
+        self.version: str = meta["version"]
+        self.etag = f'"{self.version}"'
+        self.meta = meta
+        self.data: List[Dict[str, Any]] = payload.get("data") or []
+        # Content-Encoding -> 响应体（identity 为未压缩）
+        self.bodies = bodies
+
+        self.nodes: Dict[int, Dict[str, Any]] = {}
+        self.entries: List[CategoryIndexEntry] = []
+        self._subtrees: "OrderedDict[Tuple[Optional[int], Optional[int]], bytes]" = OrderedDict()
+        self._build_index()
+
+    def _build_index(self) -> None:
+        seen = set()
+        stack = [(node, None, 0) for node in reversed(self.data)]
+        while stack:
+            node, parent_id, level = stack.pop()
+            category_id = node["value"]
+            self.nodes.setdefault(category_id, node)
+
+            if (category_id, parent_id) not in seen:
+                seen.add((category_id, parent_id))
+                name_zh = node.get("label_zh")
+                name_ru = node.get("label_ru")
+                self.entries.append(CategoryIndexEntry(
+                    category_id=category_id,
+                    parent_id=parent_id,
+                    name=node.get("label") or "",
+                    name_zh=name_zh,
+                    name_ru=name_ru,
+                    is_leaf=bool(node.get("isLeaf")),
+                    level=level,
+                    search_key=normalize_search_text(
+                        f"{name_zh or node.get('label') or ''} {name_ru or ''}"
+                    ),
+                ))
+
+            for child in reversed(node.get("children") or []):
+                stack.append((child, category_id, level + 1))
+
+    def search(self, query: str, only_leaf: bool = True, limit: int = 20) -> List[CategoryIndexEntry]:
+        """
+        按名称搜索（中文/俄文）
+
+        排序：整体前缀 > 词前缀（含俄文部分）> 其它子串，同级按名称长度
+        """
+        normalized = normalize_search_text(query)
+        if not normalized:
+            return []
+
+        matches = []
+        for entry in self.entries:
+            if only_leaf and not entry.is_leaf:
+                continue
+            position = entry.search_key.find(normalized)
+            if position < 0:
+                continue
+            if position == 0:
+                rank = 0
+            elif entry.search_key[position - 1] == " ":
+                rank = 1
+            else:
+                rank = 2
+            matches.append((rank, len(entry.name), entry))
+
+        matches.sort(key=lambda item: (item[0], item[1]))
+        return [entry for _, _, entry in matches[:limit]]
+
+    def subtree(self, root: Optional[int], depth: Optional[int]) -> Optional[bytes]:
+        """
+        子树响应体（懒加载）：root 为 None 时从顶层开始；depth 限制返回层数，
+        截断处的节点不带 children，前端按 isLeaf 判断是否需要继续加载。
+
+        Returns:
+            JSON 响应体；root 不存在时返回 None
+        """
+        key = (root, depth)
+        cached = self._subtrees.get(key)
+        if cached is not None:
+            self._subtrees.move_to_end(key)
+            return cached
+
+        if root is None:
+            nodes = self.data
+        else:
+            node = self.nodes.get(root)
+            if node is None:
+                return None
+            nodes = node.get("children") or []
+
+        body = _dump({
+            "version": self.version,
+            "root": root,
+            "data": [_trim(node, depth) for node in nodes] if depth else nodes,
+        })
+        self._subtrees[key] = body
+        while len(self._subtrees) > SUBTREE_CACHE_SIZE:
+            self._subtrees.popitem(last=False)
+        return body
+
+
+def _trim(node: Dict[str, Any], depth: int) -> Dict[str, Any]:
+    """截取 depth 层（depth=1 表示只保留节点本身）"""
+    trimmed = {key: value for key, value in node.items() if key != "children"}
+    if depth > 1 and node.get("children"):
+        trimmed["children"] = [_trim(child, depth - 1) for child in node["children"]]
+    return trimmed
+
+
+class CategoryTreeStore:
+    """进程内类目树产物（按 meta 文件变化懒加载）"""
+
+    def __init__(self, data_dir: Optional[Path] = None):
+        self.data_dir = data_dir
+        self._tree: Optional[LoadedCategoryTree] = None
+        self._loaded_mtime: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self) -> None:
+        """下次访问时重新检查文件（本进程刚生成新产物时调用）"""
+        self._checked_at = 0.0
+
+    async def get(self) -> Optional[LoadedCategoryTree]:
+        """获取当前产物；尚未生成时返回 None"""
+        if time.monotonic() - self._checked_at < RELOAD_CHECK_INTERVAL:
+            return self._tree
+
+        async with self._lock:
+            if time.monotonic() - self._checked_at < RELOAD_CHECK_INTERVAL:
+                return self._tree
+
+            data_dir = self.data_dir or get_category_tree_dir()
+            try:
+                mtime = (data_dir / META_FILE_NAME).stat().st_mtime_ns
+            except OSError:
+                mtime = None
+
+            if mtime is not None and mtime != self._loaded_mtime:
+                try:
+                    self._tree = await asyncio.to_thread(self._load, data_dir)
+                    self._loaded_mtime = mtime
+                    logger.info(f"Category tree artifact loaded: version={self._tree.version}")
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Failed to load category tree artifact: {e}")
+
+            self._checked_at = time.monotonic()
+            return self._tree
+
+    @staticmethod
+    def _load(data_dir: Path) -> LoadedCategoryTree:
+        meta = _read_meta(data_dir)
+        if meta is None:
+            raise ValueError("category tree meta missing or invalid")
+
+        tree_path = data_dir / TREE_FILE_NAME
+        raw = tree_path.read_bytes()
+        payload = json.loads(raw)
+        if payload.get("version") != meta["version"]:
+            raise ValueError("category tree file does not match meta version")
+
+        bodies = {"identity": raw}
+        for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+            path = tree_path.with_name(TREE_FILE_NAME + suffix)
+            if path.exists():
+                bodies[encoding] = path.read_bytes()
+
+        # 读取期间被重新生成时放弃本次加载（压缩文件可能已是新版本），下次检查再加载
+        latest = _read_meta(data_dir)
+        if latest is None or latest.get("version") != meta["version"]:
+            raise ValueError("category tree regenerated while loading")
+        return LoadedCategoryTree(meta, payload, bodies)
+
+
+_store: Optional[CategoryTreeStore] = None
+
+
+def get_category_tree_store() -> CategoryTreeStore:
+    """获取进程内类目树产物单例"""
+    global _store
+    if _store is None:
+        _store = CategoryTreeStore()
+    return _store
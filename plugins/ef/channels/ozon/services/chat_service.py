@@ -10,7 +10,7 @@ from ..models.chat import OzonChat, OzonChatMessage
 from ..models.ozon_shops import OzonShop
 from ..api.client import OzonAPIClient
 from ..utils.datetime_utils import parse_datetime, utcnow
-from .ozon_sync import SYNC_TASKS
+from .sync.task_state_manager import get_task_state_manager
 
 logger = logging.getLogger(__name__)
 
@@ -657,15 +657,11 @@ class OzonChatService:
         total_new_messages = 0
 
         # 初始化任务状态
+        task_manager = get_task_state_manager()
         if task_id:
-            SYNC_TASKS[task_id] = {
-                "status": "running",
-                "progress": 0,
-                "message": "正在连接OZON API...",
-                "started_at": utcnow().isoformat(),
-                "type": "chats",
-                "shop_id": self.shop_id
-            }
+            await task_manager.create_task(
+                task_id, "chats", message="正在连接OZON API...", shop_id=self.shop_id
+            )
 
         try:
             # 获取聊天列表 - 使用cursor分页
@@ -675,15 +671,13 @@ class OzonChatService:
 
             # 更新进度：开始获取聊天列表
             if task_id:
-                SYNC_TASKS[task_id]["progress"] = 10
-                SYNC_TASKS[task_id]["message"] = "正在获取聊天列表..."
+                await task_manager.update_progress(task_id, 10, "正在获取聊天列表...")
 
             for page in range(max_pages):
                 # 更新进度
                 if task_id:
                     progress = 10 + (page * 70 // max_pages)  # 10% 到 80%
-                    SYNC_TASKS[task_id]["progress"] = progress
-                    SYNC_TASKS[task_id]["message"] = f"正在获取第 {page + 1} 页聊天..."
+                    await task_manager.update_progress(task_id, progress, f"正在获取第 {page + 1} 页聊天...")
 
                 # 构建请求参数
                 params = {
@@ -734,7 +728,7 @@ class OzonChatService:
                 # 同步消息内容
                 if sync_messages:
                     if task_id:
-                        SYNC_TASKS[task_id]["message"] = f"正在同步第 {page + 1} 页的消息..."
+                        await task_manager.update_task(task_id, message=f"正在同步第 {page + 1} 页的消息...")
 
                     for chat_data in chats_data:
                         chat_info = chat_data.get("chat", {})
@@ -764,15 +758,9 @@ class OzonChatService:
             }
 
             if task_id:
-                SYNC_TASKS[task_id] = {
-                    "status": "completed",
-                    "progress": 100,
-                    "message": f"同步完成：{synced_count} 个聊天，{total_new_messages} 条新消息",
-                    "completed_at": utcnow().isoformat(),
-                    "type": "chats",
-                    "shop_id": self.shop_id,
-                    "result": result
-                }
+                await task_manager.complete_task(
+                    task_id, result, f"同步完成：{synced_count} 个聊天，{total_new_messages} 条新消息"
+                )
 
             return result
 
@@ -780,15 +768,7 @@ class OzonChatService:
             logger.error(f"Failed to sync chats: {e}")
 
             if task_id:
-                SYNC_TASKS[task_id] = {
-                    "status": "failed",
-                    "progress": SYNC_TASKS.get(task_id, {}).get("progress", 0),
-                    "message": f"同步失败: {str(e)}",
-                    "error": str(e),
-                    "failed_at": utcnow().isoformat(),
-                    "type": "chats",
-                    "shop_id": self.shop_id
-                }
+                await task_manager.fail_task(task_id, str(e))
 
             raise
 
@@ -1,13 +1,14 @@
 """
 OZON 财务交易数据同步服务
 """
+import asyncio
 import logging
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert
 
 from ef_core.database import get_task_db_manager
 from ..models import OzonShop
@@ -18,9 +19,23 @@ from .finance_translations import translate_operation_type_name
 logger = logging.getLogger(__name__)
 
 
+class DaySyncIncompleteError(RuntimeError):
+    """某天有记录块保存失败：该天视为未同步完成（水位线停在其之前，重跑时重新拉取）"""
+
+    def __init__(self, target_date: date, failed_count: int, saved_count: int):
+        super().__init__(f"{target_date} 有 {failed_count} 条交易记录保存失败")
+        self.saved_count = saved_count
+
+
 class FinanceTransactionsSyncService:
     """财务交易数据同步服务"""
 
+    # 同一店铺同时拉取的天数（请求额度由 OzonAPIClient 的共享限流器控制）
+    DAY_CONCURRENCY = 4
+
+    # 每条 INSERT 的记录数（21 列 × 1000 行，低于 asyncpg 32767 个参数的上限）
+    INSERT_CHUNK_SIZE = 1000
+
     def __init__(self):
         # 注意：不在 __init__ 中创建 db_manager，因为服务可能作为单例在模块加载时初始化
         # 而实际执行时是在 Celery 任务的独立事件循环中，需要使用独立的数据库管理器
@@ -33,6 +48,7 @@ class FinanceTransactionsSyncService:
         Args:
             config: 配置参数
                 - target_date: 目标日期（可选，默认为昨天）
+                - date_from / date_to: 日期范围（可选，优先于 target_date，按天并发拉取）
                 - shop_id: 店铺ID（可选，默认所有活跃店铺）
 
         Returns:
@@ -46,7 +62,11 @@ class FinanceTransactionsSyncService:
             # 默认同步昨天的数据
             target_date = (datetime.now(timezone.utc) - timedelta(days=1)).date()
 
-        logger.info(f"开始同步财务交易数据，目标日期：{target_date}")
+        date_from = datetime.fromisoformat(config["date_from"]).date() if config.get("date_from") else target_date
+        date_to = datetime.fromisoformat(config["date_to"]).date() if config.get("date_to") else max(date_from, target_date)
+        dates = [date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)]
+
+        logger.info(f"开始同步财务交易数据，日期范围：{date_from} ~ {date_to}（{len(dates)}天）")
 
         total_processed = 0
         total_synced = 0
@@ -74,12 +94,15 @@ class FinanceTransactionsSyncService:
                 )
                 shops = result.scalars().all()
 
+            # 结束只读事务，拉取 API 期间不占用连接池连接
+            await db.commit()
+
             for shop in shops:
                 try:
                     shop_synced_count = await self._sync_shop_transactions(
                         db=db,
                         shop=shop,
-                        target_date=target_date
+                        dates=dates
                     )
 
                     total_synced += shop_synced_count
@@ -101,7 +124,8 @@ class FinanceTransactionsSyncService:
             "records_processed": total_processed,
             "records_updated": total_synced,
             "message": f"同步完成：{len(shops_synced)}个店铺，共{total_synced}条交易记录",
-            "target_date": target_date.isoformat(),
+            "target_date": date_to.isoformat(),
+            "date_from": date_from.isoformat(),
             "shops": shops_synced
         }
 
@@ -109,15 +133,18 @@ class FinanceTransactionsSyncService:
         self,
         db: AsyncSession,
         shop: OzonShop,
-        target_date: datetime
+        dates: List[date]
     ) -> int:
         """
         同步单个店铺的财务交易数据
 
+        多天并发拉取（DAY_CONCURRENCY），请求额度由共享限流器按 client_id 控制；
+        数据库写入共用一个会话，按页串行写入。
+
         Args:
             db: 数据库会话
             shop: 店铺对象
-            target_date: 目标日期
+            dates: 要同步的日期列表（升序）
 
         Returns:
             新增的交易记录数
@@ -129,61 +156,108 @@ class FinanceTransactionsSyncService:
             shop_id=shop.id
         )
 
+        semaphore = asyncio.Semaphore(self.DAY_CONCURRENCY)
+        write_lock = asyncio.Lock()
+
+        async def sync_day(day: date) -> int:
+            async with semaphore:
+                return await self._sync_shop_day(db, client, shop, day, write_lock)
+
         try:
-            # 构建日期范围（整天）
-            date_from = f"{target_date.isoformat()}T00:00:00Z"
-            date_to = f"{target_date.isoformat()}T23:59:59Z"
-
-            logger.info(f"店铺 {shop.shop_name} 开始拉取财务交易数据: {date_from} ~ {date_to}")
-
-            # 分页获取所有交易数据
-            page = 1
-            total_synced = 0
-
-            while True:
-                # 调用OZON API
-                result = await client.get_finance_transaction_list(
-                    date_from=date_from,
-                    date_to=date_to,
-                    transaction_type="all",  # 获取所有类型的交易
-                    page=page,
-                    page_size=1000  # API上限
-                )
+            results = await asyncio.gather(*(sync_day(day) for day in dates), return_exceptions=True)
+        finally:
+            await client.close()
 
-                operations = result.get("result", {}).get("operations", [])
+        total_synced = 0
+        for result in results:
+            if isinstance(result, DaySyncIncompleteError):
+                # 部分保存失败的日期：已写入的记录仍计入
+                total_synced += result.saved_count
+            elif not isinstance(result, BaseException):
+                total_synced += result
+        failures = [(day, r) for day, r in zip(dates, results) if isinstance(r, BaseException)]
+
+        # 水位线只推进到第一个失败日期之前（断点续传从失败日期重新开始）
+        synced_through = None
+        for day, result in zip(dates, results):
+            if isinstance(result, BaseException):
+                break
+            synced_through = day
+
+        if synced_through is not None:
+            await self._update_watermark_success(db, shop.id, synced_through, total_synced)
+
+        if failures:
+            day, error = failures[0]
+            raise RuntimeError(
+                f"{len(failures)}/{len(dates)} 天同步失败（首个失败日期 {day}: {error}），"
+                f"已新增 {total_synced} 条"
+            ) from error
+
+        return total_synced
+
+    async def _sync_shop_day(
+        self,
+        db: AsyncSession,
+        client: OzonAPIClient,
+        shop: OzonShop,
+        target_date: date,
+        write_lock: asyncio.Lock
+    ) -> int:
+        """
+        分页拉取并保存单个店铺一天的交易数据，返回新增记录数
 
-                if not operations:
-                    logger.info(f"店铺 {shop.shop_name} 第{page}页无数据，同步结束")
-                    break
+        Raises:
+            DaySyncIncompleteError: 有记录块保存失败（其余块和后续页仍会写入）
+        """
+        # 构建日期范围（整天）
+        date_from = f"{target_date.isoformat()}T00:00:00Z"
+        date_to = f"{target_date.isoformat()}T23:59:59Z"
 
-                logger.info(f"店铺 {shop.shop_name} 第{page}页获取到 {len(operations)} 条交易记录")
+        logger.info(f"店铺 {shop.shop_name} 开始拉取财务交易数据: {date_from} ~ {date_to}")
 
-                # DEBUG: 打印第一条交易记录的结构
-                if operations and len(operations) > 0:
-                    import json
-                    logger.info(f"DEBUG - 第一条交易记录示例: {json.dumps(operations[0], ensure_ascii=False, default=str)[:500]}")
+        # 分页获取所有交易数据
+        page = 1
+        total_synced = 0
+        total_failed = 0
+
+        while True:
+            # 调用OZON API
+            result = await client.get_finance_transaction_list(
+                date_from=date_from,
+                date_to=date_to,
+                transaction_type="all",  # 获取所有类型的交易
+                page=page,
+                page_size=1000  # API上限
+            )
 
-                # 扁平化并保存交易记录
-                flattened = self._flatten_operations(operations, shop.id)
-                synced_count = await self._save_transactions(db, flattened)
+            operations = result.get("result", {}).get("operations", [])
 
-                total_synced += synced_count
+            if not operations:
+                logger.info(f"店铺 {shop.shop_name} {target_date} 第{page}页无数据，同步结束")
+                break
 
-                # 检查是否还有下一页
-                page_count = result.get("result", {}).get("page_count", 0)
-                if page >= page_count:
-                    logger.info(f"店铺 {shop.shop_name} 已到达最后一页（共{page_count}页）")
-                    break
+            logger.info(f"店铺 {shop.shop_name} {target_date} 第{page}页获取到 {len(operations)} 条交易记录")
 
-                page += 1
+            # 扁平化并保存交易记录（会话不支持并发，写入串行）
+            flattened = self._flatten_operations(operations, shop.id)
+            async with write_lock:
+                saved_count, failed_count = await self._save_transactions(db, flattened)
+            total_synced += saved_count
+            total_failed += failed_count
 
-            # 更新水位线
-            await self._update_watermark_success(db, shop.id, target_date, total_synced)
+            # 检查是否还有下一页
+            page_count = result.get("result", {}).get("page_count", 0)
+            if page >= page_count:
+                logger.info(f"店铺 {shop.shop_name} {target_date} 已到达最后一页（共{page_count}页）")
+                break
 
-            return total_synced
+            page += 1
 
-        finally:
-            await client.close()
+        if total_failed:
+            raise DaySyncIncompleteError(target_date, total_failed, total_synced)
+
+        return total_synced
 
     def _flatten_operations(
         self,
@@ -318,52 +392,61 @@ class FinanceTransactionsSyncService:
         self,
         db: AsyncSession,
         records: List[Dict]
-    ) -> int:
+    ) -> Tuple[int, int]:
         """
         批量保存交易记录（去重）
 
+        按 INSERT_CHUNK_SIZE 分块 INSERT ... ON CONFLICT DO NOTHING，每块一个事务：
+        已存在的记录由唯一约束跳过，某一块失败只回滚该块，不影响其他块。
+
         Args:
             db: 数据库会话
             records: 扁平化后的记录列表
 
         Returns:
-            成功保存的记录数
+            (成功保存的记录数, 保存失败的记录数)
         """
         saved_count = 0
+        failed_count = 0
 
-        for record in records:
+        for start in range(0, len(records), self.INSERT_CHUNK_SIZE):
+            chunk = records[start:start + self.INSERT_CHUNK_SIZE]
             try:
-                # 检查是否已存在（基于唯一约束：shop_id + operation_id + ozon_sku）
-                existing = await db.execute(
-                    select(OzonFinanceTransaction).where(
-                        OzonFinanceTransaction.shop_id == record["shop_id"],
-                        OzonFinanceTransaction.operation_id == record["operation_id"],
-                        OzonFinanceTransaction.ozon_sku == record.get("ozon_sku")
-                    )
+                saved_count += await self._insert_chunk(db, chunk)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                failed_count += len(chunk)
+                logger.error(
+                    f"保存交易记录失败（第 {start + 1}~{start + len(chunk)} 条，共 {len(chunk)} 条）: {e}",
+                    exc_info=True
                 )
 
-                if existing.scalar_one_or_none():
-                    # 已存在，跳过
-                    continue
+        return saved_count, failed_count
 
-                # 创建新记录
-                transaction = OzonFinanceTransaction(**record)
-                db.add(transaction)
+    async def _insert_chunk(self, db: AsyncSession, chunk: List[Dict]) -> int:
+        """插入一块记录，返回实际新增数（冲突跳过的不计）"""
+        table = OzonFinanceTransaction.__table__
+        inserted = 0
 
-                # 立即提交（逐条提交，避免批量提交时一条失败导致整个事务回滚）
-                await db.commit()
-                saved_count += 1
+        # 有 SKU 的记录按 uq_ozon_finance_transaction 去重，无 SKU 的按部分唯一索引去重
+        with_sku = [r for r in chunk if r.get("ozon_sku") is not None]
+        without_sku = [r for r in chunk if r.get("ozon_sku") is None]
 
-            except IntegrityError:
-                # 唯一约束冲突，回滚并继续
-                await db.rollback()
-                continue
-            except Exception as e:
-                logger.error(f"保存交易记录失败: {e}", exc_info=True)
-                await db.rollback()
-                continue
+        if with_sku:
+            stmt = insert(table).values(with_sku).on_conflict_do_nothing(
+                index_elements=["shop_id", "operation_id", "ozon_sku"]
+            ).returning(table.c.id)
+            inserted += len((await db.execute(stmt)).all())
+
+        if without_sku:
+            stmt = insert(table).values(without_sku).on_conflict_do_nothing(
+                index_elements=["shop_id", "operation_id"],
+                index_where=table.c.ozon_sku.is_(None)
+            ).returning(table.c.id)
+            inserted += len((await db.execute(stmt)).all())
 
-        return saved_count
+        return inserted
 
     async def _update_watermark_success(
         self,
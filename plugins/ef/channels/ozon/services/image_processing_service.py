@@ -5,6 +5,7 @@
 性能优化：
 - 复用 httpx.AsyncClient 连接，避免重复 TLS 握手
 - CPU 密集计算移到线程池，避免阻塞事件循环
+- 水印位置评分向量化：每张图一次灰度转换 + 积分图，在进程池中批量评分
 """
 
 from PIL import Image, ImageEnhance, ImageOps
@@ -18,6 +19,8 @@ from enum import Enum
 
 from ef_core.utils.logger import get_logger
 
+from .watermark_scoring import GrayscaleStats, compute_region_size, run_scoring
+
 logger = get_logger(__name__)
 
 
@@ -153,6 +156,10 @@ class ImageProcessingService:
             logger.error(f"Failed to load watermark: {e}")
             raise
 
+    def _region_stats(self, image: Image.Image) -> GrayscaleStats:
+        """单次灰度转换并构建共享统计量"""
+        return GrayscaleStats(np.asarray(image.convert('L')))
+
     def calculate_region_brightness(
         self,
         image: Image.Image,
@@ -171,29 +178,9 @@ class ImageProcessingService:
             平均亮度值（0-255）
         """
         try:
-            # 转换为灰度图用于亮度分析
-            gray_image = image.convert('L')
-            img_array = np.array(gray_image)
-
-            # 获取位置坐标
-            x_ratio, y_ratio = self.POSITION_RATIOS[position]
-            center_x = int(x_ratio * image.width)
-            center_y = int(y_ratio * image.height)
-
-            # 计算区域边界
-            half_width = region_size[0] // 2
-            half_height = region_size[1] // 2
-
-            x1 = max(0, center_x - half_width)
-            y1 = max(0, center_y - half_height)
-            x2 = min(image.width, center_x + half_width)
-            y2 = min(image.height, center_y + half_height)
-
-            # 提取区域并计算平均亮度
-            region = img_array[y1:y2, x1:x2]
-            avg_brightness = np.mean(region)
-
-            return float(avg_brightness)
+            stats = self._region_stats(image)
+            bounds = stats.region_bounds(*self.POSITION_RATIOS[position], region_size)
+            return stats.brightness_and_complexity(*bounds)[0]
 
         except Exception as e:
             logger.error(f"Failed to calculate region brightness: {e}")
@@ -217,29 +204,9 @@ class ImageProcessingService:
             复杂度值（0-255，越低表示区域越平滑）
         """
         try:
-            # 转换为灰度图
-            gray_image = image.convert('L')
-            img_array = np.array(gray_image)
-
-            # 获取位置坐标
-            x_ratio, y_ratio = self.POSITION_RATIOS[position]
-            center_x = int(x_ratio * image.width)
-            center_y = int(y_ratio * image.height)
-
-            # 计算区域边界
-            half_width = region_size[0] // 2
-            half_height = region_size[1] // 2
-
-            x1 = max(0, center_x - half_width)
-            y1 = max(0, center_y - half_height)
-            x2 = min(image.width, center_x + half_width)
-            y2 = min(image.height, center_y + half_height)
-
-            # 提取区域并计算标准差
-            region = img_array[y1:y2, x1:x2]
-            std_dev = np.std(region)
-
-            return float(std_dev)
+            stats = self._region_stats(image)
+            bounds = stats.region_bounds(*self.POSITION_RATIOS[position], region_size)
+            return stats.brightness_and_complexity(*bounds)[1]
 
         except Exception as e:
             logger.error(f"Failed to calculate region complexity: {e}")
@@ -263,41 +230,9 @@ class ImageProcessingService:
             边缘密度（0-1，越低表示区域越平滑，没有文字或复杂图案）
         """
         try:
-            from scipy import ndimage
-
-            # 转换为灰度图
-            gray_image = image.convert('L')
-            img_array = np.array(gray_image, dtype=np.float32)
-
-            # 获取位置坐标
-            x_ratio, y_ratio = self.POSITION_RATIOS[position]
-            center_x = int(x_ratio * image.width)
-            center_y = int(y_ratio * image.height)
-
-            # 计算区域边界
-            half_width = region_size[0] // 2
-            half_height = region_size[1] // 2
-
-            x1 = max(0, center_x - half_width)
-            y1 = max(0, center_y - half_height)
-            x2 = min(image.width, center_x + half_width)
-            y2 = min(image.height, center_y + half_height)
-
-            # 提取区域
-            region = img_array[y1:y2, x1:x2]
-
-            # 应用Sobel算子检测边缘
-            sobel_x = ndimage.sobel(region, axis=1)
-            sobel_y = ndimage.sobel(region, axis=0)
-            edge_magnitude = np.sqrt(sobel_x**2 + sobel_y**2)
-
-            # 计算边缘密度（边缘像素占比）
-            threshold = 30  # 边缘阈值
-            edge_pixels = np.sum(edge_magnitude > threshold)
-            total_pixels = region.size
-            edge_density = edge_pixels / total_pixels if total_pixels > 0 else 0
-
-            return float(edge_density)
+            stats = self._region_stats(image)
+            bounds = stats.region_bounds(*self.POSITION_RATIOS[position], region_size)
+            return stats.edge_density(*bounds)
 
         except Exception as e:
             logger.error(f"Failed to calculate edge density: {e}")
@@ -321,69 +256,23 @@ class ImageProcessingService:
             文字概率（0-1，越高表示越可能有文字）
         """
         try:
-            # 转换为灰度图
-            gray_image = image.convert('L')
-            img_array = np.array(gray_image, dtype=np.uint8)
-
-            # 获取区域
-            x_ratio, y_ratio = self.POSITION_RATIOS[position]
-            center_x = int(x_ratio * image.width)
-            center_y = int(y_ratio * image.height)
-
-            half_width = region_size[0] // 2
-            half_height = region_size[1] // 2
-
-            x1 = max(0, center_x - half_width)
-            y1 = max(0, center_y - half_height)
-            x2 = min(image.width, center_x + half_width)
-            y2 = min(image.height, center_y + half_height)
-
-            region = img_array[y1:y2, x1:x2]
-
-            # 计算水平和垂直方向的梯度
-            grad_x = np.abs(np.diff(region, axis=1))
-            grad_y = np.abs(np.diff(region, axis=0))
-
-            # 投影到水平和垂直轴
-            h_projection = np.sum(grad_x, axis=1)
-            v_projection = np.sum(grad_y, axis=0)
-
-            # 分析投影的周期性（文字通常有规律的间隔）
-            h_std = np.std(h_projection) if len(h_projection) > 0 else 0
-            v_std = np.std(v_projection) if len(v_projection) > 0 else 0
-
-            # 检测峰值数量（多个峰值表示可能有文字行）
-            h_mean = np.mean(h_projection) if len(h_projection) > 0 else 0
-            v_mean = np.mean(v_projection) if len(v_projection) > 0 else 0
-
-            h_peaks = np.sum(h_projection > h_mean * 1.5) if h_mean > 0 else 0
-            v_peaks = np.sum(v_projection > v_mean * 1.5) if v_mean > 0 else 0
-
-            # 计算峰值密度
-            h_peak_density = h_peaks / max(len(h_projection), 1)
-            v_peak_density = v_peaks / max(len(v_projection), 1)
-
-            # 综合评估文字概率
-            text_score = 0.0
-
-            # 水平方向文字检测（横排文字）
-            if h_peak_density > 0.1 and h_peak_density < 0.5:
-                text_score = max(text_score, h_peak_density * 2)
-
-            # 垂直方向文字检测（竖排文字或多列文字）
-            if v_peak_density > 0.1 and v_peak_density < 0.5:
-                text_score = max(text_score, v_peak_density * 2)
-
-            # 如果标准差很大，说明有明显的纹理变化（可能是文字）
-            if h_std > 20 or v_std > 20:
-                text_score = max(text_score, 0.5)
-
-            return min(text_score, 1.0)
+            stats = self._region_stats(image)
+            bounds = stats.region_bounds(*self.POSITION_RATIOS[position], region_size)
+            return stats.text_probability(*bounds)
 
         except Exception as e:
             logger.error(f"Failed to detect text region: {e}")
             return 0.0
 
+    def _resolve_candidates(self, allowed_positions: Optional[List[str]]) -> List[WatermarkPosition]:
+        """解析允许的位置列表（无有效位置时使用右下角）"""
+        if not allowed_positions:
+            return list(WatermarkPosition)
+
+        valid_values = {p.value for p in WatermarkPosition}
+        positions = [WatermarkPosition(pos) for pos in allowed_positions if pos in valid_values]
+        return positions or [WatermarkPosition.BOTTOM_RIGHT]
+
     async def find_best_watermark_position(
         self,
         base_image: Image.Image,
@@ -392,8 +281,8 @@ class ImageProcessingService:
         allowed_positions: Optional[List[str]] = None
     ) -> WatermarkPosition:
         """
-        智能选择最佳水印位置和颜色
-        综合考虑：对比度、内容复杂度、边缘密度
+        智能选择最佳水印位置
+        综合考虑：内容复杂度、边缘密度、文字区域
 
         Args:
             base_image: 原图
@@ -404,116 +293,78 @@ class ImageProcessingService:
         Returns:
             最佳位置
         """
-        try:
-            # 默认使用所有位置
-            if not allowed_positions:
-                test_positions = list(WatermarkPosition)
-            else:
-                test_positions = [
-                    WatermarkPosition(pos) for pos in allowed_positions
-                    if pos in [p.value for p in WatermarkPosition]
-                ]
-
-            # 如果没有有效位置，使用默认
-            if not test_positions:
-                test_positions = [WatermarkPosition.BOTTOM_RIGHT]
-
-            best_position = WatermarkPosition.BOTTOM_RIGHT
-            best_score = -float('inf')
-
-            # 计算水印区域大小（使用实际水印大小+边距）
-            margin = 20  # 额外边距
-            region_size = (
-                min(int(watermark.width * 1.2) + margin, base_image.width // 4),
-                min(int(watermark.height * 1.2) + margin, base_image.height // 4)
-            )
-
-            # 调整评分权重，加大对复杂区域的惩罚
-            WEIGHT_CONTRAST = 0.2      # 降低对比度权重
-            WEIGHT_SMOOTHNESS = 0.35    # 提高平滑度权重
-            WEIGHT_LOW_EDGE = 0.25      # 边缘权重
-            WEIGHT_NO_TEXT = 0.2        # 新增：无文字权重
-
-            position_scores = []
+        positions = await self.find_best_watermark_positions(
+            [base_image], watermark, allowed_positions
+        )
+        return positions[0]
 
-            # 遍历所有候选位置
-            for position in test_positions:
-                # 计算该位置的各项指标
-                brightness = self.calculate_region_brightness(
-                    base_image, position, region_size
-                )
-                complexity = self.calculate_region_complexity(
-                    base_image, position, region_size
-                )
-                edge_density = self.calculate_edge_density(
-                    base_image, position, region_size
-                )
-                text_probability = self.detect_text_region(
-                    base_image, position, region_size
-                )
-
-                # 标准化复杂度分数（0-1，越低越好）
-                # 降低阈值，让复杂度更敏感
-                complexity_score = min(complexity / 50.0, 1.0)  # 降低阈值到50
-                smoothness_score = 1.0 - complexity_score
-
-                # 边缘密度分数（0-1，越低越好）
-                # 使用非线性映射，让高边缘密度区域得分快速下降
-                edge_score = max(0, 1.0 - (edge_density ** 1.5) * 3)  # 非线性放大
-
-                # 文字惩罚分数（0-1，越低越好）
-                no_text_score = 1.0 - text_probability
+    async def find_best_watermark_positions(
+        self,
+        images: List[Image.Image],
+        watermark: Image.Image,
+        allowed_positions: Optional[List[str]] = None
+    ) -> List[WatermarkPosition]:
+        """
+        批量选择最佳水印位置（一个商品的所有图片一次评分）
 
-                # 使用固定的对比度分数（透明PNG水印不需要考虑颜色对比）
-                # 主要依靠透明度和位置来确保水印可见性
-                contrast_score = 0.5  # 中等对比度权重
+        每张图片只做一次灰度转换，所有候选位置共用积分图和一次 Sobel 结果；
+        评分在进程池中并行执行，不阻塞事件循环（见 watermark_scoring）。
 
-                # 综合评分（加入文字惩罚）
-                total_score = (
-                    WEIGHT_CONTRAST * contrast_score +
-                    WEIGHT_SMOOTHNESS * smoothness_score +
-                    WEIGHT_LOW_EDGE * edge_score +
-                    WEIGHT_NO_TEXT * no_text_score
-                )
+        Args:
+            images: 原图列表
+            watermark: 水印图片
+            allowed_positions: 允许的位置列表
 
-                # 如果检测到明显的文字区域，额外惩罚
-                if text_probability > 0.5:
-                    total_score *= (1.0 - text_probability * 0.5)  # 最多减尔50%分数
-
-                position_scores.append({
-                    'position': position,
-                    'score': total_score,
-                    'brightness': brightness,
-                    'complexity': complexity,
-                    'edge_density': edge_density,
-                    'text_prob': text_probability,
-                    'contrast': best_contrast_for_position
-                })
-
-                if total_score > best_score:
-                    best_score = total_score
-                    best_position = position
-
-            # 记录所有位置的评分（用于调试）
-            logger.info("Watermark position scores:")
-            for ps in sorted(position_scores, key=lambda x: x['score'], reverse=True)[:5]:
-                logger.info(
-                    f"  {ps['position'].value}: score={ps['score']:.3f}, "
-                    f"complexity={ps['complexity']:.1f}, edge={ps['edge_density']:.3f}, "
-                    f"text={ps['text_prob']:.2f}, contrast={ps['contrast']:.1f}"
+        Returns:
+            每张图片的最佳位置（与 images 顺序一致，评分失败的图片使用右下角）
+        """
+        if not images:
+            return []
+
+        test_positions = self._resolve_candidates(allowed_positions)
+        candidates = [
+            (position.value, *self.POSITION_RATIOS[position]) for position in test_positions
+        ]
+
+        # 灰度转换在线程中完成，进程池只接收灰度数组（体积为 RGB 的 1/3）
+        grays = await asyncio.to_thread(
+            lambda: [np.asarray(image.convert('L')) for image in images]
+        )
+        results = await asyncio.gather(
+            *(
+                run_scoring(gray, compute_region_size(image.size, watermark.size), candidates)
+                for gray, image in zip(grays, images)
+            ),
+            return_exceptions=True
+        )
+
+        best_positions = []
+        for idx, position_scores in enumerate(results):
+            if isinstance(position_scores, Exception):
+                logger.error(f"Failed to find best watermark position for image {idx}: {position_scores}")
+                best_positions.append(WatermarkPosition.BOTTOM_RIGHT)
+                continue
+
+            ranked = sorted(position_scores, key=lambda x: x['score'], reverse=True)
+
+            # 记录评分最高的位置（用于调试）
+            logger.debug(
+                f"Watermark position scores for image {idx}: " + ", ".join(
+                    f"{ps['position']}={ps['score']:.3f}"
+                    f"(complexity={ps['complexity']:.1f}, edge={ps['edge_density']:.3f}, "
+                    f"text={ps['text_prob']:.2f})"
+                    for ps in ranked[:5]
                 )
+            )
 
+            best = ranked[0]
             logger.info(
-                f"Selected best position: {best_position.value}, "
-                f"score: {best_score:.3f}"
+                f"Selected best position for image {idx}: {best['position']}, "
+                f"score: {best['score']:.3f}"
             )
+            best_positions.append(WatermarkPosition(best['position']))
 
-            return best_position
-
-        except Exception as e:
-            logger.error(f"Failed to find best watermark position: {e}")
-            # 返回默认值
-            return WatermarkPosition.BOTTOM_RIGHT
+        return best_positions
 
     def apply_watermark(
         self,
@@ -0,0 +1,580 @@
+"""
+标签预缓存 worker（事件驱动）
+
+货件状态变为 awaiting_deliver、填写国内单号等事件发生时，把货件写入 Redis 延迟队列；
+worker 常驻消费队列，在仓库人员打印之前把标签PDF缓存到本地：
+- 队列：ZSET（member = "{shop_id}:{posting_number}"，score = 到期时间），
+  入队取较早的到期时间（重复事件不会推迟），Lua 脚本原子领取到期成员，多个进程可同时消费
+- 并行：按店铺分道，不同店铺并发处理，同一店铺串行；
+  OZON 请求仍经过 API 客户端按 client_id 共享的分布式限流器
+- 节奏：每个店铺独立的 AIMD 间隔，收到 429 时按 Retry-After 翻倍退避，成功后减半，
+  取代固定的逐个 sleep；被限流或标签未就绪的货件延迟后重新入队
+- 指标：处理结果计数和入队到缓存完成的耗时分布写入 Redis 汇总（worker 进程不提供 /metrics），
+  API 进程在 /metrics 抓取前读取汇总并实时统计队列深度（已到期/未到期）
+
+队列只是加速手段：已领取未完成的货件在进程崩溃时会丢失，由定时任务
+prefetch_labels_async 按数据库状态重新补入队列，并在没有常驻 worker 时就地消费。
+"""
+import asyncio
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+try:
+    from prometheus_client import REGISTRY
+    from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+from ef_core.database import get_db_manager
+from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import get_redis
+
+from ..api.client import OzonAPIClient
+from ..models import OzonPosting, OzonShop
+from .label_service import LabelService
+
+logger = get_logger(__name__)
+
+
+
+QUEUE_KEY = "ef:ozon:labels:prefetch"
+# 首次入队时间（计算入队到缓存完成的耗时，重新入队不覆盖）
+ENQUEUED_KEY = "ef:ozon:labels:prefetch:enqueued"
+# 常驻 worker 心跳（定时任务据此判断是否需要就地消费）
+HEARTBEAT_KEY = "ef:ozon:labels:prefetch:heartbeat"
+HEARTBEAT_TTL = 30
+# 各进程共享的指标汇总（HASH）：outcome:{结果} 计数，ttc:{桶上限} / ttc:sum / ttc:count 耗时分布
+STATS_KEY = "ef:ozon:labels:prefetch:stats"
+# 入队到缓存完成耗时的直方图桶上限（秒）
+TIME_TO_CACHE_BUCKETS = (30, 45, 60, 90, 120, 180, 300, 600, 1800, 3600)
+
+# OZON 建议装配后 45-60 秒再请求标签
+DEFAULT_DELAY = 45
+# 标签未就绪 / 其他错误的重新入队延迟（秒）
+NOT_READY_DELAY = 30
+ERROR_DELAY = 60
+# 入队超过该时长仍未缓存的货件放弃（定时任务会按数据库状态重新补入）
+MAX_AGE_SECONDS = 60 * 60
+
+# 每次领取的最大货件数、内存中待处理货件上限（背压）、空闲轮询间隔
+CLAIM_BATCH = 200
+MAX_PENDING = 2000
+POLL_INTERVAL = 1.0
+# 同时处理的店铺数（限制数据库连接和 HTTP 客户端占用）
+SHOP_CONCURRENCY = 8
+# 店铺每轮处理的货件数（fetch_labels 内部再按 20 个一组请求）
+SHOP_CHUNK_SIZE = 100
+
+# 店铺节奏：429 后的最小退避、最大间隔、间隔低于该值时视为不限速
+PACE_MIN_BACKOFF = 1.0
+PACE_MAX_INTERVAL = 30.0
+PACE_FLOOR = 0.05
+
+# 入队：到期时间取较早者（重复事件不推迟已排队的货件），首次入队时间只写一次
+_ENQUEUE_LUA = """
+local now = ARGV[1]
+for i = 2, #ARGV, 2 do
+    local member = ARGV[i]
+    local due = tonumber(ARGV[i + 1])
+    local current = redis.call('ZSCORE', KEYS[1], member)
+    if (not current) or tonumber(current) > due then
+        redis.call('ZADD', KEYS[1], due, member)
+    end
+    redis.call('HSETNX', KEYS[2], member, now)
+end
+return 1
+"""
+
+# 领取：取出已到期的成员并从队列删除（原子操作，多进程不会重复领取）
+_CLAIM_LUA = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #items > 0 then
+    redis.call('ZREM', KEYS[1], unpack(items))
+end
+return items
+"""
+
+
+def _member(shop_id: int, posting_number: str) -> str:
+    return f"{shop_id}:{posting_number}"
+
+
+def _parse_member(member: str) -> Optional[Tuple[int, str]]:
+    shop_id, _, posting_number = member.partition(":")
+    try:
+        return int(shop_id), posting_number
+    except ValueError:
+        return None
+
+
+def _is_not_ready(error: Exception) -> bool:
+    message = str(error).lower()
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            message += error.response.text.lower()
+        except Exception:
+            pass
+    return "aren't ready" in message or "not ready" in message
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """429 错误返回 Retry-After 秒数，其他错误返回 None"""
+    if not isinstance(error, httpx.HTTPStatusError) or error.response.status_code != 429:
+        return None
+    try:
+        return float(error.response.headers.get("Retry-After", PACE_MIN_BACKOFF))
+    except ValueError:
+        return PACE_MIN_BACKOFF
+
+
+def _bucket(seconds: float) -> str:
+    """耗时所属的直方图桶（非累计）"""
+    for upper in TIME_TO_CACHE_BUCKETS:
+        if seconds <= upper:
+            return str(upper)
+    return "+Inf"
+
+
+async def enqueue_label_prefetch(
+    shop_id: int,
+    posting_numbers: Iterable[str],
+    delay: float = DEFAULT_DELAY,
+) -> int:
+    """
+    把货件加入标签预缓存队列
+
+    Args:
+        shop_id: 店铺ID
+        posting_numbers: 货件编号
+        delay: 延迟多少秒后处理（已在队列中且到期更早的货件保持原到期时间）
+
+    Returns:
+        入队的货件数
+
+    Raises:
+        RedisError: Redis 不可用（调用方自行降级）
+    """
+    posting_numbers = [pn for pn in posting_numbers if pn]
+    if not posting_numbers:
+        return 0
+
+    now = time.time()
+    args: List = [now]
+    for posting_number in posting_numbers:
+        args.extend((_member(shop_id, posting_number), now + delay))
+
+    redis_client = await get_redis()
+    enqueue = redis_client.register_script(_ENQUEUE_LUA)
+    await enqueue(keys=[QUEUE_KEY, ENQUEUED_KEY], args=args)
+    return len(posting_numbers)
+
+
+async def get_prefetch_queue_depth() -> Dict[str, int]:
+    """队列深度：已到期（等待处理）和未到期（延迟中）的货件数"""
+    redis_client = await get_redis()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zcount(QUEUE_KEY, "-inf", time.time())
+        pipe.zcard(QUEUE_KEY)
+        due, total = await pipe.execute()
+    return {"due": int(due), "scheduled": int(total) - int(due)}
+
+
+async def get_prefetch_stats() -> Dict[str, Any]:
+    """
+    预缓存指标：当前队列深度、各进程累计的处理结果和入队到缓存完成的耗时分布
+
+    Returns:
+        {"queue_depth": {...}, "outcomes": {结果: 数量},
+         "time_to_cache": {"buckets": [(桶上限, 累计数量), ...], "sum": 总秒数, "count": 数量}}
+    """
+    queue_depth = await get_prefetch_queue_depth()
+    redis_client = await get_redis()
+    raw = await redis_client.hgetall(STATS_KEY)
+
+    outcomes: Dict[str, int] = {}
+    for field, value in raw.items():
+        kind, _, name = field.partition(":")
+        if kind == "outcome":
+            outcomes[name] = int(value)
+
+    buckets: List[Tuple[str, int]] = []
+    cumulative = 0
+    for upper in [str(upper) for upper in TIME_TO_CACHE_BUCKETS] + ["+Inf"]:
+        cumulative += int(raw.get(f"ttc:{upper}", 0))
+        buckets.append((upper, cumulative))
+
+    return {
+        "queue_depth": queue_depth,
+        "outcomes": outcomes,
+        "time_to_cache": {
+            "buckets": buckets,
+            "sum": float(raw.get("ttc:sum", 0)),
+            "count": int(raw.get("ttc:count", 0)),
+        },
+    }
+
+
+# 最近一次 /metrics 抓取前读取的指标快照（未刷新过的进程不输出）
+_metrics_snapshot: Optional[Dict[str, Any]] = None
+
+
+async def refresh_prefetch_metrics() -> None:
+    """/metrics 抓取前的刷新回调（通过 register_metrics_refresher 注册）"""
+    global _metrics_snapshot
+    _metrics_snapshot = await get_prefetch_stats()
+
+
+class _PrefetchMetricsCollector:
+    """把指标快照输出为 prometheus 指标"""
+
+    def collect(self):
+        stats = _metrics_snapshot
+        if stats is None:
+            return
+
+        queue_depth = GaugeMetricFamily(
+            'ef_ozon_label_prefetch_queue_depth',
+            'Postings waiting in the OZON label prefetch queue',
+            labels=['state'],
+        )
+        for state, value in stats["queue_depth"].items():
+            queue_depth.add_metric([state], value)
+        yield queue_depth
+
+        outcomes = CounterMetricFamily(
+            'ef_ozon_label_prefetch',
+            'OZON label prefetch outcomes',
+            labels=['outcome'],
+        )
+        for outcome, value in stats["outcomes"].items():
+            outcomes.add_metric([outcome], value)
+        yield outcomes
+
+        time_to_cache = stats["time_to_cache"]
+        yield HistogramMetricFamily(
+            'ef_ozon_label_time_to_cache_seconds',
+            'Time from label prefetch enqueue to the label PDF being cached locally',
+            buckets=time_to_cache["buckets"],
+            sum_value=time_to_cache["sum"],
+        )
+
+
+if PROMETHEUS_AVAILABLE:
+    REGISTRY.register(_PrefetchMetricsCollector())
+
+
+async def is_worker_alive() -> bool:
+    """是否有常驻 worker 在消费队列"""
+    redis_client = await get_redis()
+    return bool(await redis_client.exists(HEARTBEAT_KEY))
+
+
+class ShopPacer:
+    """单个店铺的请求节奏（AIMD：429 时按 Retry-After 翻倍退避，成功后减半）"""
+
+    def __init__(self):
+        self.interval = 0.0
+
+    def on_throttled(self, retry_after: float) -> float:
+        self.interval = min(
+            PACE_MAX_INTERVAL,
+            max(PACE_MIN_BACKOFF, retry_after, self.interval * 2),
+        )
+        return self.interval
+
+    def on_success(self) -> None:
+        self.interval = self.interval / 2
+        if self.interval < PACE_FLOOR:
+            self.interval = 0.0
+
+
+class LabelPrefetchWorker:
+    """标签预缓存 worker（常驻模式用 ensure_started/stop，定时任务用 drain）"""
+
+    def __init__(self, db_manager=None):
+        self._db_manager = db_manager
+        self._running = False
+        self._loop_task: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 店铺分道：每个店铺一个处理任务和待处理列表
+        self._lanes: Dict[int, asyncio.Task] = {}
+        self._pending: Dict[int, List[str]] = defaultdict(list)
+        self._pacers: Dict[int, ShopPacer] = defaultdict(ShopPacer)
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def db_manager(self):
+        if self._db_manager is None:
+            self._db_manager = get_db_manager()
+        return self._db_manager
+
+    def ensure_started(self) -> None:
+        """在当前事件循环中启动（幂等）"""
+        if self._running:
+            return
+        self._running = True
+        self._semaphore = asyncio.Semaphore(SHOP_CONCURRENCY)
+        self._loop_task = asyncio.create_task(self._run())
+        logger.info("Label prefetch worker started")
+
+    async def stop(self) -> None:
+        """停止消费（已领取未完成的货件由定时任务重新补入）"""
+        if not self._running:
+            return
+        self._running = False
+
+        if self._loop_task:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+        await self._release_pending()
+        logger.info("Label prefetch worker stopped")
+
+    async def _release_pending(self) -> None:
+        """取消店铺分道，已领取未处理的货件放回队列"""
+        lanes = list(self._lanes.values())
+        for task in lanes:
+            task.cancel()
+        await asyncio.gather(*lanes, return_exceptions=True)
+
+        try:
+            for shop_id, posting_numbers in self._pending.items():
+                await self._requeue(shop_id, posting_numbers, 0, "requeued")
+        except RedisError as e:
+            logger.warning(f"Failed to requeue pending label prefetch postings: {e}")
+        self._lanes.clear()
+        self._pending.clear()
+
+    async def _run(self) -> None:
+        while self._running:
+            try:
+                redis_client = await get_redis()
+                await redis_client.set(HEARTBEAT_KEY, "1", ex=HEARTBEAT_TTL)
+                claimed = await self._dispatch()
+                if not claimed:
+                    await asyncio.sleep(POLL_INTERVAL)
+            except asyncio.CancelledError:
+                raise
+            except RedisError as e:
+                logger.warning(f"Label prefetch queue unavailable: {e}")
+                await asyncio.sleep(5)
+            except Exception as e:
+                logger.error(f"Label prefetch loop error: {e}", exc_info=True)
+                await asyncio.sleep(5)
+
+    async def drain(self, max_seconds: float) -> Dict[str, int]:
+        """
+        就地消费队列中已到期的货件，直到队列清空或超时（定时任务在没有常驻 worker 时使用）
+
+        Returns:
+            本次处理结果统计
+        """
+        self._semaphore = asyncio.Semaphore(SHOP_CONCURRENCY)
+        deadline = time.monotonic() + max_seconds
+        try:
+            while time.monotonic() < deadline:
+                claimed = await self._dispatch()
+                if not claimed and not self._lanes:
+                    break
+                if not claimed:
+                    await asyncio.wait(list(self._lanes.values()), timeout=POLL_INTERVAL)
+            lanes = list(self._lanes.values())
+            if lanes:
+                await asyncio.wait(lanes, timeout=max(deadline - time.monotonic(), 0))
+        finally:
+            # 超时未完成的店铺：取消并把货件放回队列
+            await self._release_pending()
+        return dict(self.stats)
+
+    async def _dispatch(self) -> int:
+        """领取到期货件并分配到店铺分道，返回领取数量"""
+        pending_count = sum(len(pns) for pns in self._pending.values())
+        limit = min(CLAIM_BATCH, MAX_PENDING - pending_count)
+        if limit <= 0:
+            return 0
+
+        redis_client = await get_redis()
+        claim = redis_client.register_script(_CLAIM_LUA)
+        members = await claim(keys=[QUEUE_KEY], args=[time.time(), limit])
+
+        for member in members:
+            if isinstance(member, bytes):
+                member = member.decode()
+            parsed = _parse_member(member)
+            if parsed is None:
+                await redis_client.hdel(ENQUEUED_KEY, member)
+                continue
+            shop_id, posting_number = parsed
+            self._pending[shop_id].append(posting_number)
+
+        for shop_id, posting_numbers in self._pending.items():
+            lane = self._lanes.get(shop_id)
+            if posting_numbers and (lane is None or lane.done()):
+                self._lanes[shop_id] = asyncio.create_task(self._run_lane(shop_id))
+        return len(members)
+
+    async def _run_lane(self, shop_id: int) -> None:
+        """店铺分道：串行处理该店铺的待处理货件，店铺之间并发"""
+        try:
+            async with self._semaphore:
+                pending = self._pending[shop_id]
+                while pending:
+                    pacer = self._pacers[shop_id]
+                    if pacer.interval:
+                        await asyncio.sleep(pacer.interval)
+
+                    chunk = pending[:SHOP_CHUNK_SIZE]
+                    del pending[:SHOP_CHUNK_SIZE]
+                    try:
+                        await self._process_chunk(shop_id, chunk, pacer)
+                    except asyncio.CancelledError:
+                        pending[:0] = chunk
+                        raise
+                    except Exception as e:
+                        logger.error(f"Label prefetch failed for shop {shop_id}: {e}", exc_info=True)
+                        await self._requeue(shop_id, chunk, ERROR_DELAY, "error")
+        finally:
+            if self._lanes.get(shop_id) is asyncio.current_task():
+                self._lanes.pop(shop_id, None)
+
+    async def _process_chunk(self, shop_id: int, posting_numbers: List[str], pacer: ShopPacer) -> None:
+        async with self.db_manager.get_session() as db:
+            shop = await db.get(OzonShop, shop_id)
+            if shop is None:
+                logger.warning(f"Label prefetch: shop {shop_id} not found, dropping {len(posting_numbers)} postings")
+                await self._finish(posting_numbers, shop_id, "dropped")
+                return
+
+            # 只处理仍需要标签的货件（状态已变化或已由其他途径缓存的直接完成）
+            result = await db.execute(
+                select(OzonPosting.posting_number, OzonPosting.status, OzonPosting.label_pdf_path)
+                .where(
+                    OzonPosting.shop_id == shop_id,
+                    OzonPosting.posting_number.in_(posting_numbers),
+                )
+            )
+            rows = {row.posting_number: row for row in result}
+
+            label_paths: Dict[str, str] = {}
+            to_fetch: List[str] = []
+            skipped: List[str] = []
+            for posting_number in posting_numbers:
+                row = rows.get(posting_number)
+                if row is None or row.status != "awaiting_deliver" or row.label_pdf_path:
+                    skipped.append(posting_number)
+                    continue
+                cached_path = LabelService.find_cached_label(posting_number)
+                if cached_path:
+                    label_paths[posting_number] = cached_path
+                else:
+                    to_fetch.append(posting_number)
+
+            not_ready: List[str] = []
+            throttled: List[str] = []
+            failed: List[str] = []
+            retry_after = 0.0
+            label_service = LabelService(db)
+            if to_fetch:
+                async with OzonAPIClient(shop.client_id, shop.api_key_enc, shop.id) as client:
+                    fetch_results = await label_service.fetch_labels(to_fetch, client)
+
+                for posting_number, fetched in fetch_results.items():
+                    if isinstance(fetched, str):
+                        label_paths[posting_number] = fetched
+                        continue
+                    seconds = _retry_after(fetched)
+                    if seconds is not None:
+                        throttled.append(posting_number)
+                        retry_after = max(retry_after, seconds)
+                    elif _is_not_ready(fetched):
+                        not_ready.append(posting_number)
+                    else:
+                        failed.append(posting_number)
+                        logger.warning(f"Label prefetch error: {posting_number}, {fetched}")
+
+            if label_paths:
+                await label_service.record_label_paths(label_paths)
+                await db.commit()
+
+        if throttled:
+            delay = pacer.on_throttled(retry_after)
+            logger.info(f"Label prefetch throttled for shop {shop_id}, pacing {delay:.1f}s")
+            await self._requeue(shop_id, throttled, delay, "throttled")
+        else:
+            pacer.on_success()
+
+        await self._finish(skipped, shop_id, "skipped")
+        await self._finish(list(label_paths), shop_id, "cached")
+        await self._requeue(shop_id, not_ready, NOT_READY_DELAY, "not_ready")
+        await self._requeue(shop_id, failed, ERROR_DELAY, "error")
+
+    async def _finish(self, posting_numbers: List[str], shop_id: int, outcome: str) -> None:
+        """货件处理完毕：记录结果和耗时（写入 Redis 汇总）并清除入队时间"""
+        if not posting_numbers:
+            return
+        self.stats[outcome] += len(posting_numbers)
+
+        members = [_member(shop_id, pn) for pn in posting_numbers]
+        redis_client = await get_redis()
+        durations: List[float] = []
+        if outcome == "cached":
+            now = time.time()
+            durations = [
+                max(now - float(enqueued_at), 0)
+                for enqueued_at in await redis_client.hmget(ENQUEUED_KEY, members)
+                if enqueued_at is not None
+            ]
+
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(STATS_KEY, f"outcome:{outcome}", len(posting_numbers))
+            if durations:
+                for bucket, count in Counter(_bucket(seconds) for seconds in durations).items():
+                    pipe.hincrby(STATS_KEY, f"ttc:{bucket}", count)
+                pipe.hincrbyfloat(STATS_KEY, "ttc:sum", sum(durations))
+                pipe.hincrby(STATS_KEY, "ttc:count", len(durations))
+            pipe.hdel(ENQUEUED_KEY, *members)
+            await pipe.execute()
+
+    async def _requeue(self, shop_id: int, posting_numbers: List[str], delay: float, outcome: str) -> None:
+        """延迟后重新入队；超过 MAX_AGE_SECONDS 的货件放弃"""
+        if not posting_numbers:
+            return
+        self.stats[outcome] += len(posting_numbers)
+
+        redis_client = await get_redis()
+        await redis_client.hincrby(STATS_KEY, f"outcome:{outcome}", len(posting_numbers))
+        members = [_member(shop_id, pn) for pn in posting_numbers]
+        now = time.time()
+        retry: List[str] = []
+        expired: List[str] = []
+        for posting_number, enqueued_at in zip(posting_numbers, await redis_client.hmget(ENQUEUED_KEY, members)):
+            if enqueued_at is not None and now - float(enqueued_at) > MAX_AGE_SECONDS:
+                expired.append(posting_number)
+            else:
+                retry.append(posting_number)
+
+        if retry:
+            await enqueue_label_prefetch(shop_id, retry, delay=delay)
+        if expired:
+            logger.warning(f"Label prefetch gave up after {MAX_AGE_SECONDS}s: {expired}")
+            await self._finish(expired, shop_id, "expired")
+
+
+_worker: Optional[LabelPrefetchWorker] = None
+
+
+def get_label_prefetch_worker() -> LabelPrefetchWorker:
+    """获取当前进程的常驻标签预缓存 worker"""
+    global _worker
+    if _worker is None:
+        _worker = LabelPrefetchWorker()
+    return _worker
@@ -1,27 +1,144 @@
 """
 标签服务
 负责标签PDF的下载、保存和管理
+
+缓存策略：
+- 单个货件标签按内容寻址：{posting_number}.{sha256前16位}.pdf，文件写入后不再变化
+- 多个货件按店铺分组，一次 API 调用获取（最多20个），合并PDF按页拆分回每个货件；
+  OZON 任一货件出错会导致整组失败，此时退回逐个获取，隔离失败的货件
+- 批量打印的合并PDF按货件集合（含内容哈希）记忆化：batch_{key}.pdf，相同集合直接复用
+- 合并PDF按 LRU（最近使用时间）+ TTL 淘汰
+- PDF 拆分/合并和文件写入都在工作线程中执行，不阻塞事件循环
 """
 import os
+import glob
 import base64
+import asyncio
+import hashlib
 import logging
-from typing import Optional, Dict, Any
+import time
+from io import BytesIO
+from typing import Optional, Dict, Any, List, Union
 from datetime import datetime, timezone
 
-from sqlalchemy import update
+from sqlalchemy import bindparam, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models.orders import OzonPosting
 from ..api.client import OzonAPIClient
 
+try:
+    from pypdf import PdfReader, PdfWriter
+    PDF_AVAILABLE = True
+except ImportError:
+    try:
+        from PyPDF2 import PdfReader, PdfWriter
+        PDF_AVAILABLE = True
+    except ImportError:
+        PDF_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
+# OZON 单次请求最多获取的标签数
+MAX_LABELS_PER_REQUEST = 20
+
+# 合并PDF淘汰策略：最多保留的文件数、最长保留时间（秒，按最近使用时间计算）
+BATCH_MAX_FILES = 200
+BATCH_TTL_SECONDS = 24 * 60 * 60
+
+BATCH_PREFIX = "batch_"
+
+
 def utcnow():
     """返回UTC时区的当前时间"""
     return datetime.now(timezone.utc)
 
 
+def _write_atomic(path: str, content: bytes) -> None:
+    """写入临时文件后原子替换，避免读到半个文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def split_label_pdf(content: bytes, count: int) -> Optional[List[bytes]]:
+    """
+    将多货件标签PDF按页拆分（OZON 按请求顺序每个货件一页）
+
+    Args:
+        content: 合并的标签PDF
+        count: 请求的货件数
+
+    Returns:
+        每个货件的单页PDF；页数与货件数不一致（无法确定对应关系）时返回 None
+    """
+    reader = PdfReader(BytesIO(content))
+    if len(reader.pages) != count:
+        return None
+
+    pages = []
+    for page in reader.pages:
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = BytesIO()
+        writer.write(buffer)
+        pages.append(buffer.getvalue())
+    return pages
+
+
+def merge_label_pdfs(pdf_paths: List[str], target_path: str) -> None:
+    """合并多个标签PDF，直接写入目标文件（先写临时文件再原子替换）"""
+    writer = PdfWriter()
+    for pdf_path in pdf_paths:
+        for page in PdfReader(pdf_path).pages:
+            writer.add_page(page)
+
+    tmp_path = f"{target_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        writer.write(f)
+    os.replace(tmp_path, target_path)
+
+
+def evict_label_batches(
+    label_dir: str,
+    max_files: int = BATCH_MAX_FILES,
+    ttl_seconds: int = BATCH_TTL_SECONDS
+) -> int:
+    """
+    淘汰合并PDF（LRU + TTL）
+
+    复用合并PDF时会刷新其修改时间，因此修改时间即最近使用时间：
+    先删除超过 TTL 的文件，剩余数量仍超过上限时按最近使用时间从旧到新删除。
+
+    Returns:
+        删除的文件数
+    """
+    entries = []
+    for path in glob.glob(os.path.join(label_dir, f"{BATCH_PREFIX}*.pdf")):
+        try:
+            entries.append((os.path.getmtime(path), path))
+        except OSError:
+            continue
+
+    cutoff = time.time() - ttl_seconds
+    entries.sort()
+    expired = [path for mtime, path in entries if mtime < cutoff]
+    remaining = len(entries) - len(expired)
+    if remaining > max_files:
+        expired.extend(path for _, path in entries[len(expired):len(expired) + remaining - max_files])
+
+    deleted = 0
+    for path in expired:
+        try:
+            os.remove(path)
+            deleted += 1
+        except OSError:
+            pass
+    return deleted
+
+
 class LabelService:
     """标签管理服务"""
 
@@ -44,30 +161,197 @@ class LabelService:
         return cls.LABEL_DIR
 
     @classmethod
-    def get_label_path(cls, posting_number: str) -> str:
+    def get_label_path(cls, posting_number: str, digest: Optional[str] = None) -> str:
         """
         获取标签文件路径
 
         Args:
             posting_number: 货件编号
+            digest: 内容哈希（None 表示旧版不带哈希的文件名）
 
         Returns:
             标签文件完整路径
         """
+        if digest:
+            return f"{cls.LABEL_DIR}/{posting_number}.{digest}.pdf"
         return f"{cls.LABEL_DIR}/{posting_number}.pdf"
 
     @classmethod
-    def get_label_url(cls, posting_number: str) -> str:
+    def get_label_url(cls, pdf_path: str) -> str:
         """
         获取标签访问URL
 
         Args:
-            posting_number: 货件编号
+            pdf_path: 标签目录下的文件路径（单个标签或合并PDF）
 
         Returns:
             标签访问URL（相对路径）
         """
-        return f"/downloads/labels/{posting_number}.pdf"
+        return f"/downloads/labels/{os.path.basename(pdf_path)}"
+
+    @classmethod
+    def find_cached_label(cls, posting_number: str) -> Optional[str]:
+        """
+        查找货件已缓存的标签文件（最新的内容寻址文件优先，其次旧版文件名）
+
+        Args:
+            posting_number: 货件编号
+
+        Returns:
+            标签文件路径，没有缓存时返回 None
+        """
+        candidates = glob.glob(f"{glob.escape(cls.LABEL_DIR)}/{glob.escape(posting_number)}.*.pdf")
+        if candidates:
+            return max(candidates, key=os.path.getmtime)
+
+        legacy_path = cls.get_label_path(posting_number)
+        if os.path.exists(legacy_path):
+            return legacy_path
+        return None
+
+    @classmethod
+    def _save_label_file(cls, posting_number: str, content: bytes) -> str:
+        """按内容哈希保存单个标签（内容相同的文件已存在时不重复写入）"""
+        digest = hashlib.sha256(content).hexdigest()[:16]
+        pdf_path = cls.get_label_path(posting_number, digest)
+        if not os.path.exists(pdf_path):
+            os.makedirs(cls.LABEL_DIR, exist_ok=True)
+            _write_atomic(pdf_path, content)
+        return pdf_path
+
+    async def _request_labels(self, api_client: OzonAPIClient, posting_numbers: List[str]) -> bytes:
+        """调用OZON API获取标签PDF（二进制）"""
+        api_result = await api_client.get_package_labels(posting_numbers)
+
+        pdf_content_base64 = api_result.get('file_content', '')
+        if not pdf_content_base64:
+            logger.error(
+                f"OZON API返回的PDF内容为空: {posting_numbers}, result keys: {list(api_result.keys())}"
+            )
+            raise ValueError("OZON API返回的PDF内容为空")
+
+        return base64.b64decode(pdf_content_base64)
+
+    async def _fetch_single_label(self, api_client: OzonAPIClient, posting_number: str) -> str:
+        """获取并保存单个货件的标签"""
+        content = await self._request_labels(api_client, [posting_number])
+        return await asyncio.to_thread(self._save_label_file, posting_number, content)
+
+    async def fetch_labels(
+        self,
+        posting_numbers: List[str],
+        api_client: OzonAPIClient
+    ) -> Dict[str, Union[str, Exception]]:
+        """
+        批量获取同一店铺货件的标签并保存（不检查缓存）
+
+        每 MAX_LABELS_PER_REQUEST 个货件一次 API 调用，合并PDF按页拆分回每个货件。
+        整组失败或页数对不上时退回逐个获取（并发执行，由 API 客户端的限流器控制节奏）。
+        不访问数据库（可对多个店铺并发调用），保存的路径由调用方通过 record_label_paths 写回。
+
+        Args:
+            posting_numbers: 货件编号列表（须属于 api_client 对应的店铺）
+            api_client: OZON API客户端
+
+        Returns:
+            {posting_number: 标签文件路径 或 获取失败的异常}
+        """
+        results: Dict[str, Union[str, Exception]] = {}
+
+        for start in range(0, len(posting_numbers), MAX_LABELS_PER_REQUEST):
+            group = posting_numbers[start:start + MAX_LABELS_PER_REQUEST]
+
+            pages = None
+            if len(group) == 1 or PDF_AVAILABLE:
+                try:
+                    content = await self._request_labels(api_client, group)
+                    if len(group) == 1:
+                        pages = [content]
+                    else:
+                        pages = await asyncio.to_thread(split_label_pdf, content, len(group))
+                        if pages is None:
+                            logger.warning(f"标签PDF页数与货件数不一致，改为逐个获取: {group}")
+                except Exception as e:
+                    if len(group) == 1:
+                        results[group[0]] = e
+                        continue
+                    logger.info(f"批量获取标签失败，改为逐个获取以隔离失败货件: {len(group)}个, 错误: {e}")
+
+            if pages is not None:
+                paths = await asyncio.to_thread(
+                    lambda: [self._save_label_file(pn, page) for pn, page in zip(group, pages)]
+                )
+                results.update(zip(group, paths))
+                continue
+
+            singles = await asyncio.gather(
+                *(self._fetch_single_label(api_client, pn) for pn in group),
+                return_exceptions=True
+            )
+            results.update(zip(group, singles))
+
+        saved = sum(1 for path in results.values() if isinstance(path, str))
+        logger.info(f"获取标签PDF: 成功 {saved}个, 失败 {len(results) - saved}个")
+        return results
+
+    async def record_label_paths(self, label_paths: Dict[str, str]) -> None:
+        """
+        批量更新货件的标签路径（一次 executemany，调用方负责提交事务）
+
+        Args:
+            label_paths: {posting_number: 标签文件路径}
+        """
+        if not label_paths:
+            return
+
+        table = OzonPosting.__table__
+        now = utcnow()
+        await self.db.execute(
+            update(table)
+            .where(table.c.posting_number == bindparam("b_posting_number"))
+            .values(label_pdf_path=bindparam("b_label_pdf_path"), updated_at=now),
+            [
+                {"b_posting_number": pn, "b_label_pdf_path": path}
+                for pn, path in label_paths.items()
+            ]
+        )
+
+    async def merge_labels(self, pdf_paths: List[str]) -> str:
+        """
+        合并多个标签PDF（按货件集合记忆化）
+
+        文件名由排序后的标签文件名（货件编号 + 内容哈希）计算，相同货件集合的重复打印
+        直接复用已合并的文件；页序按货件编号排序，与请求顺序无关。
+
+        Args:
+            pdf_paths: 标签文件路径列表
+
+        Returns:
+            合并PDF文件路径
+        """
+        if not PDF_AVAILABLE:
+            raise RuntimeError("PDF处理库未安装（pypdf / PyPDF2）")
+
+        ordered = sorted(set(pdf_paths), key=os.path.basename)
+        key = hashlib.sha256(
+            "\n".join(os.path.basename(path) for path in ordered).encode()
+        ).hexdigest()[:16]
+        label_dir = self.get_label_dir()
+        batch_path = f"{label_dir}/{BATCH_PREFIX}{key}.pdf"
+
+        def merge() -> bool:
+            if os.path.exists(batch_path):
+                # 刷新最近使用时间（LRU）
+                os.utime(batch_path)
+                return True
+            os.makedirs(label_dir, exist_ok=True)
+            merge_label_pdfs(ordered, batch_path)
+            evict_label_batches(label_dir)
+            return False
+
+        reused = await asyncio.to_thread(merge)
+        logger.info(f"批量标签PDF{'复用' if reused else '合并'}: {len(ordered)}个 -> {batch_path}")
+        return batch_path
 
     async def download_and_save_label(
         self,
@@ -93,56 +377,32 @@ class LabelService:
         try:
             # 1. 检查是否已有缓存
             if not force:
-                from sqlalchemy import select
                 result = await self.db.execute(
-                    select(OzonPosting).where(OzonPosting.posting_number == posting_number)
+                    select(OzonPosting.label_pdf_path).where(OzonPosting.posting_number == posting_number)
                 )
-                posting = result.scalar_one_or_none()
+                label_pdf_path = result.scalar_one_or_none()
 
-                if posting and posting.label_pdf_path and os.path.exists(posting.label_pdf_path):
+                if label_pdf_path and os.path.exists(label_pdf_path):
                     logger.info(f"使用缓存的标签PDF: {posting_number}")
                     return {
                         "success": True,
                         "cached": True,
-                        "pdf_path": posting.label_pdf_path
+                        "pdf_path": label_pdf_path
                     }
 
-            # 2. 调用OZON API下载标签
-            api_result = await api_client.get_package_labels([posting_number])
+            # 2. 调用OZON API下载并保存标签
+            result = (await self.fetch_labels([posting_number], api_client))[posting_number]
+            if isinstance(result, Exception):
+                raise result
 
-            # 3. 解析PDF数据
-            pdf_content_base64 = api_result.get('file_content', '')
-            if not pdf_content_base64:
-                error_msg = "OZON API返回的PDF内容为空"
-                logger.error(f"{error_msg}: {posting_number}, result keys: {list(api_result.keys())}")
-                return {
-                    "success": False,
-                    "error": error_msg
-                }
-
-            pdf_content = base64.b64decode(pdf_content_base64)
-
-            # 4. 保存PDF文件
-            label_dir = self.get_label_dir()
-            os.makedirs(label_dir, exist_ok=True)
-            pdf_path = self.get_label_path(posting_number)
-
-            with open(pdf_path, 'wb') as f:
-                f.write(pdf_content)
-
-            logger.info(f"成功保存标签PDF: {pdf_path}")
-
-            # 5. 更新数据库
-            await self.db.execute(
-                update(OzonPosting)
-                .where(OzonPosting.posting_number == posting_number)
-                .values(label_pdf_path=pdf_path, updated_at=utcnow())
-            )
+            # 3. 更新数据库
+            await self.record_label_paths({posting_number: result})
+            logger.info(f"成功保存标签PDF: {result}")
 
             return {
                 "success": True,
                 "cached": False,
-                "pdf_path": pdf_path
+                "pdf_path": result
             }
 
         except Exception as e:
@@ -163,13 +423,12 @@ class LabelService:
         Returns:
             标签文件是否存在
         """
-        from sqlalchemy import select
         result = await self.db.execute(
-            select(OzonPosting).where(OzonPosting.posting_number == posting_number)
+            select(OzonPosting.label_pdf_path).where(OzonPosting.posting_number == posting_number)
         )
-        posting = result.scalar_one_or_none()
+        label_pdf_path = result.scalar_one_or_none()
 
-        if posting and posting.label_pdf_path:
-            return os.path.exists(posting.label_pdf_path)
+        if label_pdf_path:
+            return os.path.exists(label_pdf_path)
 
         return False
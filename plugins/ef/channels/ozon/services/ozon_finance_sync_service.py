@@ -1,16 +1,15 @@
 """
 OZON财务费用自动同步服务
 每小时运行一次，同步最近7天内签收的订单
-使用基于日期的批量查询方式，大幅提升性能
+使用基于日期的批量查询方式，边分页边按 posting_number 建索引，批量写回
 """
 import logging
-import asyncio
 from collections import defaultdict
 from datetime import datetime, timezone, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from decimal import Decimal, InvalidOperation
 
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ef_core.database import get_task_db_manager
@@ -18,6 +17,7 @@ from ..models.orders import OzonPosting
 from ..models.ozon_shops import OzonShop
 from ..models.sync_service import SyncServiceLog
 from ..api.client import OzonAPIClient
+from .profit_calculator import compute_profit
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -25,6 +25,36 @@ logger = logging.getLogger(__name__)
 # 同步时间范围（天）
 SYNC_DAYS = 7
 
+# 财务交易分页上限（每页 1000 条；内存只保留待同步订单的交易，与页数无关）
+MAX_PAGES = 100
+
+# 单页请求失败重试次数（429 由共享限流器写入退避，重试时自动等待）
+PAGE_ATTEMPTS = 3
+
+# 每条批量 UPDATE 的订单数
+UPDATE_BATCH_SIZE = 500
+
+# 待同步订单只加载计算费用和利润需要的列
+PENDING_COLUMNS = (
+    OzonPosting.id,
+    OzonPosting.shop_id,
+    OzonPosting.posting_number,
+    OzonPosting.status,
+    OzonPosting.raw_payload,
+    OzonPosting.order_total_price,
+    OzonPosting.purchase_price,
+    OzonPosting.material_cost,
+    OzonPosting.international_logistics_fee_cny,
+)
+
+# 店铺只加载调用 API 需要的列（普通行不受 rollback 过期影响，失败后仍可读取）
+SHOP_COLUMNS = (
+    OzonShop.id,
+    OzonShop.shop_name,
+    OzonShop.client_id,
+    OzonShop.api_key_enc,
+)
+
 
 class OzonFinanceSyncService:
     """OZON财务费用自动同步服务"""
@@ -38,13 +68,15 @@ class OzonFinanceSyncService:
         同步财务费用主流程 - 使用基于日期的批量查询
 
         优化策略：
-        1. 查询最近7天内签收的订单
-        2. 按店铺分组，每个店铺只调用一次财务API（按日期范围）
-        3. 在内存中按 posting_number 匹配
-        4. 批量更新数据库
+        1. 查询最近7天内签收且未同步财务的订单（只取需要的列）
+        2. 按店铺分组，每个店铺按日期范围分页拉取财务交易
+        3. 每页到达时只保留待同步订单的交易，建立 posting_number -> 交易列表 索引
+        4. 计算费用和利润后按主键批量 UPDATE
+        请求节奏由 OzonAPIClient 的共享限流器控制，不做固定间隔等待。
 
         Args:
             config: 服务配置
+                - shop_id: 店铺ID（可选，默认所有店铺）
 
         Returns:
             同步结果统计
@@ -70,8 +102,8 @@ class OzonFinanceSyncService:
         db_manager = get_task_db_manager()
         async with db_manager.get_session() as session:
             # 1. 查询最近7天内签收且未同步财务的订单
-            postings_result = await session.execute(
-                select(OzonPosting)
+            query = (
+                select(*PENDING_COLUMNS)
                 .where(OzonPosting.status == 'delivered')
                 .where(OzonPosting.delivered_at >= date_from)
                 .where(OzonPosting.finance_synced_at == None)  # 只处理未同步的
@@ -79,7 +111,9 @@ class OzonFinanceSyncService:
                 .where(OzonPosting.posting_number != '')
                 .order_by(OzonPosting.delivered_at.desc())
             )
-            postings = postings_result.scalars().all()
+            if config.get("shop_id"):
+                query = query.where(OzonPosting.shop_id == config["shop_id"])
+            postings = (await session.execute(query)).all()
 
             if not postings:
                 logger.info(f"No postings need finance sync in the last {SYNC_DAYS} days")
@@ -90,27 +124,28 @@ class OzonFinanceSyncService:
 
             logger.info(f"Found {len(postings)} postings delivered in the last {SYNC_DAYS} days")
 
-            # 2. 按店铺分组
-            postings_by_shop = defaultdict(list)
+            # 2. 按店铺分组（posting_number -> 订单）
+            postings_by_shop: Dict[int, Dict[str, Any]] = defaultdict(dict)
             for posting in postings:
-                postings_by_shop[posting.shop_id].append(posting)
+                postings_by_shop[posting.shop_id][posting.posting_number] = posting
+
+            shops_result = await session.execute(
+                select(*SHOP_COLUMNS).where(OzonShop.id.in_(list(postings_by_shop)))
+            )
+            shops = {shop.id: shop for shop in shops_result.all()}
+
+            # 结束只读事务，拉取 API 期间不占用连接
+            await session.commit()
 
             logger.info(f"Grouped into {len(postings_by_shop)} shop(s)")
 
             # 3. 遍历每个店铺
-            shop_index = 0
-            for shop_id, shop_postings in postings_by_shop.items():
-                shop_index += 1
+            for shop_index, (shop_id, pending) in enumerate(postings_by_shop.items(), start=1):
+                shop = shops.get(shop_id)
 
-                # 获取店铺配置
-                shop_result = await session.execute(
-                    select(OzonShop).where(OzonShop.id == shop_id)
-                )
-                shop_orm = shop_result.scalar_one_or_none()
-
-                if not shop_orm:
-                    logger.error(f"Shop {shop_id} not found, skipping {len(shop_postings)} postings")
-                    for posting in shop_postings:
+                if not shop:
+                    logger.error(f"Shop {shop_id} not found, skipping {len(pending)} postings")
+                    for posting in pending.values():
                         stats["errors"].append({
                             "posting_id": posting.id,
                             "posting_number": posting.posting_number,
@@ -118,116 +153,37 @@ class OzonFinanceSyncService:
                         })
                     continue
 
-                shop_name = shop_orm.shop_name
-                client_id = shop_orm.client_id
-                api_key_enc = shop_orm.api_key_enc
-
-                logger.info(f"Processing shop {shop_index}/{len(postings_by_shop)}: {shop_name} ({len(shop_postings)} postings)")
+                shop_name = shop.shop_name
+                logger.info(f"Processing shop {shop_index}/{len(postings_by_shop)}: {shop_name} ({len(pending)} postings)")
 
                 # 记录开始时间
                 started_at = datetime.now(timezone.utc)
                 run_id = f"ozon_finance_sync_{uuid.uuid4().hex[:12]}"
 
                 try:
-                    # 4. 创建 API 客户端
-                    async with OzonAPIClient(client_id, api_key_enc, shop_id=shop_id) as client:
-                        # 5. 批量查询财务交易（按日期范围，一次性获取所有）
-                        all_operations = []
-                        page = 1
-                        max_pages = 20  # 安全限制
-
-                        while page <= max_pages:
-                            logger.info(f"Fetching finance transactions page {page} for shop {shop_name}")
-                            response = await client.get_finance_transaction_list(
-                                date_from=date_from_str,
-                                date_to=date_to_str,
-                                transaction_type="all",
-                                page=page,
-                                page_size=1000
-                            )
-
-                            result = response.get("result", {})
-                            operations = result.get("operations", [])
-                            page_count = result.get("page_count", 1)
-
-                            all_operations.extend(operations)
-                            logger.info(f"Page {page}/{page_count}: fetched {len(operations)} operations, total: {len(all_operations)}")
-
-                            if page >= page_count:
-                                break
-                            page += 1
-                            await asyncio.sleep(1)  # 页间间隔1秒
-
-                        logger.info(f"Total operations fetched for shop {shop_name}: {len(all_operations)}")
-
-                        # 6. 按 posting_number 建立索引
-                        operations_by_posting = defaultdict(list)
-                        for op in all_operations:
-                            pn = op.get("posting", {}).get("posting_number")
-                            if pn:
-                                operations_by_posting[pn].append(op)
-
-                        logger.info(f"Indexed {len(operations_by_posting)} unique posting_numbers")
-
-                        # 7. 匹配并更新每个 posting
-                        for posting in shop_postings:
-                            stats["records_processed"] += 1
-                            posting_number = posting.posting_number
-                            stats["posting_numbers"].append(posting_number)
-
-                            # 查找该 posting 的财务操作
-                            operations = operations_by_posting.get(posting_number, [])
-
-                            if not operations:
-                                logger.debug(f"No finance transactions for {posting_number}")
-                                stats["records_skipped"] += 1
-                                continue
-
-                            # 计算汇率
-                            exchange_rate = await self._calculate_exchange_rate(posting, operations)
-
-                            if exchange_rate is None or exchange_rate <= 0:
-                                logger.debug(f"Invalid exchange rate for {posting_number}")
-                                stats["records_skipped"] += 1
-                                continue
-
-                            # 提取并转换费用
-                            fees = await self._extract_and_convert_fees(operations, exchange_rate)
-
-                            # 更新 posting 记录
-                            posting.last_mile_delivery_fee_cny = fees["last_mile_delivery"]
-
-                            # 国际物流费用保护逻辑
-                            if posting.international_logistics_fee_cny and posting.international_logistics_fee_cny != 0:
-                                if fees["international_logistics"] == 0:
-                                    pass  # 保护现有值
-                                else:
-                                    posting.international_logistics_fee_cny = fees["international_logistics"]
-                            else:
-                                posting.international_logistics_fee_cny = fees["international_logistics"]
-
-                            # OZON 佣金
-                            posting.ozon_commission_cny = fees["ozon_commission"]
-                            posting.finance_synced_at = datetime.now(timezone.utc)
-
-                            # 计算利润
-                            from .profit_calculator import calculate_and_update_profit
-                            calculate_and_update_profit(posting)
-
-                            stats["records_updated"] += 1
-
-                        # 8. 批量提交该店铺的所有更新
-                        await session.commit()
-                        logger.info(f"Shop {shop_name}: committed {stats['records_updated']} updates")
-
-                        # 记录成功日志
-                        await self._create_log(
-                            session, run_id, f"shop_{shop_id}", None,
-                            started_at, "success", None
+                    # 4. 流式拉取财务交易，只索引待同步订单的交易
+                    async with OzonAPIClient(shop.client_id, shop.api_key_enc, shop_id=shop_id) as client:
+                        operations_by_posting = await self._collect_operations(
+                            client, shop_name, date_from_str, date_to_str, pending
                         )
 
+                    logger.info(f"Shop {shop_name}: matched operations for {len(operations_by_posting)}/{len(pending)} postings")
+
+                    # 5. 计算费用并批量更新
+                    updates = await self._reconcile(pending, operations_by_posting, stats)
+                    await self._write_updates(session, updates)
+                    stats["records_updated"] += len(updates)
+                    logger.info(f"Shop {shop_name}: committed {len(updates)} updates")
+
+                    # 记录成功日志
+                    await self._create_log(
+                        session, run_id, f"shop_{shop_id}", None,
+                        started_at, "success", None
+                    )
+
                 except Exception as e:
                     logger.error(f"Error processing shop {shop_id}: {e}", exc_info=True)
+                    await session.rollback()
 
                     error_str = str(e)
                     if "timeout" in error_str.lower():
@@ -237,7 +193,7 @@ class OzonFinanceSyncService:
                     else:
                         error_message = error_str[:50]
 
-                    for posting in shop_postings:
+                    for posting in pending.values():
                         stats["errors"].append({
                             "posting_id": posting.id,
                             "posting_number": posting.posting_number,
@@ -250,10 +206,6 @@ class OzonFinanceSyncService:
                     )
                     continue
 
-                # 店铺间间隔2秒
-                if shop_index < len(postings_by_shop):
-                    await asyncio.sleep(2)
-
         logger.info(
             f"Finance cost sync completed: "
             f"processed={stats['records_processed']}, "
@@ -277,6 +229,147 @@ class OzonFinanceSyncService:
             "message": message
         }
 
+    @staticmethod
+    def _operation_posting_number(op: Dict[str, Any]) -> Optional[str]:
+        """交易所属的 posting_number（posting 字段可能是字典或字符串）"""
+        posting = op.get("posting")
+        if isinstance(posting, dict):
+            return posting.get("posting_number")
+        if isinstance(posting, str):
+            return posting
+        return None
+
+    async def _collect_operations(
+        self,
+        client: OzonAPIClient,
+        shop_name: str,
+        date_from: str,
+        date_to: str,
+        pending: Dict[str, Any]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        分页拉取财务交易，边拉取边建立 posting_number -> 交易列表 索引
+
+        只保留 pending 中订单的交易，其余交易随页丢弃。
+        """
+        operations_by_posting: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        page = 1
+
+        while True:
+            response = await self._fetch_page(client, date_from, date_to, page)
+
+            result = response.get("result", {})
+            operations = result.get("operations", [])
+            page_count = result.get("page_count", 1)
+
+            matched = 0
+            for op in operations:
+                posting_number = self._operation_posting_number(op)
+                if posting_number in pending:
+                    operations_by_posting[posting_number].append(op)
+                    matched += 1
+
+            logger.info(f"Shop {shop_name} page {page}/{page_count}: fetched {len(operations)} operations, matched {matched}")
+
+            if not operations or page >= page_count:
+                break
+            if page >= MAX_PAGES:
+                logger.warning(f"Shop {shop_name}: reached page limit {MAX_PAGES} of {page_count}, remaining pages skipped")
+                break
+            page += 1
+
+        return operations_by_posting
+
+    async def _fetch_page(
+        self,
+        client: OzonAPIClient,
+        date_from: str,
+        date_to: str,
+        page: int
+    ) -> Dict[str, Any]:
+        """拉取一页财务交易（失败重试，限流等待由共享限流器处理）"""
+        for attempt in range(1, PAGE_ATTEMPTS + 1):
+            try:
+                return await client.get_finance_transaction_list(
+                    date_from=date_from,
+                    date_to=date_to,
+                    transaction_type="all",
+                    page=page,
+                    page_size=1000
+                )
+            except Exception as e:
+                if attempt == PAGE_ATTEMPTS:
+                    raise
+                logger.warning(f"Fetching finance transactions page {page} failed (attempt {attempt}/{PAGE_ATTEMPTS}): {e}")
+
+    async def _reconcile(
+        self,
+        pending: Dict[str, Any],
+        operations_by_posting: Dict[str, List[Dict[str, Any]]],
+        stats: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """匹配待同步订单与交易，返回批量 UPDATE 的参数列表"""
+        updates = []
+        synced_at = datetime.now(timezone.utc)
+
+        for posting_number, posting in pending.items():
+            stats["records_processed"] += 1
+            stats["posting_numbers"].append(posting_number)
+
+            # 查找该 posting 的财务操作
+            operations = operations_by_posting.get(posting_number)
+
+            if not operations:
+                logger.debug(f"No finance transactions for {posting_number}")
+                stats["records_skipped"] += 1
+                continue
+
+            # 计算汇率
+            exchange_rate = await self._calculate_exchange_rate(posting, operations)
+
+            if exchange_rate is None or exchange_rate <= 0:
+                logger.debug(f"Invalid exchange rate for {posting_number}")
+                stats["records_skipped"] += 1
+                continue
+
+            # 提取并转换费用
+            fees = await self._extract_and_convert_fees(operations, exchange_rate)
+
+            # 国际物流费用保护逻辑：已有非零值且本次为 0 时保留现有值
+            international_logistics = fees["international_logistics"]
+            if posting.international_logistics_fee_cny and international_logistics == 0:
+                international_logistics = posting.international_logistics_fee_cny
+
+            # 计算利润
+            profit, profit_rate = compute_profit(
+                order_total_price=posting.order_total_price,
+                status=posting.status,
+                purchase_price=posting.purchase_price,
+                ozon_commission_cny=fees["ozon_commission"],
+                international_logistics_fee_cny=international_logistics,
+                last_mile_delivery_fee_cny=fees["last_mile_delivery"],
+                material_cost=posting.material_cost
+            )
+
+            updates.append({
+                "id": posting.id,
+                "last_mile_delivery_fee_cny": fees["last_mile_delivery"],
+                "international_logistics_fee_cny": international_logistics,
+                "ozon_commission_cny": fees["ozon_commission"],
+                "profit": profit,
+                "profit_rate": profit_rate,
+                "finance_synced_at": synced_at,
+                "updated_at": synced_at,
+            })
+
+        return updates
+
+    async def _write_updates(self, session: AsyncSession, updates: List[Dict[str, Any]]) -> None:
+        """按主键批量 UPDATE（executemany），每批一个事务"""
+        for start in range(0, len(updates), UPDATE_BATCH_SIZE):
+            await session.execute(update(OzonPosting), updates[start:start + UPDATE_BATCH_SIZE])
+            await session.commit()
+
     async def _calculate_exchange_rate(
         self,
         posting: OzonPosting,
@@ -17,7 +17,6 @@ from .sync.utils import safe_int_conversion, safe_decimal_conversion  # noqa: F4
 # 向后兼容：重新导出任务状态管理器
 from .sync.task_state_manager import (
     TaskStateManager,  # noqa: F401
-    SyncTaskState,  # noqa: F401
     get_task_state_manager,
 )
 
@@ -27,13 +26,6 @@ from .sync.order_sync import OrderSyncService
 from .sync.order_sync.sales_updater import SalesUpdater
 
 
-# ============ 向后兼容：SYNC_TASKS 全局变量 ============
-# 警告：新代码应使用 get_task_state_manager() 而不是直接访问 SYNC_TASKS
-# 这个变量仅为了保持现有代码的兼容性
-
-SYNC_TASKS = get_task_state_manager()._tasks_compat
-
-
 # ============ 向后兼容：模块级函数 ============
 
 async def update_product_sales(db, shop_id: int, products_data: list, delta: int, order_time=None):
@@ -188,11 +180,6 @@ class OzonSyncService:
     # ============ 任务管理方法 ============
 
     @staticmethod
-    def get_task_status(task_id: str) -> Optional[Dict[str, Any]]:
-        """获取任务状态"""
-        return get_task_state_manager().get_task_dict(task_id)
-
-    @staticmethod
-    def clear_old_tasks():
-        """清理旧任务（超过1小时的）"""
-        return get_task_state_manager().clear_expired_tasks()
+    async def get_task_status(task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务状态（已完成/失败的任务保留1小时后自动过期）"""
+        return await get_task_state_manager().get_task_dict(task_id)
@@ -347,7 +347,15 @@ class PostingOperationsService:
         await self.db.refresh(posting)
         logger.info(f"国内单号填写成功，posting_number: {posting_number}, count: {len(unique_numbers)}, operation_status: {posting.operation_status}")
 
-        # 9. 返回结果
+        # 9. 加入标签预缓存队列（即将打印，立即处理；失败由定时任务补入）
+        if posting.status == "awaiting_deliver" and not posting.label_pdf_path:
+            try:
+                from .label_prefetch_worker import enqueue_label_prefetch
+                await enqueue_label_prefetch(posting.shop_id, [posting.posting_number], delay=0)
+            except Exception as e:
+                logger.warning(f"标签预缓存入队失败: {posting_number}, {e}")
+
+        # 10. 返回结果
         return {
             "success": True,
             "message": f"国内单号提交成功（共{len(unique_numbers)}个）",
@@ -2,22 +2,34 @@
 选品助手服务层
 """
 import re
+import json
+import base64
+import binascii
+import hashlib
+import asyncio
 import logging
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Iterator
 from datetime import datetime
 from decimal import Decimal
 from pathlib import Path
 import time
 
-from sqlalchemy import select, and_, or_, func, update
+from sqlalchemy import select, and_, or_, func, update, text, tuple_, Integer, Numeric, String, DateTime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import insert
+from openpyxl import load_workbook
+from redis.exceptions import RedisError
+
+from ef_core.utils.redis import get_redis
 
 from ..models.product_selection import ProductSelectionItem, ImportHistory
 
 logger = logging.getLogger(__name__)
 
+INT32_MAX = 2 ** 31 - 1
+
 
 class ProductSelectionService:
     """选品助手服务"""
@@ -110,106 +122,179 @@ class ProductSelectionService:
         '最低竞争价': 'competitor_min_price',  # 新增：同义词
     }
 
-    @staticmethod
-    def clean_price(value: Any) -> Optional[Decimal]:
-        """清洗价格数据"""
-        if pd.isna(value) or value == '' or value == '-':
-            return None
-
-        # 转换为字符串
-        value_str = str(value).strip()
-
-        # 处理特殊值
-        if value_str in ['-', 'nan', 'NaN', 'null', 'NULL']:
-            return None
+    # 视为空值的文本
+    NULL_TOKENS = ['', '-', 'nan', 'NaN', 'null', 'NULL', 'NaT', 'None']
+
+    # 合并键：用户ID + 商品ID + 商品名称（优先俄文名，其次中文名），与唯一索引 uq_selection_user_product_name 一致
+    MERGE_NAME_SQL = "COALESCE(product_name_ru, product_name_cn, '')"
+    STAGE_TABLE = "selection_import_stage"
+
+    # 排序方式 -> (排序列, 方向)；每种排序都有 (user_id, 排序列, id) 索引支撑游标分页
+    SORT_OPTIONS = {
+        'sales_desc': ('monthly_sales_volume', 'desc'),
+        'sales_asc': ('monthly_sales_volume', 'asc'),
+        'weight_asc': ('package_weight', 'asc'),
+        'price_asc': ('current_price', 'asc'),
+        'price_desc': ('current_price', 'desc'),
+        'created_desc': ('created_at', 'desc'),
+        'created_asc': ('created_at', 'asc'),
+    }
 
-        # 移除货币符号、空格、千分符（保留原始货币单位，不做转换）
-        value_str = re.sub(r'[¥₽\s,]', '', value_str)
+    # 搜索总数缓存时间（秒）
+    COUNT_CACHE_TTL = 120
 
-        try:
-            # 尝试转换为Decimal
-            return Decimal(value_str)
-        except:
-            logger.warning(f"无法转换价格值: {value}")
-            return None
+    # 流式读取：每块行数、预览读取的行数
+    CHUNK_ROWS = 5000
+    PREVIEW_ROWS = 5
 
     @staticmethod
-    def clean_percentage(value: Any) -> Optional[Decimal]:
-        """清洗百分比数据"""
-        if pd.isna(value) or value == '' or value == '-':
+    def _cell_text(value: Any) -> Optional[str]:
+        """Excel 单元格值转为文本（与 pandas dtype=str 读取一致，整数值的浮点数不带 .0）"""
+        if value is None:
             return None
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
 
-        value_str = str(value).strip()
-
-        # 处理特殊值
-        if value_str in ['-', 'nan', 'NaN', 'null', 'NULL']:
-            return None
-
-        # 移除百分号和空格
-        value_str = re.sub(r'[%\s]', '', value_str)
+    @classmethod
+    def _iter_file_chunks(
+        cls,
+        file_path: Path,
+        file_type: str,
+        chunk_rows: int,
+        max_rows: Optional[int] = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        按固定行数分块读取文件（CSV 分块解析，Excel 只读模式逐行迭代），内存占用与文件大小无关
 
+        分块的索引为数据行序号（从0开始，跨块连续），行号 = 索引 + 2。
+        """
+        if file_type == 'csv':
+            with pd.read_csv(
+                file_path, encoding='utf-8-sig', dtype=str, chunksize=chunk_rows, nrows=max_rows
+            ) as reader:
+                yield from reader
+            return
+
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
         try:
-            return Decimal(value_str)
-        except:
-            logger.warning(f"无法转换百分比值: {value}")
-            return None
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            columns = [
+                str(name).strip() if name is not None else f"Unnamed: {i}"
+                for i, name in enumerate(header)
+            ]
+            width = len(columns)
+
+            buffer: List[List[Optional[str]]] = []
+            index: List[int] = []
+            blank_rows: List[int] = []
+            for row_index, row in enumerate(rows):
+                if max_rows is not None and row_index >= max_rows:
+                    break
+                if all(value is None for value in row):
+                    # 空行先暂存，后面还有数据时才输出（与 pandas 一致，忽略末尾空行）
+                    blank_rows.append(row_index)
+                    continue
+                for blank_index in blank_rows:
+                    buffer.append([None] * width)
+                    index.append(blank_index)
+                blank_rows.clear()
+
+                values = [cls._cell_text(value) for value in row[:width]]
+                values.extend([None] * (width - len(values)))
+                buffer.append(values)
+                index.append(row_index)
+
+                if len(buffer) >= chunk_rows:
+                    yield pd.DataFrame(buffer, columns=columns, index=index, dtype=object)
+                    buffer, index = [], []
+
+            if buffer:
+                yield pd.DataFrame(buffer, columns=columns, index=index, dtype=object)
+        finally:
+            workbook.close()
 
     @staticmethod
-    def clean_integer(value: Any) -> Optional[int]:
-        """清洗整数数据"""
-        if pd.isna(value) or value == '' or value == '-':
-            return None
-
-        value_str = str(value).strip()
-
-        # 处理特殊值
-        if value_str in ['-', 'nan', 'NaN', 'null', 'NULL']:
-            return None
-
+    def _estimate_total_rows(file_path: Path, file_type: str) -> Optional[int]:
+        """预估数据行数（不解析内容：CSV 统计换行数，Excel 读取工作表维度），用于进度显示"""
+        if file_type == 'csv':
+            lines = 0
+            last = b'\n'
+            with open(file_path, 'rb') as f:
+                while block := f.read(1 << 20):
+                    lines += block.count(b'\n')
+                    last = block[-1:]
+            if last != b'\n':
+                lines += 1
+            return max(lines - 1, 0)
+
+        workbook = load_workbook(file_path, read_only=True)
         try:
-            # 先转为float再转int，处理带小数点的字符串
-            return int(float(value_str.replace(',', '')))
-        except:
-            logger.warning(f"无法转换整数值: {value}")
-            return None
-
-    @staticmethod
-    def normalize_brand(brand: str) -> str:
-        """标准化品牌名称"""
-        if not brand or brand == 'без бренда':
-            return 'NO_BRAND'
-
-        # 转换为大写，移除首尾空格
-        normalized = brand.upper().strip()
-        # 移除多余空格
-        normalized = re.sub(r'\s+', ' ', normalized)
+            max_row = workbook.active.max_row
+            return max(max_row - 1, 0) if max_row else None
+        finally:
+            workbook.close()
 
-        return normalized
+    @classmethod
+    def _clean_text(cls, column: pd.Series) -> pd.Series:
+        """去除首尾空格，空值标记（"-"、"nan" 等）统一置空"""
+        values = column.astype('string').str.strip()
+        return values.mask(values.isin(cls.NULL_TOKENS))
 
     @staticmethod
-    def parse_date(value: Any) -> Optional[datetime]:
-        """解析日期"""
-        if pd.isna(value) or value == '' or value == '-':
-            return None
-
-        value_str = str(value).strip()
-
-        # 处理特殊值
-        if value_str in ['-', 'nan', 'NaN', 'null', 'NULL', 'NaT']:
-            return None
+    def _to_number(values: pd.Series, label: str) -> pd.Series:
+        """文本列转为 float64（无法解析的值置空，并按列汇总告警）"""
+        numbers = pd.Series(
+            pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64', na_value=np.nan),
+            index=values.index, name=values.name
+        )
+        invalid = int((numbers.isna() & values.notna()).sum())
+        if invalid:
+            logger.warning(f"列 {values.name}: {invalid} 个{label}值无法转换，已置空")
+        return numbers
+
+    @classmethod
+    def clean_price(cls, column: pd.Series) -> pd.Series:
+        """清洗价格列（移除货币符号、空格、千分符，保留原始货币单位，不做转换）"""
+        values = cls._clean_text(column).str.replace(r'[¥₽\s,]', '', regex=True)
+        return cls._to_number(values, '价格')
+
+    @classmethod
+    def clean_percentage(cls, column: pd.Series) -> pd.Series:
+        """清洗百分比列（移除百分号和空格）"""
+        values = cls._clean_text(column).str.replace(r'[%\s]', '', regex=True)
+        return cls._to_number(values, '百分比')
+
+    @classmethod
+    def clean_integer(cls, column: pd.Series) -> pd.Series:
+        """清洗整数列（移除千分符，带小数的值向零取整）"""
+        values = cls._clean_text(column).str.replace(',', '', regex=False)
+        return np.trunc(cls._to_number(values, '整数'))
 
+    @staticmethod
+    def normalize_brand(brand: pd.Series) -> pd.Series:
+        """标准化品牌名称（大写、合并多余空格，无品牌统一为 NO_BRAND）"""
+        normalized = brand.str.upper().str.strip().str.replace(r'\s+', ' ', regex=True)
+        no_brand = brand.isna() | (brand == 'без бренда').fillna(False)
+        return normalized.mask(no_brand, 'NO_BRAND')
+
+    @classmethod
+    def parse_date(cls, column: pd.Series) -> pd.Series:
+        """解析日期列（逐值推断格式，无法解析的值置空）"""
+        if pd.api.types.is_datetime64_any_dtype(column):
+            return column
+        values = cls._clean_text(column)
         try:
-            if isinstance(value, datetime):
-                return value
-            # 尝试解析日期字符串
-            parsed = pd.to_datetime(value, errors='coerce')
-            # 检查是否为NaT（Not a Time）
-            if pd.isna(parsed):
-                return None
-            return parsed.to_pydatetime()
-        except:
-            logger.warning(f"无法转换日期值: {value}")
-            return None
+            return pd.to_datetime(values, errors='coerce', format='mixed')
+        except (ValueError, TypeError):
+            # 混合时区等整列无法统一解析时逐值解析
+            return pd.to_datetime(
+                values.map(lambda value: pd.to_datetime(value, errors='coerce', utc=True), na_action='ignore'),
+                errors='coerce', utc=True
+            )
 
     def _find_best_column_match(self, target_col: str, available_cols: List[str]) -> Optional[str]:
         """智能模糊匹配列名"""
@@ -407,9 +492,19 @@ class ProductSelectionService:
         file_type: str,
         import_strategy: str = 'update',
         user_id: int = 1,
-        validate_only: bool = False
+        validate_only: bool = False,
+        progress_callback: Optional[Callable[[int, Optional[int]], Awaitable[None]]] = None
     ) -> Dict[str, Any]:
-        """导入文件"""
+        """
+        导入文件
+
+        按固定行数流式分块读取，每块整列向量化清洗后，一次 COPY 写入临时表，
+        再用一条 INSERT ... ON CONFLICT 合并到选品表并提交；内存占用与文件大小无关，
+        数据库往返次数与行数无关。校验失败的行（缺少商品ID、数值/长度超出字段范围）按掩码汇总报告。
+
+        Args:
+            progress_callback: 每块处理完成后的进度回调 callback(已处理行数, 预估总行数)
+        """
         start_time = time.time()
 
         # 创建导入历史记录
@@ -429,135 +524,135 @@ class ProductSelectionService:
         )
 
         try:
-            # 读取文件
-            if file_type == 'csv':
-                df = pd.read_csv(file_path, encoding='utf-8-sig')
-            else:  # xlsx
-                df = pd.read_excel(file_path, engine='openpyxl')
-
-            import_history.total_rows = len(df)
-
-            # 检查必需列并应用智能列名匹配
-            missing_columns = []
-            column_mapping_applied = {}
-
-            for csv_col in self.COLUMN_MAPPING.keys():
-                if csv_col not in df.columns:
-                    # 尝试智能模糊匹配
-                    matched_col = self._find_best_column_match(csv_col, df.columns.tolist())
-                    if matched_col:
-                        df.rename(columns={matched_col: csv_col}, inplace=True)
-                        column_mapping_applied[matched_col] = csv_col
-                        logger.info(f"列名映射: '{matched_col}' -> '{csv_col}'")
-                    elif csv_col in ['商品ID', '商品名称']:  # 必需字段
-                        missing_columns.append(csv_col)
-
-            if missing_columns:
-                # 生成友好的错误信息
-                column_suggestions = []
-                for missing_col in missing_columns:
-                    # 尝试找到最相似的列名
-                    suggestion = self._find_best_column_match(missing_col, df.columns.tolist())
-                    if suggestion:
-                        column_suggestions.append(f"'{missing_col}' (建议: '{suggestion}')")
-                    else:
-                        column_suggestions.append(f"'{missing_col}'")
-
-                error_msg = f"缺少必需列: {', '.join(column_suggestions)}"
-                detailed_msg = (
-                    f"文件缺少以下必需列：{', '.join(missing_columns)}。"
-                    f"请检查CSV/Excel文件的列标题是否正确。"
-                    f"当前文件包含的列：{', '.join(df.columns.tolist()[:10])}..."
-                    if len(df.columns) > 10 else f"当前文件包含的列：{', '.join(df.columns.tolist())}"
-                )
-
-                import_history.error_details.append(detailed_msg)
-                if not validate_only:
-                    db.add(import_history)
-                    await db.commit()
-                return {
-                    'success': False,
-                    'error': detailed_msg,
-                    'missing_columns': missing_columns,
-                    'available_columns': df.columns.tolist(),
-                    'suggestions': column_suggestions
-                }
-
-            # 如果只是验证，返回预览数据
-            if validate_only:
-                preview_data = []
-                for idx, row in df.head(5).iterrows():
-                    cleaned_row = self._clean_row(row)
-                    preview_data.append(cleaned_row)
-
-                return {
-                    'success': True,
-                    'total_rows': len(df),
-                    'columns': list(df.columns),
-                    'preview': preview_data,
-                    'column_mapping': self.COLUMN_MAPPING
-                }
-
-            # 先保存导入历史记录以获取batch_id
-            db.add(import_history)
-            await db.flush()  # 获取import_history.id但不提交事务
-            batch_id = import_history.id
-
-            # 批量处理数据
-            batch_size = 100
-            success_count = 0
-            failed_count = 0
-            updated_count = 0
-            skipped_count = 0
-            error_details = []
-
-            for i in range(0, len(df), batch_size):
-                batch = df.iloc[i:i+batch_size]
-                batch_items = []
-
-                for idx, row in batch.iterrows():
-                    try:
-                        cleaned_data = self._clean_row(row)
-                        if cleaned_data and cleaned_data.get('product_id'):
-                            # 添加user_id、batch_id和source_row_index到每个清洗后的数据项
-                            cleaned_data['user_id'] = user_id
-                            cleaned_data['batch_id'] = batch_id
-                            cleaned_data['source_row_index'] = int(idx) + 2  # pandas索引从0开始，加上表头行，实际CSV行号=idx+2
-                            batch_items.append(cleaned_data)
+            # 流式读取：预览只读前 PREVIEW_ROWS 行，导入按 CHUNK_ROWS 分块（全部按文本读取，
+            # 由清洗步骤统一转换类型，避免商品ID被转成浮点数）
+            chunk_rows = self.PREVIEW_ROWS if validate_only else self.CHUNK_ROWS
+            chunks = self._iter_file_chunks(
+                file_path, file_type, chunk_rows,
+                max_rows=self.PREVIEW_ROWS if validate_only else None
+            )
+            try:
+                df = await asyncio.to_thread(next, chunks, None)
+                if df is None:
+                    df = pd.DataFrame()
+                total_estimate = await asyncio.to_thread(self._estimate_total_rows, file_path, file_type)
+
+                # 检查必需列并应用智能列名匹配（按表头解析一次，应用到每个分块）
+                missing_columns = []
+                column_renames = {}
+
+                for csv_col in self.COLUMN_MAPPING.keys():
+                    if csv_col not in df.columns:
+                        # 尝试智能模糊匹配（已精确匹配其他字段的列不参与）
+                        candidates = [col for col in df.columns if col not in self.COLUMN_MAPPING]
+                        matched_col = self._find_best_column_match(csv_col, candidates)
+                        if matched_col:
+                            df.rename(columns={matched_col: csv_col}, inplace=True)
+                            column_renames[matched_col] = csv_col
+                            logger.info(f"列名映射: '{matched_col}' -> '{csv_col}'")
+                        elif csv_col in ['商品ID', '商品名称']:  # 必需字段
+                            missing_columns.append(csv_col)
+
+                if missing_columns:
+                    # 生成友好的错误信息
+                    column_suggestions = []
+                    for missing_col in missing_columns:
+                        # 尝试找到最相似的列名
+                        suggestion = self._find_best_column_match(missing_col, df.columns.tolist())
+                        if suggestion:
+                            column_suggestions.append(f"'{missing_col}' (建议: '{suggestion}')")
                         else:
-                            failed_count += 1
-                            error_details.append({
-                                'row': idx + 2,  # Excel行号从1开始，加上表头
-                                'error': '缺少必需字段(商品ID)或数据清洗失败',
-                                'product_id': row.get('商品ID', '未知'),
-                                'product_name': row.get('商品名称', '未知')
-                            })
-                    except Exception as e:
-                        failed_count += 1
-                        # 提供更友好的错误信息
-                        error_msg = self._format_error_message(e)
-                        error_details.append({
-                            'row': idx + 2,  # Excel行号从1开始，加上表头
-                            'error': error_msg,
-                            'product_id': row.get('商品ID', '未知'),
-                            'product_name': row.get('商品名称', '未知')
-                        })
-
-                if batch_items:
-                    # 执行批量插入/更新
-                    result = await self._batch_upsert(
-                        db, batch_items, import_strategy, user_id
+                            column_suggestions.append(f"'{missing_col}'")
+
+                    detailed_msg = (
+                        f"文件缺少以下必需列：{', '.join(missing_columns)}。"
+                        f"请检查CSV/Excel文件的列标题是否正确。"
+                        f"当前文件包含的列：{', '.join(df.columns.tolist()[:10])}..."
+                        if len(df.columns) > 10 else f"当前文件包含的列：{', '.join(df.columns.tolist())}"
                     )
+
+                    import_history.total_rows = total_estimate or len(df)
+                    import_history.error_details.append(detailed_msg)
+                    if not validate_only:
+                        db.add(import_history)
+                        await db.commit()
+                    return {
+                        'success': False,
+                        'error': detailed_msg,
+                        'missing_columns': missing_columns,
+                        'available_columns': df.columns.tolist(),
+                        'suggestions': column_suggestions
+                    }
+
+                # 如果只是验证，返回预览数据
+                if validate_only:
+                    preview_frame, _ = self._clean_frame(df)
+                    preview_data = self._frame_to_dicts(preview_frame)
+
+                    return {
+                        'success': True,
+                        'total_rows': total_estimate if total_estimate is not None else len(df),
+                        'columns': list(df.columns),
+                        'preview': preview_data,
+                        'column_mapping': self.COLUMN_MAPPING
+                    }
+
+                # 先保存导入历史记录以获取batch_id
+                db.add(import_history)
+                await db.flush()
+                batch_id = import_history.id
+
+                processed_rows = 0
+                success_count = 0
+                failed_count = 0
+                updated_count = 0
+                skipped_count = 0
+                error_details = []
+
+                while df is not None:
+                    df = df.rename(columns=column_renames)
+
+                    # 整列清洗 + 校验（失败行由掩码汇总，不逐行处理）
+                    cleaned, row_errors = self._clean_frame(df)
+                    failed_mask = row_errors.notna()
+                    failed_count += int(failed_mask.sum())
+                    if len(error_details) < 100:
+                        error_details += self._describe_failed_rows(df, row_errors, limit=100 - len(error_details))
+
+                    valid = cleaned.loc[~failed_mask].copy()
+                    valid['user_id'] = user_id
+                    valid['batch_id'] = batch_id
+
+                    # COPY 到临时表后一条语句合并
+                    result = await self._merge_staged(db, valid)
                     success_count += result['success']
                     updated_count += result['updated']
-                    skipped_count += result['skipped']
+                    processed_rows += len(df)
+
+                    # 每块提交一次：导入历史实时反映进度，单个事务大小与文件大小无关
+                    import_history.total_rows = processed_rows
+                    import_history.success_rows = success_count
+                    import_history.failed_rows = failed_count
+                    import_history.updated_rows = updated_count
+                    import_history.error_details = list(error_details)
+                    import_history.process_duration = int(time.time() - start_time)
+                    await db.commit()
+
+                    logger.info(
+                        f"选品导入进度: {processed_rows}/{total_estimate or '?'} 行, "
+                        f"新增 {success_count}, 更新 {updated_count}, 失败 {failed_count}"
+                    )
+                    if progress_callback:
+                        await progress_callback(processed_rows, total_estimate)
+
+                    del df, cleaned, valid
+                    df = await asyncio.to_thread(next, chunks, None)
+            finally:
+                chunks.close()
 
             # 更新导入历史
-            import_history.success_rows = success_count
-            import_history.failed_rows = failed_count
-            import_history.updated_rows = updated_count
+            import_history.total_rows = processed_rows
             import_history.skipped_rows = skipped_count
-            import_history.error_details = error_details[:100]  # 只保留前100个错误
             import_history.process_duration = int(time.time() - start_time)
 
             # import_history已在前面添加，这里只需提交
@@ -584,6 +679,8 @@ class ProductSelectionService:
 
             if not validate_only:
                 try:
+                    # 已提交的分块保留，只回滚失败分块所在的事务
+                    await db.rollback()
                     db.add(import_history)
                     await db.commit()
                 except Exception as db_error:
@@ -595,65 +692,203 @@ class ProductSelectionService:
                 'error': user_friendly_error
             }
 
-    def _clean_row(self, row: pd.Series) -> Dict[str, Any]:
-        """清洗单行数据"""
-        cleaned = {}
+    def _column_kind(self, db_col: str) -> str:
+        """字段清洗类型（与字段命名约定一致，未覆盖的字段按模型列类型判断）"""
+        if db_col in ('product_id', 'brand', 'listing_date', 'rating', 'competitor_count'):
+            return {'rating': 'percentage', 'competitor_count': 'integer'}.get(db_col, db_col)
+        if 'price' in db_col or 'revenue' in db_col:
+            return 'price'
+        if 'commission' in db_col or 'percent' in db_col or 'rate' in db_col:
+            return 'percentage'
+        if any(key in db_col for key in ('volume', 'count', 'weight', 'length', 'width', 'height', 'days')):
+            return 'integer'
+
+        column_type = ProductSelectionItem.__table__.columns[db_col].type
+        if isinstance(column_type, Numeric):
+            return 'percentage'
+        if isinstance(column_type, Integer):
+            return 'integer'
+        return 'text'
+
+    def _clean_frame(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        整列清洗数据并校验
+
+        Returns:
+            (按数据库字段名组织的清洗结果, 每行的错误信息（通过校验的行为 None）)
+        """
+        cleaned = pd.DataFrame(index=df.index)
 
         for csv_col, db_col in self.COLUMN_MAPPING.items():
-            if csv_col not in row.index:
+            if csv_col not in df.columns:
                 continue
 
-            value = row[csv_col]
+            column = df[csv_col]
+            kind = self._column_kind(db_col)
 
-            # 根据字段类型进行清洗
-            if db_col == 'product_id':
-                # 商品ID必需且唯一
-                if pd.isna(value):
-                    raise ValueError(f"商品ID不能为空")
-                cleaned[db_col] = str(value).strip()
-
-            elif db_col == 'brand':
-                # 处理品牌字段，空值和"-"都设为默认值
-                if pd.isna(value) or str(value).strip() in ['', '-', 'nan', 'NaN']:
-                    brand = 'без бренда'
-                else:
-                    brand = str(value).strip()
+            if kind == 'brand':
+                # 空值和"-"都设为默认值
+                brand = self._clean_text(column).fillna('без бренда')
                 cleaned[db_col] = brand
                 cleaned['brand_normalized'] = self.normalize_brand(brand)
+            elif kind == 'price':
+                cleaned[db_col] = self.clean_price(column)
+            elif kind == 'percentage':
+                cleaned[db_col] = self.clean_percentage(column)
+            elif kind == 'integer':
+                cleaned[db_col] = self.clean_integer(column)
+            elif kind == 'listing_date':
+                cleaned[db_col] = self.parse_date(column)
+            else:
+                # 文本字段（含商品ID）："-"等空值标记设为None而不是空字符串
+                cleaned[db_col] = self._clean_text(column)
+
+        errors = pd.Series(None, index=df.index, dtype=object)
+        if 'product_id' in cleaned.columns:
+            errors = errors.mask(cleaned['product_id'].isna(), '缺少必需字段(商品ID)')
+        else:
+            errors[:] = '缺少必需字段(商品ID)'
 
-            elif 'price' in db_col or 'revenue' in db_col:
-                cleaned[db_col] = self.clean_price(value)
+        return cleaned, self._check_ranges(cleaned, errors)
 
-            elif 'commission' in db_col or 'percent' in db_col or 'rate' in db_col:
-                cleaned[db_col] = self.clean_percentage(value)
+    def _check_ranges(self, frame: pd.DataFrame, errors: pd.Series) -> pd.Series:
+        """按模型字段的精度/长度校验（超出范围的值会使整批写入失败，须提前剔除）"""
+        labels = {}
+        for csv_col, db_col in self.COLUMN_MAPPING.items():
+            labels.setdefault(db_col, csv_col)
 
-            elif db_col == 'competitor_count':
-                # 跟卖者数量处理
-                cleaned[db_col] = self.clean_integer(value)
+        columns = ProductSelectionItem.__table__.columns
+        for db_col in frame.columns:
+            if db_col not in columns:
+                continue
+            column_type = columns[db_col].type
+            if isinstance(column_type, Numeric) and column_type.precision:
+                limit = 10 ** (column_type.precision - (column_type.scale or 0))
+                mask = pd.to_numeric(frame[db_col], errors='coerce').abs() >= limit
+            elif isinstance(column_type, Integer):
+                mask = pd.to_numeric(frame[db_col], errors='coerce').abs() > INT32_MAX
+            elif isinstance(column_type, String) and column_type.length:
+                mask = frame[db_col].astype('string').str.len() > column_type.length
+            else:
+                continue
 
-            elif db_col == 'competitor_min_price':
-                # 最低跟卖价处理
-                cleaned[db_col] = self.clean_price(value)
+            mask = mask.fillna(False).astype(bool) & errors.isna()
+            if mask.any():
+                errors = errors.mask(mask, f"{labels.get(db_col, db_col)}超出范围")
+        return errors
 
-            elif 'volume' in db_col or 'count' in db_col or 'weight' in db_col or \
-                 'length' in db_col or 'width' in db_col or 'height' in db_col or 'days' in db_col:
-                cleaned[db_col] = self.clean_integer(value)
+    @staticmethod
+    def _describe_failed_rows(df: pd.DataFrame, errors: pd.Series, limit: int) -> List[Dict[str, Any]]:
+        """失败行的错误明细（最多 limit 条）"""
+        failed = errors.dropna().head(limit)
+        details = []
+        for idx, error in failed.items():
+            details.append({
+                'row': int(idx) + 2,  # pandas索引从0开始，加上表头行，实际行号=idx+2
+                'error': error,
+                'product_id': df.at[idx, '商品ID'] if '商品ID' in df.columns else '未知',
+                'product_name': df.at[idx, '商品名称'] if '商品名称' in df.columns else '未知',
+            })
+        return details
 
-            elif db_col == 'rating':
-                cleaned[db_col] = self.clean_percentage(value)
+    @staticmethod
+    def _frame_to_dicts(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+        """清洗结果转为字典列表（缺失值为 None）"""
+        return frame.astype(object).where(frame.notna(), None).to_dict('records')
 
-            elif db_col == 'listing_date':
-                cleaned[db_col] = self.parse_date(value)
+    @staticmethod
+    def _column_values(series: pd.Series, column_type) -> List[Any]:
+        """把一列转换为驱动可直接编码的 Python 值"""
+        present = series.notna().tolist()
+        if isinstance(column_type, Integer):
+            values = [int(v) if ok else None for v, ok in zip(series.tolist(), present)]
+        elif isinstance(column_type, DateTime):
+            values = [v.to_pydatetime() if ok and isinstance(v, pd.Timestamp) else (v if ok else None)
+                      for v, ok in zip(series.tolist(), present)]
+        elif isinstance(column_type, Numeric):
+            values = [v if ok and isinstance(v, Decimal) else (float(v) if ok else None)
+                      for v, ok in zip(series.tolist(), present)]
+        else:
+            values = [v if ok else None for v, ok in zip(series.tolist(), present)]
+        return values
 
-            else:
-                # 文本字段 - 处理"-"值
-                if not pd.isna(value) and str(value).strip() not in ['-', '', 'nan', 'NaN']:
-                    cleaned[db_col] = str(value).strip()
-                else:
-                    # 对于文本字段，"-"值设为None而不是空字符串
-                    cleaned[db_col] = None
+    async def _merge_staged(
+        self,
+        db: AsyncSession,
+        frame: pd.DataFrame,
+        preserve_existing: bool = False
+    ) -> Dict[str, int]:
+        """
+        COPY 到临时表后一条 INSERT ... ON CONFLICT 合并（调用方负责提交事务）
+
+        使用"用户ID+商品ID+商品名称"作为唯一标识（唯一索引 uq_selection_user_product_name）：
+        - 已存在则更新本次提供的字段
+        - 不存在则追加新记录
+
+        Args:
+            frame: 清洗后的数据（须包含 user_id、product_id）
+            preserve_existing: 为 True 时空值不覆盖已有数据（插件上传的字段因商品而异）
+
+        Returns:
+            {'success': 新增数, 'updated': 更新数（含同批重复行）}
+        """
+        if frame.empty:
+            return {'success': 0, 'updated': 0}
+
+        table = ProductSelectionItem.__table__
+        columns = [col for col in frame.columns if col in table.columns]
+
+        # 同一批中合并键重复的行只保留最后一行（与逐行覆盖的结果一致）
+        names = pd.Series('', index=frame.index, dtype=object)
+        for name_col in ('product_name_cn', 'product_name_ru'):
+            if name_col in frame.columns:
+                names = frame[name_col].astype(object).where(frame[name_col].notna(), names)
+        duplicated = pd.DataFrame({
+            'user_id': frame['user_id'], 'product_id': frame['product_id'], 'name': names
+        }).duplicated(keep='last')
+        frame = frame.loc[~duplicated]
+
+        column_values = [self._column_values(frame[col], table.columns[col].type) for col in columns]
+        records = list(zip(*column_values))
+
+        column_sql = ', '.join(columns)
+        await db.execute(text(f"DROP TABLE IF EXISTS {self.STAGE_TABLE}"))
+        await db.execute(text(
+            f"CREATE TEMP TABLE {self.STAGE_TABLE} ON COMMIT DROP AS "
+            f"SELECT {column_sql} FROM {table.name} WITH NO DATA"
+        ))
+
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            self.STAGE_TABLE, records=records, columns=columns
+        )
+
+        assignments = [
+            f"{col} = COALESCE(EXCLUDED.{col}, t.{col})" if preserve_existing else f"{col} = EXCLUDED.{col}"
+            for col in columns if col not in ('user_id', 'product_id')
+        ]
+        assignments.append("updated_at = now()")
+
+        result = await db.execute(text(f"""
+            WITH merged AS (
+                INSERT INTO {table.name} AS t ({column_sql}, created_at, updated_at)
+                SELECT {column_sql}, now(), now() FROM {self.STAGE_TABLE}
+                ON CONFLICT (user_id, product_id, ({self.MERGE_NAME_SQL}))
+                DO UPDATE SET {', '.join(assignments)}
+                RETURNING (xmax = 0) AS inserted
+            )
+            SELECT count(*) FILTER (WHERE inserted) AS inserted, count(*) AS total FROM merged
+        """))
+        inserted, total = result.one()
+
+        for user_id in frame['user_id'].unique():
+            await self.invalidate_search_counts(int(user_id))
 
-        return cleaned
+        return {
+            'success': int(inserted),
+            'updated': int(total) - int(inserted) + int(duplicated.sum()),
+        }
 
     async def _batch_upsert(
         self,
@@ -662,75 +897,32 @@ class ProductSelectionService:
         strategy: str,
         user_id: int
     ) -> Dict[str, int]:
-        """批量插入或更新
+        """批量插入或更新（已清洗的数据，如浏览器插件上传）
 
         使用"商品名称+商品ID"作为唯一标识：
         - 如果存在相同的商品ID和商品名称，则更新
         - 如果不存在，则追加新记录
+        超出字段范围的项计入 skipped。
         """
-        success = 0
-        updated = 0
-        skipped = 0
+        if not items:
+            return {'success': 0, 'updated': 0, 'skipped': 0}
 
-        for item in items:
-            # 使用保存点来处理单个项的失败
-            savepoint = await db.begin_nested()
-            try:
-                product_id = item['product_id']
-                product_name_ru = item.get('product_name_ru', '')
-                product_name_cn = item.get('product_name_cn', '')
-
-                # 为item添加user_id
-                if 'user_id' not in item:
-                    item['user_id'] = user_id
-
-                # 使用用户ID+商品ID+商品名称作为唯一标识
-                conditions = [
-                    ProductSelectionItem.user_id == item['user_id'],
-                    ProductSelectionItem.product_id == product_id
-                ]
-
-                if product_name_ru:
-                    conditions.append(ProductSelectionItem.product_name_ru == product_name_ru)
-                elif product_name_cn:
-                    conditions.append(ProductSelectionItem.product_name_cn == product_name_cn)
-
-                # 查询是否存在
-                existing = await db.execute(
-                    select(ProductSelectionItem).where(
-                        and_(*conditions)
-                    )
-                )
-                existing_item = existing.scalar_one_or_none()
-
-                if existing_item:
-                    # 存在则更新（默认策略）
-                    for key, value in item.items():
-                        setattr(existing_item, key, value)
-                    existing_item.updated_at = datetime.now()
-                    updated += 1
-                else:
-                    # 不存在则追加
-                    new_item = ProductSelectionItem(**item)
-                    db.add(new_item)
-                    success += 1
-
-                # 提交保存点
-                await savepoint.commit()
-
-            except Exception as e:
-                # 只回滚当前保存点，不影响之前的数据
-                await savepoint.rollback()
-                product_id = item.get('product_id', '未知')
-                product_name = item.get('product_name_ru', item.get('product_name_cn', '未知'))
-                logger.warning(f"Failed to process product {product_id} ({product_name}): {e}")
-                skipped += 1
-                continue
+        frame = pd.DataFrame(items)
+        if 'user_id' not in frame.columns:
+            frame['user_id'] = user_id
+        frame['user_id'] = frame['user_id'].fillna(user_id)
+
+        errors = pd.Series(None, index=frame.index, dtype=object)
+        errors = errors.mask(frame['product_id'].isna(), '缺少必需字段(商品ID)')
+        errors = self._check_ranges(frame, errors)
+        for idx, error in errors.dropna().items():
+            logger.warning(f"Failed to process product {items[idx].get('product_id', '未知')}: {error}")
 
+        result = await self._merge_staged(db, frame.loc[errors.isna()], preserve_existing=True)
         return {
-            'success': success,
-            'updated': updated,
-            'skipped': skipped
+            'success': result['success'],
+            'updated': result['updated'],
+            'skipped': int(errors.notna().sum())
         }
 
     async def search_products(
@@ -739,21 +931,195 @@ class ProductSelectionService:
         user_id: int,
         filters: Dict[str, Any],
         sort_by: str = 'created_asc',
-        after_id: int = 0,  # 游标：上次最后一个商品的 ID
-        limit: int = 20
+        after_id: int = 0,  # 游标：上次最后一个商品的 ID（兼容旧客户端）
+        limit: int = 20,
+        cursor: Optional[str] = None  # 游标：上一页返回的 cursor（排序键 + ID）
     ) -> Dict[str, Any]:
-        """搜索商品（使用游标分页）"""
-        query = select(ProductSelectionItem)
+        """
+        搜索商品（复合键游标分页）
 
-        # 应用筛选条件
-        conditions = [
-            ProductSelectionItem.user_id == user_id,
-            ProductSelectionItem.id > after_id  # 游标条件
-        ]
+        每种排序都按 (排序列, id) 做 keyset 分页，由 (user_id, 排序列 NULLS FIRST, id) 索引支撑，
+        每页耗时与翻页深度无关。只传 after_id 时按该商品当前的排序列值定位。
+        总数按筛选条件哈希缓存在 Redis 中（导入/删除时失效）。
+
+        Raises:
+            ValueError: cursor 无效或与排序方式不匹配
+        """
+        conditions = self._search_conditions(user_id, filters)
+        total = await self._count_cached(db, user_id, filters, conditions)
+
+        column_name, direction = self.SORT_OPTIONS.get(sort_by, ('id', 'asc'))
+        sort_col = getattr(ProductSelectionItem, column_name)
+        id_col = ProductSelectionItem.id
+
+        # 定位游标位置：(排序列值, id)
+        position = None
+        if cursor:
+            position = self._decode_cursor(cursor, sort_by, column_name)
+        elif after_id:
+            if column_name == 'id':
+                position = (after_id, after_id)
+            else:
+                row = (await db.execute(
+                    select(sort_col).where(id_col == after_id, ProductSelectionItem.user_id == user_id)
+                )).first()
+                if row is not None:
+                    position = (row[0], after_id)
+
+        # 空值段：升序排最前、降序排最后；每段都是一个索引区间，跨段时最多两次查询
+        nullable = column_name not in ('id', 'created_at')
+        segments = self._keyset_segments(sort_col, id_col, direction, nullable, position)
+
+        items: List[ProductSelectionItem] = []
+        for segment_condition, is_null_segment in segments:
+            remaining = limit + 1 - len(items)
+            if remaining <= 0:
+                break
+            query = select(ProductSelectionItem).where(*conditions)
+            if segment_condition is not None:
+                query = query.where(segment_condition)
+            query = query.order_by(*self._keyset_order(sort_col, id_col, direction, nullable, is_null_segment))
+            result = await db.execute(query.limit(remaining))
+            items.extend(result.scalars().all())
+
+        has_more = len(items) > limit
+        items = items[:limit]
+        last = items[-1] if items else None
+
+        return {
+            'items': [item.to_dict() for item in items],
+            'total': total,
+            'next_cursor': last.id if last else None,  # 下一页的 after_id（兼容）
+            'cursor': self._encode_cursor(sort_by, getattr(last, column_name), last.id) if last else None,
+            'has_more': has_more  # 是否还有更多数据
+        }
+
+    @staticmethod
+    def _keyset_order(sort_col, id_col, direction: str, nullable: bool, is_null_segment: bool) -> List[Any]:
+        """排序子句（空值顺序与索引 NULLS FIRST 一致，降序时可反向扫描同一索引）"""
+        if sort_col is id_col or is_null_segment:
+            return [id_col.desc() if direction == 'desc' else id_col.asc()]
+        if direction == 'desc':
+            col_order = sort_col.desc().nullslast() if nullable else sort_col.desc()
+            return [col_order, id_col.desc()]
+        col_order = sort_col.asc().nullsfirst() if nullable else sort_col.asc()
+        return [col_order, id_col.asc()]
+
+    @staticmethod
+    def _keyset_segments(sort_col, id_col, direction: str, nullable: bool, position) -> List[Tuple[Any, bool]]:
+        """
+        按显示顺序返回从游标位置开始的查询段：[(条件, 是否空值段)]
+
+        排序列有值的段用行比较 (排序列, id) >/< (值, id)，可以直接作为索引扫描起点。
+        """
+        value_segment = (sort_col.isnot(None), False) if nullable else (None, False)
+        null_segment = (sort_col.is_(None), True)
+
+        if position is None:
+            if not nullable:
+                return [value_segment]
+            return [null_segment, value_segment] if direction == 'asc' else [value_segment, null_segment]
+
+        value, last_id = position
+        if nullable and value is None:
+            # 游标在空值段内：只按 id 继续
+            if direction == 'asc':
+                return [(and_(sort_col.is_(None), id_col > last_id), True), value_segment]
+            return [(and_(sort_col.is_(None), id_col < last_id), True)]
+
+        if sort_col is id_col:
+            return [(id_col > last_id, False)]
+        if direction == 'asc':
+            return [(tuple_(sort_col, id_col) > tuple_(value, last_id), False)]
+        after = (tuple_(sort_col, id_col) < tuple_(value, last_id), False)
+        return [after, null_segment] if nullable else [after]
+
+    @staticmethod
+    def _encode_cursor(sort_by: str, value: Any, item_id: int) -> str:
+        """游标：排序方式 + 排序列值 + id（base64url 编码的 JSON，对客户端不透明）"""
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        payload = json.dumps({'s': sort_by, 'v': value, 'i': item_id}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def _decode_cursor(cursor: str, sort_by: str, column_name: str) -> Tuple[Any, int]:
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            value, item_id = payload['v'], int(payload['i'])
+            if payload['s'] != sort_by:
+                raise ValueError("cursor 与排序方式不匹配")
+            if value is not None:
+                if column_name == 'created_at':
+                    value = datetime.fromisoformat(value)
+                elif column_name == 'current_price':
+                    value = Decimal(value)
+                else:
+                    value = int(value)
+            return value, item_id
+        except (KeyError, TypeError, ValueError, ArithmeticError, binascii.Error) as e:
+            raise ValueError(f"无效的分页游标: {e}") from e
+
+    async def _count_cached(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        filters: Dict[str, Any],
+        conditions: List[Any]
+    ) -> int:
+        """按筛选条件哈希缓存总数（键包含用户数据版本号，导入/删除后自动失效）"""
+        digest = hashlib.sha1(
+            json.dumps(filters, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+
+        redis_client = None
+        cache_key = None
+        try:
+            redis_client = await get_redis()
+            version = await redis_client.get(self._version_key(user_id)) or '0'
+            cache_key = f"ef:ozon:selection:count:{user_id}:{version}:{digest}"
+            cached = await redis_client.get(cache_key)
+            if cached is not None:
+                return int(cached)
+        except RedisError as e:
+            logger.warning(f"选品总数缓存不可用: {e}")
+            redis_client = None
+
+        total = (await db.execute(
+            select(func.count()).select_from(ProductSelectionItem).where(*conditions)
+        )).scalar()
+
+        if redis_client is not None:
+            try:
+                await redis_client.set(cache_key, total, ex=self.COUNT_CACHE_TTL)
+            except RedisError:
+                pass
+        return total
+
+    @staticmethod
+    def _version_key(user_id: int) -> str:
+        return f"ef:ozon:selection:version:{user_id}"
+
+    @classmethod
+    async def invalidate_search_counts(cls, user_id: int) -> None:
+        """用户选品数据变化后使总数缓存失效"""
+        try:
+            redis_client = await get_redis()
+            await redis_client.incr(cls._version_key(user_id))
+        except RedisError as e:
+            logger.warning(f"选品总数缓存失效失败: user_id={user_id}, {e}")
+
+    def _search_conditions(self, user_id: int, filters: Dict[str, Any]) -> List[Any]:
+        """搜索筛选条件（不含游标）"""
+        conditions = [ProductSelectionItem.user_id == user_id]
 
         if filters.get('product_name'):
-            # 商品名称搜索 - 同时搜索中文和俄文名称
-            search_term = f"%{filters['product_name']}%"
+            # 商品名称搜索 - 同时搜索中文和俄文名称（pg_trgm GIN 索引支持 ILIKE 子串匹配）
+            term = re.sub(r'([\\%_])', r'\\\1', filters['product_name'])
+            search_term = f"%{term}%"
             conditions.append(
                 or_(
                     ProductSelectionItem.product_name_ru.ilike(search_term),
@@ -763,7 +1129,8 @@ class ProductSelectionService:
 
         if filters.get('brand'):
             conditions.append(
-                ProductSelectionItem.brand_normalized == self.normalize_brand(filters['brand'])
+                ProductSelectionItem.brand_normalized
+                == self.normalize_brand(pd.Series([filters['brand']], dtype='string')).iloc[0]
             )
 
         if filters.get('rfbs_low_max'):
@@ -823,7 +1190,6 @@ class ProductSelectionService:
 
         # 上架时间筛选
         if filters.get('listing_date_start'):
-            from datetime import datetime
             listing_date_start = datetime.strptime(filters['listing_date_start'], '%Y-%m-%d')
             conditions.append(
                 ProductSelectionItem.listing_date >= listing_date_start
@@ -841,75 +1207,7 @@ class ProductSelectionService:
                 ProductSelectionItem.is_read == filters['is_read']
             )
 
-        if conditions:
-            query = query.where(and_(*conditions))
-
-        # 获取总数（不包含游标条件）
-        count_conditions = [ProductSelectionItem.user_id == user_id]
-        # 复制其他过滤条件（排除游标条件）
-        for cond in conditions:
-            if 'id >' not in str(cond):
-                count_conditions.append(cond)
-
-        count_query = select(func.count()).select_from(ProductSelectionItem)
-        if count_conditions:
-            count_query = count_query.where(and_(*count_conditions))
-        total_result = await db.execute(count_query)
-        total = total_result.scalar()
-
-        # 应用排序 - 必须包含 id 以确保游标分页稳定
-        if sort_by == 'sales_desc':
-            query = query.order_by(
-                ProductSelectionItem.monthly_sales_volume.desc().nullslast(),
-                ProductSelectionItem.id.asc()
-            )
-        elif sort_by == 'sales_asc':
-            query = query.order_by(
-                ProductSelectionItem.monthly_sales_volume.asc().nullsfirst(),
-                ProductSelectionItem.id.asc()
-            )
-        elif sort_by == 'weight_asc':
-            query = query.order_by(
-                ProductSelectionItem.package_weight.asc().nullsfirst(),
-                ProductSelectionItem.id.asc()
-            )
-        elif sort_by == 'price_asc':
-            query = query.order_by(
-                ProductSelectionItem.current_price.asc().nullsfirst(),
-                ProductSelectionItem.id.asc()
-            )
-        elif sort_by == 'price_desc':
-            query = query.order_by(
-                ProductSelectionItem.current_price.desc().nullslast(),
-                ProductSelectionItem.id.asc()
-            )
-        elif sort_by == 'created_desc':
-            query = query.order_by(
-                ProductSelectionItem.created_at.desc(),
-                ProductSelectionItem.id.asc()
-            )
-        elif sort_by == 'created_asc':
-            query = query.order_by(
-                ProductSelectionItem.created_at.asc(),
-                ProductSelectionItem.id.asc()
-            )
-        else:
-            # 默认按 ID 排序（等同于导入顺序，因为 ID 是自增的）
-            query = query.order_by(ProductSelectionItem.id.asc())
-
-        # 游标分页：只需要 LIMIT，不需要 OFFSET
-        query = query.limit(limit)
-
-        # 执行查询
-        result = await db.execute(query)
-        items = result.scalars().all()
-
-        return {
-            'items': [item.to_dict() for item in items],
-            'total': total,
-            'next_cursor': items[-1].id if items else None,  # 返回下一页的游标
-            'has_more': len(items) == limit  # 是否还有更多数据
-        }
+        return conditions
 
     async def get_brands(self, db: AsyncSession, user_id: int) -> List[str]:
         """获取指定用户的品牌列表（返回所有品牌，包括 '-' 和 'без бренда'）"""
@@ -1016,6 +1314,7 @@ class ProductSelectionService:
             )
 
             await db.commit()
+            await self.invalidate_search_counts(user_id)
 
             logger.info(f"用户 {user_id} 删除批次 {batch_id}：{product_count} 个商品")
 
@@ -1102,6 +1401,7 @@ class ProductSelectionService:
             )
 
             await db.commit()
+            await self.invalidate_search_counts(user_id)
 
             logger.info(
                 f"用户 {user_id} 批量删除 {len(valid_batch_ids)} 个批次"
@@ -1157,6 +1457,7 @@ class ProductSelectionService:
             )
 
             await db.commit()
+            await self.invalidate_search_counts(user_id)
 
             logger.info(f"成功清空用户 {user_id} 的数据：{product_count} 个商品，{history_count} 条导入历史")
 
@@ -2,6 +2,7 @@
 利润计算工具函数
 """
 from decimal import Decimal
+from typing import Optional, Tuple
 import logging
 
 from ..models.orders import OzonPosting
@@ -9,6 +10,50 @@ from ..models.orders import OzonPosting
 logger = logging.getLogger(__name__)
 
 
+def compute_profit(
+    order_total_price: Optional[Decimal],
+    status: Optional[str],
+    purchase_price: Optional[Decimal],
+    ozon_commission_cny: Optional[Decimal],
+    international_logistics_fee_cny: Optional[Decimal],
+    last_mile_delivery_fee_cny: Optional[Decimal],
+    material_cost: Optional[Decimal]
+) -> Tuple[Decimal, Decimal]:
+    """
+    按字段值计算利润（供批量更新使用，不需要 ORM 对象）
+
+    利润 = 订单金额 - (进货价格 + Ozon佣金 + 国际物流费 + 尾程派送费 + 打包费用)
+    利润率 = (利润 / 订单金额) * 100
+
+    Returns:
+        (利润, 利润率)
+    """
+    # 1. 订单金额（CNY），取消订单不计销售额
+    order_amount = order_total_price or Decimal('0')
+    if status == 'cancelled':
+        order_amount = Decimal('0')
+
+    # 2. 各项费用（CNY）
+    total_cost = (
+        (purchase_price or Decimal('0'))
+        + (ozon_commission_cny or Decimal('0'))
+        + (international_logistics_fee_cny or Decimal('0'))
+        + (last_mile_delivery_fee_cny or Decimal('0'))
+        + (material_cost or Decimal('0'))
+    )
+    profit = order_amount - total_cost
+
+    # 3. 利润率
+    if status == 'cancelled':
+        profit_rate = Decimal('0')
+    elif order_amount > 0:
+        profit_rate = (profit / order_amount * 100).quantize(Decimal('0.0001'))
+    else:
+        profit_rate = Decimal('0')
+
+    return profit.quantize(Decimal('0.01')), profit_rate
+
+
 def calculate_and_update_profit(posting: OzonPosting) -> None:
     """
     计算并更新利润字段（同步方法，不需要 session）
@@ -20,39 +65,18 @@ def calculate_and_update_profit(posting: OzonPosting) -> None:
         posting: 货件对象
     """
     try:
-        # 1. 获取订单金额（CNY）- 使用 posting.order_total_price
-        order_amount = posting.order_total_price or Decimal('0')
-
-        # 取消订单不计销售额
-        if posting.status == 'cancelled':
-            order_amount = Decimal('0')
-
-        # 2. 获取各项费用（CNY）
-        purchase_price = posting.purchase_price or Decimal('0')
-        ozon_commission = posting.ozon_commission_cny or Decimal('0')
-        international_logistics = posting.international_logistics_fee_cny or Decimal('0')
-        last_mile_delivery = posting.last_mile_delivery_fee_cny or Decimal('0')
-        material_cost = posting.material_cost or Decimal('0')
-
-        # 3. 计算利润
-        total_cost = purchase_price + ozon_commission + international_logistics + last_mile_delivery + material_cost
-        profit = order_amount - total_cost
-
-        # 4. 计算利润率
-        if posting.status == 'cancelled':
-            profit_rate = Decimal('0')
-        elif order_amount > 0:
-            profit_rate = (profit / order_amount * 100).quantize(Decimal('0.0001'))
-        else:
-            profit_rate = Decimal('0')
-
-        # 5. 更新posting记录
-        posting.profit = profit.quantize(Decimal('0.01'))
-        posting.profit_rate = profit_rate
+        posting.profit, posting.profit_rate = compute_profit(
+            order_total_price=posting.order_total_price,
+            status=posting.status,
+            purchase_price=posting.purchase_price,
+            ozon_commission_cny=posting.ozon_commission_cny,
+            international_logistics_fee_cny=posting.international_logistics_fee_cny,
+            last_mile_delivery_fee_cny=posting.last_mile_delivery_fee_cny,
+            material_cost=posting.material_cost
+        )
 
         logger.debug(
             f"Calculated profit for posting {posting.id}: "
-            f"order_amount={order_amount}, total_cost={total_cost}, "
             f"profit={posting.profit}, profit_rate={posting.profit_rate}%"
         )
 
@@ -11,6 +11,8 @@ from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from ef_core.services.task_progress import task_progress
+
 from ..models import OzonShop, OzonProduct
 from ..api.client import OzonAPIClient
 from .cloudinary_service import CloudinaryService, CloudinaryConfigManager
@@ -179,16 +181,10 @@ class QuickPublishService:
             }
         """
         try:
-            import redis
-            import json
-
-            redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
             # 从 Redis 读取任务进度
-            key = f"celery-task-progress:{task_id}"
-            data = redis_client.get(key)
+            progress_data = await task_progress.get(task_id)
 
-            if not data:
+            if not progress_data or "status" not in progress_data:
                 # 任务不存在或已过期
                 return {
                     "task_id": task_id,
@@ -196,9 +192,6 @@ class QuickPublishService:
                     "error": "任务不存在或已过期"
                 }
 
-            # 解析任务进度
-            progress_data = json.loads(data)
-
             return {
                 "task_id": task_id,
                 "status": progress_data.get("status", "unknown"),
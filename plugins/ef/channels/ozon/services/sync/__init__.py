@@ -8,14 +8,13 @@ Ozon同步模块
 - utils: 工具函数
 """
 
-from .task_state_manager import TaskStateManager, SyncTaskState, get_task_state_manager
+from .task_state_manager import TaskStateManager, get_task_state_manager
 from .product_sync import ProductSyncService
 from .order_sync import OrderSyncService
 
 __all__ = [
     # 任务状态管理
     "TaskStateManager",
-    "SyncTaskState",
     "get_task_state_manager",
     # 同步服务
     "ProductSyncService",
@@ -2,10 +2,13 @@
 订单数据获取器
 
 负责从 OZON API 获取订单数据，支持增量和全量模式。
+全量模式支持按时间窗口分片并发拉取（fetch_orders_windowed）。
 """
 
-from datetime import timedelta
-from typing import Dict, List, AsyncIterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, AsyncIterator, Optional, Set
+import asyncio
 import logging
 
 from ....api.client import OzonAPIClient
@@ -14,6 +17,65 @@ from ....utils.datetime_utils import utcnow
 logger = logging.getLogger(__name__)
 
 
+class OrderFetchError(Exception):
+    """订单拉取失败"""
+
+
+# 窗口网格的固定起点：窗口边界为 WINDOW_EPOCH + k * window_days，不随运行时间变化
+WINDOW_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    """订单拉取时间窗口 [date_from, date_to)"""
+    date_from: datetime
+    date_to: datetime
+    # 是否为完整的网格窗口（首尾被时间范围截断的窗口为 False）
+    complete: bool = True
+
+    @property
+    def key(self) -> Optional[str]:
+        """
+        窗口标识（用于断点记录）
+
+        只有完整窗口有稳定的边界；被截断的首尾窗口边界随运行时间变化，返回 None（不记录断点）
+        """
+        if not self.complete:
+            return None
+        return f"{self.date_from.isoformat()}~{self.date_to.isoformat()}"
+
+
+@dataclass
+class WindowBatch:
+    """窗口拉取结果：一页订单，或窗口完成标记（items 为空、done=True）"""
+    window: TimeWindow
+    items: List[Dict]
+    done: bool = False
+
+
+def build_time_windows(date_from: datetime, date_to: datetime, window_days: int) -> List[TimeWindow]:
+    """
+    将时间范围切分为对齐到固定网格的窗口
+
+    窗口边界为 WINDOW_EPOCH + k * window_days，与运行时间无关，
+    断点有效期内重跑得到相同的完整窗口（断点可复用）；
+    首尾窗口截断到 [date_from, date_to)，标记为不完整。
+    """
+    step = timedelta(days=window_days)
+    start = WINDOW_EPOCH + step * ((date_from - WINDOW_EPOCH) // step)
+    windows = []
+    while start < date_to:
+        end = start + step
+        window_from, window_to = max(start, date_from), min(end, date_to)
+        windows.append(TimeWindow(
+            window_from,
+            window_to,
+            complete=(window_from == start and window_to == end),
+        ))
+        start = end
+    return windows
+
+
 class OrderFetcher:
     """订单数据获取器"""
 
@@ -22,22 +84,29 @@ class OrderFetcher:
         client: OzonAPIClient,
         hours: int = 6,
         batch_size: int = 200,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
     ) -> AsyncIterator[tuple[List[Dict], bool]]:
         """
-        增量获取订单（最近N小时）
+        增量获取订单（从水位开始，或最近N小时）
 
         Args:
             client: OZON API 客户端
-            hours: 获取最近N小时的订单
+            hours: 未指定 date_from 时，获取最近N小时的订单
             batch_size: 每批获取数量
+            date_from: 起始时间（通常为店铺同步水位减重叠窗口）
+            date_to: 截止时间（默认当前时间）
 
         Yields:
             (items, has_next) - 订单列表、是否有下一页
+
+        Raises:
+            OrderFetchError: 拉取中途失败（已产出的批次仍有效，但不应推进水位）
         """
-        date_from = utcnow() - timedelta(hours=hours)
-        date_to = utcnow()
+        date_to = date_to or utcnow()
+        date_from = date_from or date_to - timedelta(hours=hours)
 
-        logger.info(f"Fetching orders from {date_from} to {date_to} ({hours} hours, all statuses)")
+        logger.info(f"Fetching orders from {date_from} to {date_to} (all statuses)")
 
         offset = 0
         has_more = True
@@ -53,7 +122,7 @@ class OrderFetcher:
                 )
             except Exception as e:
                 logger.error(f"Failed to fetch orders at offset {offset}: {e}")
-                break
+                raise OrderFetchError(f"Failed to fetch orders at offset {offset}: {e}") from e
 
             result_data = orders_data.get("result", {})
             items = result_data.get("postings", [])
@@ -124,3 +193,100 @@ class OrderFetcher:
                 logger.info(f"No more orders to fetch: has_next={has_next}, items_count={len(items)}")
             else:
                 offset += batch_size
+
+    async def _fetch_window_pages(
+        self,
+        client: OzonAPIClient,
+        window: TimeWindow,
+        batch_size: int,
+    ) -> AsyncIterator[List[Dict]]:
+        """逐页拉取单个窗口内的订单（窗口小，offset 不会很深）"""
+        offset = 0
+        while True:
+            orders_data = await client.get_orders(
+                date_from=window.date_from,
+                date_to=window.date_to,
+                limit=batch_size,
+                offset=offset
+            )
+            result = orders_data.get("result", {})
+            items = result.get("postings", [])
+            has_next = result.get("has_next", False)
+
+            if items:
+                yield items
+
+            if not items or not has_next or len(items) < batch_size:
+                break
+            offset += batch_size
+
+    async def fetch_orders_windowed(
+        self,
+        client: OzonAPIClient,
+        days: int = 360,
+        window_days: int = 7,
+        concurrency: int = 4,
+        queue_size: int = 8,
+        batch_size: int = 200,
+        skip_windows: Optional[Set[str]] = None,
+    ) -> AsyncIterator[WindowBatch]:
+        """
+        全量获取订单（按时间窗口分片并发拉取）
+
+        - 时间范围切分为 window_days 天的窗口，最多 concurrency 个窗口同时拉取
+        - 实际请求速率由店铺共享限流器控制
+        - 有界队列提供背压：消费方（入库）跟不上时，拉取协程阻塞在 put 上
+        - 每个窗口的所有页产出后，再产出一个 done=True 的完成标记，
+          消费方在该窗口数据提交后即可记录断点
+
+        Args:
+            client: OZON API 客户端
+            days: 获取最近N天的订单（OZON API限制最大364天）
+            window_days: 窗口大小（天）
+            concurrency: 并发窗口数
+            queue_size: 缓冲队列长度（页）
+            batch_size: 每页数量
+            skip_windows: 已完成的窗口 key（断点续跑；不完整的首尾窗口总是重新拉取）
+
+        Yields:
+            WindowBatch
+        """
+        date_to = utcnow()
+        windows = build_time_windows(date_to - timedelta(days=days), date_to, window_days)
+        pending = [w for w in windows if w.key is None or not skip_windows or w.key not in skip_windows]
+
+        logger.info(
+            f"Windowed full sync: {len(pending)}/{len(windows)} windows pending "
+            f"(window_days={window_days}, concurrency={concurrency})"
+        )
+        if not pending:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def produce(window: TimeWindow) -> None:
+            async with semaphore:
+                try:
+                    async for items in self._fetch_window_pages(client, window, batch_size):
+                        await queue.put(WindowBatch(window, items))
+                    await queue.put(WindowBatch(window, [], done=True))
+                except Exception as e:
+                    logger.error(f"Failed to fetch orders window {window.date_from}~{window.date_to}: {e}")
+                    await queue.put(e)
+
+        producers = [asyncio.create_task(produce(w)) for w in pending]
+        remaining = len(pending)
+
+        try:
+            while remaining:
+                entry = await queue.get()
+                if isinstance(entry, Exception):
+                    raise entry
+                if entry.done:
+                    remaining -= 1
+                yield entry
+        finally:
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
@@ -5,6 +5,7 @@
 优化版本：使用批量处理减少数据库查询次数。
 """
 
+from datetime import datetime, timedelta
 from typing import Dict, Any, Set
 import logging
 
@@ -16,8 +17,9 @@ from ....api.client import OzonAPIClient
 from ....utils.datetime_utils import utcnow
 
 from ..task_state_manager import get_task_state_manager
-from .order_fetcher import OrderFetcher
+from .order_fetcher import OrderFetcher, OrderFetchError, build_time_windows
 from .posting_processor import PostingProcessor
+from .sync_checkpoint import FullSyncCheckpoint
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,16 @@ logger = logging.getLogger(__name__)
 class OrderSyncService:
     """订单同步服务"""
 
+    # 增量同步：无水位时的回溯小时数、水位重叠窗口（防止边界遗漏）、最长回溯天数
+    INCREMENTAL_DEFAULT_HOURS = 6
+    INCREMENTAL_OVERLAP_MINUTES = 15
+    INCREMENTAL_MAX_LOOKBACK_DAYS = 30
+
+    # 全量同步：时间范围（OZON API 限制最大364天）、窗口大小、并发窗口数
+    FULL_SYNC_DAYS = 360
+    FULL_SYNC_WINDOW_DAYS = 7
+    FULL_SYNC_CONCURRENCY = 4
+
     def __init__(self):
         self.fetcher = OrderFetcher()
         self.posting_processor = PostingProcessor()
@@ -60,10 +72,15 @@ class OrderSyncService:
         db: AsyncSession,
         task_id: str
     ) -> Dict[str, Any]:
-        """增量同步订单 - 最近6小时"""
+        """
+        增量同步订单 - 从店铺同步水位开始
+
+        拉取区间为 [水位 - 重叠窗口, 当前时间]，无水位时回退到最近6小时；
+        内容哈希未变化的 posting 直接跳过。全部拉取成功后才推进水位。
+        """
         try:
             # 初始化任务状态
-            self.task_manager.create_task(
+            await self.task_manager.create_task(
                 task_id=task_id,
                 task_type="orders",
                 mode="incremental",
@@ -74,73 +91,111 @@ class OrderSyncService:
             shop, client = await self._get_shop_and_client(shop_id, db)
 
             # 更新进度
-            self.task_manager.update_progress(task_id, 5, "正在连接Ozon API...")
+            await self.task_manager.update_progress(task_id, 5, "正在连接Ozon API...")
+
+            date_to = utcnow()
+            date_from = self._incremental_date_from(shop, date_to)
 
             total_synced = 0
+            total_fetched = 0
             synced_posting_numbers: Set[str] = set()
             batch_count = 0
-
-            self.task_manager.update_progress(task_id, 5, "正在同步订单...")
-
-            async for items, has_next in self.fetcher.fetch_orders_incremental(client):
-                batch_count += 1
-
-                # 过滤已同步的 posting
-                new_items = []
-                for item in items:
-                    posting_number = item.get("posting_number", "")
-                    if posting_number and posting_number not in synced_posting_numbers:
-                        synced_posting_numbers.add(posting_number)
-                        new_items.append(item)
-
-                if new_items:
-                    # 更新进度
-                    self.task_manager.update_progress(
-                        task_id,
-                        min(5 + (85 * batch_count / 10), 90),
-                        f"正在批量同步第 {batch_count} 批订单（{len(new_items)} 个）..."
-                    )
-
-                    # 使用批量处理方法
-                    synced = await self.posting_processor.sync_postings_batch(
-                        db=db,
-                        items=new_items,
-                        shop=shop
-                    )
-                    total_synced += synced
-
-                # 每批次提交一次
-                await db.commit()
-
-            # 更新店铺最后同步时间
+            fetch_complete = True
+
+            await self.task_manager.update_progress(task_id, 5, "正在同步订单...")
+
+            try:
+                async for items, has_next in self.fetcher.fetch_orders_incremental(
+                    client, date_from=date_from, date_to=date_to
+                ):
+                    batch_count += 1
+
+                    # 过滤已同步的 posting
+                    new_items = []
+                    for item in items:
+                        posting_number = item.get("posting_number", "")
+                        if posting_number and posting_number not in synced_posting_numbers:
+                            synced_posting_numbers.add(posting_number)
+                            new_items.append(item)
+
+                    if new_items:
+                        total_fetched += len(new_items)
+
+                        # 更新进度
+                        await self.task_manager.update_progress(
+                            task_id,
+                            min(5 + (85 * batch_count / 10), 90),
+                            f"正在批量同步第 {batch_count} 批订单（{len(new_items)} 个）..."
+                        )
+
+                        # 使用批量处理方法（跳过内容未变化的 posting）
+                        synced = await self.posting_processor.sync_postings_batch(
+                            db=db,
+                            items=new_items,
+                            shop=shop,
+                            skip_unchanged=True
+                        )
+                        total_synced += synced
+
+                    # 每批次提交一次
+                    await db.commit()
+            except OrderFetchError as e:
+                # 已提交的批次保留，但水位不推进，下次从原水位重新拉取
+                fetch_complete = False
+                logger.warning(f"Incremental order fetch incomplete for shop {shop_id}: {e}")
+
+            # 更新店铺最后同步时间和同步水位
             shop.last_sync_at = utcnow()
+            if fetch_complete:
+                shop.order_sync_watermark = date_to
             await db.commit()
 
             # 完成任务
-            message = f"增量同步完成，共同步{total_synced}个订单"
-            self.task_manager.complete_task(
+            skipped = total_fetched - total_synced
+            message = f"增量同步完成，共同步{total_synced}个订单（{skipped}个未变化已跳过）"
+            return await self.task_manager.complete_task(
                 task_id,
-                result={"total_synced": total_synced},
+                result={"total_synced": total_synced, "total_fetched": total_fetched, "skipped": skipped},
                 message=message
             )
 
-            return self.task_manager.get_task_dict(task_id)
-
         except Exception as e:
             logger.error(f"Incremental sync orders failed: {e}")
-            self.task_manager.fail_task(task_id, str(e), f"增量同步失败: {str(e)}")
+            await self.task_manager.fail_task(task_id, str(e), f"增量同步失败: {str(e)}")
             raise
 
+    def _incremental_date_from(self, shop: OzonShop, date_to: datetime) -> datetime:
+        """计算增量同步起始时间：水位减重叠窗口，最长回溯 INCREMENTAL_MAX_LOOKBACK_DAYS 天"""
+        watermark = shop.order_sync_watermark
+        if not watermark:
+            return date_to - timedelta(hours=self.INCREMENTAL_DEFAULT_HOURS)
+
+        date_from = watermark - timedelta(minutes=self.INCREMENTAL_OVERLAP_MINUTES)
+        earliest = date_to - timedelta(days=self.INCREMENTAL_MAX_LOOKBACK_DAYS)
+        if date_from < earliest:
+            logger.warning(
+                f"Order sync watermark for shop {shop.id} is older than "
+                f"{self.INCREMENTAL_MAX_LOOKBACK_DAYS} days ({watermark}), run a full sync to backfill"
+            )
+            date_from = earliest
+        return date_from
+
     async def _sync_orders_full(
         self,
         shop_id: int,
         db: AsyncSession,
         task_id: str
     ) -> Dict[str, Any]:
-        """全量同步订单 - 获取店铺所有历史订单"""
+        """
+        全量同步订单 - 获取店铺所有历史订单
+
+        按时间窗口并发拉取，逐批入库；每个窗口提交后记录断点，
+        中途失败重跑时跳过已完成的窗口。
+        """
+        checkpoint = FullSyncCheckpoint(shop_id)
         try:
             # 初始化任务状态
-            self.task_manager.create_task(
+            await self.task_manager.create_task(
                 task_id=task_id,
                 task_type="orders",
                 mode="full",
@@ -151,32 +206,55 @@ class OrderSyncService:
             shop, client = await self._get_shop_and_client(shop_id, db)
 
             # 更新进度
-            self.task_manager.update_progress(task_id, 5, "正在连接Ozon API...")
-            self.task_manager.update_progress(task_id, 10, "正在获取所有历史订单...")
+            await self.task_manager.update_progress(task_id, 5, "正在连接Ozon API...")
+
+            done_windows = await checkpoint.load()
+            if done_windows:
+                logger.info(f"Resuming full sync for shop {shop_id}: {len(done_windows)} windows already done")
+
+            now = utcnow()
+            windows = build_time_windows(
+                now - timedelta(days=self.FULL_SYNC_DAYS), now, self.FULL_SYNC_WINDOW_DAYS
+            )
+            total_windows = len(windows)
+            await self.task_manager.update_progress(task_id, 10, "正在分时间窗口获取历史订单...")
 
             total_synced = 0
             synced_posting_numbers: Set[str] = set()
             batch_count = 0
+            windows_completed = sum(1 for w in windows if w.key is not None and w.key in done_windows)
+
+            async for batch in self.fetcher.fetch_orders_windowed(
+                client,
+                days=self.FULL_SYNC_DAYS,
+                window_days=self.FULL_SYNC_WINDOW_DAYS,
+                concurrency=self.FULL_SYNC_CONCURRENCY,
+                skip_windows=done_windows,
+            ):
+                if batch.done:
+                    # 该窗口的所有批次均已提交，记录断点（被截断的首尾窗口边界不稳定，不记录）
+                    if batch.window.key is not None:
+                        await checkpoint.mark_done(batch.window.key)
+                    windows_completed += 1
+                    continue
 
-            async for items, has_next in self.fetcher.fetch_orders_full(client):
                 batch_count += 1
 
-                # 过滤已同步的 posting
+                # 过滤已同步的 posting（窗口边界可能重复）
                 new_items = []
-                for item in items:
+                for item in batch.items:
                     posting_number = item.get("posting_number", "")
                     if posting_number and posting_number not in synced_posting_numbers:
                         synced_posting_numbers.add(posting_number)
                         new_items.append(item)
 
                 if new_items:
-                    # 更新进度（全量同步估算进度）
-                    estimated_total = max(50, batch_count * 1.5)
-                    progress = 10 + (80 * batch_count / estimated_total)
-                    self.task_manager.update_progress(
+                    progress = 10 + (80 * windows_completed / max(total_windows, 1))
+                    await self.task_manager.update_progress(
                         task_id,
                         min(int(progress), 90),
-                        f"正在批量同步第 {batch_count} 批订单（{len(new_items)} 个）..."
+                        f"正在批量同步第 {batch_count} 批订单（{len(new_items)} 个，"
+                        f"窗口 {windows_completed}/{total_windows}）..."
                     )
 
                     # 使用批量处理方法
@@ -194,19 +272,20 @@ class OrderSyncService:
             shop.last_sync_at = utcnow()
             await db.commit()
 
+            # 全量完成，清除断点
+            await checkpoint.clear()
+
             # 完成任务
             message = f"全量同步完成，共同步{total_synced}个订单"
-            self.task_manager.complete_task(
+            return await self.task_manager.complete_task(
                 task_id,
                 result={"total_synced": total_synced},
                 message=message
             )
 
-            return self.task_manager.get_task_dict(task_id)
-
         except Exception as e:
             logger.error(f"Full sync orders failed: {e}")
-            self.task_manager.fail_task(task_id, str(e), f"全量同步失败: {str(e)}")
+            await self.task_manager.fail_task(task_id, str(e), f"全量同步失败: {str(e)}")
             raise
 
     async def _get_shop_and_client(
@@ -0,0 +1,460 @@
+"""
+Posting 集合式批量写入引擎
+
+先在内存中算出整批 posting 的全部变更（posting 字段、包裹、operation_status、销量增量），
+再用固定数量的语句写入数据库：
+
+1. 查询已存在 posting 快照（只取计算所需列）          - 1 次
+2. 查询有采购信息的 SKU                                - 1 次
+3. INSERT ... ON CONFLICT (posting_number) DO UPDATE   - 1 次
+4. INSERT ... ON CONFLICT (posting_id, package_number) - 1 次
+5. UPDATE ozon_products ... FROM (VALUES ...) 聚合销量  - 1 次
+
+语句数与批大小无关（仅在超过单条语句参数上限时按 CHUNK_SIZE 分块）。
+需要调用详情接口补全包裹的 posting 在写库前并发拉取，不占用数据库连接。
+"""
+
+from collections import defaultdict
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+import asyncio
+import logging
+
+from sqlalchemy import BigInteger, DateTime, Integer, and_, case, column, func, or_, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ....models import OzonPosting, OzonShipmentPackage, OzonProduct, OzonShop
+from ....api.client import OzonAPIClient
+from ....utils.datetime_utils import parse_datetime, utcnow
+from ....utils.serialization import content_hash
+from ...posting_status_manager import PostingStatusManager
+
+if TYPE_CHECKING:
+    from .posting_processor import PostingProcessor
+
+logger = logging.getLogger(__name__)
+
+# 同步流程每次都会赋值的 posting 列（ON CONFLICT 时直接覆盖）
+_SYNC_COLUMNS = (
+    "shop_id", "posting_number", "status", "substatus", "shipment_date", "in_process_at",
+    "shipped_at", "delivered_at", "is_cancelled", "raw_payload", "payload_hash",
+    "has_tracking_number", "tracking_synced_at", "operation_status", "created_at", "updated_at",
+)
+# 仅在 OZON 返回对应数据（或状态变化）时才赋值的列：NULL 表示保留原值（ON CONFLICT 时 COALESCE）
+# 进货价、备注、标签路径等用户维护的列不在两者之中，不会被同步覆盖
+_OPTIONAL_COLUMNS = (
+    "ozon_posting_number", "delivery_method_id", "delivery_method_name", "warehouse_id", "warehouse_name",
+    "cancel_reason_id", "cancel_reason", "cancelled_at", "product_skus", "order_total_price",
+    "has_purchase_info", "operation_time",
+)
+
+
+class PostingBulkWriter:
+    """Posting 集合式批量写入引擎"""
+
+    # 单条 INSERT 的最大行数（约 30 列 × 500 行，低于 asyncpg 32767 参数上限）
+    CHUNK_SIZE = 500
+    # 详情接口并发数（实际速率仍受店铺共享限流器控制）
+    DETAIL_CONCURRENCY = 5
+
+    def __init__(self, processor: "PostingProcessor"):
+        # 复用 PostingProcessor 的字段映射逻辑，保证与单条同步路径结果一致
+        self.processor = processor
+
+    async def sync_batch(
+        self,
+        db: AsyncSession,
+        items: List[Dict[str, Any]],
+        shop: OzonShop,
+        skip_unchanged: bool = False,
+    ) -> int:
+        """
+        集合式同步一批 posting
+
+        Args:
+            db: 数据库会话（只执行语句，不提交）
+            items: OZON API 返回的 posting 数据列表
+            shop: 店铺对象
+            skip_unchanged: 是否跳过 raw_payload 内容未变化的 posting
+
+        Returns:
+            写入的 posting 数量（不含跳过的）
+        """
+        # 同一批内重复的 posting 以最后一条为准（ON CONFLICT 不能在一条语句中更新同一行两次）
+        items_by_number: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            posting_number = item.get("posting_number")
+            if posting_number:
+                items_by_number[posting_number] = item
+
+        if not items_by_number:
+            return 0
+
+        payload_hashes = {pn: content_hash(item) for pn, item in items_by_number.items()}
+
+        # 1. 已存在 posting 快照
+        snapshot_result = await db.execute(
+            select(
+                OzonPosting.posting_number,
+                OzonPosting.status,
+                OzonPosting.is_cancelled,
+                OzonPosting.payload_hash,
+                OzonPosting.operation_status,
+                OzonPosting.has_domestic_tracking,
+                OzonPosting.shipped_at,
+                OzonPosting.tracking_synced_at,
+            ).where(OzonPosting.posting_number.in_(list(items_by_number)))
+        )
+        existing = {row.posting_number: row for row in snapshot_result.all()}
+
+        if skip_unchanged:
+            items_by_number = {
+                pn: item for pn, item in items_by_number.items()
+                if pn not in existing or existing[pn].payload_hash != payload_hashes[pn]
+            }
+            logger.info(f"Content hash check: {len(items_by_number)}/{len(payload_hashes)} postings changed")
+            if not items_by_number:
+                return 0
+
+        # 2. 有采购信息的 SKU
+        skus_with_purchase = await self._load_skus_with_purchase(db, shop.id, items_by_number.values())
+
+        # 3. 需要详情接口补全包裹的 posting（并发拉取）
+        packages_by_number = await self._resolve_packages(shop, items_by_number)
+
+        # 4. 内存中计算 posting 行与销量增量
+        now = utcnow()
+        posting_rows: List[Dict[str, Any]] = []
+        sales_deltas: Dict[int, int] = defaultdict(int)
+        last_sale_at: Dict[int, datetime] = {}
+
+        for posting_number, item in items_by_number.items():
+            snapshot = existing.get(posting_number)
+            posting = self._compute_posting(shop.id, item, snapshot, skus_with_purchase, now)
+            posting.payload_hash = payload_hashes[posting_number]
+            posting_rows.append(self._to_row(posting, now))
+
+            self._accumulate_sales(posting, item, snapshot, now, sales_deltas, last_sale_at)
+
+        # 5. 写入 posting，取回 id
+        posting_ids = await self._upsert_postings(db, posting_rows)
+
+        # 6. 写入包裹
+        await self._upsert_packages(db, posting_ids, packages_by_number, now)
+
+        # 7. 聚合更新销量
+        await self._apply_sales(db, shop.id, sales_deltas, last_sale_at)
+
+        logger.info(
+            f"Bulk synced {len(posting_rows)} postings "
+            f"({len(posting_rows) - len(existing.keys() & items_by_number.keys())} new), "
+            f"{sum(len(p) for p in packages_by_number.values())} packages, "
+            f"{len(sales_deltas)} sku sales deltas"
+        )
+        return len(posting_rows)
+
+    async def _load_skus_with_purchase(self, db: AsyncSession, shop_id: int, items) -> Set[int]:
+        """批量查询有采购信息的 SKU"""
+        all_skus: Set[int] = set()
+        for item in items:
+            for p in item.get("products", []):
+                sku = p.get("sku")
+                if sku is not None:
+                    try:
+                        all_skus.add(int(sku))
+                    except (ValueError, TypeError):
+                        pass
+
+        if not all_skus:
+            return set()
+
+        result = await db.execute(
+            select(OzonProduct.ozon_sku).where(
+                OzonProduct.shop_id == shop_id,
+                OzonProduct.ozon_sku.in_(list(all_skus)),
+                OzonProduct.purchase_url.isnot(None),
+                OzonProduct.purchase_url != ''
+            )
+        )
+        return {row[0] for row in result.all()}
+
+    async def _resolve_packages(
+        self,
+        shop: OzonShop,
+        items_by_number: Dict[str, Dict[str, Any]],
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        确定每个 posting 的包裹数据来源（规则同 PostingProcessor.sync_packages）
+
+        列表接口已带有效追踪号（或尚不需要追踪号）时直接使用；
+        否则并发调用详情接口补全。
+        """
+        packages_by_number: Dict[str, List[Dict[str, Any]]] = {}
+        need_details: List[str] = []
+
+        for posting_number, item in items_by_number.items():
+            needs_tracking = item.get("status") in ["awaiting_deliver", "delivering", "delivered"]
+            packages_from_list = item.get("packages", [])
+            has_valid_tracking = any(
+                pkg.get("tracking_number") and pkg.get("tracking_number") != posting_number
+                for pkg in packages_from_list
+            )
+
+            if packages_from_list and (has_valid_tracking or not needs_tracking):
+                packages_by_number[posting_number] = packages_from_list
+            elif needs_tracking:
+                need_details.append(posting_number)
+
+        if not need_details:
+            return packages_by_number
+
+        semaphore = asyncio.Semaphore(self.DETAIL_CONCURRENCY)
+
+        async with OzonAPIClient(shop.client_id, shop.api_key_enc, shop.id) as client:
+            async def fetch(posting_number: str) -> Tuple[str, Optional[List[Dict[str, Any]]]]:
+                async with semaphore:
+                    try:
+                        detail_response = await client.get_posting_details(posting_number)
+                        return posting_number, detail_response.get("result", {}).get("packages") or None
+                    except Exception as e:
+                        logger.warning(f"Failed to fetch package details for posting {posting_number}: {e}")
+                        return posting_number, None
+
+            for posting_number, packages in await asyncio.gather(*(fetch(pn) for pn in need_details)):
+                if packages:
+                    packages_by_number[posting_number] = packages
+
+        logger.info(f"Fetched package details for {len(need_details)} postings")
+        return packages_by_number
+
+    def _compute_posting(
+        self,
+        shop_id: int,
+        item: Dict[str, Any],
+        snapshot: Optional[Any],
+        skus_with_purchase: Set[int],
+        now: datetime,
+    ) -> OzonPosting:
+        """
+        在游离（transient）的 OzonPosting 上计算全部同步字段
+
+        对象不加入会话，只作为计算载体；只有被赋值过的列会写入数据库。
+        """
+        posting_number = item["posting_number"]
+        if snapshot is None:
+            posting = OzonPosting(
+                shop_id=shop_id,
+                posting_number=posting_number,
+                ozon_posting_number=posting_number,
+                status=item.get("status") or "awaiting_packaging",
+                # 与 ORM 插入时的列默认值一致
+                operation_status="awaiting_stock",
+                has_domestic_tracking=False,
+                has_purchase_info=False,
+            )
+        else:
+            posting = OzonPosting(
+                shop_id=shop_id,
+                posting_number=posting_number,
+                status=item.get("status") or snapshot.status,
+                operation_status=snapshot.operation_status,
+                has_domestic_tracking=snapshot.has_domestic_tracking,
+                shipped_at=snapshot.shipped_at,
+                tracking_synced_at=snapshot.tracking_synced_at,
+            )
+
+        self.processor._update_posting_details(posting, item)
+        self.processor._update_denormalized_fields_fast(posting, item, skus_with_purchase)
+
+        # operation_status（规则同 PostingStatusManager.update_posting_status）
+        new_status, changed = PostingStatusManager.calculate_operation_status(
+            posting=posting,
+            ozon_status=posting.status,
+            preserve_manual=True
+        )
+        posting.operation_status = new_status
+        if changed:
+            posting.operation_time = now
+
+        # has_domestic_tracking 只用于状态计算，由国内单号流程维护
+        posting.__dict__.pop("has_domestic_tracking", None)
+        return posting
+
+    def _to_row(self, posting: OzonPosting, now: datetime) -> Dict[str, Any]:
+        """
+        提取写入列（所有行列相同，才能合并为一条多行 INSERT）
+
+        未赋值的可选列置 NULL，ON CONFLICT 时保留原值。
+        """
+        values_ = posting.__dict__
+        row = {key: values_.get(key) for key in _SYNC_COLUMNS + _OPTIONAL_COLUMNS}
+        # created_at 仅在插入时生效（ON CONFLICT 不更新）
+        row["created_at"] = now
+        row["updated_at"] = now
+        return row
+
+    def _accumulate_sales(
+        self,
+        posting: OzonPosting,
+        item: Dict[str, Any],
+        snapshot: Optional[Any],
+        now: datetime,
+        sales_deltas: Dict[int, int],
+        last_sale_at: Dict[int, datetime],
+    ) -> None:
+        """累计销量增量（规则同 PostingProcessor._update_product_sales）"""
+        new_is_cancelled = posting.is_cancelled
+        if snapshot is None:
+            delta = 0 if new_is_cancelled else 1
+        elif not snapshot.is_cancelled and new_is_cancelled:
+            delta = -1
+        elif snapshot.is_cancelled and not new_is_cancelled:
+            delta = 1
+        else:
+            delta = 0
+
+        if not delta:
+            return
+
+        order_time = posting.in_process_at or posting.shipment_date or now
+        for product in item.get("products", []):
+            ozon_sku = product.get("sku")
+            if not ozon_sku:
+                continue
+            sku = int(ozon_sku)
+            sales_deltas[sku] += delta * product.get("quantity", 1)
+            if delta > 0 and (sku not in last_sale_at or order_time > last_sale_at[sku]):
+                last_sale_at[sku] = order_time
+
+    async def _upsert_postings(self, db: AsyncSession, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        INSERT ... ON CONFLICT (posting_number) DO UPDATE ... RETURNING id
+
+        Returns:
+            posting_number -> id
+        """
+        posting_ids: Dict[str, int] = {}
+        table = OzonPosting.__table__
+
+        for start in range(0, len(rows), self.CHUNK_SIZE):
+            stmt = insert(OzonPosting).values(rows[start:start + self.CHUNK_SIZE])
+            set_ = {
+                key: stmt.excluded[key]
+                for key in _SYNC_COLUMNS if key not in ("shop_id", "posting_number", "created_at")
+            }
+            set_.update({
+                key: func.coalesce(stmt.excluded[key], table.c[key])
+                for key in _OPTIONAL_COLUMNS
+            })
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[OzonPosting.posting_number],
+                set_=set_
+            ).returning(OzonPosting.id, OzonPosting.posting_number)
+
+            result = await db.execute(stmt)
+            posting_ids.update({row.posting_number: row.id for row in result.all()})
+
+        return posting_ids
+
+    async def _upsert_packages(
+        self,
+        db: AsyncSession,
+        posting_ids: Dict[str, int],
+        packages_by_number: Dict[str, List[Dict[str, Any]]],
+        now: datetime,
+    ) -> None:
+        """INSERT ... ON CONFLICT (posting_id, package_number) DO UPDATE"""
+        package_rows: Dict[Tuple[int, str], Dict[str, Any]] = {}
+
+        for posting_number, packages in packages_by_number.items():
+            posting_id = posting_ids.get(posting_number)
+            if posting_id is None:
+                continue
+
+            for package_data in packages:
+                package_number = package_data.get("package_number") or package_data.get("id")
+                if not package_number:
+                    continue
+                package_number = str(package_number)
+
+                raw_tracking_number = package_data.get("tracking_number")
+                if raw_tracking_number and raw_tracking_number == posting_number:
+                    raw_tracking_number = None
+
+                package_rows[(posting_id, package_number)] = {
+                    "posting_id": posting_id,
+                    "package_number": package_number,
+                    "tracking_number": raw_tracking_number,
+                    "carrier_name": package_data.get("carrier_name"),
+                    "carrier_code": package_data.get("carrier_code"),
+                    "status": package_data.get("status"),
+                    "status_updated_at": parse_datetime(package_data.get("status_updated_at")),
+                    "created_at": now,
+                    "updated_at": now,
+                }
+
+        rows = list(package_rows.values())
+        for start in range(0, len(rows), self.CHUNK_SIZE):
+            stmt = insert(OzonShipmentPackage).values(rows[start:start + self.CHUNK_SIZE])
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_ozon_packages",
+                set_={
+                    "tracking_number": stmt.excluded.tracking_number,
+                    "carrier_name": stmt.excluded.carrier_name,
+                    "carrier_code": stmt.excluded.carrier_code,
+                    "status": stmt.excluded.status,
+                    # 仅当 OZON 返回了状态时间时才覆盖
+                    "status_updated_at": func.coalesce(
+                        stmt.excluded.status_updated_at, OzonShipmentPackage.status_updated_at
+                    ),
+                    "updated_at": stmt.excluded.updated_at,
+                }
+            )
+            await db.execute(stmt)
+
+    async def _apply_sales(
+        self,
+        db: AsyncSession,
+        shop_id: int,
+        sales_deltas: Dict[int, int],
+        last_sale_at: Dict[int, datetime],
+    ) -> None:
+        """UPDATE ozon_products ... FROM (VALUES ...) 一次性应用整批销量增量"""
+        data = [
+            (sku, delta, last_sale_at.get(sku))
+            for sku, delta in sales_deltas.items()
+            if delta or sku in last_sale_at
+        ]
+        if not data:
+            return
+
+        deltas = values(
+            column("ozon_sku", BigInteger),
+            column("delta", Integer),
+            column("sale_at", DateTime(timezone=True)),
+            name="sales_deltas",
+        ).data(data)
+
+        stmt = (
+            update(OzonProduct)
+            .where(
+                OzonProduct.shop_id == shop_id,
+                OzonProduct.ozon_sku == deltas.c.ozon_sku,
+            )
+            .values(
+                sales_count=func.greatest(0, func.coalesce(OzonProduct.sales_count, 0) + deltas.c.delta),
+                last_sale_at=case(
+                    (
+                        and_(
+                            deltas.c.sale_at.isnot(None),
+                            or_(OzonProduct.last_sale_at.is_(None), deltas.c.sale_at > OzonProduct.last_sale_at),
+                        ),
+                        deltas.c.sale_at,
+                    ),
+                    else_=OzonProduct.last_sale_at,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.execute(stmt)
@@ -14,6 +14,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ....models import OzonPosting, OzonShipmentPackage, OzonProduct, OzonShop
 from ....api.client import OzonAPIClient
 from ....utils.datetime_utils import parse_datetime, utcnow
+from ....utils.serialization import content_hash
 
 logger = logging.getLogger(__name__)
 
@@ -21,166 +22,37 @@ logger = logging.getLogger(__name__)
 class PostingProcessor:
     """Posting 处理器"""
 
+    def __init__(self):
+        from .posting_bulk_writer import PostingBulkWriter
+
+        self.bulk_writer = PostingBulkWriter(self)
+
     async def sync_postings_batch(
         self,
         db: AsyncSession,
         items: List[Dict[str, Any]],
         shop: OzonShop,
+        skip_unchanged: bool = False,
     ) -> int:
         """
-        批量同步 postings（优化版）
+        批量同步 postings（集合式）
 
-        优化点：
-        1. 批量查询已存在的 postings（1次查询）
-        2. 批量查询已存在的 packages（1次查询）
-        3. 批量收集所有 SKU，一次查询采购信息
-        4. shop 对象直接传入，不再重复查询
+        整批变更在内存中计算，再以固定数量的 INSERT ... ON CONFLICT / UPDATE ... FROM (VALUES)
+        语句写入，语句数不随批大小增长，详见 PostingBulkWriter。
 
         Args:
             db: 数据库会话
             items: OZON API 返回的 posting 数据列表
             shop: 店铺对象
+            skip_unchanged: 是否跳过 raw_payload 内容未变化的 posting
 
         Returns:
-            成功同步的数量
+            成功同步的数量（不含跳过的）
         """
         if not items:
             return 0
 
-        shop_id = shop.id
-
-        # 1. 提取所有 posting_number
-        posting_numbers = [
-            item.get("posting_number") for item in items
-            if item.get("posting_number")
-        ]
-
-        if not posting_numbers:
-            return 0
-
-        # 2. 批量查询已存在的 postings（1次查询代替 N 次）
-        existing_result = await db.execute(
-            select(OzonPosting).where(OzonPosting.posting_number.in_(posting_numbers))
-        )
-        existing_postings = {p.posting_number: p for p in existing_result.scalars().all()}
-
-        logger.info(f"Batch query: {len(existing_postings)}/{len(posting_numbers)} postings already exist")
-
-        # 3. 收集所有 SKU 用于批量查询采购信息
-        all_skus: Set[int] = set()
-        for item in items:
-            products = item.get("products", [])
-            for p in products:
-                sku = p.get("sku")
-                if sku is not None:
-                    try:
-                        all_skus.add(int(sku))
-                    except (ValueError, TypeError):
-                        pass
-
-        # 4. 批量查询有采购信息的 SKU（1次查询）
-        skus_with_purchase: Set[int] = set()
-        if all_skus:
-            purchase_result = await db.execute(
-                select(OzonProduct.ozon_sku).where(
-                    OzonProduct.shop_id == shop_id,
-                    OzonProduct.ozon_sku.in_(list(all_skus)),
-                    OzonProduct.purchase_url.isnot(None),
-                    OzonProduct.purchase_url != ''
-                )
-            )
-            skus_with_purchase = {row[0] for row in purchase_result.all()}
-
-        # 5. 处理每个 posting
-        synced_count = 0
-        new_postings: List[OzonPosting] = []
-        postings_to_process: List[tuple[OzonPosting, Dict, bool, bool]] = []
-
-        for item in items:
-            posting_number = item.get("posting_number")
-            if not posting_number:
-                continue
-
-            posting = existing_postings.get(posting_number)
-            is_new_posting = posting is None
-            old_is_cancelled = posting.is_cancelled if posting else False
-
-            if not posting:
-                posting = OzonPosting(
-                    shop_id=shop_id,
-                    posting_number=posting_number,
-                    ozon_posting_number=posting_number,
-                    status=item.get("status") or "awaiting_packaging",
-                )
-                new_postings.append(posting)
-                logger.debug(f"Created new posting {posting_number}")
-            else:
-                old_status = posting.status
-                new_status = item.get("status") or posting.status
-                posting.status = new_status
-                logger.debug(f"Updating posting {posting_number}: {old_status} → {new_status}")
-
-            # 更新 posting 详细信息
-            self._update_posting_details(posting, item)
-
-            # 更新反范式化字段（使用预查询的采购信息）
-            self._update_denormalized_fields_fast(posting, item, skus_with_purchase)
-
-            postings_to_process.append((posting, item, is_new_posting, old_is_cancelled))
-            synced_count += 1
-
-        # 6. 批量添加新 postings
-        if new_postings:
-            db.add_all(new_postings)
-            logger.info(f"Batch added {len(new_postings)} new postings")
-
-        # 7. Flush 以获取 posting IDs
-        await db.flush()
-
-        # 8. 批量查询已存在的 packages
-        posting_ids = [p.id for p, _, _, _ in postings_to_process if p.id]
-        existing_packages_map: Dict[int, Dict[str, OzonShipmentPackage]] = {}
-
-        if posting_ids:
-            packages_result = await db.execute(
-                select(OzonShipmentPackage).where(
-                    OzonShipmentPackage.posting_id.in_(posting_ids)
-                )
-            )
-            for pkg in packages_result.scalars().all():
-                if pkg.posting_id not in existing_packages_map:
-                    existing_packages_map[pkg.posting_id] = {}
-                existing_packages_map[pkg.posting_id][pkg.package_number] = pkg
-
-        logger.info(f"Batch query: found packages for {len(existing_packages_map)} postings")
-
-        # 9. 处理 packages 和更新 operation_status、销量
-        new_packages: List[OzonShipmentPackage] = []
-
-        for posting, item, is_new_posting, old_is_cancelled in postings_to_process:
-            # 同步包裹信息（批量版）
-            new_pkgs = await self._sync_packages_fast(
-                db, posting, item, shop,
-                existing_packages_map.get(posting.id, {})
-            )
-            new_packages.extend(new_pkgs)
-
-            # 更新 operation_status
-            await self._update_operation_status(db, posting, item)
-
-            # 更新商品销量
-            await self._update_product_sales(
-                db, shop_id, item.get("products", []),
-                is_new_posting, old_is_cancelled, posting.is_cancelled,
-                posting
-            )
-
-        # 10. 批量添加新 packages
-        if new_packages:
-            db.add_all(new_packages)
-            logger.info(f"Batch added {len(new_packages)} new packages")
-
-        return synced_count
+        return await self.bulk_writer.sync_batch(db, items, shop, skip_unchanged=skip_unchanged)
 
     async def sync_posting(
         self,
@@ -245,6 +117,7 @@ class PostingProcessor:
 
         # 更新 posting 详细信息
         self._update_posting_details(posting, posting_data)
+        posting.payload_hash = content_hash(posting_data)
 
         # 更新反范式化字段
         await self._update_denormalized_fields(db, posting, posting_data, shop_id)
@@ -478,95 +351,6 @@ class PostingProcessor:
                 await sales_updater.update_product_sales(db, shop_id, products, delta=1, order_time=order_time)
                 logger.debug(f"Restored sales for uncancelled posting {posting.posting_number}")
 
-    async def _sync_packages_fast(
-        self,
-        db: AsyncSession,
-        posting: OzonPosting,
-        posting_data: Dict[str, Any],
-        shop: OzonShop,
-        existing_packages: Dict[str, OzonShipmentPackage]
-    ) -> List[OzonShipmentPackage]:
-        """
-        同步包裹信息（批量优化版）
-
-        Args:
-            db: 数据库会话
-            posting: Posting 对象
-            posting_data: OZON API 返回的 posting 数据
-            shop: 店铺对象
-            existing_packages: 已存在的包裹 {package_number: package}
-
-        Returns:
-            新创建的包裹列表
-        """
-        posting_status = posting_data.get("status")
-        needs_tracking = posting_status in ["awaiting_deliver", "delivering", "delivered"]
-
-        # 检查列表 API 返回的 packages
-        packages_from_list = posting_data.get("packages", [])
-        has_valid_tracking = False
-
-        if packages_from_list:
-            for pkg in packages_from_list:
-                tracking = pkg.get("tracking_number")
-                if tracking and tracking != posting.posting_number:
-                    has_valid_tracking = True
-                    break
-
-        # 决定数据来源
-        if packages_from_list and (has_valid_tracking or not needs_tracking):
-            packages_list = packages_from_list
-        elif needs_tracking:
-            # 调用详情接口
-            try:
-                client = OzonAPIClient(shop.client_id, shop.api_key_enc)
-                detail_response = await client.get_posting_details(posting.posting_number)
-                detail_data = detail_response.get("result", {})
-
-                if detail_data.get("packages"):
-                    packages_list = detail_data["packages"]
-                else:
-                    return []
-
-            except Exception as e:
-                logger.warning(f"Failed to fetch package details for posting {posting.posting_number}: {e}")
-                return []
-        else:
-            return []
-
-        # 处理包裹信息
-        new_packages: List[OzonShipmentPackage] = []
-
-        for package_data in packages_list:
-            package_number = package_data.get("package_number") or package_data.get("id")
-            if not package_number:
-                continue
-
-            package = existing_packages.get(package_number)
-
-            if not package:
-                package = OzonShipmentPackage(
-                    posting_id=posting.id,
-                    package_number=package_number
-                )
-                new_packages.append(package)
-
-            # 更新包裹信息
-            raw_tracking_number = package_data.get("tracking_number")
-            if raw_tracking_number and raw_tracking_number == posting.posting_number:
-                package.tracking_number = None
-            else:
-                package.tracking_number = raw_tracking_number
-
-            package.carrier_name = package_data.get("carrier_name")
-            package.carrier_code = package_data.get("carrier_code")
-            package.status = package_data.get("status")
-
-            if package_data.get("status_updated_at"):
-                package.status_updated_at = parse_datetime(package_data["status_updated_at"])
-
-        return new_packages
-
     async def sync_packages(
         self,
         db: AsyncSession,
@@ -0,0 +1,58 @@
+"""
+全量同步断点
+
+按时间窗口记录全量订单同步进度（Redis Set），
+进程崩溃或任务重启后可跳过已完成的窗口，而不是从 offset 0 重新开始。
+"""
+
+from typing import Set
+import logging
+
+import redis.asyncio as aioredis
+
+from ef_core.utils.redis import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+class FullSyncCheckpoint:
+    """全量同步窗口断点（按店铺）"""
+
+    KEY_PREFIX = "ef:ozon:order_full_sync"
+    # 断点保留时间：3天内重启可续跑，超时后重新全量
+    TTL_SECONDS = 3 * 24 * 3600
+
+    def __init__(self, shop_id: int):
+        self.shop_id = shop_id
+        self.key = f"{self.KEY_PREFIX}:{shop_id}"
+
+    async def _get_redis(self) -> aioredis.Redis:
+        return await get_redis()
+
+    async def load(self) -> Set[str]:
+        """读取已完成的窗口（Redis 不可用时视为无断点）"""
+        try:
+            r = await self._get_redis()
+            return set(await r.smembers(self.key))
+        except Exception as e:
+            logger.warning(f"Failed to load full sync checkpoint for shop {self.shop_id}: {e}")
+            return set()
+
+    async def mark_done(self, window_key: str) -> None:
+        """记录窗口已完成（调用方需保证该窗口数据已提交）"""
+        try:
+            r = await self._get_redis()
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.sadd(self.key, window_key)
+                pipe.expire(self.key, self.TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Failed to save full sync checkpoint {window_key} for shop {self.shop_id}: {e}")
+
+    async def clear(self) -> None:
+        """全量同步成功完成后清除断点"""
+        try:
+            r = await self._get_redis()
+            await r.delete(self.key)
+        except Exception as e:
+            logger.warning(f"Failed to clear full sync checkpoint for shop {self.shop_id}: {e}")
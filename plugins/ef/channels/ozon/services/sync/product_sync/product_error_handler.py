@@ -7,7 +7,7 @@
 from typing import Optional, List
 import logging
 
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ....models.products import OzonProductSyncError
@@ -116,6 +116,43 @@ class ProductErrorHandler:
         except Exception as e:
             logger.error(f"Failed to clear product error for {offer_id}: {e}")
 
+    async def clear_errors(
+        self,
+        db: AsyncSession,
+        shop_id: int,
+        offer_ids: List[str]
+    ) -> int:
+        """
+        批量清除商品错误信息（一条 DELETE，替代逐个商品查询再删除）
+
+        Args:
+            db: 数据库会话
+            shop_id: 店铺ID
+            offer_ids: 商品offer_id列表
+
+        Returns:
+            删除的错误记录数
+        """
+        if not offer_ids:
+            return 0
+
+        try:
+            result = await db.execute(
+                delete(OzonProductSyncError).where(
+                    and_(
+                        OzonProductSyncError.shop_id == shop_id,
+                        OzonProductSyncError.offer_id.in_(offer_ids)
+                    )
+                )
+            )
+            if result.rowcount:
+                logger.info(f"Cleared {result.rowcount} product error(s) for shop {shop_id}")
+            return result.rowcount or 0
+
+        except Exception as e:
+            logger.error(f"Failed to clear product errors for shop {shop_id}: {e}")
+            return 0
+
     async def get_errors(
         self,
         db: AsyncSession,
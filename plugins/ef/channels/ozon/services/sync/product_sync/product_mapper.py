@@ -15,9 +15,13 @@ import logging
 
 from ..utils import safe_int_conversion, safe_decimal_conversion
 from ....utils.datetime_utils import parse_datetime
+from ....utils.serialization import content_hash
 
 logger = logging.getLogger(__name__)
 
+# 内容哈希版本：映射/状态计算规则变化时递增，使所有商品在下一次同步时重新映射
+CONTENT_HASH_VERSION = 1
+
 
 @dataclass
 class ProductUpdateData:
@@ -85,6 +89,33 @@ class ProductUpdateData:
 class ProductMapper:
     """商品数据映射器"""
 
+    @staticmethod
+    def content_hash(
+        item: Dict[str, Any],
+        product_details: Optional[Dict[str, Any]],
+        price_info: Optional[Dict[str, Any]],
+        stock_info: Optional[Dict[str, Any]],
+        attr_info: Optional[Dict[str, Any]],
+        visibility: str,
+        is_archived: bool,
+    ) -> str:
+        """
+        OZON 数据内容哈希
+
+        覆盖映射与状态计算的全部输入；哈希与上次同步一致时，映射结果必然一致，可跳过映射和更新。
+        """
+        payload = {
+            "v": CONTENT_HASH_VERSION,
+            "visibility": visibility,
+            "is_archived": is_archived,
+            "item": {k: v for k, v in item.items() if not k.startswith("_sync_")},
+            "details": product_details,
+            "price": price_info,
+            "stock": stock_info,
+            "attributes": attr_info,
+        }
+        return content_hash(payload)
+
     def map_to_product_data(
         self,
         item: Dict[str, Any],
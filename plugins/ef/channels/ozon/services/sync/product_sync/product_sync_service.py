@@ -4,11 +4,15 @@
 商品同步的主入口，负责协调各个组件完成同步流程。
 """
 
+from collections import deque
+from dataclasses import dataclass
 from datetime import timedelta
-from typing import Dict, Any, List, Optional
+from typing import Deque, Dict, Any, List, Optional
+import asyncio
 import logging
+import time
 
-from sqlalchemy import select, and_
+from sqlalchemy import select, and_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ....models import OzonShop, OzonProduct
@@ -23,6 +27,22 @@ from .product_error_handler import ProductErrorHandler
 
 logger = logging.getLogger(__name__)
 
+# 列表页预取深度（页）
+PREFETCH_PAGES = 2
+# 同时在途的补充数据批次（页）；OZON 限流由客户端的分布式限流器保证
+ENRICH_AHEAD = 2
+
+
+@dataclass
+class EnrichedPage:
+    """一页商品及其补充数据（{offer_id: data} 映射）"""
+    items: List[Dict[str, Any]]
+    total: int
+    details: Dict[str, Dict]
+    prices: Dict[str, Dict]
+    stocks: Dict[str, Dict]
+    attributes: Dict[str, Dict]
+
 
 class ProductSyncService:
     """商品同步服务"""
@@ -55,7 +75,7 @@ class ProductSyncService:
         """
         try:
             # 初始化任务状态
-            self.task_manager.create_task(
+            await self.task_manager.create_task(
                 task_id=task_id,
                 task_type="products",
                 mode=mode,
@@ -73,7 +93,7 @@ class ProductSyncService:
             client = OzonAPIClient(shop.client_id, shop.api_key_enc)
 
             # 更新进度
-            self.task_manager.update_progress(
+            await self.task_manager.update_progress(
                 task_id, 10, f"正在连接Ozon API... (模式: {mode})"
             )
 
@@ -96,6 +116,8 @@ class ProductSyncService:
 
             total_synced = 0
             total_products = 0
+            # 流水线统计（各可见性累计）
+            stats = self._new_stats()
 
             # 同步不同状态的商品
             visibility_filters = [
@@ -118,6 +140,9 @@ class ProductSyncService:
                     filter_params=filter_params,
                     counters=counters,
                     total_synced=total_synced,
+                    stats=stats,
+                    # 全量同步不跳过未变化商品，用于纠正本地被改动过的字段
+                    use_content_hash=(mode != "full"),
                 )
 
                 total_synced = synced
@@ -148,6 +173,10 @@ class ProductSyncService:
             logger.info(f"  • 待修改 (pending_modification): {counters['pending_modification']}个")
             logger.info(f"  • 已下架 (inactive): {counters['inactive']}个")
             logger.info(f"  • 已归档 (archived): {counters['archived']}个")
+            logger.info(
+                f"流水线: {stats['pages']} 页, 变化 {stats['changed']} 个, 未变化 {stats['unchanged']} 个, "
+                f"阶段耗时 {self._format_timings(stats['timings'])}"
+            )
 
             # 完成任务
             result_data = {
@@ -158,6 +187,10 @@ class ProductSyncService:
                 "pending_modification_count": counters["pending_modification"],
                 "inactive_count": counters["inactive"],
                 "archived_count": counters["archived"],
+                "unchanged_count": stats["unchanged"],
+                "stage_timings": {
+                    stage: round(seconds, 2) for stage, seconds in stats["timings"].items()
+                },
             }
 
             message = (
@@ -165,12 +198,11 @@ class ProductSyncService:
                 f"准备销售: {counters['ready_to_sell']}, 已归档: {counters['archived']}）"
             )
 
-            self.task_manager.complete_task(task_id, result_data, message)
-            return self.task_manager.get_task_dict(task_id)
+            return await self.task_manager.complete_task(task_id, result_data, message)
 
         except Exception as e:
             logger.error(f"Sync products failed: {e}")
-            self.task_manager.fail_task(task_id, str(e))
+            await self.task_manager.fail_task(task_id, str(e))
             raise
 
     async def _sync_visibility_products(
@@ -185,135 +217,323 @@ class ProductSyncService:
         filter_params: Dict[str, Any],
         counters: Dict[str, int],
         total_synced: int,
+        stats: Optional[Dict[str, Any]] = None,
+        use_content_hash: bool = True,
     ) -> tuple[int, int]:
         """
-        同步指定可见性的商品
+        同步指定可见性的商品（三段流水线）
+
+        1. 列表页：后台任务预取，最多领先 PREFETCH_PAGES 页
+        2. 补充数据：详情→库存 与 价格、属性并发请求；最多 ENRICH_AHEAD 页同时在途
+        3. 写库：当前页写库期间，后续页的列表和补充数据继续获取
 
         Returns:
             (total_synced, visibility_total) - 累计同步数, 该类型总数
         """
+        stats = stats if stats is not None else self._new_stats()
+        timings = stats["timings"]
         visibility_total = 0
 
-        async for items, last_id, total in self.fetcher.fetch_products_paginated(
-            client, visibility, filter_params
-        ):
-            if visibility_total == 0:
-                visibility_total = total
+        page_queue: asyncio.Queue = asyncio.Queue(maxsize=PREFETCH_PAGES)
+        producer = asyncio.create_task(
+            self._produce_pages(client, visibility, filter_params, page_queue, timings)
+        )
+        in_flight: Deque[asyncio.Task] = deque()
+        exhausted = False
+
+        async def fill_pipeline() -> None:
+            nonlocal exhausted
+            while not exhausted and len(in_flight) < ENRICH_AHEAD:
+                page = await page_queue.get()
+                if page is None:
+                    exhausted = True
+                    break
+                in_flight.append(asyncio.create_task(
+                    self._enrich_page(client, page[0], page[1], visibility, timings)
+                ))
 
-            # 收集所有 offer_id
-            offer_ids = [item.get("offer_id") for item in items if item.get("offer_id")]
+        try:
+            await fill_pipeline()
+            while in_flight:
+                wait_start = time.perf_counter()
+                page = await in_flight.popleft()
+                timings["write_wait"] += time.perf_counter() - wait_start
 
-            # 批量获取各种信息
-            products_detail_map = await self.fetcher.fetch_product_details_batch(client, offer_ids)
-            products_price_map = await self.fetcher.fetch_prices_batch(client, offer_ids)
-            # 使用 /v1/product/info/stocks-by-warehouse/fbs API，直接返回仓库名
-            products_stock_map = await self.fetcher.fetch_stocks_batch(client, products_detail_map)
-            products_attributes_map = await self.fetcher.fetch_attributes_batch(
-                client, offer_ids, visibility
-            )
+                # 写库前先把下一页的补充请求发出去，与写库重叠
+                await fill_pipeline()
+
+                if visibility_total == 0:
+                    visibility_total = page.total
+
+                write_start = time.perf_counter()
+                await self._write_page(
+                    db=db,
+                    shop_id=shop_id,
+                    page=page,
+                    visibility=visibility,
+                    is_archived=is_archived,
+                    counters=counters,
+                    stats=stats,
+                    use_content_hash=use_content_hash,
+                )
+                timings["write"] += time.perf_counter() - write_start
 
-            # 批量查询现有商品
-            existing_products_map = await self._batch_query_products(db, shop_id, offer_ids)
+                total_synced += len(page.items)
+                stats["pages"] += 1
 
-            # 处理每个商品
-            for idx, item in enumerate(items):
-                # 更新进度
-                current_item_index = total_synced + idx + 1
+                # 更新进度（按页）
                 if visibility_total > 0:
-                    progress = 10 + (80 * current_item_index / max(visibility_total, 1))
+                    progress = 10 + (80 * total_synced / max(visibility_total, 1))
                 else:
-                    progress = 10 + (80 * current_item_index / max(1000, current_item_index))
-
-                self.task_manager.update_progress(
+                    progress = 10 + (80 * total_synced / max(1000, total_synced))
+                await self.task_manager.update_progress(
                     task_id,
                     min(int(progress), 90),
-                    f"正在同步商品 {item.get('offer_id', 'unknown')} ({current_item_index}/{visibility_total or '?'})..."
+                    f"正在同步{visibility_desc} ({total_synced}/{visibility_total or '?'})..."
                 )
+        finally:
+            producer.cancel()
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(producer, *in_flight, return_exceptions=True)
+
+        logger.info(
+            f"{visibility} 同步完成: {total_synced} 个商品, "
+            f"跳过未变化 {stats['unchanged']} 个, 阶段耗时 {self._format_timings(timings)}"
+        )
+        return total_synced, visibility_total
 
-                # 标记商品来源
-                item["_sync_visibility_type"] = visibility
-                item["_sync_is_archived"] = is_archived
-
-                # 获取关联数据
-                offer_id = item.get("offer_id")
-                product_details = products_detail_map.get(offer_id) if offer_id else None
-                price_info = products_price_map.get(offer_id) if offer_id else None
-                stock_info = products_stock_map.get(offer_id) if offer_id else None
-                attr_info = products_attributes_map.get(offer_id) if offer_id else None
-
-                # 获取或创建商品
-                product = existing_products_map.get(offer_id)
-                is_new = product is None
-
-                if is_new:
-                    product = OzonProduct(
-                        shop_id=shop_id,
-                        offer_id=offer_id or "",
-                    )
-                    db.add(product)
-
-                # 映射数据
-                product_data = self.mapper.map_to_product_data(
-                    item, product_details, price_info, stock_info, attr_info
-                )
+    async def _produce_pages(
+        self,
+        client: OzonAPIClient,
+        visibility: str,
+        filter_params: Dict[str, Any],
+        page_queue: asyncio.Queue,
+        timings: Dict[str, float],
+    ) -> None:
+        """列表页生产者：预取列表页放入有界队列，结束时放入 None"""
+        pages = self.fetcher.fetch_products_paginated(client, visibility, filter_params)
+        try:
+            while True:
+                fetch_start = time.perf_counter()
+                try:
+                    items, _last_id, total = await pages.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    timings["list"] += time.perf_counter() - fetch_start
+                await page_queue.put((items, total))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to prefetch {visibility} product pages: {e}", exc_info=True)
+        finally:
+            await pages.aclose()
+
+        # 正常结束（或列表请求失败）时通知消费端；被取消时消费端已退出，不再通知
+        await page_queue.put(None)
 
-                # 应用映射数据
-                self.mapper.apply_to_product(product, product_data, is_new)
-
-                # 计算状态
-                visibility_details = product_data.ozon_visibility_details or {}
-                status, ozon_status, status_reason = self.status_calculator.calculate_status(
-                    visibility_type=visibility,
-                    sync_is_archived=is_archived,
-                    ozon_archived=product.ozon_archived,
-                    is_archived=product.is_archived,
-                    product_details=product_details,
-                    visibility_details=visibility_details,
-                    price=product.price,
-                    has_fbo_stocks=product.ozon_has_fbo_stocks,
-                    has_fbs_stocks=product.ozon_has_fbs_stocks,
+    async def _enrich_page(
+        self,
+        client: OzonAPIClient,
+        items: List[Dict[str, Any]],
+        total: int,
+        visibility: str,
+        timings: Dict[str, float],
+    ) -> EnrichedPage:
+        """并发获取一页商品的补充数据（库存依赖详情里的 SKU，与详情串行）"""
+        offer_ids = [item.get("offer_id") for item in items if item.get("offer_id")]
+        page_start = time.perf_counter()
+
+        async def timed(stage: str, coro):
+            stage_start = time.perf_counter()
+            try:
+                return await coro
+            finally:
+                timings[stage] += time.perf_counter() - stage_start
+
+        async def details_then_stocks():
+            details = await timed("details", self.fetcher.fetch_product_details_batch(client, offer_ids))
+            # 使用 /v1/product/info/stocks-by-warehouse/fbs API，直接返回仓库名
+            stocks = await timed("stocks", self.fetcher.fetch_stocks_batch(client, details))
+            return details, stocks
+
+        (details, stocks), prices, attributes = await asyncio.gather(
+            details_then_stocks(),
+            timed("prices", self.fetcher.fetch_prices_batch(client, offer_ids)),
+            timed("attributes", self.fetcher.fetch_attributes_batch(client, offer_ids, visibility)),
+        )
+        timings["enrich"] += time.perf_counter() - page_start
+
+        return EnrichedPage(
+            items=items,
+            total=total,
+            details=details,
+            prices=prices,
+            stocks=stocks,
+            attributes=attributes,
+        )
+
+    async def _write_page(
+        self,
+        db: AsyncSession,
+        shop_id: int,
+        page: EnrichedPage,
+        visibility: str,
+        is_archived: bool,
+        counters: Dict[str, int],
+        stats: Dict[str, Any],
+        use_content_hash: bool,
+    ) -> None:
+        """写入一页商品；内容哈希未变化的商品只刷新同步时间"""
+        offer_ids = [item.get("offer_id") for item in page.items if item.get("offer_id")]
+
+        # 批量查询现有商品
+        existing_products_map = await self._batch_query_products(db, shop_id, offer_ids)
+
+        unchanged_ids: List[int] = []
+        error_products: List[tuple[OzonProduct, list]] = []
+        cleared_offer_ids: List[str] = []
+        has_new = False
+        now = utcnow()
+
+        for item in page.items:
+            # 标记商品来源
+            item["_sync_visibility_type"] = visibility
+            item["_sync_is_archived"] = is_archived
+
+            # 获取关联数据
+            offer_id = item.get("offer_id")
+            product_details = page.details.get(offer_id) if offer_id else None
+            price_info = page.prices.get(offer_id) if offer_id else None
+            stock_info = page.stocks.get(offer_id) if offer_id else None
+            attr_info = page.attributes.get(offer_id) if offer_id else None
+
+            content_hash = self.mapper.content_hash(
+                item, product_details, price_info, stock_info, attr_info, visibility, is_archived
+            )
+
+            # 获取或创建商品
+            product = existing_products_map.get(offer_id)
+            is_new = product is None
+
+            # OZON 数据未变化：跳过映射和 ORM 更新
+            if use_content_hash and not is_new and product.sync_content_hash == content_hash:
+                unchanged_ids.append(product.id)
+                if product.status:
+                    counters[product.status] = counters.get(product.status, 0) + 1
+                continue
+
+            if is_new:
+                product = OzonProduct(
+                    shop_id=shop_id,
+                    offer_id=offer_id or "",
                 )
+                db.add(product)
+                has_new = True
 
-                product.status = status
-                product.ozon_status = ozon_status
-                product.status_reason = status_reason
-
-                # 更新计数器
-                counters[status] = counters.get(status, 0) + 1
-
-                # 处理错误记录
-                if status == "error":
-                    error_list = self.status_calculator.get_error_list(product_details)
-                    if is_new:
-                        await db.flush()  # 获取 product.id
-                    await self.error_handler.save_error(
-                        db=db,
-                        shop_id=shop_id,
-                        product_id=product.id,
-                        offer_id=product.offer_id,
-                        task_id=None,
-                        status="error",
-                        errors=error_list
-                    )
-                else:
-                    await self.error_handler.clear_error(db, shop_id, product.offer_id)
+            # 映射数据
+            product_data = self.mapper.map_to_product_data(
+                item, product_details, price_info, stock_info, attr_info
+            )
 
-                # INVISIBLE 商品的可见性
-                if visibility == "INVISIBLE":
-                    product.visibility = False
+            # 应用映射数据
+            self.mapper.apply_to_product(product, product_data, is_new)
+
+            # 计算状态
+            visibility_details = product_data.ozon_visibility_details or {}
+            status, ozon_status, status_reason = self.status_calculator.calculate_status(
+                visibility_type=visibility,
+                sync_is_archived=is_archived,
+                ozon_archived=product.ozon_archived,
+                is_archived=product.is_archived,
+                product_details=product_details,
+                visibility_details=visibility_details,
+                price=product.price,
+                has_fbo_stocks=product.ozon_has_fbo_stocks,
+                has_fbs_stocks=product.ozon_has_fbs_stocks,
+            )
 
-                # 更新同步状态
-                product.sync_status = "success"
-                product.last_sync_at = utcnow()
-                product.updated_at = utcnow()
+            product.status = status
+            product.ozon_status = ozon_status
+            product.status_reason = status_reason
+
+            # 更新计数器
+            counters[status] = counters.get(status, 0) + 1
+
+            # 错误记录在本页商品处理完后批量写入/清除
+            if status == "error":
+                error_products.append((product, self.status_calculator.get_error_list(product_details)))
+            else:
+                cleared_offer_ids.append(product.offer_id)
+
+            # INVISIBLE 商品的可见性
+            if visibility == "INVISIBLE":
+                product.visibility = False
+
+            # 更新同步状态
+            product.sync_status = "success"
+            product.sync_content_hash = content_hash
+            product.last_sync_at = now
+            product.updated_at = now
+
+        # 新商品需要 flush 才有 product.id（错误记录关联用）
+        if has_new and error_products:
+            await db.flush()
+
+        for product, error_list in error_products:
+            await self.error_handler.save_error(
+                db=db,
+                shop_id=shop_id,
+                product_id=product.id,
+                offer_id=product.offer_id,
+                task_id=None,
+                status="error",
+                errors=error_list
+            )
+        await self.error_handler.clear_errors(db, shop_id, cleared_offer_ids)
+
+        # 未变化的商品只刷新同步时间（一条 UPDATE）
+        if unchanged_ids:
+            await db.execute(
+                update(OzonProduct)
+                .where(OzonProduct.id.in_(unchanged_ids))
+                .values(last_sync_at=now, sync_status="success")
+                .execution_options(synchronize_session=False)
+            )
+            stats["unchanged"] += len(unchanged_ids)
 
-            total_synced += len(items)
+        stats["changed"] += len(page.items) - len(unchanged_ids)
 
-            # 分批提交
-            await db.commit()
-            logger.debug(f"Committed batch of {len(items)} products for {visibility}")
+        # 分批提交
+        await db.commit()
+        logger.debug(
+            f"Committed batch of {len(page.items)} products for {visibility} "
+            f"({len(unchanged_ids)} unchanged)"
+        )
 
-        return total_synced, visibility_total
+    @staticmethod
+    def _new_stats() -> Dict[str, Any]:
+        """流水线统计（阶段耗时为累计秒数；enrich 为各页补充数据的墙钟时间）"""
+        return {
+            "pages": 0,
+            "changed": 0,
+            "unchanged": 0,
+            "timings": {
+                "list": 0.0,
+                "details": 0.0,
+                "prices": 0.0,
+                "stocks": 0.0,
+                "attributes": 0.0,
+                "enrich": 0.0,
+                "write": 0.0,
+                "write_wait": 0.0,
+            },
+        }
+
+    @staticmethod
+    def _format_timings(timings: Dict[str, float]) -> str:
+        return ", ".join(f"{stage}={seconds:.1f}s" for stage, seconds in timings.items())
 
     async def _batch_query_products(
         self,
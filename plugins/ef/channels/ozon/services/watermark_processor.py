@@ -123,18 +123,46 @@ class WatermarkProcessor:
                 try:
                     watermark_image = await self.image_service.download_image(watermark_config.image_url)
                     first_image = await self.image_service.download_image(original_images[0])
-                    best_position_enum, best_color = await self.image_service.find_best_watermark_position(
+                    best_position_enum = await self.image_service.find_best_watermark_position(
                         first_image,
                         watermark_image,
                         [{"color_type": watermark_config.color_type}],
                         watermark_config.positions
                     )
                     fast_mode_position = best_position_enum.value
-                    fast_mode_color = best_color.value
+                    fast_mode_color = watermark_config.color_type
                     logger.info(f"Fast mode: Using position {fast_mode_position} with color {fast_mode_color} for all images")
                 except Exception as e:
                     logger.warning(f"Failed to analyze first image in fast mode: {e}, using defaults")
 
+            # 精准模式：下载需要自动定位的图片，一次批量评分（进程池并行）
+            individual_positions: Dict[int, Any] = {}
+            if analyze_mode == "individual" and watermark_image:
+                analyze_indexes = [
+                    idx for idx in range(len(original_images))
+                    if not (position_overrides and str(idx) in position_overrides)
+                ]
+                downloads = await asyncio.gather(
+                    *(self.image_service.download_image(original_images[idx]) for idx in analyze_indexes),
+                    return_exceptions=True
+                )
+                downloaded = []
+                for idx, result in zip(analyze_indexes, downloads):
+                    if isinstance(result, Exception):
+                        individual_positions[idx] = result
+                    else:
+                        downloaded.append((idx, result))
+
+                if downloaded:
+                    logger.info(f"Analyzing {len(downloaded)} images for best watermark position...")
+                    best_positions = await self.image_service.find_best_watermark_positions(
+                        [image for _, image in downloaded],
+                        watermark_image,
+                        watermark_config.positions  # 使用配置的所有允许位置
+                    )
+                    for (idx, _), position in zip(downloaded, best_positions):
+                        individual_positions[idx] = position
+
             # 处理每张图片
             processed_images = []
             cloudinary_public_ids = []
@@ -185,29 +213,20 @@ class WatermarkProcessor:
                             logger.info(f"Image {idx+1}: using fast mode position: {best_position}")
 
                     elif analyze_mode == "individual" and watermark_image:
-                        # 精准模式：为每张图片单独分析最佳位置
+                        # 精准模式：使用批量评分得到的本图最佳位置
                         try:
-                            logger.info(f"Analyzing image {idx+1}/{len(original_images)} for best watermark position...")
-
-                            # 下载当前图片进行分析
-                            current_image = await self.image_service.download_image(image_url)
-
-                            # 智能选择最佳位置
-                            best_position_enum, best_color = await self.image_service.find_best_watermark_position(
-                                current_image,
-                                watermark_image,
-                                [{"color_type": watermark_config.color_type}],
-                                watermark_config.positions  # 使用配置的所有允许位置
-                            )
+                            analyzed = individual_positions.get(idx)
+                            if isinstance(analyzed, Exception):
+                                raise analyzed
 
-                            best_position = best_position_enum.value
+                            best_position = analyzed.value
                             position_metadata.append({
                                 "image_index": idx,
                                 "position": best_position,
-                                "color": best_color.value,
+                                "color": watermark_config.color_type,
                                 "mode": "individual"
                             })
-                            logger.info(f"Image {idx+1}: selected position: {best_position} with color: {best_color.value}")
+                            logger.info(f"Image {idx+1}: selected position: {best_position}")
 
                         except Exception as e:
                             logger.warning(f"Failed to analyze image {idx+1} for best position: {e}, using default")
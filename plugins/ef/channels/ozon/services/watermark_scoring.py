@@ -0,0 +1,367 @@
+"""
+水印位置评分（向量化）
+
+每张图片只做一次灰度转换，在覆盖所有候选区域的行带/列带上一次性构建：
+- 灰度值 / 灰度平方的积分图（summed-area table）：任意区域的均值、标准差 O(1)
+- 一次 Sobel 边缘检测 + 边缘像素积分图：任意区域的边缘密度 O(1)
+- 行/列梯度前缀和：任意区域的梯度投影（文字检测）只需一次向量减法
+
+所有候选位置共用这些数组，不再按位置重复转换整图。
+
+评分函数是模块级纯函数，参数和返回值都可 pickle，可直接提交到进程池执行；
+进程池不可用（如 Celery prefork 的守护子进程不能再创建子进程）时退回线程池。
+"""
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ef_core.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+# 边缘阈值（Sobel 梯度幅值）
+EDGE_THRESHOLD = 30
+
+# 评分权重（加大对复杂区域的惩罚）
+WEIGHT_CONTRAST = 0.2      # 对比度权重
+WEIGHT_SMOOTHNESS = 0.35   # 平滑度权重
+WEIGHT_LOW_EDGE = 0.25     # 低边缘密度权重
+WEIGHT_NO_TEXT = 0.2       # 无文字权重
+
+# 透明PNG水印不需要考虑颜色对比，使用固定的对比度分数
+CONTRAST_SCORE = 0.5
+
+# 水印区域额外边距（像素）
+REGION_MARGIN = 20
+
+# 进程池最大进程数
+MAX_SCORING_WORKERS = 4
+
+# 候选位置：(位置值, x 比例, y 比例)
+Candidate = Tuple[str, float, float]
+
+
+def compute_region_size(
+    image_size: Tuple[int, int],
+    watermark_size: Tuple[int, int]
+) -> Tuple[int, int]:
+    """
+    计算评分区域大小（水印实际大小 * 1.2 + 边距，不超过原图的 1/4）
+
+    Args:
+        image_size: 原图 (宽, 高)
+        watermark_size: 水印 (宽, 高)
+
+    Returns:
+        区域 (宽, 高)
+    """
+    return (
+        min(int(watermark_size[0] * 1.2) + REGION_MARGIN, image_size[0] // 4),
+        min(int(watermark_size[1] * 1.2) + REGION_MARGIN, image_size[1] // 4)
+    )
+
+
+def _integral(values: np.ndarray) -> np.ndarray:
+    """构建积分图（首行首列补零，区域和 = 四角加减）"""
+    table = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.int64)
+    np.cumsum(values, axis=0, dtype=np.int64, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+    return table
+
+
+def _sobel_edges(gray: np.ndarray, threshold: float = EDGE_THRESHOLD) -> np.ndarray:
+    """
+    整图 Sobel 边缘检测（边界按镜像处理，与 scipy.ndimage.sobel 默认行为一致）
+
+    Sobel 核可分离：先在一个方向做 [1, 2, 1] 平滑，再在另一个方向做中心差分。
+    全程整数运算，用梯度平方和与阈值平方比较，省去开方。
+
+    Returns:
+        边缘像素掩码（梯度幅值 > threshold）
+    """
+    if gray.size == 0:
+        return np.zeros(gray.shape, dtype=bool)
+
+    padded = np.pad(gray.astype(np.int32), 1, mode="symmetric")
+
+    smooth_y = padded[:-2, :] + 2 * padded[1:-1, :] + padded[2:, :]
+    grad_x = smooth_y[:, 2:] - smooth_y[:, :-2]
+
+    smooth_x = padded[:, :-2] + 2 * padded[:, 1:-1] + padded[:, 2:]
+    grad_y = smooth_x[2:, :] - smooth_x[:-2, :]
+
+    return grad_x * grad_x + grad_y * grad_y > threshold * threshold
+
+
+def region_bounds(
+    width: int,
+    height: int,
+    x_ratio: float,
+    y_ratio: float,
+    region_size: Tuple[int, int]
+) -> Tuple[int, int, int, int]:
+    """根据相对位置和区域大小计算区域边界 (x1, y1, x2, y2)"""
+    center_x = int(x_ratio * width)
+    center_y = int(y_ratio * height)
+
+    half_width = region_size[0] // 2
+    half_height = region_size[1] // 2
+
+    x1 = max(0, center_x - half_width)
+    y1 = max(0, center_y - half_height)
+    x2 = min(width, center_x + half_width)
+    y2 = min(height, center_y + half_height)
+    return x1, y1, x2, y2
+
+
+def _covering_axis(intervals: List[Tuple[int, int]], limit: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    计算覆盖所有区间的坐标（每个区间两侧各外扩 1 像素，保证区域内 Sobel 取到真实邻居）
+
+    Returns:
+        (保留的原坐标数组, 原坐标 -> 紧凑坐标映射)
+    """
+    mask = np.zeros(limit, dtype=bool)
+    for start, end in intervals:
+        if end > start:
+            mask[max(0, start - 1):min(limit, end + 1)] = True
+    return np.flatnonzero(mask), np.cumsum(mask) - 1
+
+
+class GrayscaleStats:
+    """单张灰度图的共享统计量，供所有候选区域复用"""
+
+    def __init__(self, gray: np.ndarray):
+        """
+        Args:
+            gray: 灰度图数组（uint8，形状 (高, 宽)）
+        """
+        self.height, self.width = gray.shape
+        pixels = gray.astype(np.int64)
+
+        # 均值 / 方差
+        self._sum = _integral(pixels)
+        self._sq_sum = _integral(pixels * pixels)
+
+        # 边缘密度：一次 Sobel，阈值化后做积分图
+        self._edges = _integral(_sobel_edges(gray))
+
+        # 文字检测：相邻像素梯度的行/列前缀和（首列/首行补零）
+        signed = gray.astype(np.int16)
+        grad_x = np.abs(np.diff(signed, axis=1))
+        grad_y = np.abs(np.diff(signed, axis=0))
+        self._grad_x_rows = np.zeros((self.height, self.width), dtype=np.int64)
+        np.cumsum(grad_x, axis=1, out=self._grad_x_rows[:, 1:])
+        self._grad_y_cols = np.zeros((self.height, self.width), dtype=np.int64)
+        np.cumsum(grad_y, axis=0, out=self._grad_y_cols[1:, :])
+
+    def region_bounds(
+        self,
+        x_ratio: float,
+        y_ratio: float,
+        region_size: Tuple[int, int]
+    ) -> Tuple[int, int, int, int]:
+        """根据相对位置和区域大小计算区域边界 (x1, y1, x2, y2)"""
+        return region_bounds(self.width, self.height, x_ratio, y_ratio, region_size)
+
+    @staticmethod
+    def _area_sum(table: np.ndarray, x1: int, y1: int, x2: int, y2: int) -> int:
+        return int(table[y2, x2] - table[y1, x2] - table[y2, x1] + table[y1, x1])
+
+    def brightness_and_complexity(self, x1: int, y1: int, x2: int, y2: int) -> Tuple[float, float]:
+        """
+        区域平均亮度和复杂度（标准差）
+
+        Returns:
+            (平均亮度 0-255, 标准差 0-255)；空区域返回中等默认值
+        """
+        area = (x2 - x1) * (y2 - y1)
+        if area <= 0:
+            return 128.0, 50.0
+
+        mean = self._area_sum(self._sum, x1, y1, x2, y2) / area
+        variance = self._area_sum(self._sq_sum, x1, y1, x2, y2) / area - mean * mean
+        return float(mean), float(np.sqrt(max(variance, 0.0)))
+
+    def edge_density(self, x1: int, y1: int, x2: int, y2: int) -> float:
+        """区域边缘密度（边缘像素占比 0-1）"""
+        area = (x2 - x1) * (y2 - y1)
+        if area <= 0:
+            return 0.0
+        return self._area_sum(self._edges, x1, y1, x2, y2) / area
+
+    def text_probability(self, x1: int, y1: int, x2: int, y2: int) -> float:
+        """
+        区域包含文字的概率（梯度投影分析）
+
+        Returns:
+            文字概率（0-1，越高表示越可能有文字）
+        """
+        if x2 <= x1 or y2 <= y1:
+            return 0.0
+
+        # 区域内每行的水平梯度和、每列的垂直梯度和
+        rows = self._grad_x_rows[y1:y2]
+        h_projection = rows[:, x2 - 1] - rows[:, x1]
+        cols = self._grad_y_cols[:, x1:x2]
+        v_projection = cols[y2 - 1] - cols[y1]
+
+        h_std = float(np.std(h_projection))
+        v_std = float(np.std(v_projection))
+        h_mean = float(np.mean(h_projection))
+        v_mean = float(np.mean(v_projection))
+
+        # 峰值密度（多个峰值表示可能有文字行）
+        h_peaks = int(np.count_nonzero(h_projection > h_mean * 1.5)) if h_mean > 0 else 0
+        v_peaks = int(np.count_nonzero(v_projection > v_mean * 1.5)) if v_mean > 0 else 0
+        h_peak_density = h_peaks / len(h_projection)
+        v_peak_density = v_peaks / len(v_projection)
+
+        text_score = 0.0
+
+        # 水平方向文字检测（横排文字）
+        if 0.1 < h_peak_density < 0.5:
+            text_score = max(text_score, h_peak_density * 2)
+
+        # 垂直方向文字检测（竖排文字或多列文字）
+        if 0.1 < v_peak_density < 0.5:
+            text_score = max(text_score, v_peak_density * 2)
+
+        # 标准差很大说明有明显的纹理变化（可能是文字）
+        if h_std > 20 or v_std > 20:
+            text_score = max(text_score, 0.5)
+
+        return min(text_score, 1.0)
+
+    def score(self, bounds: Tuple[int, int, int, int]) -> Dict[str, Any]:
+        """计算单个区域的综合评分"""
+        brightness, complexity = self.brightness_and_complexity(*bounds)
+        edge_density = self.edge_density(*bounds)
+        text_probability = self.text_probability(*bounds)
+
+        # 平滑度（复杂度阈值 50，越平滑分越高）
+        smoothness_score = 1.0 - min(complexity / 50.0, 1.0)
+        # 边缘分数：非线性映射，高边缘密度区域得分快速下降
+        edge_score = max(0.0, 1.0 - (edge_density ** 1.5) * 3)
+        no_text_score = 1.0 - text_probability
+
+        total_score = (
+            WEIGHT_CONTRAST * CONTRAST_SCORE +
+            WEIGHT_SMOOTHNESS * smoothness_score +
+            WEIGHT_LOW_EDGE * edge_score +
+            WEIGHT_NO_TEXT * no_text_score
+        )
+
+        # 明显的文字区域额外惩罚（最多减 50% 分数）
+        if text_probability > 0.5:
+            total_score *= (1.0 - text_probability * 0.5)
+
+        return {
+            "score": total_score,
+            "brightness": brightness,
+            "complexity": complexity,
+            "edge_density": edge_density,
+            "text_prob": text_probability,
+        }
+
+
+def score_watermark_positions(
+    gray: np.ndarray,
+    region_size: Tuple[int, int],
+    candidates: Sequence[Candidate]
+) -> List[Dict[str, Any]]:
+    """
+    对一张灰度图的所有候选位置评分（进程池入口，纯函数）
+
+    候选区域只占整图的一小部分，统计量只在覆盖所有候选区域的行带/列带上构建
+    （np.ix_ 抽取成紧凑图），区域在紧凑图中仍是连续矩形，结果与整图计算一致。
+
+    Args:
+        gray: 灰度图数组（uint8）
+        region_size: 评分区域大小
+        candidates: 候选位置列表
+
+    Returns:
+        每个候选位置的评分明细（与 candidates 顺序一致）
+    """
+    height, width = gray.shape
+    bounds = [
+        region_bounds(width, height, x_ratio, y_ratio, region_size)
+        for _, x_ratio, y_ratio in candidates
+    ]
+
+    rows, row_map = _covering_axis([(y1, y2) for _, y1, _, y2 in bounds], height)
+    cols, col_map = _covering_axis([(x1, x2) for x1, _, x2, _ in bounds], width)
+    stats = GrayscaleStats(gray[np.ix_(rows, cols)])
+
+    results = []
+    for (position, _, _), (x1, y1, x2, y2) in zip(candidates, bounds):
+        if x2 > x1 and y2 > y1:
+            compact = (int(col_map[x1]), int(row_map[y1]), int(col_map[x2 - 1]) + 1, int(row_map[y2 - 1]) + 1)
+        else:
+            compact = (0, 0, 0, 0)
+        results.append({"position": position, **stats.score(compact)})
+    return results
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_disabled = False
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    """获取评分进程池（懒创建）；当前进程不能创建子进程时返回 None"""
+    global _executor, _executor_disabled
+    if _executor_disabled:
+        return None
+    if _executor is None:
+        # 守护进程（如 Celery prefork 子进程）不允许再创建子进程
+        if multiprocessing.current_process().daemon:
+            _executor_disabled = True
+            logger.info("Watermark scoring runs in threads (daemon process cannot spawn workers)")
+            return None
+        workers = max(1, min(MAX_SCORING_WORKERS, os.cpu_count() or 1))
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        logger.info(f"Created watermark scoring process pool, workers={workers}")
+    return _executor
+
+
+async def run_scoring(
+    gray: np.ndarray,
+    region_size: Tuple[int, int],
+    candidates: Sequence[Candidate]
+) -> List[Dict[str, Any]]:
+    """
+    在进程池中评分（不阻塞事件循环）；进程池不可用时退回线程池
+
+    Returns:
+        每个候选位置的评分明细
+    """
+    global _executor, _executor_disabled
+    executor = _get_executor()
+    if executor is not None:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                executor, score_watermark_positions, gray, region_size, list(candidates)
+            )
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning(f"Watermark scoring process pool unavailable, falling back to threads: {e}")
+            _executor = None
+            _executor_disabled = True
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    return await asyncio.to_thread(score_watermark_positions, gray, region_size, list(candidates))
+
+
+def shutdown_scoring_executor() -> None:
+    """关闭评分进程池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
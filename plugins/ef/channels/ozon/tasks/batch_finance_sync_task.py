@@ -7,13 +7,14 @@ import asyncio
 import logging
 from typing import Dict, Any
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
-import redis
 
 from ef_core.tasks.celery_app import celery_app
-from ef_core.database import get_db_manager
+from ef_core.tasks.async_runner import run_async
+from ef_core.database import get_task_db_manager
+from ef_core.services.task_progress import task_progress
+from ef_core.utils.redis import get_redis
 from sqlalchemy import select, and_
 
 from ..models.orders import OzonPosting
@@ -22,11 +23,10 @@ from ..api.client import OzonAPIClient
 
 logger = logging.getLogger(__name__)
 
-# 创建线程池用于运行异步任务
-_thread_pool = ThreadPoolExecutor(max_workers=2)
 
-# Redis 客户端用于存储进度信息
-_redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+# 批量同步锁（API 启动任务时获取，任务结束时释放，防止并发启动）
+BATCH_SYNC_LOCK_KEY = "batch_finance_sync:lock"
+BATCH_SYNC_LOCK_TTL = 300
 
 # 同步时间范围（天）
 SYNC_DAYS = 7
@@ -43,35 +43,25 @@ def batch_finance_sync_task(self):
     logger.info(f"Batch finance sync task started, task_id: {task_id}")
 
     # 初始化进度
-    _update_progress(task_id, {
-        "status": "running",
-        "current": 0,
-        "total": 0,
-        "message": "正在查询需要同步的订单..."
-    })
-
-    def run_async_in_thread():
-        """在新线程中运行异步代码，显式管理 event loop"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(_batch_finance_sync_async(task_id))
-        finally:
-            loop.close()
-            asyncio.set_event_loop(None)
+    run_async(task_progress.start(
+        task_id,
+        "batch_finance_sync",
+        message="正在查询需要同步的订单...",
+        current=0,
+        total=0
+    ))
 
     try:
-        future = _thread_pool.submit(run_async_in_thread)
-        result = future.result(timeout=7200)  # 2小时超时
+        result = run_async(_batch_finance_sync_async(task_id), timeout=7200)  # 2小时超时
 
         # 更新最终进度
-        _update_progress(task_id, {
-            "status": "completed",
-            "current": result.get("updated", 0) + result.get("skipped", 0) + result.get("errors", 0),
-            "total": result.get("total_found", 0),
-            "message": result.get("message", "同步完成"),
-            "result": result
-        })
+        run_async(task_progress.complete(
+            task_id,
+            result=result,
+            message=result.get("message", "同步完成"),
+            current=result.get("updated", 0) + result.get("skipped", 0) + result.get("errors", 0),
+            total=result.get("total_found", 0)
+        ))
 
         return result
     except Exception as e:
@@ -81,23 +71,24 @@ def batch_finance_sync_task(self):
             "error": str(e)
         }
 
-        _update_progress(task_id, {
-            "status": "failed",
-            "message": f"同步失败: {str(e)}",
-            "result": error_result
-        })
+        run_async(task_progress.fail(task_id, str(e), message=f"同步失败: {str(e)}", result=error_result))
 
         return error_result
     finally:
         # 释放 Redis 锁
         try:
-            lock_key = "batch_finance_sync:lock"
-            _redis_client.delete(lock_key)
-            logger.info(f"Released lock: {lock_key}")
+            run_async(release_batch_sync_lock())
+            logger.info(f"Released lock: {BATCH_SYNC_LOCK_KEY}")
         except Exception as e:
             logger.error(f"Failed to release lock: {e}")
 
 
+async def release_batch_sync_lock() -> None:
+    """释放批量同步锁"""
+    redis_client = await get_redis()
+    await redis_client.delete(BATCH_SYNC_LOCK_KEY)
+
+
 async def _batch_finance_sync_async(task_id: str) -> Dict[str, Any]:
     """
     批量财务同步的异步实现 - 使用基于日期的批量查询
@@ -131,9 +122,7 @@ async def _batch_finance_sync_async(task_id: str) -> Dict[str, Any]:
 
     logger.info(f"Batch finance sync: date range {date_from_str} ~ {date_to_str}")
 
-    # 在当前 event loop 中重新创建 db_manager（避免 loop 冲突）
-    from ef_core.database import DatabaseManager
-    db_manager = DatabaseManager()
+    db_manager = get_task_db_manager()
 
     async with db_manager.get_session() as session:
         # 1. 查询最近7天内签收且未同步财务的订单
@@ -160,12 +149,13 @@ async def _batch_finance_sync_async(task_id: str) -> Dict[str, Any]:
         logger.info(f"Found {len(postings)} postings delivered in the last {SYNC_DAYS} days")
 
         # 更新进度
-        _update_progress(task_id, {
-            "status": "running",
-            "current": 0,
-            "total": len(postings),
-            "message": f"找到 {len(postings)} 个订单，正在批量查询财务数据..."
-        })
+        await task_progress.update(
+            task_id,
+            status="running",
+            current=0,
+            total=len(postings),
+            message=f"找到 {len(postings)} 个订单，正在批量查询财务数据..."
+        )
 
         # 2. 按店铺分组
         postings_by_shop = defaultdict(list)
@@ -202,12 +192,13 @@ async def _batch_finance_sync_async(task_id: str) -> Dict[str, Any]:
             logger.info(f"Processing shop {shop_index}/{len(postings_by_shop)}: {shop_name} ({len(shop_postings)} postings)")
 
             # 更新进度
-            _update_progress(task_id, {
-                "status": "running",
-                "current": stats["processed"],
-                "total": stats["total_found"],
-                "message": f"正在查询店铺 {shop_name} 的财务数据..."
-            })
+            await task_progress.update(
+                task_id,
+                status="running",
+                current=stats["processed"],
+                total=stats["total_found"],
+                message=f"正在查询店铺 {shop_name} 的财务数据..."
+            )
 
             try:
                 # 4. 创建 API 客户端
@@ -256,12 +247,13 @@ async def _batch_finance_sync_async(task_id: str) -> Dict[str, Any]:
                         posting_number = posting.posting_number
 
                         # 更新进度
-                        _update_progress(task_id, {
-                            "status": "running",
-                            "current": stats["processed"],
-                            "total": stats["total_found"],
-                            "message": f"正在处理 {posting_number}..."
-                        })
+                        await task_progress.update(
+                            task_id,
+                            status="running",
+                            current=stats["processed"],
+                            total=stats["total_found"],
+                            message=f"正在处理 {posting_number}..."
+                        )
 
                         # 查找该 posting 的财务操作
                         operations = operations_by_posting.get(posting_number, [])
@@ -411,12 +403,3 @@ def _calculate_profit(posting: OzonPosting) -> None:
         posting.profit_rate = Decimal('0')
     else:
         posting.profit_rate = (profit / order_amount * 100) if order_amount > 0 else Decimal('0')
-
-
-def _update_progress(task_id: str, progress: Dict[str, Any]):
-    """更新任务进度到 Redis"""
-    try:
-        key = f"batch_finance_sync:{task_id}"
-        _redis_client.setex(key, 3600, str(progress))  # 1小时过期
-    except Exception as e:
-        logger.error(f"Failed to update progress: {e}")
@@ -1,22 +1,18 @@
 """
 批量更新商品价格的后台任务
 """
-import asyncio
-import json
 from typing import List, Dict, Any
-import redis
 from datetime import datetime
 from decimal import Decimal
 
 from ef_core.tasks.celery_app import celery_app
+from ef_core.tasks.async_runner import run_async
 from ef_core.database import get_task_db_manager
+from ef_core.services.task_progress import task_progress
 from ef_core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-# Redis客户端用于存储进度信息
-_redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
 
 @celery_app.task(bind=True, name="ef.ozon.batch_update_prices")
 def batch_update_prices_task(
@@ -34,24 +30,8 @@ def batch_update_prices_task(
     task_id = self.request.id if self.request.id else "unknown"
     logger.info(f"批量价格更新任务启动 - Task ID: {task_id}, shop_id: {shop_id}, 更新数量: {len(updates)}")
 
-    def run_async_in_thread():
-        """在新线程中运行异步代码，显式管理 event loop"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                _batch_update_prices_async(
-                    task_id,
-                    shop_id,
-                    updates
-                )
-            )
-        finally:
-            loop.close()
-            asyncio.set_event_loop(None)
-
     try:
-        result = run_async_in_thread()
+        result = run_async(_batch_update_prices_async(task_id, shop_id, updates))
         return result
     except Exception as e:
         logger.error(f"批量价格更新任务执行错误: {e}", exc_info=True)
@@ -99,21 +79,16 @@ async def _batch_update_prices_async(
                 api_key=shop.api_key_enc
             )
 
-            # Redis 进度 key
-            progress_key = f"celery-task-progress:{task_id}"
-
             # 初始化进度
-            _redis_client.setex(
-                progress_key,
-                3600,  # 1小时过期
-                json.dumps({
-                    'status': 'starting',
-                    'updated': 0,
-                    'total': len(updates),
-                    'errors': [],
-                    'current': '准备中...',
-                    'percent': 0
-                })
+            await task_progress.start(
+                task_id,
+                "price_update",
+                status='starting',
+                updated=0,
+                total=len(updates),
+                errors=[],
+                current='准备中...',
+                percent=0
             )
 
             # 获取汇率服务用于折扣验证
@@ -132,18 +107,16 @@ async def _batch_update_prices_async(
                 new_price = update.get("price")
                 old_price = update.get("old_price")
 
-                # 更新进度
-                _redis_client.setex(
-                    progress_key,
-                    3600,
-                    json.dumps({
-                        'status': 'syncing',
-                        'updated': updated_count,
-                        'total': len(updates),
-                        'errors': errors[:10],
-                        'current': f'正在更新商品 {idx + 1}/{len(updates)}...',
-                        'percent': int(((idx + 1) / len(updates)) * 100)
-                    })
+                # 更新进度（逐个商品调用，节流合并写入）
+                percent = int(((idx + 1) / len(updates)) * 100)
+                await task_progress.update(
+                    task_id,
+                    status='syncing',
+                    updated=updated_count,
+                    errors=errors[:10],
+                    current=f'正在更新商品 {idx + 1}/{len(updates)}...',
+                    percent=percent,
+                    progress=percent
                 )
 
                 if not offer_id or new_price is None:
@@ -265,18 +238,15 @@ async def _batch_update_prices_async(
             # 判断整体成功标志
             success = updated_count > 0 or len(errors) == 0
 
-            # 更新最终进度
-            _redis_client.setex(
-                progress_key,
-                3600,
-                json.dumps({
-                    'status': 'completed' if success else 'failed',
-                    'updated': updated_count,
-                    'total': len(updates),
-                    'errors': errors[:20],
-                    'current': '完成',
-                    'percent': 100
-                })
+            # 更新最终进度（终态立即写入）
+            await task_progress.update(
+                task_id,
+                status='completed' if success else 'failed',
+                updated=updated_count,
+                errors=errors[:20],
+                current='完成',
+                percent=100,
+                progress=100
             )
 
             result = {
@@ -294,6 +264,7 @@ async def _batch_update_prices_async(
 
     except Exception as e:
         logger.error(f"批量价格更新任务失败: {e}", exc_info=True)
+        await task_progress.fail(task_id, str(e))
         return {
             "success": False,
             "error": str(e)
@@ -1,21 +1,17 @@
 """
 批量更新商品库存的后台任务
 """
-import asyncio
-import json
 from typing import List, Dict, Any
-import redis
 from datetime import datetime
 
 from ef_core.tasks.celery_app import celery_app
-from ef_core.database import get_db_manager
+from ef_core.tasks.async_runner import run_async
+from ef_core.database import get_task_db_manager
+from ef_core.services.task_progress import task_progress
 from ef_core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-# Redis客户端用于存储进度信息
-_redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
 
 @celery_app.task(bind=True, name="ef.ozon.batch_update_stocks")
 def batch_update_stocks_task(
@@ -33,24 +29,8 @@ def batch_update_stocks_task(
     task_id = self.request.id if self.request.id else "unknown"
     logger.info(f"批量库存更新任务启动 - Task ID: {task_id}, shop_id: {shop_id}, 更新数量: {len(updates)}")
 
-    def run_async_in_thread():
-        """在新线程中运行异步代码，显式管理 event loop"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                _batch_update_stocks_async(
-                    task_id,
-                    shop_id,
-                    updates
-                )
-            )
-        finally:
-            loop.close()
-            asyncio.set_event_loop(None)
-
     try:
-        result = run_async_in_thread()
+        result = run_async(_batch_update_stocks_async(task_id, shop_id, updates))
         return result
     except Exception as e:
         logger.error(f"批量库存更新任务执行错误: {e}", exc_info=True)
@@ -70,25 +50,11 @@ async def _batch_update_stocks_async(
     from ..models.products import OzonProduct
     from ..api.client import OzonAPIClient
     from sqlalchemy import select
-    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-    from sqlalchemy.orm import sessionmaker
-    from ef_core.config import get_settings
     from fastapi import HTTPException
 
     try:
-        # 在当前事件循环中创建新的数据库引擎和会话
-        # 这样可以避免"Future attached to a different loop"错误
-        settings = get_settings()
-        engine = create_async_engine(
-            settings.database_url,
-            echo=False,
-            pool_pre_ping=True,
-        )
-        async_session_factory = sessionmaker(
-            engine, class_=AsyncSession, expire_on_commit=False
-        )
-
-        async with async_session_factory() as db:
+        # worker 常驻事件循环上共享的引擎和连接池
+        async with get_task_db_manager().get_session() as db:
             # 获取店铺信息
             shop_result = await db.execute(
                 select(OzonShop).where(OzonShop.id == shop_id)
@@ -111,20 +77,15 @@ async def _batch_update_stocks_async(
                 api_key=shop.api_key_enc
             )
 
-            # Redis 进度 key
-            progress_key = f"celery-task-progress:{task_id}"
-
             # 初始化进度
-            _redis_client.setex(
-                progress_key,
-                3600,  # 1小时过期
-                json.dumps({
-                    'status': 'starting',
-                    'updated': 0,
-                    'total': 0,
-                    'errors': [],
-                    'current': '准备中...'
-                })
+            await task_progress.start(
+                task_id,
+                "stock_update",
+                status='starting',
+                updated=0,
+                total=0,
+                errors=[],
+                current='准备中...'
             )
 
             # 检查是否需要对全部商品操作
@@ -183,17 +144,13 @@ async def _batch_update_stocks_async(
                 logger.info(f"批量更新全部商品库存 - 店铺ID: {shop_id}, 商品数量: {len(updates)}, 目标库存: {stock_value}, 仓库ID: {warehouse_id_value}")
 
             # 更新总数
-            _redis_client.setex(
-                progress_key,
-                3600,
-                json.dumps({
-                    'status': 'syncing',
-                    'updated': 0,
-                    'total': len(updates),
-                    'errors': [],
-                    'current': '开始更新...',
-                    'percent': 0
-                })
+            await task_progress.update(
+                task_id,
+                force=True,
+                status='syncing',
+                total=len(updates),
+                current='开始更新...',
+                percent=0
             )
 
             # 构建批量更新列表
@@ -268,18 +225,17 @@ async def _batch_update_stocks_async(
                 batch = stock_items[batch_idx:batch_idx + BATCH_SIZE]
                 current_batch_num = (batch_idx // BATCH_SIZE) + 1
 
-                # 更新进度
-                _redis_client.setex(
-                    progress_key,
-                    3600,
-                    json.dumps({
-                        'status': 'syncing',
-                        'updated': updated_count,
-                        'total': len(stock_items),
-                        'errors': errors[:10],  # 只保留前10个错误
-                        'current': f'正在更新第 {current_batch_num}/{total_batches} 批...',
-                        'percent': int((batch_idx / len(stock_items)) * 100) if len(stock_items) > 0 else 0
-                    })
+                # 更新进度（节流写入）
+                percent = int((batch_idx / len(stock_items)) * 100) if len(stock_items) > 0 else 0
+                await task_progress.update(
+                    task_id,
+                    status='syncing',
+                    updated=updated_count,
+                    total=len(stock_items),
+                    errors=errors[:10],  # 只保留前10个错误
+                    current=f'正在更新第 {current_batch_num}/{total_batches} 批...',
+                    percent=percent,
+                    progress=percent
                 )
 
                 try:
@@ -327,24 +283,19 @@ async def _batch_update_stocks_async(
             # 关闭API客户端
             await client.close()
 
-        # 关闭数据库引擎（在 async with 块外）
-        await engine.dispose()
-
         # 判断整体成功标志
         success = updated_count > 0 or len(errors) == 0
 
-        # 更新最终进度
-        _redis_client.setex(
-            progress_key,
-            3600,
-            json.dumps({
-                'status': 'completed' if success else 'failed',
-                'updated': updated_count,
-                'total': len(stock_items),
-                'errors': errors[:20],  # 最多保留20个错误
-                'current': '完成',
-                'percent': 100
-            })
+        # 更新最终进度（终态立即写入）
+        await task_progress.update(
+            task_id,
+            status='completed' if success else 'failed',
+            updated=updated_count,
+            total=len(stock_items),
+            errors=errors[:20],  # 最多保留20个错误
+            current='完成',
+            percent=100,
+            progress=100
         )
 
         result = {
@@ -362,6 +313,7 @@ async def _batch_update_stocks_async(
 
     except Exception as e:
         logger.error(f"批量库存更新任务失败: {e}", exc_info=True)
+        await task_progress.fail(task_id, str(e))
         return {
             "success": False,
             "error": str(e)
@@ -1,23 +1,15 @@
 """
 批量同步类目和特征的后台任务
 """
-import asyncio
-import json
 from typing import Optional, List
-from concurrent.futures import ThreadPoolExecutor
-import redis
 from ef_core.tasks.celery_app import celery_app
+from ef_core.tasks.async_runner import run_async
 from ef_core.database import get_task_db_manager
+from ef_core.services.task_progress import task_progress
 from ef_core.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-# 创建线程池用于运行异步任务
-_thread_pool = ThreadPoolExecutor(max_workers=2)
-
-# Redis客户端用于存储进度信息
-_redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
 
 @celery_app.task(bind=True, name="ef.ozon.batch_sync_category_attributes")
 def batch_sync_category_attributes_task(
@@ -40,38 +32,24 @@ def batch_sync_category_attributes_task(
         language: 语言（ZH_HANS/DEFAULT/RU/EN/TR）
         max_concurrent: 最大并发数
     """
-    # 在单独的线程中运行异步代码，避免 event loop 冲突
     # 先在主线程获取 task_id
     task_id = self.request.id if self.request.id else "unknown"
 
     logger.info(f"Task ID: {task_id}, shop_id: {shop_id}")
 
-    def run_async_in_thread():
-        """在新线程中运行异步代码，显式管理 event loop"""
-        # 创建新的 event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                _batch_sync_async(
-                    task_id,
-                    shop_id,
-                    category_ids,
-                    sync_all_leaf,
-                    sync_dictionary_values,
-                    language,
-                    max_concurrent
-                )
-            )
-        finally:
-            # 清理 loop
-            loop.close()
-            asyncio.set_event_loop(None)
-
     try:
-        # 使用线程池执行异步任务
-        future = _thread_pool.submit(run_async_in_thread)
-        result = future.result(timeout=7200)  # 2小时超时
+        result = run_async(
+            _batch_sync_async(
+                task_id,
+                shop_id,
+                category_ids,
+                sync_all_leaf,
+                sync_dictionary_values,
+                language,
+                max_concurrent
+            ),
+            timeout=7200  # 2小时超时
+        )
         return result
     except Exception as e:
         logger.error(f"Task execution error: {e}", exc_info=True)
@@ -94,33 +72,12 @@ def sync_category_tree_task(
         shop_id: 店铺ID
         force_refresh: 是否强制刷新
     """
-    # 在单独的线程中运行异步代码，避免 event loop 冲突
     task_id = self.request.id if self.request.id else "unknown"
 
     logger.info(f"Category Tree Sync Task ID: {task_id}, shop_id: {shop_id}")
 
-    def run_async_in_thread():
-        """在新线程中运行异步代码，显式管理 event loop"""
-        # 创建新的 event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                _sync_category_tree_async(
-                    task_id,
-                    shop_id,
-                    force_refresh
-                )
-            )
-        finally:
-            # 清理 loop
-            loop.close()
-            asyncio.set_event_loop(None)
-
     try:
-        # 使用线程池执行异步任务
-        future = _thread_pool.submit(run_async_in_thread)
-        result = future.result(timeout=7200)  # 2小时超时
+        result = run_async(_sync_category_tree_async(task_id, shop_id, force_refresh), timeout=7200)  # 2小时超时
         return result
     except Exception as e:
         logger.error(f"Category tree sync task execution error: {e}", exc_info=True)
@@ -169,19 +126,14 @@ async def _sync_category_tree_async(
             # 创建目录服务
             catalog_service = CatalogService(client, db)
 
-            # 使用 Redis 存储进度信息
-            progress_key = f"celery-task-progress:{task_id}"
-
             # 初始化进度
-            _redis_client.setex(
-                progress_key,
-                7200,  # 2小时过期
-                json.dumps({
-                    'status': 'starting',
-                    'processed_categories': 0,
-                    'total_categories': 0,
-                    'current_category': '准备中...'
-                })
+            await task_progress.start(
+                task_id,
+                "category_tree_sync",
+                status='starting',
+                processed_categories=0,
+                total_categories=0,
+                current_category='准备中...'
             )
 
             logger.info(
@@ -189,18 +141,17 @@ async def _sync_category_tree_async(
                 f"force_refresh={force_refresh}"
             )
 
-            # 定义进度回调函数
-            def update_progress(current, total, category_name):
-                _redis_client.setex(
-                    progress_key,
-                    7200,  # 2小时过期
-                    json.dumps({
-                        'status': 'syncing',
-                        'processed_categories': current,
-                        'total_categories': total,
-                        'current_category': category_name,
-                        'percent': int((current / total) * 100) if total > 0 else 0
-                    })
+            # 定义进度回调函数（节流写入）
+            async def update_progress(current, total, category_name):
+                percent = int((current / total) * 100) if total > 0 else 0
+                await task_progress.update(
+                    task_id,
+                    status='syncing',
+                    processed_categories=current,
+                    total_categories=total,
+                    current_category=category_name,
+                    percent=percent,
+                    progress=percent
                 )
 
             # 执行类目树同步
@@ -220,17 +171,13 @@ async def _sync_category_tree_async(
             )
 
             # 更新进度状态为已完成
-            _redis_client.setex(
-                progress_key,
-                300,  # 完成后保留5分钟
-                json.dumps({
-                    'status': 'completed',
-                    'processed_categories': result.get('total_categories', 0),
-                    'total_categories': result.get('total_categories', 0),
-                    'current_category': '同步完成',
-                    'percent': 100,
-                    'result': result
-                })
+            await task_progress.complete(
+                task_id,
+                result=result,
+                processed_categories=result.get('total_categories', 0),
+                total_categories=result.get('total_categories', 0),
+                current_category='同步完成',
+                percent=100
             )
 
             return result
@@ -238,15 +185,7 @@ async def _sync_category_tree_async(
     except Exception as e:
         logger.error(f"Category tree sync task failed: {e}", exc_info=True)
         # 更新进度状态为失败
-        _redis_client.setex(
-            progress_key,
-            300,  # 保留5分钟
-            json.dumps({
-                'status': 'failed',
-                'error': str(e),
-                'current_category': '同步失败'
-            })
-        )
+        await task_progress.fail(task_id, str(e), current_category='同步失败')
         return {
             "success": False,
             "error": str(e)
@@ -296,19 +235,14 @@ async def _batch_sync_async(
             # 创建目录服务
             catalog_service = CatalogService(client, db)
 
-            # 使用 Redis 存储进度信息（绕过 Celery 状态机制）
-            progress_key = f"celery-task-progress:{task_id}"
-
-            # 初始化进度
-            _redis_client.setex(
-                progress_key,
-                7200,  # 2小时过期
-                json.dumps({
-                    'status': 'starting',
-                    'synced_categories': 0,
-                    'total_categories': 0,
-                    'current_category': '准备中...'
-                })
+            # 使用统一的任务进度服务存储进度信息（绕过 Celery 状态机制）
+            await task_progress.start(
+                task_id,
+                "category_attributes_sync",
+                status='starting',
+                synced_categories=0,
+                total_categories=0,
+                current_category='准备中...'
             )
 
             logger.info(
@@ -317,20 +251,19 @@ async def _batch_sync_async(
             )
 
             # 定义进度回调函数
-            def update_progress(current, total, category_id, category_name, synced_attributes, synced_values):
-                _redis_client.setex(
-                    progress_key,
-                    7200,  # 2小时过期
-                    json.dumps({
-                        'status': 'syncing',
-                        'synced_categories': current,
-                        'total_categories': total,
-                        'current_category': category_name,
-                        'current_category_id': category_id,
-                        'synced_attributes': synced_attributes,
-                        'synced_values': synced_values,
-                        'percent': int((current / total) * 100) if total > 0 else 0
-                    })
+            async def update_progress(current, total, category_id, category_name, synced_attributes, synced_values):
+                percent = int((current / total) * 100) if total > 0 else 0
+                await task_progress.update(
+                    task_id,
+                    status='syncing',
+                    synced_categories=current,
+                    total_categories=total,
+                    current_category=category_name,
+                    current_category_id=category_id,
+                    synced_attributes=synced_attributes,
+                    synced_values=synced_values,
+                    percent=percent,
+                    progress=percent
                 )
 
             # 执行批量同步
@@ -356,19 +289,15 @@ async def _batch_sync_async(
             )
 
             # 更新进度状态为已完成
-            _redis_client.setex(
-                progress_key,
-                300,  # 完成后保留5分钟
-                json.dumps({
-                    'status': 'completed',
-                    'synced_categories': result.get('synced_categories', 0),
-                    'total_categories': result.get('total_categories', 0),
-                    'synced_attributes': result.get('synced_attributes', 0),
-                    'synced_values': result.get('synced_values', 0),
-                    'current_category': '同步完成',
-                    'percent': 100,
-                    'result': result
-                })
+            await task_progress.complete(
+                task_id,
+                result=result,
+                synced_categories=result.get('synced_categories', 0),
+                total_categories=result.get('total_categories', 0),
+                synced_attributes=result.get('synced_attributes', 0),
+                synced_values=result.get('synced_values', 0),
+                current_category='同步完成',
+                percent=100
             )
 
             return result
@@ -376,15 +305,7 @@ async def _batch_sync_async(
     except Exception as e:
         logger.error(f"Batch sync task failed: {e}", exc_info=True)
         # 更新进度状态为失败
-        _redis_client.setex(
-            progress_key,
-            300,  # 保留5分钟
-            json.dumps({
-                'status': 'failed',
-                'error': str(e),
-                'current_category': '同步失败'
-            })
-        )
+        await task_progress.fail(task_id, str(e), current_category='同步失败')
         return {
             "success": False,
             "error": str(e)
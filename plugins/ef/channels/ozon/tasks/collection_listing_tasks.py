@@ -1,19 +1,20 @@
 """
 Celery 任务：采集记录上架任务
 """
-import asyncio
 import logging
 import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any, List
 
 from decimal import Decimal
+from functools import lru_cache
 
 from ef_core.tasks.celery_app import celery_app
+from ef_core.tasks.async_runner import run_async
+from ef_core.database import get_task_db_manager
 from ef_core.config import get_settings
 from sqlalchemy import select, create_engine
 from sqlalchemy.orm import Session, sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
 from ..models.collection_record import OzonProductCollectionRecord
 from ..models import OzonShop
@@ -21,31 +22,9 @@ from ..models import OzonShop
 logger = logging.getLogger(__name__)
 
 
-def run_async_in_celery(coro):
-    """
-    在 Celery 任务中安全执行异步函数
-    """
-    try:
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-    except RuntimeError:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-    try:
-        return loop.run_until_complete(coro)
-    except Exception as e:
-        logger.error(f"Async execution failed: {e}", exc_info=True)
-        raise
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
-
-
+@lru_cache(maxsize=1)
 def get_sync_db_session():
-    """创建同步数据库会话"""
+    """创建同步数据库会话工厂（进程内复用同一个引擎和连接池）"""
     settings = get_settings()
     sync_db_url = settings.database_url.replace('+asyncpg', '')
     engine = create_engine(sync_db_url, pool_pre_ping=True, pool_recycle=3600)
@@ -120,11 +99,7 @@ def process_follow_pdp_listing(record_id: int) -> dict:
                 from ..services.translation_factory import TranslationFactory
                 from ..models.listing import OzonCategory
 
-                settings = get_settings()
-                async_engine = create_async_engine(settings.database_url, pool_pre_ping=True)
-                AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
-
-                async with AsyncSession() as async_db:
+                async with get_task_db_manager().get_session() as async_db:
                     # 从 "Тип" 属性值查找类目ID（不使用采集的 category_id，因为它是页面跟踪ID而非API的type_id）
                     valid_category_id = None
                     attributes = listing_payload.get("attributes", [])
@@ -261,7 +236,7 @@ def process_follow_pdp_listing(record_id: int) -> dict:
                     return variant_dtos
 
             # 执行异步处理（仅准备数据，不触发任务）
-            variant_dtos = run_async_in_celery(prepare_variants())
+            variant_dtos = run_async(prepare_variants())
 
             # 5. 在同步上下文中触发 Celery 任务（避免异步上下文中的连接问题）
             from ..tasks.quick_publish_task import quick_publish_chain_task
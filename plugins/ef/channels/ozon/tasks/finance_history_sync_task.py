@@ -4,15 +4,14 @@
 """
 import asyncio
 import logging
-import json
 from typing import Dict, Any
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from decimal import Decimal
-import redis
 
 from ef_core.tasks.celery_app import celery_app
-from ef_core.database import DatabaseManager
+from ef_core.tasks.async_runner import run_async
+from ef_core.database import get_task_db_manager
+from ef_core.services.task_progress import task_progress
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
@@ -24,12 +23,6 @@ from ..services.finance_translations import translate_operation_type_name
 
 logger = logging.getLogger(__name__)
 
-# 创建线程池用于运行异步任务
-_thread_pool = ThreadPoolExecutor(max_workers=2)
-
-# Redis 客户端用于存储进度信息
-_redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
-
 
 @celery_app.task(bind=True, name="ef.ozon.finance_history_sync")
 def finance_history_sync_task(self, date_from: str, date_to: str, shop_id: int = None):
@@ -45,39 +38,30 @@ def finance_history_sync_task(self, date_from: str, date_to: str, shop_id: int =
     logger.info(f"Finance history sync task started, task_id: {task_id}, range: {date_from} ~ {date_to}")
 
     # 初始化进度
-    _update_progress(task_id, {
-        "status": "running",
-        "current": 0,
-        "total": 0,
-        "message": "正在初始化同步任务...",
-        "date_from": date_from,
-        "date_to": date_to
-    })
-
-    def run_async_in_thread():
-        """在新线程中运行异步代码"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                _finance_history_sync_async(task_id, date_from, date_to, shop_id)
-            )
-        finally:
-            loop.close()
-            asyncio.set_event_loop(None)
+    run_async(task_progress.start(
+        task_id,
+        "finance_history_sync",
+        message="正在初始化同步任务...",
+        current=0,
+        total=0,
+        date_from=date_from,
+        date_to=date_to
+    ))
 
     try:
-        future = _thread_pool.submit(run_async_in_thread)
-        result = future.result(timeout=7200)  # 2小时超时
+        result = run_async(
+            _finance_history_sync_async(task_id, date_from, date_to, shop_id),
+            timeout=7200  # 2小时超时
+        )
 
         # 更新最终进度
-        _update_progress(task_id, {
-            "status": "completed",
-            "current": result.get("synced", 0),
-            "total": result.get("synced", 0),
-            "message": result.get("message", "同步完成"),
-            "result": result
-        })
+        run_async(task_progress.complete(
+            task_id,
+            result=result,
+            message=result.get("message", "同步完成"),
+            current=result.get("synced", 0),
+            total=result.get("synced", 0)
+        ))
 
         return result
     except Exception as e:
@@ -87,11 +71,7 @@ def finance_history_sync_task(self, date_from: str, date_to: str, shop_id: int =
             "error": str(e)
         }
 
-        _update_progress(task_id, {
-            "status": "failed",
-            "message": f"同步失败: {str(e)}",
-            "result": error_result
-        })
+        run_async(task_progress.fail(task_id, str(e), message=f"同步失败: {str(e)}", result=error_result))
 
         return error_result
 
@@ -137,15 +117,15 @@ async def _finance_history_sync_async(
     logger.info(f"Finance history sync: {date_from} ~ {date_to}, total {total_days} days")
 
     # 更新进度
-    _update_progress(task_id, {
-        "status": "running",
-        "current": 0,
-        "total": total_days,
-        "message": f"准备同步 {total_days} 天的数据..."
-    })
+    await task_progress.update(
+        task_id,
+        status="running",
+        current=0,
+        total=total_days,
+        message=f"准备同步 {total_days} 天的数据..."
+    )
 
-    # 创建数据库管理器
-    db_manager = DatabaseManager()
+    db_manager = get_task_db_manager()
 
     async with db_manager.get_session() as session:
         # 获取要同步的店铺列表
@@ -196,13 +176,14 @@ async def _finance_history_sync_async(
                         date_str = current_date.strftime("%Y-%m-%d")
 
                         # 更新进度
-                        _update_progress(task_id, {
-                            "status": "running",
-                            "current": stats["processed_days"],
-                            "total": total_days * len(shops),
-                            "message": f"正在同步 {shop.shop_name} - {date_str}...",
-                            "progress": round(stats["processed_days"] / (total_days * len(shops)) * 100, 1)
-                        })
+                        await task_progress.update(
+                            task_id,
+                            status="running",
+                            current=stats["processed_days"],
+                            total=total_days * len(shops),
+                            message=f"正在同步 {shop.shop_name} - {date_str}...",
+                            progress=round(stats["processed_days"] / (total_days * len(shops)) * 100, 1)
+                        )
 
                         try:
                             # 同步该日期的数据
@@ -448,23 +429,9 @@ async def _save_transactions(session, records: list) -> int:
     return saved_count
 
 
-def _update_progress(task_id: str, progress: Dict[str, Any]):
-    """更新任务进度到 Redis"""
-    try:
-        key = f"finance_history_sync:{task_id}"
-        _redis_client.setex(key, 3600, json.dumps(progress, default=str))
-    except Exception as e:
-        logger.error(f"Failed to update progress: {e}")
-
-
-def get_task_progress(task_id: str) -> Dict[str, Any]:
+async def get_task_progress(task_id: str) -> Dict[str, Any]:
     """获取任务进度"""
-    try:
-        key = f"finance_history_sync:{task_id}"
-        data = _redis_client.get(key)
-        if data:
-            return json.loads(data)
-        return {"status": "unknown", "message": "任务不存在或已过期"}
-    except Exception as e:
-        logger.error(f"Failed to get progress: {e}")
-        return {"status": "error", "message": str(e)}
+    progress = await task_progress.get(task_id)
+    if progress and "status" in progress:
+        return progress
+    return {"status": "unknown", "message": "任务不存在或已过期"}
@@ -2,13 +2,12 @@
 图片异步上传任务
 从象寄URL上传到当前激活的图床（Cloudinary/阿里云OSS）
 """
-import asyncio
 from typing import Optional
-from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ef_core.tasks.celery_app import celery_app
+from ef_core.tasks.async_runner import run_async
 from ef_core.database import get_task_db_manager
 from ef_core.utils.logger import get_logger
 
@@ -18,9 +17,6 @@ from ..utils.image_utils import has_xiangji_urls, extract_xiangji_urls, replace_
 
 logger = get_logger(__name__)
 
-# 创建线程池用于运行异步任务
-_thread_pool = ThreadPoolExecutor(max_workers=2)
-
 
 @celery_app.task(
     bind=True,
@@ -53,21 +49,8 @@ def upload_xiangji_images_to_storage(
 
     logger.info(f"[Task {task_id}] 开始上传图片任务: product_id={product_id}, variant_id={variant_id}")
 
-    def run_async_in_thread():
-        """在新线程中运行异步代码"""
-        # 创建新的event loop
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            return loop.run_until_complete(
-                _upload_images_async(product_id, variant_id, task_id)
-            )
-        finally:
-            loop.close()
-            asyncio.set_event_loop(None)
-
     try:
-        result = run_async_in_thread()
+        result = run_async(_upload_images_async(product_id, variant_id, task_id))
         logger.info(f"[Task {task_id}] 任务完成: {result}")
         return result
     except Exception as exc:
@@ -4,6 +4,7 @@ Ozon 插件的 Celery 后台任务
 import os
 import base64
 from ef_core.tasks.celery_app import celery_app
+from ef_core.tasks.async_runner import run_async
 from ef_core.database import get_task_db_manager
 from ef_core.utils.logger import get_logger
 from sqlalchemy import select, update
@@ -20,17 +21,7 @@ def download_label_pdf_task(self, posting_number: str, shop_id: int):
         posting_number: 货件编号
         shop_id: 店铺ID
     """
-    import asyncio
-
-    # 在同步任务中运行异步代码
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-    try:
-        loop.run_until_complete(_download_label_pdf_async(posting_number, shop_id))
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
+    run_async(_download_label_pdf_async(posting_number, shop_id))
 
 
 async def _download_label_pdf_async(posting_number: str, shop_id: int):
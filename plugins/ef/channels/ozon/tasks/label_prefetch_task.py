@@ -1,8 +1,9 @@
 """
 标签预缓存定时任务
 
-定时扫描待打印的订单，预先下载标签PDF到本地缓存
-这样用户打印时可以直接读取本地文件，无需等待 OZON API 响应
+标签主要由事件驱动的预缓存 worker（services/label_prefetch_worker.py）在货件状态变化时下载；
+本定时任务作为兜底扫描：把数据库中待打印且未缓存标签的订单补入预缓存队列，
+没有常驻 worker 存活时就地消费队列，保证用户打印时可以直接读取本地文件。
 
 注意：
 - 定时任务通过 hooks.register_cron() 注册，传入异步函数
@@ -10,7 +11,6 @@
 - 不要在这里使用 @celery_app.task 装饰器，否则会导致双重包装和递归错误
 """
 import os
-import asyncio
 import logging
 from typing import List, Dict, Any
 
@@ -21,8 +21,8 @@ logger = logging.getLogger(__name__)
 
 
 # 配置参数
-BATCH_SIZE = 50  # 每次最多处理的订单数
-DELAY_BETWEEN_REQUESTS = 0.5  # 请求间隔（秒），避免 API 限流
+SWEEP_LIMIT = 1000  # 每次最多补入队列的订单数
+DRAIN_SECONDS = 240  # 没有常驻 worker 时就地消费的最长时间（小于调度间隔）
 
 
 async def prefetch_labels_async(**kwargs) -> Dict[str, Any]:
@@ -30,28 +30,26 @@ async def prefetch_labels_async(**kwargs) -> Dict[str, Any]:
     标签预缓存定时任务
 
     扫描所有待打印（awaiting_deliver + tracking_confirmed）且未缓存标签的订单，
-    预先下载标签 PDF 到本地。
+    补入标签预缓存队列（立即到期）；没有常驻 worker 时就地消费队列。
 
     Args:
         **kwargs: 由 register_cron 注入的上下文参数（如 _plugin）
     """
-    from ..models import OzonShop, OzonPosting
-    from ..api.client import OzonAPIClient
-    from ..services.label_service import LabelService
+    from ..models import OzonPosting
+    from ..services.label_prefetch_worker import (
+        LabelPrefetchWorker,
+        enqueue_label_prefetch,
+        get_prefetch_queue_depth,
+        is_worker_alive,
+    )
 
     db_manager = get_task_db_manager()
 
-    total_processed = 0
-    total_success = 0
-    total_skipped = 0
-    total_failed = 0
-    shop_results = []
-
+    # 1. 查找所有需要预缓存的 posting
+    # 条件：awaiting_deliver + tracking_confirmed + 无缓存
     async with db_manager.get_session() as db:
-        # 1. 查找所有需要预缓存的 posting
-        # 条件：awaiting_deliver + tracking_confirmed + 无缓存
         result = await db.execute(
-            select(OzonPosting)
+            select(OzonPosting.shop_id, OzonPosting.posting_number)
             .where(
                 and_(
                     OzonPosting.status == 'awaiting_deliver',
@@ -61,137 +59,53 @@ async def prefetch_labels_async(**kwargs) -> Dict[str, Any]:
                 )
             )
             .order_by(OzonPosting.created_at.desc())
-            .limit(BATCH_SIZE)
-        )
-        postings = result.scalars().all()
-
-        if not postings:
-            logger.info("标签预缓存: 没有需要缓存的订单")
-            return {
-                "success": True,
-                "message": "没有需要缓存的订单",
-                "total_processed": 0
-            }
-
-        logger.info(f"标签预缓存: 找到 {len(postings)} 个需要缓存的订单")
-
-        # 2. 按店铺分组
-        shop_postings: Dict[int, List[OzonPosting]] = {}
-        for posting in postings:
-            if posting.shop_id not in shop_postings:
-                shop_postings[posting.shop_id] = []
-            shop_postings[posting.shop_id].append(posting)
-
-        # 3. 获取店铺信息
-        shop_ids = list(shop_postings.keys())
-        shops_result = await db.execute(
-            select(OzonShop).where(OzonShop.id.in_(shop_ids))
+            .limit(SWEEP_LIMIT)
         )
-        shops = {shop.id: shop for shop in shops_result.scalars().all()}
+        rows = result.all()
 
-        # 4. 按店铺处理
-        label_service = LabelService(db)
+    # 2. 按店铺分组补入队列（已在队列中的订单保持较早的到期时间）
+    shop_postings: Dict[int, List[str]] = {}
+    for shop_id, posting_number in rows:
+        shop_postings.setdefault(shop_id, []).append(posting_number)
 
-        for shop_id, shop_posting_list in shop_postings.items():
-            shop = shops.get(shop_id)
-            if not shop:
-                logger.warning(f"标签预缓存: 店铺 {shop_id} 不存在，跳过")
-                total_skipped += len(shop_posting_list)
-                continue
+    total_enqueued = 0
+    for shop_id, posting_numbers in shop_postings.items():
+        total_enqueued += await enqueue_label_prefetch(shop_id, posting_numbers, delay=0)
 
-            shop_success = 0
-            shop_failed = 0
-            shop_skipped = 0
+    # 3. 没有常驻 worker 时就地消费
+    worker_alive = await is_worker_alive()
+    drain_stats: Dict[str, int] = {}
+    if not worker_alive:
+        drain_stats = await LabelPrefetchWorker(db_manager).drain(DRAIN_SECONDS)
 
-            try:
-                async with OzonAPIClient(shop.client_id, shop.api_key_enc, shop.id) as client:
-                    for posting in shop_posting_list:
-                        total_processed += 1
-
-                        # 再次检查文件是否存在（可能其他进程已下载）
-                        expected_path = LabelService.get_label_path(posting.posting_number)
-                        if os.path.exists(expected_path):
-                            # 更新数据库记录
-                            posting.label_pdf_path = expected_path
-                            shop_skipped += 1
-                            logger.debug(f"标签已存在，更新记录: {posting.posting_number}")
-                            continue
-
-                        try:
-                            # 下载标签
-                            download_result = await label_service.download_and_save_label(
-                                posting_number=posting.posting_number,
-                                api_client=client,
-                                force=False
-                            )
-
-                            if download_result["success"]:
-                                shop_success += 1
-                                logger.info(f"预缓存成功: {posting.posting_number}")
-                            else:
-                                shop_failed += 1
-                                logger.warning(
-                                    f"预缓存失败: {posting.posting_number}, "
-                                    f"错误: {download_result.get('error')}"
-                                )
-
-                        except Exception as e:
-                            shop_failed += 1
-                            error_msg = str(e)
-                            # 如果是"标签未就绪"错误，降低日志级别
-                            if "aren't ready" in error_msg.lower() or "not ready" in error_msg.lower():
-                                logger.debug(f"标签未就绪，稍后重试: {posting.posting_number}")
-                            else:
-                                logger.warning(f"预缓存异常: {posting.posting_number}, 错误: {error_msg}")
-
-                        # 请求间隔，避免 API 限流
-                        await asyncio.sleep(DELAY_BETWEEN_REQUESTS)
+    queue_depth = await get_prefetch_queue_depth()
 
-            except Exception as e:
-                logger.error(f"店铺 {shop.shop_name} 预缓存出错: {e}")
-                shop_failed += len(shop_posting_list) - shop_success - shop_skipped
-
-            total_success += shop_success
-            total_failed += shop_failed
-            total_skipped += shop_skipped
-
-            shop_results.append({
-                "shop_id": shop_id,
-                "shop_name": shop.shop_name,
-                "success": shop_success,
-                "failed": shop_failed,
-                "skipped": shop_skipped
-            })
-
-        # 5. 提交数据库更改
-        await db.commit()
-
-    # 6. 记录汇总日志
+    # 4. 记录汇总日志
     logger.info(
-        f"标签预缓存完成: 处理 {total_processed} 个, "
-        f"成功 {total_success}, 跳过 {total_skipped}, 失败 {total_failed}"
+        f"标签预缓存: 补入队列 {total_enqueued} 个（{len(shop_postings)} 个店铺）, "
+        f"常驻worker={'在线' if worker_alive else '离线'}, 就地处理 {drain_stats}, 队列 {queue_depth}"
     )
 
-    # 7. 记录任务结果到数据库
+    # 5. 记录任务结果到数据库
     from ef_core.tasks.task_logger import update_task_result
     update_task_result(
         task_name="ef.ozon.labels.prefetch",
-        records_processed=total_processed,
-        records_updated=total_success,
+        records_processed=total_enqueued,
+        records_updated=drain_stats.get("cached", 0),
         extra_data={
-            "skipped": total_skipped,
-            "failed": total_failed,
-            "shops": len(shop_results)
+            "shops": len(shop_postings),
+            "worker_alive": worker_alive,
+            "drain": drain_stats,
+            "queue_depth": queue_depth,
         }
     )
 
     return {
         "success": True,
-        "total_processed": total_processed,
-        "total_success": total_success,
-        "total_skipped": total_skipped,
-        "total_failed": total_failed,
-        "shop_results": shop_results
+        "total_enqueued": total_enqueued,
+        "worker_alive": worker_alive,
+        "drain": drain_stats,
+        "queue_depth": queue_depth,
     }
 
 
@@ -204,7 +118,7 @@ async def cleanup_labels_async(**kwargs) -> Dict[str, Any]:
     标签缓存清理定时任务
 
     清理超过 7 天的标签 PDF 文件，释放磁盘空间。
-    同时清理数据库中对应的 label_pdf_path 字段。
+    同时清理数据库中对应的 label_pdf_path 字段；合并PDF按 LRU + TTL 淘汰。
 
     Args:
         **kwargs: 由 register_cron 注入的上下文参数（如 _plugin）
@@ -213,7 +127,7 @@ async def cleanup_labels_async(**kwargs) -> Dict[str, Any]:
     from datetime import datetime, timezone
     from sqlalchemy import update
     from ..models import OzonPosting
-    from ..services.label_service import LabelService
+    from ..services.label_service import BATCH_PREFIX, LabelService, evict_label_batches
 
     db_manager = get_task_db_manager()
 
@@ -223,12 +137,17 @@ async def cleanup_labels_async(**kwargs) -> Dict[str, Any]:
     files_deleted = 0
     files_skipped = 0
     files_failed = 0
-    deleted_posting_numbers = []
+    deleted_paths = []
+
+    # 1. 合并PDF按 LRU + TTL 淘汰
+    batches_deleted = 0
+    if os.path.exists(label_dir):
+        batches_deleted = evict_label_batches(label_dir)
 
-    # 1. 扫描并删除过期文件
+    # 2. 扫描并删除过期的单个标签文件
     if os.path.exists(label_dir):
         for filename in os.listdir(label_dir):
-            if not filename.endswith('.pdf'):
+            if not filename.endswith('.pdf') or filename.startswith(BATCH_PREFIX):
                 continue
 
             filepath = os.path.join(label_dir, filename)
@@ -242,9 +161,8 @@ async def cleanup_labels_async(**kwargs) -> Dict[str, Any]:
                     os.remove(filepath)
                     files_deleted += 1
 
-                    # 提取 posting_number（文件名去掉 .pdf 后缀）
-                    posting_number = filename[:-4]
-                    deleted_posting_numbers.append(posting_number)
+                    # 记录被删除的文件路径（与 label_pdf_path 的格式一致）
+                    deleted_paths.append(f"{label_dir}/{filename}")
 
                     logger.debug(f"已删除过期标签: {filename}")
                 else:
@@ -254,21 +172,21 @@ async def cleanup_labels_async(**kwargs) -> Dict[str, Any]:
                 files_failed += 1
                 logger.warning(f"删除标签失败 {filename}: {e}")
 
-    # 2. 清理数据库中对应的 label_pdf_path
+    # 3. 清理数据库中对应的 label_pdf_path
     db_updated = 0
-    if deleted_posting_numbers:
+    if deleted_paths:
         async with db_manager.get_session() as db:
-            # 批量更新，清空已删除文件对应的 label_pdf_path
+            # 批量更新，清空指向已删除文件的 label_pdf_path
             result = await db.execute(
                 update(OzonPosting)
-                .where(OzonPosting.posting_number.in_(deleted_posting_numbers))
+                .where(OzonPosting.label_pdf_path.in_(deleted_paths))
                 .values(label_pdf_path=None)
             )
             db_updated = result.rowcount
             await db.commit()
 
     logger.info(
-        f"标签清理完成: 删除 {files_deleted} 个文件, "
+        f"标签清理完成: 删除 {files_deleted} 个文件, 淘汰合并PDF {batches_deleted} 个, "
         f"跳过 {files_skipped} 个, 失败 {files_failed} 个, "
         f"更新数据库 {db_updated} 条"
     )
@@ -281,6 +199,7 @@ async def cleanup_labels_async(**kwargs) -> Dict[str, Any]:
         records_updated=files_deleted,
         extra_data={
             "db_updated": db_updated,
+            "batches_deleted": batches_deleted,
             "skipped": files_skipped,
             "failed": files_failed
         }
@@ -292,5 +211,6 @@ async def cleanup_labels_async(**kwargs) -> Dict[str, Any]:
         "files_skipped": files_skipped,
         "files_failed": files_failed,
         "db_updated": db_updated,
+        "batches_deleted": batches_deleted,
         "cleanup_days": CLEANUP_DAYS
     }
@@ -2,19 +2,21 @@
 OZON 一键跟卖 Celery 任务
 处理商品创建、图片上传、库存更新的异步流程
 """
-import asyncio
-import json
 import time
 import secrets
 import string
 from typing import Dict, List, Optional
 from datetime import datetime, UTC
+from functools import lru_cache
 
 from celery import chain
 from sqlalchemy import select, create_engine
 from sqlalchemy.orm import sessionmaker
 
 from ef_core.tasks.celery_app import celery_app
+from ef_core.tasks.async_runner import run_async
+from ef_core.database import get_task_db_manager
+from ef_core.services.task_progress import task_progress
 from ef_core.config import get_settings
 from ef_core.utils.logger import get_logger
 
@@ -25,94 +27,76 @@ from ..services.image_relay_service import is_already_staged_url
 
 logger = get_logger(__name__)
 
-# Redis 键前缀
-REDIS_TASK_PROGRESS_PREFIX = "celery-task-progress:"
+# 任务进度类型（ef_core.services.task_progress）
+TASK_PROGRESS_TYPE = "quick_publish"
 
 
 # ========== 辅助函数 ==========
 
-def run_async_in_celery(coro):
-    """
-    在 Celery 任务中安全执行异步函数
-    避免 Event loop is closed 错误
-    """
-    try:
-        # 尝试获取当前事件循环
-        loop = asyncio.get_event_loop()
-        if loop.is_closed():
-            # 如果已关闭，创建新的
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-    except RuntimeError:
-        # 没有事件循环，创建新的
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-
-    try:
-        return loop.run_until_complete(coro)
-    except Exception as e:
-        logger.error(f"Async execution failed: {e}", exc_info=True)
-        raise
-    finally:
-        loop.close()
-        asyncio.set_event_loop(None)
-
-
+@lru_cache(maxsize=1)
 def get_sync_db_session():
-    """创建同步数据库会话 (用于 Celery 任务)"""
+    """创建同步数据库会话工厂 (用于 Celery 任务，进程内复用同一个引擎和连接池)"""
     settings = get_settings()
     sync_db_url = settings.database_url.replace('+asyncpg', '')
     engine = create_engine(sync_db_url, pool_pre_ping=True, pool_recycle=3600)
     return sessionmaker(bind=engine)
 
 
-def update_task_progress(task_id: str, status: str, current_step: str, progress: int,
-                        step_details: Dict = None, error: str = None):
-    """更新任务进度到 Redis"""
-    try:
-        import redis
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+def _initial_steps() -> Dict[str, Dict]:
+    return {
+        "create_product": {"status": "pending"},
+        "upload_images": {"status": "pending"},
+        "update_images": {"status": "pending"},
+        "update_price": {"status": "pending"},
+        "update_stock": {"status": "pending"}
+    }
 
-        key = f"{REDIS_TASK_PROGRESS_PREFIX}{task_id}"
-        existing_data = redis_client.get(key)
 
-        if existing_data:
-            data = json.loads(existing_data)
-        else:
-            data = {
-                "task_id": task_id,
-                "status": status,
-                "current_step": current_step,
-                "progress": 0,
-                "steps": {
-                    "create_product": {"status": "pending"},
-                    "upload_images": {"status": "pending"},
-                    "update_images": {"status": "pending"},
-                    "update_price": {"status": "pending"},
-                    "update_stock": {"status": "pending"}
-                },
-                "created_at": datetime.now(UTC).isoformat(),
-                "updated_at": datetime.now(UTC).isoformat()
-            }
+async def start_task_progress_async(task_id: str, user_id: int):
+    """初始化任务进度（进度变化推送给发起用户）"""
+    await task_progress.start(
+        task_id,
+        TASK_PROGRESS_TYPE,
+        user_id=user_id,
+        current_step="upload_images",
+        steps=_initial_steps(),
+        created_at=datetime.now(UTC).isoformat()
+    )
+
 
-        data["status"] = status
-        data["current_step"] = current_step
-        data["progress"] = progress
-        data["updated_at"] = datetime.now(UTC).isoformat()
+async def update_task_progress_async(task_id: str, status: str, current_step: str, progress: int,
+                                     step_details: Dict = None, error: str = None):
+    """
+    更新任务进度（在事件循环中调用）
 
+    链中各步骤在不同的 worker 进程执行，每次更新都立即写入（不节流），
+    下一步骤读取 steps 时总能看到上一步骤的最终状态。
+    """
+    try:
+        fields = {"status": status, "current_step": current_step, "progress": progress}
         if error:
-            data["error"] = error
+            fields["error"] = error
 
-        if step_details and current_step in data["steps"]:
-            data["steps"][current_step].update(step_details)
+        if step_details:
+            snapshot = await task_progress.get(task_id) or {}
+            steps = snapshot.get("steps") or _initial_steps()
+            if current_step in steps:
+                steps[current_step].update(step_details)
+            fields["steps"] = steps
 
-        redis_client.setex(key, 3600, json.dumps(data))
+        await task_progress.update(task_id, force=True, **fields)
         logger.info(f"Task progress updated: {task_id}, step={current_step}, progress={progress}%")
 
     except Exception as e:
         logger.error(f"Failed to update task progress: {e}", exc_info=True)
 
 
+def update_task_progress(task_id: str, status: str, current_step: str, progress: int,
+                        step_details: Dict = None, error: str = None):
+    """更新任务进度（Celery 任务同步代码中调用）"""
+    run_async(update_task_progress_async(task_id, status, current_step, progress, step_details, error))
+
+
 def get_shop_sync(shop_id: int) -> Optional[OzonShop]:
     """同步获取店铺信息"""
     SessionLocal = get_sync_db_session()
@@ -351,7 +335,7 @@ def quick_publish_chain_task(self, dto_dict: Dict, user_id: int, shop_id: int):
     logger.info(f"Quick publish chain started: task_id={task_id}, shop_id={shop_id}")
 
     try:
-        update_task_progress(task_id, status="running", current_step="upload_images", progress=0)
+        run_async(start_task_progress_async(task_id, user_id))
 
         task_chain = chain(
             # Step 1: 上传图片到图床（添加水印）
@@ -583,7 +567,7 @@ def create_product_task(self, prev_result: Dict, dto_dict: Dict, user_id: int, s
 
             return ozon_task_id
 
-        ozon_task_id = run_async_in_celery(submit_import())
+        ozon_task_id = run_async(submit_import())
 
         update_task_progress(
             parent_task_id, status="running", current_step="create_product",
@@ -675,12 +659,7 @@ def upload_images_to_storage_task(self, dto_dict: Dict, shop_id: int, parent_tas
         async def upload_all_images():
             nonlocal storage_type, uploaded_urls
 
-            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-            settings = get_settings()
-            async_engine = create_async_engine(settings.database_url, pool_pre_ping=True)
-            AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
-
-            async with AsyncSession() as db:
+            async with get_task_db_manager().get_session() as db:
                 storage_type_result, storage_service = await get_image_storage_config(db)
                 storage_type = storage_type_result
 
@@ -770,7 +749,7 @@ def upload_images_to_storage_task(self, dto_dict: Dict, shop_id: int, parent_tas
 
                     # 更新进度
                     progress = 5 + int((idx + 1) / len(all_image_sources) * 25)
-                    update_task_progress(
+                    await update_task_progress_async(
                         parent_task_id, status="running", current_step="upload_images",
                         progress=progress,
                         step_details={"status": "running", "total": len(all_image_sources), "uploaded": idx + 1}
@@ -778,7 +757,7 @@ def upload_images_to_storage_task(self, dto_dict: Dict, shop_id: int, parent_tas
 
                 return uploaded
 
-        uploaded_urls = run_async_in_celery(upload_all_images())
+        uploaded_urls = run_async(upload_all_images())
 
         if not uploaded_urls:
             uploaded_urls = [s["source"] for s in all_image_sources]
@@ -879,7 +858,7 @@ def update_product_price_task_legacy(self, prev_result: Dict, dto_dict: Dict, sh
 
         logger.info(f"[Step 4] Calling OZON API update_prices with data: {price_data}")
 
-        result = run_async_in_celery(api_client.update_prices([price_data]))
+        result = run_async(api_client.update_prices([price_data]))
 
         if not result.get('result'):
             logger.warning(f"Price update failed: {result}, continuing...")
@@ -975,7 +954,7 @@ def update_product_stock_task(self, prev_result: Dict, dto_dict: Dict, shop_id:
 
                 # 更新进度（55% -> 90%）
                 progress = 55 + int((attempt + 1) / max_attempts * 35)
-                update_task_progress(
+                await update_task_progress_async(
                     parent_task_id, status="running", current_step="update_stock",
                     progress=progress, step_details={
                         "status": "polling",
@@ -1018,7 +997,7 @@ def update_product_stock_task(self, prev_result: Dict, dto_dict: Dict, shop_id:
                 except Exception as e:
                     logger.warning(f"[Step 3] Failed to get product status: {e}")
 
-                update_task_progress(
+                await update_task_progress_async(
                     parent_task_id, status="running", current_step="update_stock",
                     progress=90 + attempt, step_details={
                         "status": "waiting_price_sent",
@@ -1033,7 +1012,7 @@ def update_product_stock_task(self, prev_result: Dict, dto_dict: Dict, shop_id:
 
             logger.info(f"[Step 3] Updating stock: product_id={product_id}, stock={stock}, warehouse_id={warehouse_id}")
 
-            update_task_progress(
+            await update_task_progress_async(
                 parent_task_id, status="running", current_step="update_stock",
                 progress=98, step_details={"status": "updating_stock", "product_id": product_id}
             )
@@ -1060,7 +1039,7 @@ def update_product_stock_task(self, prev_result: Dict, dto_dict: Dict, shop_id:
 
             return product_id
 
-        product_id = run_async_in_celery(poll_and_update_stock())
+        product_id = run_async(poll_and_update_stock())
 
         update_task_progress(
             parent_task_id, status="completed", current_step="update_stock",
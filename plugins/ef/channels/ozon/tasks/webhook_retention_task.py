@@ -0,0 +1,88 @@
+"""
+Webhook 事件保留期清理定时任务
+
+ozon_webhook_events 只用于排查与失败重试，按状态保留：
+- processed / ignored：保留 30 天
+- failed：保留 90 天（便于人工重试）
+- pending：不清理（等待 worker 恢复扫描）
+
+分批删除（每批按主键取一段），避免长事务和大范围锁；空间回收交给 autovacuum。
+
+说明：没有采用按时间分区，因为 event_id 唯一约束是去重的最终保障，
+分区表的唯一约束必须包含分区键，会失去跨分区去重。
+"""
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Any, Dict
+
+from sqlalchemy import and_, delete, select
+
+from ef_core.database import get_task_db_manager
+
+logger = logging.getLogger(__name__)
+
+
+# 保留天数（按状态）
+RETENTION_DAYS = {
+    "processed": 30,
+    "ignored": 30,
+    "failed": 90,
+}
+DELETE_BATCH_SIZE = 5000
+# 批次间隔（秒），给在线写入让出 IO
+DELAY_BETWEEN_BATCHES = 0.2
+
+
+async def cleanup_webhook_events_async(**kwargs) -> Dict[str, Any]:
+    """
+    Webhook 事件清理定时任务
+
+    Args:
+        **kwargs: 由 register_cron 注入的上下文参数（如 _plugin）
+    """
+    from ..models.sync import OzonWebhookEvent
+    from ..utils.datetime_utils import utcnow
+
+    db_manager = get_task_db_manager()
+    deleted: Dict[str, int] = {}
+
+    for status, days in RETENTION_DAYS.items():
+        cutoff = utcnow() - timedelta(days=days)
+        deleted[status] = 0
+
+        while True:
+            async with db_manager.get_session() as db:
+                batch_ids = (
+                    select(OzonWebhookEvent.id)
+                    .where(and_(
+                        OzonWebhookEvent.status == status,
+                        OzonWebhookEvent.created_at < cutoff,
+                    ))
+                    .order_by(OzonWebhookEvent.id)
+                    .limit(DELETE_BATCH_SIZE)
+                    .scalar_subquery()
+                )
+                result = await db.execute(
+                    delete(OzonWebhookEvent).where(OzonWebhookEvent.id.in_(batch_ids))
+                )
+                await db.commit()
+
+            deleted[status] += result.rowcount
+            if result.rowcount < DELETE_BATCH_SIZE:
+                break
+            await asyncio.sleep(DELAY_BETWEEN_BATCHES)
+
+    total = sum(deleted.values())
+    logger.info(f"Webhook 事件清理完成: 删除 {total} 条 {deleted}")
+
+    # 记录任务结果到数据库
+    from ef_core.tasks.task_logger import update_task_result
+    update_task_result(
+        task_name="ef.ozon.webhooks.cleanup",
+        records_processed=total,
+        records_updated=total,
+        extra_data={"deleted": deleted},
+    )
+
+    return {"success": True, "deleted": deleted, "retention_days": RETENTION_DAYS}
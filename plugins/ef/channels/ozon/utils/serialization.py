@@ -1,6 +1,8 @@
 """
 Ozon 数据序列化工具函数
 """
+import hashlib
+import json
 from decimal import Decimal
 from typing import Any, Optional, Union
 
@@ -104,4 +106,20 @@ def serialize_order_amounts(order_dict: dict) -> dict:
                 if 'total_price' in product and product['total_price'] is not None:
                     product['total_price'] = format_currency(product['total_price'])
 
-    return order_dict
\ No newline at end of file
+    return order_dict
+
+
+def content_hash(data: Any) -> str:
+    """
+    计算 OZON 返回数据的内容哈希（用于变更检测）
+
+    键排序后序列化，字段顺序不同但内容相同的数据得到相同哈希。
+
+    Args:
+        data: 可 JSON 序列化的数据（dict/list）
+
+    Returns:
+        32位十六进制 MD5 摘要
+    """
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
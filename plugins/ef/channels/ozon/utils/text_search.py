@@ -0,0 +1,22 @@
+"""
+本地搜索文本归一化
+
+字典值、类目名称的本地搜索共用：小写，ё 归一为 е，NFKC 折叠全角字母数字。
+"""
+import unicodedata
+
+
+def normalize_search_text(text: str) -> str:
+    """
+    查询词/名称归一化
+
+    与字典值 search_text 生成表达式一致（小写，ё 归一为 е）；另做 NFKC 折叠全角字母数字
+    """
+    return unicodedata.normalize("NFKC", text).strip().lower().replace("ё", "е")
+
+
+def min_search_length(text: str) -> int:
+    """最短搜索长度：含中文时单字即可，其它语言至少 2 个字符"""
+    if any("\u4e00" <= ch <= "\u9fff" or "\u3400" <= ch <= "\u4dbf" for ch in text):
+        return 1
+    return 2
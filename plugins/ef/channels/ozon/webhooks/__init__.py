@@ -1,5 +1,13 @@
 """Ozon Webhook 处理模块"""
 
 from .handler import OzonWebhookHandler
+from .queue import enqueue_webhook
+from .worker import WebhookWorkerPool, get_queue_stats, get_webhook_worker_pool
 
-__all__ = ["OzonWebhookHandler"]
\ No newline at end of file
+__all__ = [
+    "OzonWebhookHandler",
+    "enqueue_webhook",
+    "WebhookWorkerPool",
+    "get_queue_stats",
+    "get_webhook_worker_pool",
+]
@@ -0,0 +1,129 @@
+"""
+Ozon Webhook 去重（快速路径）
+
+三层判重，越靠前越便宜：
+1. 进程内最近事件缓存：同一进程收到的重复推送直接拒绝，不访问 Redis
+2. Redis SET NX + TTL：跨进程判重，重复推送不会进入队列，也不会访问 Postgres
+3. ozon_webhook_events.event_id 唯一约束：最终保障（worker 落库时 ON CONFLICT DO NOTHING）
+
+说明：进程内缓存使用精确的有界集合而不是布隆过滤器，
+布隆过滤器的误判会把真实事件当作重复丢弃，而 OZON 不会再推送同一事件。
+"""
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+try:
+    from prometheus_client import Counter
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import get_redis
+
+logger = get_logger(__name__)
+
+
+if PROMETHEUS_AVAILABLE:
+    _DEDUP_HITS = Counter(
+        'ef_ozon_webhook_dedup_total',
+        'OZON webhook dedup decisions',
+        ['layer', 'result'],
+    )
+
+
+SEEN_KEY_PREFIX = "ef:ozon:webhooks:seen"
+# OZON 重试窗口远小于 3 天；超过 TTL 的重复推送由数据库唯一约束兜底
+SEEN_TTL_SECONDS = 3 * 24 * 3600
+# 进程内缓存
+LOCAL_MAX_KEYS = 50_000
+LOCAL_TTL_SECONDS = 3600
+
+
+class WebhookDeduplicator:
+    """Webhook 事件去重器"""
+
+    def __init__(self, max_keys: int = LOCAL_MAX_KEYS, local_ttl: float = LOCAL_TTL_SECONDS):
+        self.max_keys = max_keys
+        self.local_ttl = local_ttl
+        self._recent: "OrderedDict[str, float]" = OrderedDict()
+
+    @staticmethod
+    def _key(shop_id: int, event_id: str) -> str:
+        return f"{shop_id}:{event_id}"
+
+    def _seen_locally(self, key: str) -> bool:
+        expires_at = self._recent.get(key)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            del self._recent[key]
+            return False
+        return True
+
+    def _remember(self, key: str) -> None:
+        self._recent[key] = time.monotonic() + self.local_ttl
+        self._recent.move_to_end(key)
+        while len(self._recent) > self.max_keys:
+            self._recent.popitem(last=False)
+
+    async def claim(self, shop_id: int, event_id: str) -> bool:
+        """
+        登记事件
+
+        Returns:
+            True 表示首次出现（应入队）；False 表示重复推送
+        """
+        key = self._key(shop_id, event_id)
+
+        if self._seen_locally(key):
+            self._record("local", "duplicate")
+            return False
+
+        try:
+            redis_client = await get_redis()
+            first_seen = await redis_client.set(
+                f"{SEEN_KEY_PREFIX}:{key}", "1", nx=True, ex=SEEN_TTL_SECONDS
+            )
+        except RedisError as e:
+            # Redis 不可用时放行，由数据库唯一约束兜底
+            logger.warning(f"Webhook dedup unavailable, falling back to database guard: {e}")
+            self._record("redis", "unavailable")
+            return True
+
+        self._remember(key)
+        if not first_seen:
+            self._record("redis", "duplicate")
+            return False
+
+        self._record("redis", "new")
+        return True
+
+    async def release(self, shop_id: int, event_id: str) -> None:
+        """入队失败时撤销登记，让 OZON 的重试能够重新进入"""
+        key = self._key(shop_id, event_id)
+        self._recent.pop(key, None)
+        try:
+            redis_client = await get_redis()
+            await redis_client.delete(f"{SEEN_KEY_PREFIX}:{key}")
+        except RedisError as e:
+            logger.warning(f"Failed to release webhook dedup key {key}: {e}")
+
+    @staticmethod
+    def _record(layer: str, result: str) -> None:
+        if PROMETHEUS_AVAILABLE:
+            _DEDUP_HITS.labels(layer=layer, result=result).inc()
+
+
+_deduplicator: Optional[WebhookDeduplicator] = None
+
+
+def get_webhook_deduplicator() -> WebhookDeduplicator:
+    """获取去重器单例"""
+    global _deduplicator
+    if _deduplicator is None:
+        _deduplicator = WebhookDeduplicator()
+    return _deduplicator
@@ -18,6 +18,9 @@ from ef_core.utils.logger import get_logger
 from ..models.sync import OzonWebhookEvent
 from ..services.sync.order_sync.posting_processor import PostingProcessor
 from ..utils.datetime_utils import parse_datetime, utcnow
+from ..utils.serialization import content_hash
+from .dedup import get_webhook_deduplicator
+from .queue import enqueue_webhook
 
 logger = get_logger(__name__)
 
@@ -156,7 +159,7 @@ class OzonWebhookHandler:
         raw_body: bytes,
     ) -> Dict[str, Any]:
         """
-        处理 Webhook 请求
+        接收 Webhook 请求：入队后立即返回，由 worker 池异步处理（见 webhooks/worker.py）
 
         Args:
             event_type: 事件类型（来自X-Event-Type头或其他来源）
@@ -165,11 +168,11 @@ class OzonWebhookHandler:
             raw_body: 原始请求体
 
         Returns:
-            处理结果
+            入队结果
         """
         # 规范化事件类型（支持OZON的TYPE_*格式和payload中的message_type）
         event_type = self.normalize_event_type(event_type, payload)
-        logger.info(f"Processing webhook event: {event_type}")
+        logger.info(f"Queueing webhook event: {event_type}")
 
         # 记录签名信息（OZON实际使用小写的 "signature" 头，不是 "X-Ozon-Signature"）
         signature = headers.get("signature") or headers.get("X-Ozon-Signature", "")
@@ -180,67 +183,39 @@ class OzonWebhookHandler:
         # 注意：OZON的webhook测试包括EMPTY_SIGN、INVALID_SIGN等场景
         # 这些测试都期望返回200，所以我们不验证签名，直接接受所有请求
 
-        # 检查幂等性
-        event_id = headers.get("X-Event-Id", f"{event_type}-{utcnow().timestamp()}")
-        idempotency_key = f"{self.shop_id}-{event_id}"
-
-        db_manager = get_db_manager()
-        async with db_manager.get_session() as session:
-            # 检查是否已处理
-            stmt = select(OzonWebhookEvent).where(
-                OzonWebhookEvent.idempotency_key == idempotency_key
-            )
-            existing_event = await session.scalar(stmt)
+        # 幂等性：没有 X-Event-Id 时按载荷内容生成事件ID，OZON 重试推送的载荷完全相同
+        # Starlette 的请求头字典键为小写
+        event_id = (
+            headers.get("x-event-id")
+            or headers.get("X-Event-Id")
+            or f"{event_type}-{content_hash(payload)}"
+        )
 
-            if existing_event:
-                logger.info(f"Duplicate webhook event: {idempotency_key}")
-                return {
-                    "success": True,
-                    "message": "Event already processed",
-                    "event_id": existing_event.event_id,
-                }
+        deduplicator = get_webhook_deduplicator()
+        if not await deduplicator.claim(self.shop_id, event_id):
+            logger.info(f"Duplicate webhook event: {self.shop_id}-{event_id}")
+            return {
+                "success": True,
+                "message": "Event already processed",
+                "event_id": event_id,
+            }
 
-            # 创建事件记录
-            webhook_event = OzonWebhookEvent(
+        try:
+            message_id = await enqueue_webhook(
+                shop_id=self.shop_id,
                 event_id=event_id,
                 event_type=event_type,
-                shop_id=self.shop_id,
                 payload=payload,
                 headers=dict(headers),
                 signature=signature,
-                is_verified=True,
-                status="processing",
-                idempotency_key=idempotency_key,
             )
-            session.add(webhook_event)
-            await session.commit()
-
-        # 异步处理事件
-        try:
-            result = await self._process_event(event_type, payload, webhook_event)
-
-            # 更新事件状态
-            async with db_manager.get_session() as session:
-                webhook_event.status = "processed"
-                webhook_event.processed_at = utcnow()
-                session.add(webhook_event)
-                await session.commit()
-
-            return {"success": True, "event_id": event_id, "result": result}
-
         except Exception as e:
-            logger.error(f"Failed to process webhook event {event_id}: {e}")
-
-            # 更新事件为失败状态
-            async with db_manager.get_session() as session:
-                webhook_event.status = "failed"
-                webhook_event.error_message = str(e)
-                webhook_event.retry_count += 1
-                session.add(webhook_event)
-                await session.commit()
-
+            logger.error(f"Failed to queue webhook event {event_id}: {e}")
+            await deduplicator.release(self.shop_id, event_id)
             return {"success": False, "event_id": event_id, "error": str(e)}
 
+        return {"success": True, "event_id": event_id, "queued": True, "message_id": message_id}
+
     async def _process_event(
         self, event_type: str, payload: Dict[str, Any], webhook_event: OzonWebhookEvent
     ) -> Dict[str, Any]:
@@ -376,19 +351,25 @@ class OzonWebhookHandler:
                 webhook_event.entity_type = "posting"
                 webhook_event.entity_id = posting.posting_number
 
-                # 如果状态变为"awaiting_deliver"（等待发运），自动下载PDF标签
+                # 如果状态变为"awaiting_deliver"（等待发运），加入标签预缓存队列（45秒后处理）
                 if new_status == "awaiting_deliver":
                     logger.info(
                         f"Posting {posting_number} awaiting_deliver, "
-                        "triggering label download (45s delay)"
-                    )
-                    # 使用Celery后台任务，45秒后执行
-                    from ..tasks import download_label_pdf_task
-
-                    download_label_pdf_task.apply_async(
-                        args=[posting_number, posting.shop_id],
-                        countdown=45,
+                        "queueing label prefetch (45s delay)"
                     )
+                    from ..services.label_prefetch_worker import enqueue_label_prefetch
+
+                    try:
+                        await enqueue_label_prefetch(posting.shop_id, [posting_number])
+                    except Exception as e:
+                        # 队列不可用时退回 Celery 后台任务
+                        logger.warning(f"Label prefetch queue unavailable, falling back to Celery: {e}")
+                        from ..tasks import download_label_pdf_task
+
+                        download_label_pdf_task.apply_async(
+                            args=[posting_number, posting.shop_id],
+                            countdown=45,
+                        )
 
                 # 发送 WebSocket 通知（全局广播）
                 try:
@@ -0,0 +1,143 @@
+"""
+Ozon Webhook 持久化队列（生产端）
+
+接收端只做一次写入即返回：
+- 正常路径：XADD 到 Redis Stream（按排序键分片，同一 posting 始终落在同一分片）
+- 降级路径：Redis 不可用时，单条 INSERT 一条 pending 状态的 OzonWebhookEvent，
+  由 worker 的恢复扫描重新入队
+
+消费端见 webhooks/worker.py
+"""
+import json
+import zlib
+from typing import Any, Dict, Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy.dialects.postgresql import insert
+
+from ef_core.database import get_db_manager
+from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import get_redis
+
+from ..models.sync import OzonWebhookEvent
+from ..utils.datetime_utils import utcnow
+
+logger = get_logger(__name__)
+
+
+# 分片数量：同一排序键（posting/聊天/商品）只会进入一个分片，分片内严格按序消费
+SHARD_COUNT = 8
+
+STREAM_PREFIX = "ef:ozon:webhooks"
+CONSUMER_GROUP = "ef:group:ozon-webhooks"
+DLQ_STREAM = f"{STREAM_PREFIX}:dlq"
+LEASE_PREFIX = f"{STREAM_PREFIX}:lease"
+
+# Stream 近似上限（XADD MAXLEN ~），已确认的消息会被逐步裁剪
+STREAM_MAXLEN = 100_000
+DLQ_MAXLEN = 10_000
+
+# 降级写库时使用的状态，worker 恢复扫描据此重新入队
+PENDING_STATUS = "pending"
+
+
+def shard_stream(shard: int) -> str:
+    """分片对应的 Stream 名称"""
+    return f"{STREAM_PREFIX}:{shard}"
+
+
+def ordering_key(shop_id: int, event_type: str, payload: Dict[str, Any]) -> str:
+    """
+    事件排序键
+
+    同一个 posting 的状态推送必须按到达顺序处理（TYPE_NEW_POSTING → TYPE_STATE_CHANGED …），
+    其次是聊天、商品；无法识别实体的事件按事件类型归组。
+    """
+    entity = (
+        payload.get("posting_number")
+        or payload.get("chat_id")
+        or payload.get("product_id")
+        or payload.get("offer_id")
+        or event_type
+    )
+    return f"{shop_id}:{entity}"
+
+
+def shard_for(key: str) -> int:
+    """排序键 → 分片（crc32 在各进程间稳定，不能用内置 hash）"""
+    return zlib.crc32(key.encode("utf-8")) % SHARD_COUNT
+
+
+def build_message(
+    shop_id: int,
+    event_id: str,
+    event_type: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    signature: str,
+) -> Dict[str, str]:
+    """构造 Stream 消息字段（Redis 字段只能是字符串）"""
+    return {
+        "shop_id": str(shop_id),
+        "event_id": event_id,
+        "event_type": event_type,
+        "payload": json.dumps(payload, ensure_ascii=False, default=str),
+        "headers": json.dumps(headers, ensure_ascii=False, default=str),
+        "signature": signature or "",
+    }
+
+
+async def enqueue_webhook(
+    shop_id: int,
+    event_id: str,
+    event_type: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    signature: str,
+) -> Optional[str]:
+    """
+    Webhook 入队（接收端唯一的一次写入）
+
+    Returns:
+        Stream 消息ID；降级写库时返回 None
+    """
+    fields = build_message(shop_id, event_id, event_type, payload, headers, signature)
+    stream = shard_stream(shard_for(ordering_key(shop_id, event_type, payload)))
+
+    try:
+        redis_client = await get_redis()
+        return await redis_client.xadd(stream, fields, maxlen=STREAM_MAXLEN, approximate=True)
+    except RedisError as e:
+        logger.warning(f"Webhook stream unavailable, persisting event {event_id} to database: {e}")
+
+    await _persist_pending(shop_id, event_id, event_type, payload, headers, signature)
+    return None
+
+
+async def _persist_pending(
+    shop_id: int,
+    event_id: str,
+    event_type: str,
+    payload: Dict[str, Any],
+    headers: Dict[str, str],
+    signature: str,
+) -> None:
+    """降级路径：单条 INSERT，重复的 event_id 直接忽略"""
+    stmt = insert(OzonWebhookEvent).values(
+        event_id=event_id,
+        event_type=event_type,
+        shop_id=shop_id,
+        payload=payload,
+        headers=headers,
+        signature=signature,
+        is_verified=True,
+        status=PENDING_STATUS,
+        retry_count=0,
+        idempotency_key=f"{shop_id}-{event_id}",
+        created_at=utcnow(),
+        updated_at=utcnow(),
+    ).on_conflict_do_nothing(index_elements=["event_id"])
+
+    async with get_db_manager().get_session() as session:
+        await session.execute(stmt)
+        await session.commit()
@@ -0,0 +1,564 @@
+"""
+Ozon Webhook 队列消费者（worker 池）
+
+消费 webhooks/queue.py 写入的分片 Stream：
+- 分片租约：每个分片同一时刻只由一个进程消费（SET NX PX + 续约），
+  消费者名按分片固定，接管分片时先读取该消费者的未确认消息（ID "0"），崩溃不丢消息
+- 批处理：每批一次 INSERT ... ON CONFLICT DO NOTHING 落库（event_id 去重），
+  一次批量更新处理状态，一次 XACK
+- 顺序：批内按排序键分组，同一 posting 串行、不同 posting 并发
+- 重试：指数退避原地重试（保证同一 posting 的顺序），超过次数写入死信 Stream
+- 指标：消费延迟、积压、处理结果（prometheus 可选）
+"""
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy import and_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+try:
+    from prometheus_client import Counter, Gauge, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+from ef_core.database import get_db_manager
+from ef_core.utils.logger import get_logger
+from ef_core.utils.redis import PUBSUB, get_redis
+
+from ..models.sync import OzonWebhookEvent
+from ..utils.datetime_utils import utcnow
+from .handler import OzonWebhookHandler
+from .queue import (
+    CONSUMER_GROUP,
+    DLQ_MAXLEN,
+    DLQ_STREAM,
+    LEASE_PREFIX,
+    PENDING_STATUS,
+    SHARD_COUNT,
+    STREAM_MAXLEN,
+    build_message,
+    ordering_key,
+    shard_for,
+    shard_stream,
+)
+
+logger = get_logger(__name__)
+
+
+if PROMETHEUS_AVAILABLE:
+    _QUEUE_LAG = Gauge(
+        'ef_ozon_webhook_queue_lag_seconds',
+        'Age of the oldest OZON webhook message in the batch when it was picked up',
+        ['shard'],
+    )
+    _QUEUE_LATENCY = Histogram(
+        'ef_ozon_webhook_queue_latency_seconds',
+        'Time from OZON webhook enqueue to processing completion',
+        buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+    )
+    _EVENTS = Counter(
+        'ef_ozon_webhook_events_total',
+        'OZON webhook events drained from the queue',
+        ['outcome'],
+    )
+
+
+# 每批读取的消息数
+BATCH_SIZE = 50
+# XREADGROUP 阻塞时间（毫秒）
+BLOCK_MS = 2000
+# 同时执行的事件处理器数量（跨分片共享，限制数据库连接占用）
+PROCESS_CONCURRENCY = 8
+# 原地重试：最多尝试次数与退避基数（1s, 2s, 4s …）
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+# 分片租约
+LEASE_TTL_MS = 30_000
+LEASE_RENEW_INTERVAL = 10
+# 降级写库事件的恢复扫描
+RECOVER_INTERVAL = 60
+RECOVER_AFTER_SECONDS = 300
+RECOVER_BATCH = 200
+RECOVER_MAX_TIMES = 5
+
+_RENEW_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_LEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+@dataclass
+class QueuedWebhook:
+    """从 Stream 读出的一条 Webhook 消息"""
+    message_id: str
+    shop_id: int
+    event_id: str
+    event_type: str
+    payload: Dict[str, Any]
+    headers: Dict[str, Any]
+    signature: str
+
+    # 处理结果（回写数据库）
+    row_id: Optional[int] = None
+    status: str = PENDING_STATUS
+    error_message: Optional[str] = None
+    entity_type: Optional[str] = None
+    entity_id: Optional[str] = None
+    retry_count: int = 0
+    duration_ms: int = 0
+
+    @property
+    def enqueued_at(self) -> float:
+        """入队时间（Stream 消息ID的毫秒时间戳部分）"""
+        return int(self.message_id.split("-", 1)[0]) / 1000
+
+    @classmethod
+    def parse(cls, message_id: str, data: Optional[Dict[str, str]]) -> Optional["QueuedWebhook"]:
+        """解析消息；字段缺失或已被裁剪的消息返回 None（直接确认丢弃）"""
+        if not data or "event_id" not in data:
+            return None
+        try:
+            return cls(
+                message_id=message_id,
+                shop_id=int(data["shop_id"]),
+                event_id=data["event_id"],
+                event_type=data["event_type"],
+                payload=json.loads(data.get("payload") or "{}"),
+                headers=json.loads(data.get("headers") or "{}"),
+                signature=data.get("signature", ""),
+            )
+        except (KeyError, ValueError) as e:
+            logger.error(f"Malformed webhook message {message_id}: {e}")
+            return None
+
+
+class WebhookWorkerPool:
+    """Webhook 队列 worker 池（每个 API 进程一个实例）"""
+
+    def __init__(self):
+        self.instance_id = uuid.uuid4().hex
+        self._running = False
+        self._supervisor: Optional[asyncio.Task] = None
+        self._shard_tasks: Dict[int, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def ensure_started(self) -> None:
+        """在当前事件循环中启动（幂等）"""
+        if self._running:
+            return
+        self._running = True
+        self._semaphore = asyncio.Semaphore(PROCESS_CONCURRENCY)
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info(f"Webhook worker pool started: instance={self.instance_id}")
+
+    async def stop(self) -> None:
+        """停止消费并释放持有的分片租约"""
+        if not self._running:
+            return
+        self._running = False
+
+        tasks = list(self._shard_tasks.values())
+        if self._supervisor:
+            tasks.append(self._supervisor)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            redis_client = await get_redis()
+            release = redis_client.register_script(_RELEASE_LEASE_LUA)
+            for shard in list(self._shard_tasks):
+                await release(keys=[_lease_key(shard)], args=[self.instance_id])
+        except RedisError as e:
+            logger.warning(f"Failed to release webhook shard leases: {e}")
+
+        self._shard_tasks.clear()
+        logger.info(f"Webhook worker pool stopped: instance={self.instance_id}")
+
+    # ------------------------------------------------------------------
+    # 分片租约
+    # ------------------------------------------------------------------
+
+    async def _supervise(self) -> None:
+        """租约管理：抢占空闲分片、续约已持有分片、定期恢复降级写库的事件"""
+        last_recover = 0.0
+
+        while self._running:
+            try:
+                redis_client = await get_redis()
+                renew = redis_client.register_script(_RENEW_LEASE_LUA)
+
+                for shard in range(SHARD_COUNT):
+                    task = self._shard_tasks.get(shard)
+                    owned = False
+                    if task is not None:
+                        owned = bool(await renew(keys=[_lease_key(shard)], args=[self.instance_id, LEASE_TTL_MS]))
+                        if not owned:
+                            logger.warning(f"Lost webhook shard lease: shard={shard}")
+                            task.cancel()
+                            self._shard_tasks.pop(shard)
+                            task = None
+                    if not owned:
+                        owned = bool(await redis_client.set(
+                            _lease_key(shard), self.instance_id, nx=True, px=LEASE_TTL_MS
+                        ))
+                    if owned and (task is None or task.done()):
+                        self._shard_tasks[shard] = asyncio.create_task(self._run_shard(shard))
+
+                # 恢复扫描只由持有 0 号分片的进程执行，避免多进程重复入队
+                if 0 in self._shard_tasks and time.monotonic() - last_recover >= RECOVER_INTERVAL:
+                    last_recover = time.monotonic()
+                    await self._recover_pending_rows()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker supervisor error: {e}", exc_info=True)
+
+            await asyncio.sleep(LEASE_RENEW_INTERVAL)
+
+    # ------------------------------------------------------------------
+    # 分片消费
+    # ------------------------------------------------------------------
+
+    async def _run_shard(self, shard: int) -> None:
+        """消费单个分片：先补处理本分片未确认的消息，再读取新消息"""
+        stream = shard_stream(shard)
+        consumer = f"shard-{shard}"
+        backlog = True
+
+        logger.info(f"Webhook shard consumer started: shard={shard}")
+
+        while self._running:
+            try:
+                # 阻塞读取长时间占用连接，使用 pubsub 连接池
+                redis_client = await get_redis(PUBSUB)
+                if backlog:
+                    await _ensure_group(redis_client, stream)
+                    response = await redis_client.xreadgroup(
+                        CONSUMER_GROUP, consumer, {stream: "0"}, count=BATCH_SIZE
+                    )
+                else:
+                    response = await redis_client.xreadgroup(
+                        CONSUMER_GROUP, consumer, {stream: ">"}, count=BATCH_SIZE, block=BLOCK_MS
+                    )
+
+                entries = response[0][1] if response else []
+                if not entries:
+                    backlog = False
+                    continue
+
+                await self._process_batch(shard, stream, entries)
+
+            except asyncio.CancelledError:
+                logger.info(f"Webhook shard consumer stopped: shard={shard}")
+                raise
+            except Exception as e:
+                logger.error(f"Webhook shard consumer error: shard={shard}, error={e}", exc_info=True)
+                # 出错后回到未确认消息重新处理
+                backlog = True
+                await asyncio.sleep(5)
+
+    async def _process_batch(
+        self, shard: int, stream: str, entries: List[Tuple[str, Optional[Dict[str, str]]]]
+    ) -> None:
+        """处理一批消息：落库去重 → 分组处理 → 批量回写状态 → 批量确认"""
+        message_ids = [message_id for message_id, _ in entries]
+        messages = [m for m in (QueuedWebhook.parse(mid, data) for mid, data in entries) if m]
+
+        if messages:
+            if PROMETHEUS_AVAILABLE:
+                _QUEUE_LAG.labels(shard=str(shard)).set(max(0.0, time.time() - messages[0].enqueued_at))
+
+            to_process = await self._persist_batch(messages)
+            if to_process:
+                groups: Dict[str, List[QueuedWebhook]] = {}
+                for message in to_process:
+                    key = ordering_key(message.shop_id, message.event_type, message.payload)
+                    groups.setdefault(key, []).append(message)
+
+                await asyncio.gather(*(self._process_group(group) for group in groups.values()))
+                await self._save_results(to_process)
+
+            duplicates = len(messages) - len(to_process)
+            if duplicates and PROMETHEUS_AVAILABLE:
+                _EVENTS.labels(outcome="duplicate").inc(duplicates)
+
+        redis_client = await get_redis()
+        await redis_client.xack(stream, CONSUMER_GROUP, *message_ids)
+
+    async def _persist_batch(self, messages: List[QueuedWebhook]) -> List[QueuedWebhook]:
+        """
+        批量落库事件记录（event_id 唯一，重复投递直接忽略）
+
+        Returns:
+            需要处理的消息（记录仍为 pending 的）
+        """
+        now = utcnow()
+        rows = {}
+        for message in messages:
+            rows.setdefault(message.event_id, {
+                "event_id": message.event_id,
+                "event_type": message.event_type,
+                "shop_id": message.shop_id,
+                "payload": message.payload,
+                "headers": message.headers,
+                "signature": message.signature,
+                "is_verified": True,
+                "status": PENDING_STATUS,
+                "retry_count": 0,
+                "idempotency_key": f"{message.shop_id}-{message.event_id}",
+                "created_at": now,
+                "updated_at": now,
+            })
+
+        async with get_db_manager().get_session() as session:
+            await session.execute(
+                insert(OzonWebhookEvent)
+                .values(list(rows.values()))
+                .on_conflict_do_nothing(index_elements=["event_id"])
+            )
+            result = await session.execute(
+                select(OzonWebhookEvent.id, OzonWebhookEvent.event_id, OzonWebhookEvent.status)
+                .where(OzonWebhookEvent.event_id.in_(list(rows)))
+            )
+            existing = {row.event_id: row for row in result}
+            await session.commit()
+
+        to_process = []
+        claimed = set()
+        for message in messages:
+            row = existing.get(message.event_id)
+            if row is None or row.status != PENDING_STATUS or message.event_id in claimed:
+                continue
+            claimed.add(message.event_id)
+            message.row_id = row.id
+            to_process.append(message)
+        return to_process
+
+    async def _process_group(self, group: List[QueuedWebhook]) -> None:
+        """同一排序键的消息严格按序处理"""
+        for message in group:
+            async with self._semaphore:
+                await self._process_message(message)
+
+    async def _process_message(self, message: QueuedWebhook) -> None:
+        """处理单条消息（指数退避原地重试，失败写入死信队列）"""
+        handler = OzonWebhookHandler(shop_id=message.shop_id, webhook_secret="")
+        start = time.perf_counter()
+
+        for attempt in range(MAX_ATTEMPTS):
+            message.retry_count = attempt
+            # 处理器只会修改事件对象的状态/关联实体字段，使用游离对象承载
+            webhook_event = OzonWebhookEvent(
+                id=message.row_id,
+                event_id=message.event_id,
+                event_type=message.event_type,
+                shop_id=message.shop_id,
+                payload=message.payload,
+                status="processing",
+                retry_count=attempt,
+            )
+            try:
+                await handler._process_event(message.event_type, message.payload, webhook_event)
+            except Exception as e:
+                message.status = "failed"
+                message.error_message = str(e)[:1000]
+                logger.warning(
+                    f"Webhook event {message.event_id} failed (attempt {attempt + 1}/{MAX_ATTEMPTS}): {e}"
+                )
+                if attempt + 1 < MAX_ATTEMPTS:
+                    await asyncio.sleep(RETRY_BASE_DELAY * (2 ** attempt))
+                continue
+
+            message.status = "ignored" if webhook_event.status == "ignored" else "processed"
+            message.entity_type = webhook_event.entity_type
+            message.entity_id = webhook_event.entity_id
+            message.error_message = None
+            break
+
+        message.duration_ms = int((time.perf_counter() - start) * 1000)
+
+        if message.status == "failed":
+            await self._dead_letter(message)
+
+        if PROMETHEUS_AVAILABLE:
+            _EVENTS.labels(outcome=message.status).inc()
+            _QUEUE_LATENCY.observe(max(0.0, time.time() - message.enqueued_at))
+
+    async def _dead_letter(self, message: QueuedWebhook) -> None:
+        """写入死信 Stream（数据库记录同时标记为 failed，可通过 /events/{id}/retry 重试）"""
+        fields = build_message(
+            message.shop_id, message.event_id, message.event_type,
+            message.payload, message.headers, message.signature,
+        )
+        fields.update({
+            "source_id": message.message_id,
+            "error": message.error_message or "",
+            "attempts": str(MAX_ATTEMPTS),
+            "failed_at": utcnow().isoformat(),
+        })
+        try:
+            redis_client = await get_redis()
+            await redis_client.xadd(DLQ_STREAM, fields, maxlen=DLQ_MAXLEN, approximate=True)
+        except RedisError as e:
+            logger.error(f"Failed to dead-letter webhook event {message.event_id}: {e}")
+
+        if PROMETHEUS_AVAILABLE:
+            _EVENTS.labels(outcome="dead_lettered").inc()
+
+    async def _save_results(self, messages: List[QueuedWebhook]) -> None:
+        """批量回写处理结果（按主键 executemany）"""
+        now = utcnow()
+        params = []
+        for message in messages:
+            params.append({
+                "id": message.row_id,
+                "status": message.status,
+                "processed_at": now if message.status != "failed" else None,
+                "retry_count": message.retry_count,
+                "error_message": message.error_message,
+                "entity_type": message.entity_type,
+                "entity_id": message.entity_id,
+                "processing_duration_ms": message.duration_ms,
+                "updated_at": now,
+            })
+
+        async with get_db_manager().get_session() as session:
+            await session.execute(update(OzonWebhookEvent), params)
+            await session.commit()
+
+    # ------------------------------------------------------------------
+    # 降级写库事件恢复
+    # ------------------------------------------------------------------
+
+    async def _recover_pending_rows(self) -> None:
+        """将 Redis 不可用期间直接落库的 pending 事件重新入队"""
+        cutoff = utcnow() - timedelta(seconds=RECOVER_AFTER_SECONDS)
+        async with get_db_manager().get_session() as session:
+            result = await session.execute(
+                select(OzonWebhookEvent)
+                .where(and_(
+                    OzonWebhookEvent.status == PENDING_STATUS,
+                    OzonWebhookEvent.updated_at < cutoff,
+                ))
+                .order_by(OzonWebhookEvent.id)
+                .limit(RECOVER_BATCH)
+            )
+            events = result.scalars().all()
+            if not events:
+                return
+
+            redis_client = await get_redis()
+            requeued = 0
+            for event in events:
+                event.updated_at = utcnow()
+                if (event.retry_count or 0) >= RECOVER_MAX_TIMES:
+                    event.status = "failed"
+                    event.error_message = "Webhook event could not be requeued"
+                    continue
+
+                event.retry_count = (event.retry_count or 0) + 1
+                key = ordering_key(event.shop_id, event.event_type, event.payload or {})
+                await redis_client.xadd(
+                    shard_stream(shard_for(key)),
+                    build_message(
+                        event.shop_id, event.event_id, event.event_type,
+                        event.payload or {}, event.headers or {}, event.signature or "",
+                    ),
+                    maxlen=STREAM_MAXLEN,
+                    approximate=True,
+                )
+                requeued += 1
+
+            await session.commit()
+
+        logger.info(f"Requeued {requeued} pending webhook events from database")
+
+
+def _lease_key(shard: int) -> str:
+    return f"{LEASE_PREFIX}:{shard}"
+
+
+async def _ensure_group(redis_client, stream: str) -> None:
+    """创建消费组（已存在则忽略）"""
+    try:
+        await redis_client.xgroup_create(stream, CONSUMER_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+async def get_queue_stats() -> Dict[str, Any]:
+    """
+    队列状态：各分片长度、未确认数、未投递数、最旧未确认消息的等待时间、租约持有者，以及死信数量
+    """
+    redis_client = await get_redis()
+    now_ms = int(time.time() * 1000)
+    shards = []
+
+    for shard in range(SHARD_COUNT):
+        stream = shard_stream(shard)
+        length = await redis_client.xlen(stream)
+        pending = 0
+        undelivered = None
+        oldest_pending_seconds = None
+        if length:
+            try:
+                for group in await redis_client.xinfo_groups(stream):
+                    if group.get("name") == CONSUMER_GROUP:
+                        # Redis 7+ 才提供 lag（尚未投递给消费者的消息数）
+                        undelivered = group.get("lag")
+                summary = await redis_client.xpending(stream, CONSUMER_GROUP)
+                pending = summary.get("pending", 0)
+                if pending and summary.get("min"):
+                    oldest_ms = int(summary["min"].split("-", 1)[0])
+                    oldest_pending_seconds = round((now_ms - oldest_ms) / 1000, 1)
+            except ResponseError:
+                pass
+
+        shards.append({
+            "shard": shard,
+            "length": length,
+            "pending": pending,
+            "undelivered": undelivered,
+            "oldest_pending_seconds": oldest_pending_seconds,
+            "owner": await redis_client.get(_lease_key(shard)),
+        })
+
+    return {
+        "shards": shards,
+        "pending": sum(s["pending"] for s in shards),
+        "dead_letter": await redis_client.xlen(DLQ_STREAM),
+    }
+
+
+_worker_pool: Optional[WebhookWorkerPool] = None
+
+
+def get_webhook_worker_pool() -> WebhookWorkerPool:
+    """获取 worker 池单例"""
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = WebhookWorkerPool()
+    return _worker_pool
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Celery 任务调度开销基准测试
+
+对比单个任务在两种执行方式下的固定开销（任务体只做一次 SELECT 1）：
+- before：旧的任务包装方式，每次任务 new_event_loop() + create_async_engine()，
+  执行 SELECT 1 后 dispose() 引擎并关闭事件循环（每次都重新建立连接、完成认证）
+- after：ef_core.tasks.async_runner.run_async()，在 worker 进程的常驻事件循环上执行，
+  复用 get_task_db_manager() 的共享引擎和连接池
+
+--no-db 只比较事件循环本身的开销（任务体为空协程），无需数据库。
+
+用法:
+    python scripts/benchmarks/bench_celery_task_overhead.py
+    python scripts/benchmarks/bench_celery_task_overhead.py --tasks 500
+    python scripts/benchmarks/bench_celery_task_overhead.py --no-db --tasks 5000
+
+依赖:
+    celery（导入 async_runner）；不加 --no-db 时需要 EF__DB_* 环境变量指向可连接的 PostgreSQL
+
+输出列:
+    impl、任务数、总耗时、每任务平均耗时（ms）、p95（ms）
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import structlog  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+
+from ef_core.config import get_settings  # noqa: E402
+from ef_core.database import get_task_db_manager  # noqa: E402
+from ef_core.tasks.async_runner import run_async, shutdown_worker_loop  # noqa: E402
+
+
+async def noop() -> None:
+    return None
+
+
+async def select_one_shared() -> None:
+    async with get_task_db_manager().create_async_engine().connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+async def select_one_fresh_engine() -> None:
+    """旧实现：每个任务创建并释放独立引擎"""
+    engine = create_async_engine(get_settings().database_url, pool_pre_ping=True)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    finally:
+        await engine.dispose()
+
+
+def run_in_new_loop(coro_fn) -> None:
+    """旧的任务包装：每次任务一个新事件循环"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(coro_fn())
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+
+
+def measure(label: str, count: int, fn) -> None:
+    durations = []
+    started = time.perf_counter()
+    for _ in range(count):
+        t0 = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - started
+
+    p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) >= 20 else max(durations)
+    print(f"{label:<8} {count:>7} {elapsed:>9.2f} {statistics.mean(durations):>10.3f} {p95:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Celery task overhead benchmark")
+    parser.add_argument("--tasks", type=int, default=200, help="tasks per implementation")
+    parser.add_argument("--no-db", action="store_true", help="measure event loop overhead only")
+    args = parser.parse_args()
+
+    # 引擎创建日志会淹没结果，基准测试期间关闭
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    logging.disable(logging.INFO)
+
+    before_body = noop if args.no_db else select_one_fresh_engine
+    after_body = noop if args.no_db else select_one_shared
+
+    # 预热：常驻循环启动、共享连接池建立首个连接（worker 进程启动时一次性完成）
+    run_async(after_body())
+
+    print(f"mode: {'event loop only' if args.no_db else 'SELECT 1 per task'}")
+    print(f"{'impl':<8} {'tasks':>7} {'seconds':>9} {'avg_ms':>10} {'p95_ms':>10}")
+    measure("before", args.tasks, lambda: run_in_new_loop(before_body))
+    measure("after", args.tasks, lambda: run_async(after_body()))
+
+    shutdown_worker_loop()
+
+
+if __name__ == "__main__":
+    main()
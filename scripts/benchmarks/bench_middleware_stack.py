@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+中间件栈吞吐基准测试
+
+对比同一个极简端点在两套中间件栈下的 req/s：
+- before：原 BaseHTTPMiddleware 栈（日志中间件缓冲完整响应体、指标中间件、认证中间件各一层
+  BaseHTTPMiddleware，耗时日志在事件循环上同步 open().write()）
+- after：InstrumentationMiddleware（原生 ASGI，一次包装完成 trace_id/日志/指标/耗时日志，
+  日志经有界队列由后台线程写出）+ 原生 ASGI 认证中间件（端点为公开路径，直接放行）
+
+请求在进程内通过 httpx.ASGITransport 发出，不经过网络，测得的差异即中间件本身的开销。
+
+用法:
+    python scripts/benchmarks/bench_middleware_stack.py
+    python scripts/benchmarks/bench_middleware_stack.py --requests 20000 --concurrency 64
+
+依赖:
+    fastapi、httpx；无需数据库/Redis（认证中间件不可导入时 after 栈跳过认证层并给出提示）
+
+输出列:
+    stack、请求数、耗时、req/s、p50/p99 延迟
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI, Request  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+from starlette.responses import StreamingResponse  # noqa: E402
+
+from ef_core.middleware.instrumentation import InstrumentationMiddleware  # noqa: E402
+from ef_core.middleware.metrics import PROMETHEUS_AVAILABLE, endpoint_pattern  # noqa: E402
+from ef_core.utils.logger import LogContext, get_logger, setup_logging  # noqa: E402
+
+if PROMETHEUS_AVAILABLE:
+    from ef_core.middleware.metrics import REQUEST_COUNT, REQUEST_DURATION  # noqa: E402
+
+# 公开前缀下的路径：认证中间件直接放行，两套栈都走完整的日志/指标/耗时日志流程
+BENCH_PATH = "/api/ef/v1/ozon/sync-services/bench"
+
+
+# ========== before：原 BaseHTTPMiddleware 栈（行为与替换前一致） ==========
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+        self.logger = get_logger("middleware.logging")
+
+    async def dispatch(self, request: Request, call_next):
+        trace_id = str(uuid.uuid4())
+        request.state.trace_id = trace_id
+        start_time = time.time()
+        with LogContext(trace_id=trace_id):
+            self.logger.info("API request", method=request.method, path=request.url.path, url=str(request.url))
+            response = await call_next(request)
+            body = None
+            if not isinstance(response, StreamingResponse):
+                chunks = b""
+                async for chunk in response.body_iterator:
+                    chunks += chunk
+                body = chunks
+
+                async def body_iterator():
+                    yield chunks
+
+                response.body_iterator = body_iterator()
+            self.logger.info(
+                "API response",
+                status_code=response.status_code,
+                latency_ms=int((time.time() - start_time) * 1000),
+                response_body=body.decode("utf-8", errors="replace") if body else None,
+            )
+            response.headers["X-Trace-Id"] = trace_id
+            return response
+
+
+class LegacyMetricsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        endpoint = endpoint_pattern.__wrapped__(request.url.path)
+        start_time = time.time()
+        response = await call_next(request)
+        if PROMETHEUS_AVAILABLE:
+            REQUEST_COUNT.labels(method=request.method, endpoint=endpoint, status_code=str(response.status_code)).inc()
+            REQUEST_DURATION.labels(method=request.method, endpoint=endpoint).observe(time.time() - start_time)
+        return response
+
+
+class LegacyPassthroughMiddleware(BaseHTTPMiddleware):
+    """代表原 BaseHTTPMiddleware 认证层（公开路径直接 call_next）"""
+
+    async def dispatch(self, request: Request, call_next):
+        return await call_next(request)
+
+
+class LegacyApiCostMiddleware:
+    def __init__(self, app, log_file: Path):
+        self.app = app
+        self.log_file = log_file
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start_time = time.perf_counter()
+        status_code = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration_ms = (time.perf_counter() - start_time) * 1000
+            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(f"{timestamp} | {scope['method']:6s} | {scope['path']:60s} | {status_code:3d} | {duration_ms:8.2f}ms | -\n")
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get(BENCH_PATH)
+    async def bench():
+        return {"ok": True}
+
+    return app
+
+
+def build_before(log_dir: Path) -> FastAPI:
+    app = build_app()
+    app.add_middleware(LegacyMetricsMiddleware)
+    app.add_middleware(LegacyApiCostMiddleware, log_file=log_dir / "api_cost_before.log")
+    app.add_middleware(LegacyLoggingMiddleware)
+    app.add_middleware(LegacyPassthroughMiddleware)
+    return app
+
+
+def build_after(log_dir: Path) -> FastAPI:
+    app = build_app()
+    app.add_middleware(InstrumentationMiddleware, metrics_enabled=True, log_dir=str(log_dir))
+    try:
+        from ef_core.middleware.auth import AuthMiddleware
+        app.add_middleware(AuthMiddleware)
+    except ImportError as e:
+        print(f"[warn] AuthMiddleware unavailable ({e}); 'after' stack runs without the auth layer")
+    return app
+
+
+async def run(app: FastAPI, total: int, concurrency: int) -> tuple[float, list[float]]:
+    transport = httpx.ASGITransport(app=app)
+    latencies: list[float] = []
+    remaining = total
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # 预热
+        for _ in range(50):
+            await client.get(BENCH_PATH)
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                response = await client.get(BENCH_PATH)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Middleware stack throughput benchmark")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    devnull = open("/dev/null", "w")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp)
+        print(f"{'stack':<8} {'requests':>9} {'seconds':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, builder in (("before", build_before), ("after", build_after)):
+            # before 同步写 stdout，after 经有界队列由后台线程写出；输出重定向到 /dev/null 避免终端刷屏
+            setup_logging(log_level="INFO", log_format="json", async_stdout=(name == "after"))
+            handler = logging.getLogger().handlers[0]
+            getattr(handler, "target", handler).stream = devnull
+
+            elapsed, latencies = asyncio.run(run(builder(log_dir), args.requests, args.concurrency))
+            latencies.sort()
+            p50 = statistics.median(latencies) * 1000
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+            print(
+                f"{name:<8} {args.requests:>9} {elapsed:>8.2f} {args.requests / elapsed:>9.0f} "
+                f"{p50:>8.2f} {p99:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Posting 批量同步基准测试
+
+验证 PostingProcessor.sync_postings_batch（集合式写入）每批 SQL 语句数
+不随批大小增长。使用合成的 posting 数据，在单个事务内执行后回滚，不留下任何数据。
+
+用法:
+    python scripts/benchmarks/bench_posting_batch.py
+    python scripts/benchmarks/bench_posting_batch.py --sizes 50 200 800 --rounds 3
+
+依赖:
+    EF__DB_* 环境变量指向可写的 PostgreSQL（已执行 alembic upgrade head）
+
+输出列:
+    batch_size、每批语句数（首次插入 / 二次更新）、每批耗时、吞吐
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from sqlalchemy import event  # noqa: E402
+
+from ef_core.database import DatabaseManager  # noqa: E402
+from plugins.ef.channels.ozon.services.sync.order_sync.posting_processor import PostingProcessor  # noqa: E402
+
+# 合成数据使用的店铺ID（ozon_postings.shop_id 无外键；事务最终回滚）
+BENCH_SHOP_ID = -1
+
+
+def make_postings(count: int, prefix: str, status: str = "awaiting_packaging") -> list[dict]:
+    """生成合成 posting（列表接口已带包裹追踪号，不会触发详情接口调用）"""
+    items = []
+    for i in range(count):
+        posting_number = f"{prefix}-{i:06d}-1"
+        items.append({
+            "posting_number": posting_number,
+            "order_id": i,
+            "status": status,
+            "substatus": "posting_created",
+            "in_process_at": "2025-12-01T10:00:00Z",
+            "shipment_date": "2025-12-03T10:00:00Z",
+            "delivery_method": {"id": 1, "name": "bench", "warehouse_id": 1, "warehouse": "bench"},
+            "products": [
+                {"sku": 900000000 + (i % 50), "offer_id": f"bench-{i % 50}", "price": "199.00", "quantity": 1},
+            ],
+            "packages": [
+                {"package_number": f"{posting_number}-pkg", "tracking_number": f"TRK{i:08d}"},
+            ],
+            "tracking_number": f"TRK{i:08d}",
+        })
+    return items
+
+
+async def run(sizes: list[int], rounds: int) -> None:
+    db_manager = DatabaseManager()
+    engine = db_manager.create_async_engine()
+    processor = PostingProcessor()
+    shop = SimpleNamespace(id=BENCH_SHOP_ID, client_id="bench", api_key_enc="bench")
+
+    statements = 0
+
+    def count_statement(*_args, **_kwargs):
+        nonlocal statements
+        statements += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+
+    print(f"{'batch_size':>10}  {'stmts/batch(new)':>16}  {'stmts/batch(update)':>19}  {'ms/batch':>9}  {'postings/s':>10}")
+
+    try:
+        for size in sizes:
+            new_stmts = update_stmts = 0
+            elapsed = 0.0
+
+            for _ in range(rounds):
+                prefix = f"BENCH-{uuid.uuid4().hex[:8]}"
+                async with db_manager.get_session() as db:
+                    # 首次同步：全部为新 posting
+                    statements = 0
+                    start = time.perf_counter()
+                    await processor.sync_postings_batch(db, make_postings(size, prefix), shop)
+                    elapsed += time.perf_counter() - start
+                    new_stmts += statements
+
+                    # 二次同步：状态变化，全部为更新
+                    statements = 0
+                    start = time.perf_counter()
+                    await processor.sync_postings_batch(db, make_postings(size, prefix, "cancelled"), shop)
+                    elapsed += time.perf_counter() - start
+                    update_stmts += statements
+
+                    await db.rollback()
+
+            batches = rounds * 2
+            print(
+                f"{size:>10}  {new_stmts / rounds:>16.1f}  {update_stmts / rounds:>19.1f}  "
+                f"{elapsed * 1000 / batches:>9.1f}  {size * batches / elapsed:>10.0f}"
+            )
+    finally:
+        await db_manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Posting 批量同步基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200, 400, 800])
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.sizes, args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Redis 批量读写基准测试
+
+对比 N 个缓存键在三种访问方式下的耗时：
+- sync：旧实现，在协程中直接调用同步 redis.Redis（每个键一次往返，期间阻塞事件循环）
+- async：逐键 await 异步客户端（每个键一次往返，不阻塞事件循环）
+- batch：ef_core.utils.redis 的 mset/mget（按块 pipeline，一次往返）
+
+同时并发运行一个 1ms 定时器，统计其最大延迟，反映同步调用对事件循环的阻塞。
+
+用法:
+    python scripts/benchmarks/bench_redis_batch.py
+    python scripts/benchmarks/bench_redis_batch.py --keys 1000 --rounds 20
+
+依赖:
+    EF__REDIS_* 环境变量指向可连接的 Redis（写入 ef:bench:* 临时键，结束时删除）
+
+输出列:
+    impl、每轮键数、每轮平均耗时（ms）、p95（ms）、事件循环最大延迟（ms）
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import redis  # noqa: E402
+import structlog  # noqa: E402
+
+from ef_core.config import get_settings  # noqa: E402
+from ef_core.utils.redis import close_redis, get_redis, mget, mset  # noqa: E402
+
+KEY_PREFIX = "ef:bench:redis"
+TTL = 300
+
+
+async def run_sync(keys, values, sync_client) -> None:
+    for key, value in zip(keys, values):
+        sync_client.setex(key, TTL, value)
+    for key in keys:
+        sync_client.get(key)
+
+
+async def run_async(keys, values) -> None:
+    redis_client = await get_redis()
+    for key, value in zip(keys, values):
+        await redis_client.setex(key, TTL, value)
+    for key in keys:
+        await redis_client.get(key)
+
+
+async def run_batch(keys, values) -> None:
+    await mset(dict(zip(keys, values)), ttl=TTL)
+    await mget(keys)
+
+
+async def measure(label: str, count: int, rounds: int, body) -> None:
+    max_lag = 0.0
+    stop = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_lag
+        while not stop.is_set():
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            max_lag = max(max_lag, time.perf_counter() - expected)
+
+    ticker_task = asyncio.create_task(ticker())
+    durations = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        await body()
+        durations.append((time.perf_counter() - t0) * 1000)
+    stop.set()
+    await ticker_task
+
+    p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) >= 20 else max(durations)
+    print(f"{label:<8} {count:>7} {statistics.mean(durations):>10.2f} {p95:>10.2f} {max_lag * 1000:>10.2f}")
+
+
+async def main_async(args) -> None:
+    keys = [f"{KEY_PREFIX}:{i}" for i in range(args.keys)]
+    values = [json.dumps({"id": i, "payload": "x" * 64}) for i in range(args.keys)]
+    sync_client = redis.Redis.from_url(get_settings().redis_url, decode_responses=True)
+
+    print(f"{'impl':<8} {'keys':>7} {'avg_ms':>10} {'p95_ms':>10} {'lag_ms':>10}")
+    try:
+        await measure("sync", args.keys, args.rounds, lambda: run_sync(keys, values, sync_client))
+        await measure("async", args.keys, args.rounds, lambda: run_async(keys, values))
+        await measure("batch", args.keys, args.rounds, lambda: run_batch(keys, values))
+    finally:
+        redis_client = await get_redis()
+        await redis_client.delete(*keys)
+        sync_client.close()
+        await close_redis()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis batch access benchmark")
+    parser.add_argument("--keys", type=int, default=200, help="keys per round")
+    parser.add_argument("--rounds", type=int, default=20, help="rounds per implementation")
+    args = parser.parse_args()
+
+    # 慢命令警告会淹没结果，基准测试期间关闭
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.ERROR))
+
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
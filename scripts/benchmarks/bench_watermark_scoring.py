@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+水印位置评分吞吐基准测试
+
+对比同一批合成商品图在两种实现下的 images/sec：
+- before：原实现（9 个候选位置 × 4 项指标，每项指标各自 convert('L') + np.array 整图，
+  每个区域单独做一次 Sobel，全部在调用线程中串行执行）
+- after-inline：向量化实现（每张图一次灰度转换 + 积分图 + 一次整图 Sobel），当前进程串行
+- after-batch：ImageProcessingService.find_best_watermark_positions，整批提交到进程池
+
+同时校验两种实现在每个区域上的亮度/复杂度/边缘密度是否一致（边缘密度只在区域边界
+处因整图 Sobel 与区域内 Sobel 的边界处理不同而略有差异）。
+
+用法:
+    python scripts/benchmarks/bench_watermark_scoring.py
+    python scripts/benchmarks/bench_watermark_scoring.py --images 48 --size 1200
+
+依赖:
+    numpy、Pillow；无需数据库/Redis/网络
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT))
+
+import numpy as np  # noqa: E402
+import structlog  # noqa: E402
+from PIL import Image, ImageDraw  # noqa: E402
+
+from plugins.ef.channels.ozon.services.image_processing_service import (  # noqa: E402
+    ImageProcessingService,
+    WatermarkPosition,
+)
+from plugins.ef.channels.ozon.services.watermark_scoring import (  # noqa: E402
+    GrayscaleStats,
+    _sobel_edges,
+    compute_region_size,
+    score_watermark_positions,
+    shutdown_scoring_executor,
+)
+
+RATIOS = ImageProcessingService.POSITION_RATIOS
+
+
+def make_images(count: int, size: int) -> list:
+    """生成带色块、文字条纹和噪点的合成商品图"""
+    rng = np.random.default_rng(42)
+    images = []
+    for i in range(count):
+        pixels = rng.integers(235, 256, (size, size, 3), dtype=np.uint8)
+        image = Image.fromarray(pixels, "RGB")
+        draw = ImageDraw.Draw(image)
+        draw.ellipse((size // 4, size // 4, size * 3 // 4, size * 3 // 4), fill=(40 + i % 100, 90, 160))
+        for row in range(8):
+            y = size // 12 + row * 9
+            draw.rectangle((size // 20, y, size // 3, y + 4), fill=(10, 10, 10))
+        images.append(image)
+    return images
+
+
+# ========== before：原实现（每项指标各自转换整图） ==========
+
+def _legacy_region(image, position, region_size, dtype):
+    img_array = np.array(image.convert('L'), dtype=dtype)
+    x_ratio, y_ratio = RATIOS[position]
+    center_x = int(x_ratio * image.width)
+    center_y = int(y_ratio * image.height)
+    x1 = max(0, center_x - region_size[0] // 2)
+    y1 = max(0, center_y - region_size[1] // 2)
+    x2 = min(image.width, center_x + region_size[0] // 2)
+    y2 = min(image.height, center_y + region_size[1] // 2)
+    return img_array[y1:y2, x1:x2]
+
+
+def legacy_metrics(image, position, region_size):
+    brightness = float(np.mean(_legacy_region(image, position, region_size, np.uint8)))
+    complexity = float(np.std(_legacy_region(image, position, region_size, np.uint8)))
+    region = _legacy_region(image, position, region_size, np.float32)
+    edge_density = float(np.count_nonzero(_sobel_edges(region)) / region.size)
+    region = _legacy_region(image, position, region_size, np.int16)
+    grad_x = np.abs(np.diff(region, axis=1))
+    grad_y = np.abs(np.diff(region, axis=0))
+    h_projection = np.sum(grad_x, axis=1)
+    v_projection = np.sum(grad_y, axis=0)
+    _ = (np.std(h_projection), np.std(v_projection), np.mean(h_projection), np.mean(v_projection))
+    return brightness, complexity, edge_density
+
+
+def legacy_score(image, region_size):
+    return [legacy_metrics(image, position, region_size) for position in WatermarkPosition]
+
+
+def verify(image, region_size) -> tuple:
+    """返回 (亮度/复杂度最大误差, 边缘密度最大误差)"""
+    stats = GrayscaleStats(np.asarray(image.convert('L')))
+    max_basic = 0.0
+    max_edge = 0.0
+    for position in WatermarkPosition:
+        brightness, complexity, edge_density = legacy_metrics(image, position, region_size)
+        bounds = stats.region_bounds(*RATIOS[position], region_size)
+        new_brightness, new_complexity = stats.brightness_and_complexity(*bounds)
+        max_basic = max(max_basic, abs(brightness - new_brightness), abs(complexity - new_complexity))
+        max_edge = max(max_edge, abs(edge_density - stats.edge_density(*bounds)))
+    return max_basic, max_edge
+
+
+def timed(label: str, count: int, fn) -> None:
+    started = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<14} {count:>7} {elapsed:>9.2f} {count / elapsed:>11.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watermark position scoring benchmark")
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--size", type=int, default=1000, help="image edge length in pixels")
+    args = parser.parse_args()
+
+    # 逐图评分日志会淹没结果，基准测试期间关闭
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    images = make_images(args.images, args.size)
+    watermark = Image.new("RGBA", (160, 60))
+    region_size = compute_region_size(images[0].size, watermark.size)
+    candidates = [(p.value, *RATIOS[p]) for p in WatermarkPosition]
+
+    max_basic, max_edge = verify(images[0], region_size)
+    print(f"max diff: brightness/complexity={max_basic:.6f}, edge_density={max_edge:.4f}")
+
+    service = ImageProcessingService()
+
+    async def batch():
+        return await service.find_best_watermark_positions(images, watermark)
+
+    # 预热进程池（首批包含进程启动开销）
+    asyncio.run(service.find_best_watermark_positions(images[:1], watermark))
+
+    print(f"{'impl':<14} {'images':>7} {'seconds':>9} {'images/sec':>11}")
+    timed("before", args.images, lambda: [legacy_score(image, region_size) for image in images])
+    timed("after-inline", args.images, lambda: [
+        score_watermark_positions(np.asarray(image.convert('L')), region_size, candidates)
+        for image in images
+    ])
+    timed("after-batch", args.images, lambda: asyncio.run(batch()))
+
+    shutdown_scoring_executor()
+
+
+if __name__ == "__main__":
+    main()
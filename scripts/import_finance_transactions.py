@@ -2,7 +2,7 @@
 OZON财务交易历史数据导入脚本
 
 功能：
-- 从数据库最早订单日期开始，逐天导入财务交易数据
+- 从数据库最早订单日期开始，按窗口（默认 7 天）导入财务交易数据，窗口内各天并发拉取
 - 支持断点续传（通过水位线表记录进度）
 - 错误处理和重试机制
 - 进度显示
@@ -31,6 +31,9 @@ from plugins.ef.channels.ozon.models.finance import OzonFinanceSyncWatermark
 from plugins.ef.channels.ozon.services.finance_transactions_sync_service import get_finance_transactions_sync_service
 from sqlalchemy import select, func
 
+# 每次调用同步服务覆盖的天数（失败时水位线停在首个失败日期之前，重跑即可续传）
+WINDOW_DAYS = 7
+
 
 async def get_earliest_order_date(db, shop_id: int) -> datetime:
     """获取最早订单日期"""
@@ -115,47 +118,43 @@ async def main(shop_id: int, start_date: str, end_date: str):
         print(f"✓ 总计需要同步: {total_days} 天")
         print("=" * 60)
 
-        # 5. 逐天导入
-        current_date = start_date_obj
+        # 5. 按窗口导入（窗口内各天由同步服务并发拉取）
+        window_start = start_date_obj
         success_count = 0
         fail_count = 0
         total_transactions = 0
 
-        while current_date <= end_date_obj:
-            day_index = (current_date - start_date_obj).days + 1
-            print(f"\n[{day_index}/{total_days}] 正在同步 {current_date}...")
+        while window_start <= end_date_obj:
+            window_end = min(window_start + timedelta(days=WINDOW_DAYS - 1), end_date_obj)
+            window_days = (window_end - window_start).days + 1
+            print(f"\n正在同步 {window_start} ~ {window_end}（{window_days} 天）...")
 
             try:
                 # 调用同步服务
                 result = await finance_service.sync_transactions({
-                    "target_date": current_date.isoformat(),
+                    "date_from": window_start.isoformat(),
+                    "date_to": window_end.isoformat(),
                     "shop_id": shop_id
                 })
 
                 synced_count = result.get("records_updated", 0)
                 total_transactions += synced_count
 
-                if synced_count > 0:
+                if result.get("shops"):
                     print(f"  ✓ 成功同步 {synced_count} 条交易记录")
+                    success_count += window_days
                 else:
-                    print(f"  - 该日期无交易数据")
-
-                success_count += 1
+                    # 店铺同步失败时服务层只记录错误和水位线，不抛出异常
+                    print(f"  ❌ 同步失败，详见日志")
+                    fail_count += window_days
+                    break
 
             except Exception as e:
                 print(f"  ❌ 同步失败: {e}")
-                fail_count += 1
-
-                # 错误后是否继续
-                if fail_count >= 5:
-                    print("\n❌ 连续失败次数过多，停止导入")
-                    break
-
-            # 移动到下一天
-            current_date += timedelta(days=1)
+                fail_count += window_days
+                break
 
-            # 避免API限流，稍微延迟
-            await asyncio.sleep(0.5)
+            window_start = window_end + timedelta(days=1)
 
         # 6. 总结
         print("\n" + "=" * 60)
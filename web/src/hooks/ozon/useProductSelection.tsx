@@ -158,6 +158,7 @@ export const useProductSelection = (): UseProductSelectionReturn => {
   const loadingLockRef = useRef(false);
   const lastRequestPageRef = useRef(0);
   const [lastId, setLastId] = useState<number>(0);
+  const [lastCursor, setLastCursor] = useState<string | undefined>(undefined);
   // 搜索版本号，用于强制触发数据更新
   const [searchVersion, setSearchVersion] = useState(0);
 
@@ -316,6 +317,7 @@ export const useProductSelection = (): UseProductSelectionReturn => {
       api.searchProducts({
         ...searchParams,
         after_id: currentPage === 1 ? 0 : lastId,
+        cursor: currentPage === 1 ? undefined : lastCursor,
         limit: currentPage === 1 ? initialPageSize : loadMoreSize,
       }),
     enabled: activeTab === 'search' && isCalculated,
@@ -335,18 +337,20 @@ export const useProductSelection = (): UseProductSelectionReturn => {
   useEffect(() => {
     if (!productsData?.data) return;
 
-    const { items = [], has_more } = productsData.data;
+    const { items = [], has_more, cursor } = productsData.data;
 
     if (currentPage === 1) {
       setAllProducts(items);
       setHasMoreData(has_more ?? false);
       if (items.length > 0) {
         setLastId(items[items.length - 1].id);
+        setLastCursor(cursor ?? undefined);
       }
     } else if (items.length > 0) {
       setAllProducts((prev) => [...prev, ...items]);
       setHasMoreData(has_more ?? false);
       setLastId(items[items.length - 1].id);
+      setLastCursor(cursor ?? undefined);
     } else {
       setHasMoreData(false);
     }
@@ -552,6 +556,7 @@ export const useProductSelection = (): UseProductSelectionReturn => {
     setHasMoreData(true);
     setPageSize(initialPageSize);
     setLastId(0);
+    setLastCursor(undefined);
     loadingLockRef.current = false;
     lastRequestPageRef.current = 0;
     // 递增搜索版本号，强制触发新的查询（绕过缓存）
@@ -568,6 +573,7 @@ export const useProductSelection = (): UseProductSelectionReturn => {
     setHasMoreData(true);
     setPageSize(initialPageSize);
     setLastId(0);
+    setLastCursor(undefined);
     setSelectedProductIds(new Set());
     // 递增搜索版本号，强制触发新的查询（绕过缓存）
     setSearchVersion((v) => v + 1);
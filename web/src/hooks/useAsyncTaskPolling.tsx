@@ -1,6 +1,9 @@
 /**
  * 异步任务轮询 Hook
  * 统一处理后台任务的轮询、进度显示、取消等逻辑
+ *
+ * 后端通过 WebSocket 推送任务进度（task.progress）时立即刷新状态，
+ * 收到推送后轮询降级为低频兜底（pushFallbackInterval）
  */
 import React, { useRef, useCallback } from 'react';
 import { Progress } from 'antd';
@@ -8,6 +11,7 @@ import { SyncOutlined } from '@ant-design/icons';
 import { getGlobalNotification } from '@/utils/globalNotification';
 import { notifySuccess, notifyError, notifyWarning } from '@/utils/notification';
 import { logger } from '@/utils/logger';
+import { TASK_PROGRESS_EVENT, TaskProgressEventDetail } from '@/types/notification';
 
 export interface TaskStatus<T = unknown> {
   state: 'PENDING' | 'SUCCESS' | 'FAILURE' | 'PROGRESS';
@@ -27,6 +31,7 @@ export interface UseAsyncTaskPollingOptions {
 
   // 轮询配置
   pollingInterval?: number; // 轮询间隔（毫秒），默认 2000
+  pushFallbackInterval?: number; // 收到进度推送后的兜底轮询间隔（毫秒），默认 10000
   timeout?: number; // 超时时间（毫秒），默认 30分钟
 
   // 通知配置
@@ -50,6 +55,7 @@ export const useAsyncTaskPolling = (options: UseAsyncTaskPollingOptions) => {
   const {
     getStatus,
     pollingInterval = 2000,
+    pushFallbackInterval = 10000,
     timeout = 30 * 60 * 1000,
     notificationKey = 'async-task',
     initialMessage = '任务进行中',
@@ -65,6 +71,7 @@ export const useAsyncTaskPolling = (options: UseAsyncTaskPollingOptions) => {
   const cancelFlagRef = useRef<boolean>(false);
   const pollingIntervalRef = useRef<NodeJS.Timeout | null>(null);
   const timeoutTimerRef = useRef<NodeJS.Timeout | null>(null);
+  const pushListenerRef = useRef<((event: Event) => void) | null>(null);
 
   // 停止轮询
   const stopPolling = useCallback(() => {
@@ -72,6 +79,10 @@ export const useAsyncTaskPolling = (options: UseAsyncTaskPollingOptions) => {
       clearInterval(pollingIntervalRef.current);
       pollingIntervalRef.current = null;
     }
+    if (pushListenerRef.current) {
+      window.removeEventListener(TASK_PROGRESS_EVENT, pushListenerRef.current);
+      pushListenerRef.current = null;
+    }
     if (timeoutTimerRef.current) {
       clearTimeout(timeoutTimerRef.current);
       timeoutTimerRef.current = null;
@@ -221,15 +232,35 @@ export const useAsyncTaskPolling = (options: UseAsyncTaskPollingOptions) => {
       }
     };
 
+    // 进度推送：立即刷新，并把定时轮询降级为低频兜底
+    let pushReceived = false;
+    const handlePush = (event: Event) => {
+      const { detail } = event as CustomEvent<TaskProgressEventDetail>;
+      if (detail?.taskId !== taskId || !pollingIntervalRef.current) {
+        return;
+      }
+      if (!pushReceived) {
+        pushReceived = true;
+        clearInterval(pollingIntervalRef.current);
+        pollingIntervalRef.current = setInterval(poll, Math.max(pollingInterval, pushFallbackInterval));
+      }
+      poll();
+    };
+    pushListenerRef.current = handlePush;
+    window.addEventListener(TASK_PROGRESS_EVENT, handlePush);
+
     // 首次立即执行
     await poll();
 
-    // 设置定时轮询
-    pollingIntervalRef.current = setInterval(poll, pollingInterval);
+    // 设置定时轮询（任务可能已在首次查询时结束）
+    if (pushListenerRef.current === handlePush) {
+      pollingIntervalRef.current = setInterval(poll, pollingInterval);
+    }
 
   }, [
     getStatus,
     pollingInterval,
+    pushFallbackInterval,
     timeout,
     notificationKey,
     initialMessage,
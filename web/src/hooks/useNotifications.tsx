@@ -19,6 +19,9 @@ import {
   ChatNotificationData,
   PostingNotificationData,
   SessionExpiredNotificationData,
+  TaskProgressNotificationData,
+  TaskProgressEventDetail,
+  TASK_PROGRESS_EVENT,
 } from '@/types/notification';
 import authService from '@/services/authService';
 import { markSessionExpired } from '@/services/axios';
@@ -251,6 +254,20 @@ export const useNotifications = (shopId: number | null) => {
           }
           break;
 
+        case 'task.progress':
+          // 后台任务进度推送：转发给正在监控该任务的 useAsyncTaskPolling
+          if (message.task_id && message.data) {
+            window.dispatchEvent(
+              new CustomEvent<TaskProgressEventDetail>(TASK_PROGRESS_EVENT, {
+                detail: {
+                  taskId: message.task_id,
+                  data: message.data as TaskProgressNotificationData,
+                },
+              })
+            );
+          }
+          break;
+
         case 'ping':
         case 'pong':
           // 心跳消息，忽略
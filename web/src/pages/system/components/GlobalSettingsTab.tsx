@@ -581,22 +581,15 @@ const CategoryFeaturesSection: React.FC<CategoryFeaturesSectionProps> = ({ isAdm
 
   const firstShopId = shopsData?.shops?.[0]?.id || 1; // 取第一个店铺，兜底值为1
 
-  // 动态加载类目树（使用文件的generatedAt作为缓存key）
+  // 动态加载类目树（类目树产物接口，版本未变时由浏览器缓存按 ETag 协商返回）
   const { data: categoryTreeData, isLoading: categoryTreeLoading, refetch: _refetchCategoryTree } = useQuery({
     queryKey: ['category-tree'],
     queryFn: async () => {
-      // 首次加载时添加时间戳破坏缓存，获取最新的generatedAt
-      const timestamp = Date.now();
-      const response = await fetch(`/data/categoryTree.json?t=${timestamp}`);
-      if (!response.ok) {
-        throw new Error('加载类目树失败');
-      }
-      const json = await response.json();
+      const json = await ozonApi.getCategoryTreeArtifact();
 
-      // 使用文件的 generatedAt 更新 queryKey
-      // 这样当类目同步后，generatedAt变化会自动触发重新加载
       return {
         data: json.data as CategoryOption[],
+        version: json.version,
         generatedAt: json.generatedAt,
         totalRecords: json.totalRecords,
       };
@@ -15,6 +15,19 @@ export const getCategoryTree = async (shopId: number) => {
   return response.data;
 };
 
+/**
+ * 获取类目树产物（与 /data/categoryTree.json 同内容）
+ *
+ * 服务端返回 ETag（产物版本号），浏览器缓存按 If-None-Match 协商，版本未变时 304 不重新下载；
+ * 传 root/depth 时只返回子树（懒加载）
+ */
+export const getCategoryTreeArtifact = async (params?: { root?: number; depth?: number }) => {
+  const response = await apiClient.get("/ozon/listings/categories/tree/artifact", {
+    params,
+  });
+  return response.data;
+};
+
 /**
  * 搜索类目
  */
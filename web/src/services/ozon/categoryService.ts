@@ -34,21 +34,14 @@ export interface CategoryAttributesResult {
 }
 
 /**
- * 从 public 目录加载类目树
+ * 加载类目树（类目树产物接口，版本未变时由浏览器缓存按 ETag 协商返回）
  *
  * @returns 类目树数据
  * @throws 加载失败时抛出异常
  */
 export async function loadCategoryTree(): Promise<CategoryOption[]> {
   try {
-    const timestamp = Date.now();
-    const response = await fetch(`/data/categoryTree.json?t=${timestamp}`);
-
-    if (!response.ok) {
-      throw new Error('加载类目树失败');
-    }
-
-    const json = await response.json();
+    const json = await ozonApi.getCategoryTreeArtifact();
     return json.data || [];
   } catch (error) {
     loggers.ozon.error('加载类目树失败', { error });
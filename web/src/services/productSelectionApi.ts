@@ -93,6 +93,7 @@ export interface ProductSearchParams {
     | 'created_desc'
     | 'created_asc';
   after_id?: number; // 游标：上次最后一个商品的ID
+  cursor?: string; // 游标：上一页返回的 cursor（优先于 after_id）
   limit?: number; // 每次加载数量
 }
 
@@ -102,6 +103,7 @@ export interface SearchResponse {
     items: ProductSelectionItem[];
     total: number;
     next_cursor?: number; // 下一页的游标
+    cursor?: string | null; // 下一页的游标（排序键 + ID）
     has_more: boolean; // 是否还有更多数据
   };
 }
@@ -118,6 +120,7 @@ export interface ImportResponse {
   error?: string;
   errors?: Array<{ row: number; error: string }>;
   missing_columns?: string[];
+  task_id?: string; // 导入进度任务ID（task.progress 推送）
 }
 
 export interface ImportHistoryResponse {
@@ -161,12 +164,16 @@ export interface ImportHistory {
 export const importProducts = async (
   file: File,
   strategy: 'skip' | 'update' | 'append' = 'update',
-  shopId: number = 1 // 默认使用店铺ID 1
+  shopId: number = 1, // 默认使用店铺ID 1
+  taskId?: string // 进度任务ID，上传前生成即可在导入期间接收 task.progress 推送
 ): Promise<ImportResponse> => {
   const formData = new FormData();
   formData.append('file', file);
   formData.append('strategy', strategy);
   formData.append('shop_id', shopId.toString());
+  if (taskId) {
+    formData.append('task_id', taskId);
+  }
 
   const response = await axios.post<ImportResponse>(
     '/api/ef/v1/ozon/product-selection/import',
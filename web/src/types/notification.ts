@@ -31,6 +31,24 @@ export interface SessionExpiredNotificationData {
   new_ip_address?: string;
 }
 
+// 后台任务进度推送数据（ef_core.services.task_progress 的任务快照）
+export interface TaskProgressNotificationData {
+  task_id: string;
+  type?: string;
+  status?: string;
+  progress?: number;
+  message?: string;
+  [key: string]: unknown;
+}
+
+// 收到 task.progress 推送时在 window 上派发的事件（detail: TaskProgressEventDetail）
+export const TASK_PROGRESS_EVENT = 'ef:task-progress';
+
+export interface TaskProgressEventDetail {
+  taskId: string;
+  data: TaskProgressNotificationData;
+}
+
 export interface WebSocketNotification {
   type:
     | 'connected'
@@ -42,10 +60,17 @@ export interface WebSocketNotification {
     | 'posting.cancelled'
     | 'posting.status_changed'
     | 'posting.delivered'
-    | 'session_expired'; // 单设备登录：会话失效
+    | 'session_expired' // 单设备登录：会话失效
+    | 'task.progress'; // 后台任务进度
   shop_id?: number;
   chat_id?: string;
-  data?: ChatNotificationData | PostingNotificationData | SessionExpiredNotificationData | unknown;
+  task_id?: string;
+  data?:
+    | ChatNotificationData
+    | PostingNotificationData
+    | SessionExpiredNotificationData
+    | TaskProgressNotificationData
+    | unknown;
   timestamp?: string;
 }
 